@@ -0,0 +1,96 @@
+# #############################################################################
+#
+#  bench_area.py - incident area ranking benchmark
+#
+#  usage: python benchmarks/bench_area.py [vertices] [count]
+#
+#  Builds a reproducible county-sized boundary (default 20000 vertices,
+#   a smooth random wobble around a 100 km wide oval, same seed every run)
+#   and reports:
+#   - index build time
+#   - point-in-polygon and distance-to-boundary time per candidate, for the
+#     candidates of a batch-sized corpus of coordinate strings
+#     (bench_engine.makeCorpus), indexed and brute force (every edge)
+#   - rankCandidates time per candidate
+#  and checks that the indexed answers agree with brute force.
+#
+# #############################################################################
+
+import argparse
+import math
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0,os.path.join(os.path.dirname(os.path.abspath(__file__)),".."))
+sys.path.insert(0,os.path.dirname(os.path.abspath(__file__)))
+
+import buckshot_area
+import buckshot_engine
+from bench_engine import makeCorpus
+
+# makeBoundary - one ring of (lon,lat) around 39.3 N 120.8 W
+def makeBoundary(vertices):
+	rnd=random.Random(5)
+	ring=[]
+	r=0.35
+	for k in range(vertices):
+		r=min(0.5,max(0.2,r+rnd.uniform(-0.003,0.003)))
+		a=2*math.pi*k/vertices
+		ring.append((-120.8+1.3*r*math.cos(a),39.3+r*math.sin(a)))
+	return ring
+
+def bruteContains(area,x,y):
+	inside=False
+	for (x1,y1,x2,y2) in area.edges:
+		if (y1>y)!=(y2>y) and x<x1+(y-y1)*(x2-x1)/(y2-y1):
+			inside=not inside
+	return inside
+
+def bruteDistance(area,x,y):
+	return math.sqrt(min(buckshot_area.segmentDistance2(x,y,edge) for edge in area.edges))
+
+def timePerPoint(f,points):
+	t0=time.perf_counter()
+	results=[f(x,y) for (x,y) in points]
+	return (results,(time.perf_counter()-t0)/len(points)*1e6)
+
+def main():
+	parser=argparse.ArgumentParser(description="incident area benchmark")
+	parser.add_argument("vertices",type=int,nargs="?",default=20000,help="boundary vertices (default 20000)")
+	parser.add_argument("count",type=int,nargs="?",default=300,help="coordinate strings whose candidates are tested (default 300)")
+	args=parser.parse_args()
+	(vertices,count)=(args.vertices,args.count)
+	t0=time.perf_counter()
+	area=buckshot_area.IncidentArea([makeBoundary(vertices)],"bench")
+	print("%d edges, %dx%d grid: build %.2f s" % (len(area.edges),area.nx,area.ny,time.perf_counter()-t0))
+
+	candidates=[]
+	for coordString in makeCorpus(count):
+		candidateSet=buckshot_engine.generate(coordString)
+		candidates.extend(candidateSet.Dd+candidateSet.DMm+candidateSet.DMSs)
+	points=[area.project(c.lat,c.lon) for c in candidates]
+	# brute force is slow; compare on a sample
+	sample=points[::max(1,len(points)//200)]
+
+	(inside,t)=timePerPoint(area.containsXY,points)
+	print("%d candidates, %d inside" % (len(points),sum(inside)))
+	print("contains, indexed     : %8.1f us/candidate" % t)
+	(distances,t)=timePerPoint(area.distanceXY,points)
+	print("distance, indexed     : %8.1f us/candidate" % t)
+	(bruteInside,t)=timePerPoint(lambda x,y: bruteContains(area,x,y),sample)
+	print("contains, brute force : %8.1f us/candidate" % t)
+	(bruteDistances,t)=timePerPoint(lambda x,y: bruteDistance(area,x,y),sample)
+	print("distance, brute force : %8.1f us/candidate" % t)
+	t0=time.perf_counter()
+	area.rankCandidates(candidates)
+	print("rankCandidates        : %8.1f us/candidate" % ((time.perf_counter()-t0)/len(candidates)*1e6))
+
+	step=max(1,len(points)//200)
+	for (n,(x,y)) in enumerate(sample):
+		if inside[n*step]!=bruteInside[n] or abs(distances[n*step]-bruteDistances[n])>1e-6:
+			raise RuntimeError("indexed and brute force results differ at "+str((x,y)))
+
+if __name__=="__main__":
+	main()
@@ -0,0 +1,94 @@
+# #############################################################################
+#
+#  bench_datum.py - datum expansion benchmark
+#
+#  usage: python benchmarks/bench_datum.py [count] [grid base name]
+#
+#  Without a grid, writes a reproducible synthetic NADCON .las/.los pair
+#   with the layout of conus (0.25 degree spacing, 131-63 W, 20-50 N) to a
+#   temporary directory.  Reports:
+#   - the per-keystroke cost: converting the candidates of one coordinate
+#     string (bench_engine.makeCorpus) and expanding their markers
+#   - points per second for Datum.convertMany over a batch-sized corpus,
+#     all points at once (with NumPy if installed) and one point at a time
+#  and checks that both give the same positions.
+#
+# #############################################################################
+
+import argparse
+import os
+import random
+import shutil
+import struct
+import sys
+import tempfile
+import time
+
+sys.path.insert(0,os.path.join(os.path.dirname(os.path.abspath(__file__)),".."))
+sys.path.insert(0,os.path.dirname(os.path.abspath(__file__)))
+
+import buckshot_datum
+import buckshot_engine
+import buckshot_export
+from bench_engine import makeCorpus
+
+# writeGrid - a .las/.los pair of smooth random shifts (arc-seconds)
+def writeGrid(base):
+	rnd=random.Random(27)
+	(nc,nr)=(273,121)
+	for (ext,mean) in ((".las",0.3),(".los",3.0)):
+		with open(base+ext,"wb") as f:
+			f.write(struct.pack("<56s8s3i5f",b"synthetic conus layout",b"NADCON",nc,nr,1,-131.0,0.25,20.0,0.25,0.0).ljust((nc+1)*4,b"\0"))
+			for r in range(nr):
+				f.write(struct.pack("<i%df" % nc,0,*[mean+rnd.uniform(-1,1) for c in range(nc)]))
+
+def main():
+	parser=argparse.ArgumentParser(description="datum expansion benchmark")
+	parser.add_argument("count",type=int,nargs="?",default=1000,help="coordinate strings (default 1000)")
+	parser.add_argument("base",nargs="?",help="NADCON grid base name (.las/.los); default: a synthetic grid")
+	args=parser.parse_args()
+	count=args.count
+	tempDir=None
+	if args.base:
+		base=args.base
+	else:
+		tempDir=tempfile.mkdtemp()
+		base=os.path.join(tempDir,"conus")
+		writeGrid(base)
+	try:
+		datum=buckshot_datum.Datum("NAD27",[buckshot_datum.ShiftGrid(base)])
+		corpus=makeCorpus(count)
+		candidateSets=[buckshot_engine.generate(coordString) for coordString in corpus]
+		print("%d coordinate strings (numpy %s)" % (count,"yes" if buckshot_datum.np else "no"))
+
+		t0=time.perf_counter()
+		for candidates in candidateSets:
+			markerList=buckshot_export.makeMarkers(candidates,"X",None)
+			buckshot_datum.expandMarkers(markerList,[datum])
+		t=time.perf_counter()-t0
+		print("expand one string    : %10.1f us/keystroke" % (t/count*1e6))
+
+		lats=[]
+		lons=[]
+		for candidates in candidateSets:
+			for c in candidates.Dd+candidates.DMm+candidates.DMSs:
+				lats.append(c.lat)
+				lons.append(c.lon)
+		t0=time.perf_counter()
+		batched=datum.convertMany(lats,lons)
+		t=time.perf_counter()-t0
+		print("convertMany (batched): %10.0f points/s (%d points)" % (len(lats)/t,len(lats)))
+		t0=time.perf_counter()
+		one=[datum.convertMany([lat],[lon])[0] for (lat,lon) in zip(lats,lons)]
+		t=time.perf_counter()-t0
+		print("convert (one by one) : %10.0f points/s" % (len(lats)/t))
+		for (a,b) in zip(batched,one):
+			if (a is None)!=(b is None) or (a is not None and max(abs(a[0]-b[0]),abs(a[1]-b[1]))>1e-9):
+				raise RuntimeError("batched and one-by-one positions differ")
+		datum.close()
+	finally:
+		if tempDir:
+			shutil.rmtree(tempDir)
+
+if __name__=="__main__":
+	main()
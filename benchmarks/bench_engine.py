@@ -0,0 +1,118 @@
+# #############################################################################
+#
+#  bench_engine.py - throughput benchmark for the buckshot candidate engine
+#
+#  usage: python benchmarks/bench_engine.py [count] [--region NAMES]...
+#
+#  Generates a reproducible corpus of coordinate strings (same random seed
+#   every run, so numbers are comparable between laptops and releases) and
+#   reports strings per second for:
+#   - calcLatLon on the digit strings (enumeration only)
+#   - generate without the cache (canonicalize + enumeration + match marking)
+#   - typing: generate (with the candidate cache, as the window calls it)
+#     for each string typed one character at a time
+#   - buckshot_vector.generateColumns on the whole corpus (if numpy is installed)
+#  all of the above use the default region hypothesis (latitude 20-49 N,
+#   longitude 100-129 W), so that the numbers stay comparable with releases
+#   that had it hard-coded; then, calcLatLon and typing are
+#   repeated for broader regions (--region, repeatable, presets joined with
+#   +; default conus and default+conus+alaska+hawaii), along with the
+#   average number of candidates per string; world is left out by default,
+#   since at about 1500 candidates per string its typing run alone takes
+#   minutes (try --region world with a count of 2000)
+#
+# #############################################################################
+
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0,os.path.join(os.path.dirname(os.path.abspath(__file__)),".."))
+
+import buckshot_engine
+
+# makeCorpus - coordinate strings that look like typical radio readings,
+#  i.e. latitude 20-49, longitude 100-129, one to six digits after each
+def makeCorpus(count):
+	rnd=random.Random(1234)
+	corpus=[]
+	for n in range(count):
+		lat=str(rnd.randint(20,49))+" "+"".join(rnd.choice("0123456789") for i in range(rnd.randint(1,6)))
+		lon=str(rnd.randint(100,129))+" "+"".join(rnd.choice("0123456789") for i in range(rnd.randint(1,6)))
+		corpus.append(lat+" "+lon)
+	return corpus
+
+# bestOf - best wall-clock time of several repeats of func
+def bestOf(func,repeats=5):
+	best=None
+	for n in range(repeats):
+		t0=time.perf_counter()
+		func()
+		t=time.perf_counter()-t0
+		if best is None or t<best:
+			best=t
+	return best
+
+def main():
+	parser=argparse.ArgumentParser(description="throughput benchmark for the buckshot candidate engine")
+	parser.add_argument("count",type=int,nargs="?",default=20000,help="coordinate strings in the corpus (default 20000)")
+	parser.add_argument("--region",action="append",metavar="NAMES",
+		help="broader regions to repeat the run for, presets joined with +, e.g. world; repeatable (default: conus and default+conus+alaska+hawaii)")
+	args=parser.parse_args()
+	count=args.count
+	regionNames=args.region or ["conus","default+conus+alaska+hawaii"]
+	for name in regionNames:
+		for preset in name.split("+"):
+			if preset not in buckshot_engine.regionPresets:
+				parser.error("unknown region preset: "+preset)
+	corpus=makeCorpus(count)
+	numbersList=["".join(c for c in coordString if c.isdigit()) for coordString in corpus]
+
+	def runCalcLatLon():
+		for numbers in numbersList:
+			buckshot_engine.calcLatLon(numbers)
+
+	def runGenerate():
+		for coordString in corpus:
+			buckshot_engine.generate(coordString,useCache=False)
+
+	def runTyping():
+		buckshot_engine.cacheClear()
+		for coordString in corpus[:count//10]:
+			for n in range(1,len(coordString)+1):
+				buckshot_engine.generate(coordString[:n])
+
+	keystrokes=sum(len(coordString) for coordString in corpus[:count//10])
+
+	t=bestOf(runCalcLatLon)
+	print("calcLatLon           : %9.0f strings/s" % (count/t))
+	t=bestOf(runGenerate)
+	print("generate (no cache)  : %9.0f strings/s" % (count/t))
+	t=bestOf(runTyping)
+	print("typing               : %9.0f keystrokes/s" % (keystrokes/t))
+
+	try:
+		import buckshot_vector
+	except ImportError:
+		print("vectorized           : skipped (numpy not installed)")
+	else:
+		t=bestOf(lambda: buckshot_vector.generateColumns(numbersList))
+		print("vectorized           : %9.0f strings/s" % (count/t))
+
+	for name in regionNames:
+		regionList=[]
+		for preset in name.split("+"):
+			regionList.extend(buckshot_engine.lookupRegions(preset))
+		buckshot_engine.setRegions(regionList)
+		candidates=sum(sum(len(c) for c in buckshot_engine.calcLatLon(numbers)) for numbers in numbersList[:count//10])
+		print("region "+name+": %.1f candidates/string" % (candidates/(count//10)))
+		t=bestOf(runCalcLatLon,3)
+		print("  calcLatLon         : %9.0f strings/s" % (count/t))
+		t=bestOf(runTyping,3)
+		print("  typing             : %9.0f keystrokes/s" % (keystrokes/t))
+	buckshot_engine.setRegions(buckshot_engine.lookupRegions("default"))
+
+if __name__=="__main__":
+	main()
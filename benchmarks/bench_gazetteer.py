@@ -0,0 +1,85 @@
+# #############################################################################
+#
+#  bench_gazetteer.py - offline gazetteer benchmark
+#
+#  usage: python benchmarks/bench_gazetteer.py [count] [gazetteer file]
+#
+#  Without a file, writes a reproducible GNIS NationalFile-style file of
+#   count random features (default 500000, a bit over a quarter of the
+#   national file) to a temporary directory.  Reports:
+#   - load (index build) time
+#   - search time for each prefix of a few landmark names, i.e. what typing
+#     a landmark one key at a time costs per keystroke
+#   - nearest-place lookups per second, for random points in the data
+#
+# #############################################################################
+
+import argparse
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0,os.path.join(os.path.dirname(os.path.abspath(__file__)),".."))
+
+import buckshot_gazetteer
+
+header="FEATURE_ID|FEATURE_NAME|FEATURE_CLASS|STATE_ALPHA|STATE_NUMERIC|COUNTY_NAME|COUNTY_NUMERIC|PRIMARY_LAT_DMS|PRIM_LONG_DMS|PRIM_LAT_DEC|PRIM_LONG_DEC|SOURCE_LAT_DMS|SOURCE_LONG_DMS|SOURCE_LAT_DEC|SOURCE_LONG_DEC|ELEV_IN_M|ELEV_IN_FT|MAP_NAME|DATE_CREATED|DATE_EDITED\n"
+
+words=["Bald","Bear","Cedar","Crystal","Deer","Eagle","Granite","Hobart","Indian","Lost","Mill","Pine","Prosser","Red","Rock","Sage","Spring","Sugar","Trout","Willow"]
+classes=[("Summit",["Mountain","Peak","Hill","Butte"]),("Lake",["Lake","Reservoir"]),("Stream",["Creek","Fork","Branch"]),("Populated Place",["","Mills","Flat"])]
+states=["CA","NV","OR","AZ","UT","ID"]
+
+# writeFile - count random features in GNIS NationalFile layout
+def writeFile(filename,count):
+	rnd=random.Random(4321)
+	with open(filename,"w",encoding="utf-8") as f:
+		f.write(header)
+		for n in range(count):
+			(featureClass,suffixes)=rnd.choice(classes)
+			name=" ".join(filter(None,[rnd.choice(words),rnd.choice(words) if rnd.random()<0.3 else "",rnd.choice(suffixes)]))
+			lat=rnd.uniform(31.0,49.0)
+			lon=-rnd.uniform(109.0,124.0)
+			f.write("%d|%s|%s|%s|06|County %d|057|||%.7f|%.7f|||||||Map|01/01/1980|\n" % (n+1,name,featureClass,rnd.choice(states),n%58,lat,lon))
+
+def main():
+	parser=argparse.ArgumentParser(description="gazetteer load and lookup benchmark")
+	parser.add_argument("count",type=int,nargs="?",default=500000,help="features in the synthetic gazetteer (default 500000)")
+	parser.add_argument("filename",nargs="?",help="gazetteer file to load instead of a synthetic one")
+	args=parser.parse_args()
+	count=args.count
+	tempDir=None
+	if args.filename:
+		filename=args.filename
+	else:
+		tempDir=tempfile.mkdtemp()
+		filename=os.path.join(tempDir,"gnis.txt")
+		writeFile(filename,count)
+	try:
+		t0=time.perf_counter()
+		gazetteer=buckshot_gazetteer.Gazetteer(filename)
+		print("%d features, %d name keys: load %.2f s" % (len(gazetteer),len(gazetteer.keys),time.perf_counter()-t0))
+
+		times=[]
+		for name in ["Prosser Hill","Sugar Pine Reservoir","Hobart Mills","Lake"]:
+			for k in range(1,len(name)+1):
+				t0=time.perf_counter()
+				gazetteer.search(name[:k])
+				times.append(time.perf_counter()-t0)
+		print("search, per keystroke : %8.1f us average, %8.1f us worst" % (sum(times)/len(times)*1e6,max(times)*1e6))
+
+		rnd=random.Random(1)
+		points=[(rnd.uniform(31.0,49.0),-rnd.uniform(109.0,124.0)) for n in range(2000)]
+		t0=time.perf_counter()
+		for (lat,lon) in points:
+			gazetteer.nearest(lat,lon)
+		print("nearest place (5 km)  : %8.1f us/lookup" % ((time.perf_counter()-t0)/len(points)*1e6))
+		gazetteer.close()
+	finally:
+		if tempDir:
+			shutil.rmtree(tempDir)
+
+if __name__=="__main__":
+	main()
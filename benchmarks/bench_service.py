@@ -0,0 +1,131 @@
+# #############################################################################
+#
+#  bench_service.py - HTTP/JSON service throughput benchmark
+#
+#  usage: python benchmarks/bench_service.py [clients] [requests per client]
+#
+#  Starts the service (buckshot_service; python buckshot_cli.py serve) on a
+#   free port in another process, and sends it typical radio readings (the
+#   bench_engine corpus) from many concurrent clients (default 50, 20
+#   requests each):
+#   - keep-alive: each client sends its requests over one connection
+#   - new connection per request (Connection: close)
+#   - batch: each client sends its readings as one batch request
+#  Reports requests (or readings) per second and, for single readings, the
+#   median and 99th percentile latency as seen by the clients; checks that
+#   every response was a 200 with the right number of records.
+#
+# #############################################################################
+
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import time
+from urllib.parse import quote
+
+repoDir=os.path.join(os.path.dirname(os.path.abspath(__file__)),"..")
+sys.path.insert(0,os.path.dirname(os.path.abspath(__file__)))
+
+from bench_engine import makeCorpus
+
+# startService - launch the service on a free port; returns (process,port)
+def startService():
+	proc=subprocess.Popen([sys.executable,os.path.join(repoDir,"buckshot_cli.py"),"serve","--port","0"],
+		stderr=subprocess.PIPE,universal_newlines=True)
+	line=proc.stderr.readline()
+	if "serving on" not in line:
+		proc.kill()
+		raise RuntimeError("service did not start: "+line)
+	port=int(line.rstrip().rstrip("/").rsplit(":",1)[1])
+	return (proc,port)
+
+# request - send one request and read its response; returns the response
+#  body (raises if the status isn't 200)
+async def request(reader,writer,method,target,body=b"",close=False):
+	head="%s %s HTTP/1.1\r\nHost: localhost\r\nContent-Length: %d\r\n" % (method,target,len(body))
+	if close:
+		head+="Connection: close\r\n"
+	writer.write(head.encode("latin-1")+b"\r\n"+body)
+	status=await reader.readline()
+	length=0
+	while True:
+		line=await reader.readline()
+		if line in (b"\r\n",b""):
+			break
+		(name,sep,value)=line.decode("latin-1").partition(":")
+		if name.lower()=="content-length":
+			length=int(value)
+	data=await reader.readexactly(length)
+	if b" 200 " not in status:
+		raise RuntimeError(status.decode("latin-1").strip()+": "+data.decode("utf-8","replace"))
+	return data
+
+def singleTarget(coordString):
+	return "/candidates?coords="+quote(coordString)
+
+async def keepAliveClient(port,coordStrings,latencies):
+	(reader,writer)=await asyncio.open_connection("127.0.0.1",port)
+	for coordString in coordStrings:
+		t0=time.perf_counter()
+		json.loads(await request(reader,writer,"GET",singleTarget(coordString)))
+		latencies.append(time.perf_counter()-t0)
+	writer.close()
+
+async def connectionPerRequestClient(port,coordStrings,latencies):
+	for coordString in coordStrings:
+		t0=time.perf_counter()
+		(reader,writer)=await asyncio.open_connection("127.0.0.1",port)
+		json.loads(await request(reader,writer,"GET",singleTarget(coordString),close=True))
+		writer.close()
+		latencies.append(time.perf_counter()-t0)
+
+async def batchClient(port,coordStrings,latencies):
+	(reader,writer)=await asyncio.open_connection("127.0.0.1",port)
+	t0=time.perf_counter()
+	results=json.loads(await request(reader,writer,"POST","/candidates",json.dumps({"coords":coordStrings}).encode("utf-8")))["results"]
+	latencies.append(time.perf_counter()-t0)
+	if len(results)!=len(coordStrings):
+		raise RuntimeError("batch of %d gave %d records" % (len(coordStrings),len(results)))
+	writer.close()
+
+# run - all clients at once; returns (seconds,latencies)
+def run(client,port,work):
+	latencies=[]
+	async def runAll():
+		await asyncio.gather(*[client(port,coordStrings,latencies) for coordStrings in work])
+	t0=time.perf_counter()
+	asyncio.run(runAll())
+	return (time.perf_counter()-t0,sorted(latencies))
+
+def percentile(values,p):
+	return values[min(len(values)-1,int(p*len(values)))]
+
+def main():
+	parser=argparse.ArgumentParser(description="HTTP/JSON service throughput benchmark")
+	parser.add_argument("clients",type=int,nargs="?",default=50,help="concurrent clients (default 50)")
+	parser.add_argument("perClient",type=int,nargs="?",default=20,metavar="requests",help="requests per client (default 20)")
+	args=parser.parse_args()
+	(clients,perClient)=(args.clients,args.perClient)
+	corpus=makeCorpus(clients*perClient)
+	work=[corpus[n*perClient:(n+1)*perClient] for n in range(clients)]
+	(proc,port)=startService()
+	try:
+		print("%d clients, %d readings each" % (clients,perClient))
+		# (warm up: the deferred imports, and the candidate cache for
+		#  every run alike)
+		run(keepAliveClient,port,work)
+		for (label,client) in (("keep-alive            ",keepAliveClient),("connection per request",connectionPerRequestClient)):
+			(t,latencies)=run(client,port,work)
+			print("%s: %7.0f requests/s, latency %6.1f ms median, %6.1f ms p99" % (label,
+				len(latencies)/t,percentile(latencies,0.5)*1000,percentile(latencies,0.99)*1000))
+		(t,latencies)=run(batchClient,port,work)
+		print("batch                 : %7.0f readings/s" % (clients*perClient/t))
+	finally:
+		proc.terminate()
+		proc.wait()
+
+if __name__=="__main__":
+	main()
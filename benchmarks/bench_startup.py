@@ -0,0 +1,111 @@
+# #############################################################################
+#
+#  bench_startup.py - cold-start benchmark for the buckshot window
+#
+#  usage: python benchmarks/bench_startup.py [runs] [budget seconds]
+#
+#  Launches a fresh interpreter for each run (so nothing is already
+#   imported or cached in-process; the OS file cache will be warm after the
+#   first run, same as when the operator launches it a second time) that
+#   imports buckshot, opens MyWindow and quits as soon as it has been
+#   painted.  Reports, best and median over the runs:
+#   - launch to first paint, as seen from here (interpreter startup
+#     included), which is what is checked against the budget
+#   - within the launched interpreter: importing buckshot, building the
+#     window, and showing it until the first paint
+#  and checks that none of the modules deferred to keep startup quick
+#   (NumPy, requests; see buckshot_lazy) were imported before the first
+#   paint.  Exits with status 1 if the median is over the budget (default
+#   0.5 s; about 0.2 s on a current laptop, against 0.4 s when everything
+#   was imported up front) or a deferred module was imported.
+#  Without a display (e.g. on a build machine), Qt's offscreen platform is
+#   used.
+#
+# #############################################################################
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+repoDir=os.path.join(os.path.dirname(os.path.abspath(__file__)),"..")
+
+# modules that must not be imported before the window is painted
+deferredModules=["numpy","requests","buckshot_sartopo","multiprocessing",
+	"buckshot_area","buckshot_cli","buckshot_cluster","buckshot_datum","buckshot_gazetteer","buckshot_metrics","buckshot_terrain"]
+
+defaultBudget=0.5
+
+# child - run in the launched interpreter: report the stage times as one
+#  line of JSON once the window has been painted
+def child():
+	t0=time.perf_counter()
+	sys.path.insert(0,repoDir)
+	import buckshot
+	from PyQt5.QtWidgets import QApplication
+	tImport=time.perf_counter()
+	app=QApplication(sys.argv[:1])
+	w=buckshot.MyWindow(app)
+	tWindow=time.perf_counter()
+	def painted():
+		tPaint=time.perf_counter()
+		print(json.dumps({
+			"import":tImport-t0,
+			"window":tWindow-tImport,
+			"paint":tPaint-tWindow,
+			"loaded":[name for name in deferredModules if name in sys.modules]}))
+		sys.stdout.flush()
+		app.quit()
+	w.painted.connect(painted)
+	w.show()
+	app.exec_()
+
+# launch - one cold start; returns (seconds to first paint,child report)
+def launch():
+	env=dict(os.environ)
+	if sys.platform.startswith("linux") and not env.get("DISPLAY") and not env.get("WAYLAND_DISPLAY"):
+		env.setdefault("QT_QPA_PLATFORM","offscreen")
+	t0=time.perf_counter()
+	proc=subprocess.Popen([sys.executable,os.path.abspath(__file__),"--child"],stdout=subprocess.PIPE,env=env,universal_newlines=True)
+	line=proc.stdout.readline()
+	t=time.perf_counter()-t0
+	proc.stdout.close()
+	proc.wait()
+	if not line:
+		raise RuntimeError("window did not start (exit status %d)" % proc.returncode)
+	return (t,json.loads(line))
+
+def median(values):
+	values=sorted(values)
+	return values[len(values)//2]
+
+def main():
+	parser=argparse.ArgumentParser(description="cold-start benchmark for the buckshot window")
+	parser.add_argument("runs",type=int,nargs="?",default=10,help="cold starts (default 10)")
+	parser.add_argument("budget",type=float,nargs="?",default=defaultBudget,help="median launch-to-paint budget in seconds (default %g)" % defaultBudget)
+	args=parser.parse_args()
+	(runs,budget)=(args.runs,args.budget)
+	results=[launch() for n in range(runs)]
+	totals=[t for (t,report) in results]
+	print("%d cold starts" % runs)
+	print("launch to first paint: %7.0f ms best, %7.0f ms median (budget %.0f ms)" % (min(totals)*1000,median(totals)*1000,budget*1000))
+	for stage in ["import","window","paint"]:
+		values=[report[stage] for (t,report) in results]
+		print("  %-19s: %7.0f ms best, %7.0f ms median" % (stage,min(values)*1000,median(values)*1000))
+	ok=True
+	loaded=sorted(set(name for (t,report) in results for name in report["loaded"]))
+	if loaded:
+		print("imported before first paint: "+", ".join(loaded))
+		ok=False
+	if median(totals)>budget:
+		print("over budget")
+		ok=False
+	return 0 if ok else 1
+
+if __name__=="__main__":
+	if sys.argv[1:]==["--child"]:
+		child()
+	else:
+		sys.exit(main())
@@ -0,0 +1,87 @@
+# #############################################################################
+#
+#  bench_terrain.py - terrain sampling benchmark
+#
+#  usage: python benchmarks/bench_terrain.py [points] [dem directory]
+#
+#  Without a DEM directory, writes a reproducible 2x2 degree mosaic of
+#   synthetic 3 arc-second SRTM .hgt tiles (plus a BIL water mask) to a
+#   temporary directory.  Reports points per second for:
+#   - Terrain.sample, one point at a time (what the GUI does per row)
+#   - Terrain.sampleMany, all points at once, grouped by tile (what batch
+#     mode does per chunk), with NumPy if installed
+#  and checks that both give the same samples.
+#
+# #############################################################################
+
+import argparse
+import os
+import random
+import shutil
+import struct
+import sys
+import tempfile
+import time
+
+sys.path.insert(0,os.path.join(os.path.dirname(os.path.abspath(__file__)),".."))
+
+import buckshot_terrain
+
+# writeTiles - .hgt tiles for 39-41 N, 120-122 W and a water mask over them
+def writeTiles(directory):
+	rnd=random.Random(99)
+	n=1201
+	for lat in (39,40):
+		for lon in (121,122):
+			row=struct.pack(">%dh" % n,*[rnd.randint(500,3000) for i in range(n)])
+			with open(os.path.join(directory,"N%02dW%03d.hgt" % (lat,lon)),"wb") as f:
+				for r in range(n):
+					f.write(row[r%7*2:]+row[:r%7*2])
+	with open(os.path.join(directory,"water.bil"),"wb") as f:
+		f.write(bytes(rnd.random()<0.05 for i in range(200*200)))
+	with open(os.path.join(directory,"water.hdr"),"w") as f:
+		f.write("BYTEORDER I\nNROWS 200\nNCOLS 200\nNBITS 8\nULXMAP -121.995\nULYMAP 40.995\nXDIM 0.01\nYDIM 0.01\n")
+
+def main():
+	parser=argparse.ArgumentParser(description="terrain sampling benchmark")
+	parser.add_argument("count",type=int,nargs="?",default=1000000,help="points sampled (default 1000000)")
+	parser.add_argument("dem",nargs="?",help="DEM directory to sample instead of synthetic tiles")
+	args=parser.parse_args()
+	count=args.count
+	tempDir=None
+	if args.dem:
+		demPaths=[args.dem]
+		waterPaths=[]
+	else:
+		tempDir=tempfile.mkdtemp()
+		writeTiles(tempDir)
+		demPaths=[os.path.join(tempDir,name) for name in os.listdir(tempDir) if name.endswith(".hgt")]
+		waterPaths=[os.path.join(tempDir,"water.bil")]
+	try:
+		terrain=buckshot_terrain.Terrain(demPaths,waterPaths)
+		(south,north)=(min(r.bottom for r in terrain.dem.rasters),max(r.top for r in terrain.dem.rasters))
+		(west,east)=(min(r.left for r in terrain.dem.rasters),max(r.right for r in terrain.dem.rasters))
+		rnd=random.Random(1)
+		lats=[rnd.uniform(south,north) for n in range(count)]
+		lons=[rnd.uniform(west,east) for n in range(count)]
+		print("%d points over %d DEM tiles (numpy %s)" % (count,len(terrain.dem),"yes" if buckshot_terrain.np else "no"))
+
+		t0=time.perf_counter()
+		batched=terrain.sampleMany(lats,lons)
+		t=time.perf_counter()-t0
+		print("sampleMany (batched) : %10.0f points/s" % (count/t))
+
+		single=min(count,200000)
+		t0=time.perf_counter()
+		one=[terrain.sample(lat,lon) for (lat,lon) in zip(lats[:single],lons[:single])]
+		t=time.perf_counter()-t0
+		print("sample (one by one)  : %10.0f points/s" % (single/t))
+		if one!=batched[:single]:
+			raise RuntimeError("batched and one-by-one samples differ")
+		terrain.close()
+	finally:
+		if tempDir:
+			shutil.rmtree(tempDir)
+
+if __name__=="__main__":
+	main()
@@ -0,0 +1,63 @@
+# #############################################################################
+#
+#  bench_upload.py - SARTopo marker upload benchmark
+#
+#  usage: python benchmarks/bench_upload.py [delay]
+#
+#  Starts the local SARTopo stand-in (sartopo_standin.py) with the given
+#   per-request latency (default 0.1 seconds, roughly a slow field LTE link)
+#   and uploads a typical buckshot marker list with 1 worker (the old
+#   one-marker-at-a-time behavior) and with the default pool size, checking
+#   that every marker arrived both times; then uploads a reading with runs
+#   of zeros, whose interpretations pile up on a few points, with and
+#   without merging markers within 10 meters (buckshot_cluster).
+#
+# #############################################################################
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0,os.path.join(os.path.dirname(os.path.abspath(__file__)),".."))
+sys.path.insert(0,os.path.dirname(os.path.abspath(__file__)))
+
+import buckshot_cluster
+import buckshot_engine
+import buckshot_export
+import buckshot_sartopo
+from sartopo_standin import StandinServer
+
+def upload(server,markerList,maxWorkers):
+	t0=time.perf_counter()
+	with buckshot_sartopo.SartopoUploader(server.domainAndPort(),"bench",maxWorkers) as uploader:
+		results=uploader.uploadMarkers(markerList)
+	t=time.perf_counter()-t0
+	failed=[result for result in results if not result.ok]
+	if failed:
+		raise RuntimeError(str(len(failed))+" markers failed: "+failed[0].error)
+	return t
+
+def main():
+	parser=argparse.ArgumentParser(description="SARTopo upload benchmark against the local stand-in server")
+	parser.add_argument("delay",type=float,nargs="?",default=0.1,help="seconds the stand-in takes per request (default 0.1)")
+	delay=parser.parse_args().delay
+	candidates=buckshot_engine.generate("39 2345 120 1234")
+	markerList=buckshot_export.makeMarkers(candidates,"X")
+	server=StandinServer(delay=delay).start()
+	try:
+		print(str(len(markerList))+" markers, "+str(delay)+" s per request")
+		for maxWorkers in (1,4,8):
+			t=upload(server,markerList,maxWorkers)
+			print("%d worker(s)          : %6.2f s" % (maxWorkers,t))
+		candidates=buckshot_engine.generate("39 30 00 120 30 00")
+		markerList=buckshot_export.makeMarkers(candidates,"X")
+		clustered=buckshot_cluster.clusterMarkers(markerList,candidates,10)
+		for (label,markers) in (("unclustered",markerList),("clustered  ",clustered)):
+			t=upload(server,markers,4)
+			print("%s, %2d markers: %6.2f s" % (label,len(markers),t))
+	finally:
+		server.stop()
+
+if __name__=="__main__":
+	main()
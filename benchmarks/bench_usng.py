@@ -0,0 +1,63 @@
+# #############################################################################
+#
+#  bench_usng.py - UTM/USNG projection benchmark
+#
+#  usage: python benchmarks/bench_usng.py [count]
+#
+#  Projects the candidates of a batch-sized corpus of coordinate strings
+#   (bench_engine.makeCorpus) to UTM and reports points per second for:
+#   - toUTMMany, all points at once (what batch mode does per chunk), with
+#     NumPy if installed
+#   - toUTM, one point at a time
+#   - usngText, formatting the projected points
+#  checks that both projections give the same USNG references, and that
+#  parsing each reference back lands in the same square meter.
+#
+# #############################################################################
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0,os.path.join(os.path.dirname(os.path.abspath(__file__)),".."))
+sys.path.insert(0,os.path.dirname(os.path.abspath(__file__)))
+
+import buckshot_engine
+import buckshot_usng
+from bench_engine import makeCorpus
+
+def main():
+	parser=argparse.ArgumentParser(description="UTM/USNG projection benchmark")
+	parser.add_argument("count",type=int,nargs="?",default=3000,help="coordinate strings whose candidates are projected (default 3000)")
+	count=parser.parse_args().count
+	lats=[]
+	lons=[]
+	for coordString in makeCorpus(count):
+		for c in buckshot_engine.allCandidates(buckshot_engine.generate(coordString)):
+			lats.append(c.lat)
+			lons.append(c.lon)
+	print("%d candidates of %d coordinate strings (numpy %s)" % (len(lats),count,"yes" if buckshot_usng.np else "no"))
+
+	t0=time.perf_counter()
+	batched=buckshot_usng.toUTMMany(lats,lons)
+	t=time.perf_counter()-t0
+	print("toUTMMany (batched)  : %10.0f points/s" % (len(lats)/t))
+	t0=time.perf_counter()
+	one=[buckshot_usng.toUTM(lat,lon) for (lat,lon) in zip(lats,lons)]
+	t=time.perf_counter()-t0
+	print("toUTM (one by one)   : %10.0f points/s" % (len(lats)/t))
+	t0=time.perf_counter()
+	texts=[buckshot_usng.usngText(utm) for utm in batched]
+	t=time.perf_counter()-t0
+	print("usngText             : %10.0f points/s" % (len(lats)/t))
+
+	if texts!=[buckshot_usng.usngText(utm) for utm in one]:
+		raise RuntimeError("batched and one-by-one projections differ")
+	# (the band letter may differ for points right on a band edge)
+	for text in texts[::max(1,len(texts)//1000)]:
+		if text and buckshot_usng.usngText(buckshot_usng.toUTM(*buckshot_usng.referenceLatLon(buckshot_usng.parseUSNG(text)))).split()[1:]!=text.split()[1:]:
+			raise RuntimeError("USNG reference does not parse back to itself: "+text)
+
+if __name__=="__main__":
+	main()
@@ -0,0 +1,114 @@
+# #############################################################################
+#
+#  sartopo_standin.py - local stand-in for the SARTopo folder/marker API
+#
+#  usage: python benchmarks/sartopo_standin.py [--port 8080] [--delay 0.2]
+#          [--fail-every N] [--api 1|0]
+#
+#  Answers the requests that buckshot_sartopo.SartopoUploader makes, so that
+#   marker upload can be exercised (and timed) without a real SARTopo server:
+#   API v1: GET /api/v1/map/, POST /api/v1/map/<mapID>/Folder/ and /Marker/
+#   API v0: GET /rest/marker/, GET /m/<mapID>, POST /rest/folder/ and /marker/
+#  --delay adds a fixed latency to every POST, to mimic a slow field link;
+#  --fail-every N answers every Nth marker POST with HTTP 500.
+#  Everything received is kept in StandinServer.folders / .markers.
+#
+# #############################################################################
+
+import argparse
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler,ThreadingHTTPServer
+from urllib.parse import parse_qs
+
+class StandinHandler(BaseHTTPRequestHandler):
+	protocol_version="HTTP/1.1" # keep-alive, like the real server
+
+	def log_message(self,*args):
+		pass
+
+	def reply(self,status,obj):
+		body=json.dumps(obj).encode("utf-8")
+		self.send_response(status)
+		self.send_header("Content-Type","application/json")
+		self.send_header("Content-Length",str(len(body)))
+		self.end_headers()
+		self.wfile.write(body)
+
+	def do_GET(self):
+		server=self.server
+		if server.api==1 and self.path=="/api/v1/map/":
+			self.reply(200,{"status":"ok"})
+		elif server.api==0 and (self.path=="/rest/marker/" or self.path.startswith("/m/")):
+			self.reply(200,{"status":"ok"})
+		else:
+			self.reply(404,{"status":"not found"})
+
+	def do_POST(self):
+		server=self.server
+		length=int(self.headers.get("Content-Length",0))
+		form=parse_qs(self.rfile.read(length).decode("utf-8"))
+		j=json.loads(form.get("json",["{}"])[0])
+		endpoint=self.path.rstrip("/").split("/")[-1].lower()
+		if server.delay:
+			time.sleep(server.delay)
+		with server.lock:
+			if endpoint=="folder":
+				server.folders.append(j)
+				fid=len(server.folders)
+				self.reply(200,{"status":"ok","result":{"id":fid}})
+			elif endpoint=="marker":
+				server.markerPosts+=1
+				if server.failEvery and server.markerPosts%server.failEvery==0:
+					self.reply(500,{"status":"error","message":"stand-in failure"})
+					return
+				server.markers.append(j)
+				self.reply(200,{"status":"ok","result":{"id":len(server.markers)}})
+			else:
+				self.reply(404,{"status":"not found"})
+
+class StandinServer(ThreadingHTTPServer):
+	daemon_threads=True
+
+	def __init__(self,port=0,delay=0,failEvery=0,api=1):
+		ThreadingHTTPServer.__init__(self,("127.0.0.1",port),StandinHandler)
+		self.delay=delay
+		self.failEvery=failEvery
+		self.api=api
+		self.lock=threading.Lock()
+		self.folders=[]
+		self.markers=[]
+		self.markerPosts=0
+
+	# domainAndPort - in the form that SartopoUploader expects
+	def domainAndPort(self):
+		return "127.0.0.1:"+str(self.server_address[1])
+
+	# start - serve from a background thread; returns self
+	def start(self):
+		thread=threading.Thread(target=self.serve_forever,daemon=True)
+		thread.start()
+		return self
+
+	def stop(self):
+		self.shutdown()
+		self.server_close()
+
+def main():
+	parser=argparse.ArgumentParser(description="local stand-in for the SARTopo folder/marker API")
+	parser.add_argument("--port",type=int,default=8080)
+	parser.add_argument("--delay",type=float,default=0,help="seconds of latency added to every POST")
+	parser.add_argument("--fail-every",type=int,default=0,help="answer every Nth marker POST with HTTP 500")
+	parser.add_argument("--api",type=int,choices=[0,1],default=1)
+	args=parser.parse_args()
+	server=StandinServer(args.port,args.delay,args.fail_every,args.api)
+	print("SARTopo stand-in on http://"+server.domainAndPort()+"/m/<mapID> (Ctrl-C to stop)")
+	try:
+		server.serve_forever()
+	except KeyboardInterrupt:
+		pass
+	server.server_close()
+
+if __name__=="__main__":
+	main()
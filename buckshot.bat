@@ -1 +1 @@
-python buckshot.py
+python buckshot.py %*
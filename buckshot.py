@@ -67,17 +67,39 @@ from PyQt5.QtCore import *
 from PyQt5.QtGui import *
 from PyQt5.QtWidgets import *
 
-import xml.dom.minidom
-import regex as re
-from parse import *
+import argparse
 import sys
-import requests
 import json
 import os
-
-from sartopo_python import SartopoSession
+import threading
 
 from buckshot_ui import Ui_buckshot
+import buckshot_engine
+import buckshot_lazy
+import buckshot_log
+# the rest is deferred to get the window up quickly (see buckshot_lazy): the
+#  feature modules are only needed once there are candidates to show, an
+#  option turns them on or markers are exported, and buckshot_cli (for the
+#  options and the headless modes) is imported in main; buckshot_sartopo
+#  (and with it requests) is only needed on export, so it is imported
+#  there, and NumPy is deferred too; warmUp loads them all in the
+#  background once the window is up
+buckshot_area=buckshot_lazy.optionalModule("buckshot_area")
+buckshot_cluster=buckshot_lazy.optionalModule("buckshot_cluster")
+buckshot_datum=buckshot_lazy.optionalModule("buckshot_datum")
+buckshot_export=buckshot_lazy.optionalModule("buckshot_export")
+buckshot_gazetteer=buckshot_lazy.optionalModule("buckshot_gazetteer")
+buckshot_metrics=buckshot_lazy.optionalModule("buckshot_metrics")
+buckshot_timing=buckshot_lazy.optionalModule("buckshot_timing")
+buckshot_usng=buckshot_lazy.optionalModule("buckshot_usng")
+from buckshot_engine import delimiterRegEx,bestMatchLabelPrefix,closeMatchLabelPrefix
+
+log=buckshot_log.getLogger("window")
+
+# exported markers within this many meters of each other are merged into one
+#  marker (see buckshot_cluster); off by default, so that an export has one
+#  marker per candidate as it always has; --cluster METERS turns it on
+defaultClusterRadius=0
 
 # valid delimiters: space, period, X, x, D, d, M, m, ', S, s, "
 # 'best match' = all correct delimiters in all the correct places
@@ -114,33 +136,265 @@ from buckshot_ui import Ui_buckshot
 #  - unknown delimiters are represented by a <space>
 #  - known delimiters are [.dmsx]
 
-# criteria for exact match:
-#
-delimiterRegEx="[ .XxDdMm'Ss\"]"
-bestMatchLabelPrefix="*"
-closeMatchLabelPrefix="+"
+# criteria for exact and close matches:
+#  see buckshot_engine.canonicalize and buckshot_engine.gradeCandidate
+
+# CandidateListModel - list model over one coordinate system's candidates,
+#  for the DdField, DMmField and DMSsField list views
+#  setCandidates() updates the rows in place: rows whose candidate did not
+#  change are left alone, changed rows get a dataChanged, and only the
+#  difference in length is inserted or removed, so the views don't rebuild
+#  every item on each keystroke
+#  exact matches are shown bold and close matches italic (FontRole), in
+#  addition to their label prefix; CandidateRole gives the Candidate itself
+#  with an incident area (--area), candidates outside it are grayed out and
+#  every row's tooltip says whether it is inside; with a gazetteer
+#  (--gazetteer), the tooltip also gives the distance from the selected
+#  landmark and the nearest named place; with terrain rasters (--dem,
+#  --water), candidates in water or outside the reported elevation range
+#  are grayed out too, and the tooltip gives the elevation; all of this is
+#  only worked out when the view asks for it, i.e. for visible or hovered
+#  rows; every tooltip gives the candidate's UTM and USNG, and with datums
+#  (--datum), where the candidate would be if read in each datum; these come
+#  from the projections and datum positions that calcLatLon works out for
+#  all candidates in one batch on each update (setGridRefs,
+#  setDatumPositions)
+#  the per-candidate results (plausibility, terrain sample, tooltip) are
+#  kept only for the current rows: setCandidates() drops the others, so a
+#  candidate that stays in the list across keystrokes keeps its results
+#  and the caches never outgrow the list
+class CandidateListModel(QAbstractListModel):
+	CandidateRole=Qt.UserRole
+
+	def __init__(self,parent=None,area=None,gazetteer=None,terrain=None,datums=()):
+		QAbstractListModel.__init__(self,parent)
+		self.candidates=()
+		self.area=area
+		self.gazetteer=gazetteer
+		self.terrain=terrain
+		self.datums=list(datums)
+		self.datumPositions={} # (lat,lon) -> [(lat,lon) or None for each datum]
+		self.gridRefs={} # (lat,lon) -> buckshot_usng.UTM
+		self.landmark=None
+		self.plausibilities={} # (lat,lon) -> buckshot_area.Plausibility
+		self.terrainSamples={} # (lat,lon) -> buckshot_terrain.TerrainSample
+		self.toolTips={} # (lat,lon) -> tooltip text
+		self.outsideBrush=QBrush(Qt.gray)
+		self.exactFont=QFont()
+		self.exactFont.setBold(True)
+		self.closeFont=QFont()
+		self.closeFont.setItalic(True)
+
+	def rowCount(self,parent=QModelIndex()):
+		if parent.isValid():
+			return 0
+		return len(self.candidates)
+
+	def data(self,index,role=Qt.DisplayRole):
+		if not index.isValid() or index.row()>=len(self.candidates):
+			return None
+		candidate=self.candidates[index.row()]
+		if role==Qt.DisplayRole:
+			return candidate.label()
+		if role==Qt.FontRole:
+			if candidate.match==buckshot_engine.exactMatch:
+				return self.exactFont
+			if candidate.match==buckshot_engine.closeMatch:
+				return self.closeFont
+			return None
+		if role==self.CandidateRole:
+			return candidate
+		if role==Qt.ForegroundRole:
+			if self.area is not None and not self.plausibility(candidate).inside:
+				return self.outsideBrush
+			if self.terrain is not None and not self.terrain.plausible(self.terrainSample(candidate)):
+				return self.outsideBrush
+			return None
+		if role==Qt.ToolTipRole:
+			return self.toolTip(candidate)
+		return None
+
+	def plausibility(self,candidate):
+		key=(candidate.lat,candidate.lon)
+		p=self.plausibilities.get(key)
+		if p is None:
+			p=self.area.plausibility(candidate.lat,candidate.lon)
+			self.plausibilities[key]=p
+		return p
+
+	def terrainSample(self,candidate):
+		key=(candidate.lat,candidate.lon)
+		sample=self.terrainSamples.get(key)
+		if sample is None:
+			sample=self.terrain.sample(candidate.lat,candidate.lon)
+			self.terrainSamples[key]=sample
+		return sample
+
+	def toolTip(self,candidate):
+		key=(candidate.lat,candidate.lon)
+		text=self.toolTips.get(key)
+		if text is None:
+			lines=[]
+			utm=self.gridRefs.get(key)
+			if utm is None:
+				utm=buckshot_usng.toUTM(candidate.lat,candidate.lon)
+			if utm is not None:
+				lines.append("UTM "+buckshot_usng.utmText(utm))
+				lines.append("USNG "+buckshot_usng.usngText(utm))
+			if self.area is not None:
+				p=self.plausibility(candidate)
+				if p.inside:
+					lines.append("inside incident area")
+				else:
+					lines.append("outside incident area ("+buckshot_area.formatDistance(p.distance)+")")
+			if self.terrain is not None:
+				lines.append(self.terrain.describe(self.terrainSample(candidate)))
+			if self.landmark is not None:
+				d=buckshot_gazetteer.distance(self.landmark.lat,self.landmark.lon,candidate.lat,candidate.lon)
+				lines.append(buckshot_area.formatDistance(d)+" from "+self.landmark.name)
+			if self.gazetteer is not None:
+				nearest=self.gazetteer.nearest(candidate.lat,candidate.lon)
+				if nearest:
+					lines.append("nearest named place: "+buckshot_gazetteer.featureLabel(nearest[0])+", "+buckshot_area.formatDistance(nearest[1]))
+			positions=self.datumPositions.get(key)
+			if positions is not None:
+				for (datum,position) in zip(self.datums,positions):
+					if position is not None:
+						d=buckshot_datum.shiftDistance(candidate.lat,candidate.lon,position[0],position[1])
+						lines.append("if read in %s: %.5f, %.5f (%s away)" % (datum.name,position[0],position[1],buckshot_area.formatDistance(d)))
+			text="\n".join(filter(None,lines))
+			self.toolTips[key]=text
+		return text or None
+
+	# setLandmark - the landmark (buckshot_gazetteer.Feature) that tooltips
+	#  give the distance from, or None
+	def setLandmark(self,landmark):
+		if landmark!=self.landmark:
+			self.landmark=landmark
+			self.toolTips.clear()
+
+	# setGridRefs - UTM of the next candidates, from
+	#  buckshot_usng.candidateUTM, for the tooltips (replaces the last ones)
+	def setGridRefs(self,gridRefs):
+		self.gridRefs=gridRefs
+
+	# setDatumPositions - datum positions of the next candidates, from
+	#  buckshot_cli.convertCandidates, for the tooltips (replaces the last
+	#  ones; a candidate's positions only depend on where it is, so its
+	#  cached tooltip stays right)
+	def setDatumPositions(self,positions):
+		self.datumPositions=positions
+
+	def candidate(self,row):
+		return self.candidates[row]
+
+	def setCandidates(self,candidates):
+		old=tuple(self.candidates)
+		candidates=tuple(candidates)
+		common=min(len(old),len(candidates))
+		# the rows both lists have change first, with one dataChanged covering
+		#  the first through last changed row; the rows that stay must not
+		#  change while rows are inserted or removed
+		changed=[n for n in range(common) if old[n]!=candidates[n]]
+		if changed:
+			self.candidates=candidates[:common]+old[common:]
+			self.dataChanged.emit(self.index(changed[0]),self.index(changed[-1]))
+		if len(candidates)<len(old):
+			self.beginRemoveRows(QModelIndex(),common,len(old)-1)
+			self.candidates=candidates
+			self.endRemoveRows()
+		elif len(candidates)>len(old):
+			self.beginInsertRows(QModelIndex(),common,len(candidates)-1)
+			self.candidates=candidates
+			self.endInsertRows()
+		else:
+			self.candidates=candidates
+		keys={(c.lat,c.lon) for c in candidates}
+		for name in ("plausibilities","terrainSamples","toolTips"):
+			cache=getattr(self,name)
+			setattr(self,name,{key:value for (key,value) in cache.items() if key in keys})
 
 class MyWindow(QDialog,Ui_buckshot):
-	def __init__(self,parent):
+	# emitted once, after the window has been painted for the first time
+	painted=pyqtSignal()
+
+	# gazetteer = optional buckshot_gazetteer.Gazetteer for the landmark field
+	# clusterRadius = exported markers within this many meters of each other
+	#  are merged into one (0 = never)
+	# area, terrain, datums = incident area (--area), terrain rasters (--dem,
+	#  --water) and datums (--datum), if any (see buckshot_cli)
+	def __init__(self,parent,gazetteer=None,clusterRadius=defaultClusterRadius,area=None,terrain=None,datums=()):
 		QDialog.__init__(self)
 		self.setWindowFlags(self.windowFlags()|Qt.WindowMinMaxButtonsHint)
 		self.parent=parent
 		self.ui=Ui_buckshot()
 		self.ui.setupUi(self)
 		self.setAttribute(Qt.WA_DeleteOnClose)
-		self.coordDdStringList=[]
-		self.coordDMmStringList=[]
-		self.coordDMSsStringList=[]
+		self.candidates=buckshot_engine.generate("")
+		# coalesce bursts of textChanged (typing, pasting) into at most one
+		#  list refresh per frame
+		self.calcTimer=QTimer(self)
+		self.calcTimer.setSingleShot(True)
+		self.calcTimer.setInterval(16)
+		self.calcTimer.timeout.connect(self.calcLatLon)
 		# default gpx dir: ~\Documents if it exists, ~ otherwise
 		self.gpxDefaultDir=os.path.expanduser("~")
 		docDir=self.gpxDefaultDir+"\\Documents"
 		if os.path.isdir(docDir):
 			self.gpxDefaultDir=docDir
 		self.ui.gpxFileNameField.setText(self.gpxDefaultDir+"\\buckshot_blank.gpx")
-		self.bestMatch=""
+		self.bestMatch=None
+		self.exportTask=None
+		self.clusterRadius=clusterRadius
+		# incident area (--area) and terrain rasters (--dem, --water), if
+		#  any: candidates are ranked against them; datums (--datum), if any:
+		#  exported markers are expanded across them
+		self.area=area
+		self.terrain=terrain
+		self.datums=list(datums)
+		self.candidateModels={}
+		for (system,view) in [
+				("Dd",self.ui.DdField),
+				("DMm",self.ui.DMmField),
+				("DMSs",self.ui.DMSsField)]:
+			self.candidateModels[system]=CandidateListModel(self,self.area,gazetteer,self.terrain,self.datums)
+			view.setModel(self.candidateModels[system])
+		# offline gazetteer (--gazetteer), if any: the landmark field looks up
+		#  a named place as it is typed (offering the best few matches for
+		#  completion), and the candidates are ranked by distance from it
+		self.gazetteer=gazetteer
+		self.landmark=None
+		self.landmarkChoices={} # completion text -> Feature
+		self.landmarkCompletions=QStringListModel(self)
+		landmarkCompleter=QCompleter(self.landmarkCompletions,self)
+		landmarkCompleter.setCompletionMode(QCompleter.UnfilteredPopupCompletion)
+		self.ui.landmarkField.setCompleter(landmarkCompleter)
+		if gazetteer is None:
+			self.ui.landmarkLabel.hide()
+			self.ui.landmarkField.hide()
+			self.ui.landmarkMatchLabel.hide()
+		self.goButtonText=self.ui.goButton.text()
+		self.firstPaintDone=False
+		self.renderStart=None
+		# with --profile, Ctrl+Shift+P writes the profile reports so far
+		QShortcut(QKeySequence("Ctrl+Shift+P"),self,activated=self.dumpProfile)
+
+	def paintEvent(self,event):
+		QDialog.paintEvent(self,event)
+		if not self.firstPaintDone:
+			self.firstPaintDone=True
+			# (queued, so the paint itself finishes first)
+			QTimer.singleShot(0,self.painted.emit)
+
+	def dumpProfile(self):
+		base=buckshot_timing.dumpProfile()
+		if base is None:
+			QMessageBox.information(self,"Profile","Not profiling; start buckshot with --profile DIR to profile a session.")
+		else:
+			QMessageBox.information(self,"Profile","Profile written to:\n\n"+base+"*")
 
 	def markerNameChanged(self):
-		print("markerNameChanged called")
+		log.debug("markerNameChanged called")
 		markerName=self.ui.markerNameField.text()
 		fileName=self.ui.gpxFileNameField.text()
 		idx=fileName.find("buckshot_")
@@ -158,613 +412,369 @@ class MyWindow(QDialog,Ui_buckshot):
 		if gpxFileName[0]!="":
 			self.ui.gpxFileNameField.setText(gpxFileName[0])
 
-	def writeGPX(self,markerList):
-		gpxFileName=self.ui.gpxFileNameField.text()
-		print("Writing GPX file "+gpxFileName)
-		
-		# make sure the file is writable; if not, return False here
-		gpxFile=self.fnameValidate(gpxFileName)
-		if not gpxFile:
-			return False
-
-		doc=xml.dom.minidom.Document()
-		gpx=doc.createElement("gpx")
-		gpx.setAttribute("creator","BUCKSHOT")
-		gpx.setAttribute("version","1.1")
-		gpx.setAttribute("xmlns","http://www.topografix.com/GPX/1/1")
-
-		# each element in markerList will result in a gpx wpt token.
-		#  markerList element syntax = [name,lat,lon,color]
-
-		# <desc> CDATA contains SARSoft marker and color
-		# <sym> CDATA contains Locus marker, parsed from marker name
-		#  some relevant Locus markers:
-		#   z-ico01 = red down arrow
-		#   z-ico02 = red x
-		#   z-ico03 = red donut
-		#   z-ico04 = red dot
-		#   z-ico05 = red down triangle
-		#   same sequence as above: 06-10 = cyan; 11-15=green; 16-20=yellow
-		#   misc-sunny = large green star bubble
-
-		for marker in markerList:
-##			print("marker:"+str(marker)+"\n")
-			[title,lat,lon,color,symbol]=marker
-			description=""
-			if title.startswith(bestMatchLabelPrefix):
-				description="User-selected best match!"
-			if title.startswith(closeMatchLabelPrefix):
-				description="CLOSE match for specified coordinates"
-			wpt=doc.createElement("wpt")
-			wpt.setAttribute("lat",str(lat))
-			wpt.setAttribute("lon",str(lon))
-			name=doc.createElement("name")
-			desc=doc.createElement("desc")
-			sym=doc.createElement("sym")
-# 			descCDATAStr="comments=&url=%23"+marker[3][1:]
-			descCDATAStr=description
-			descCDATA=doc.createCDATASection(descCDATAStr)
-			if "_Dd" in title: # red
-				if title.startswith(bestMatchLabelPrefix):
-					symCDATAStr="z-ico01"
-				else:
-					symCDATAStr="z-ico04"
-			elif "_DMm" in title: # cyan
-				if title.startswith(bestMatchLabelPrefix):
-					symCDATAStr="z-ico06"
-				else:
-					symCDATAStr="z-ico09"
-			elif "_DMSs" in title: # yellow
-				if title.startswith(bestMatchLabelPrefix):
-					symCDATAStr="z-ico16"
-				else:
-					symCDATAStr="z-ico19"
-			else:
-				if title.startswith(bestMatchLabelPrefix):
-					symCDATAStr="z-ico11"
-				else:
-					symCDATAStr="z-ico14"
-
-			name.appendChild(doc.createTextNode(title))
-			desc.appendChild(descCDATA)
-			symCDATA=doc.createCDATASection(symCDATAStr)
-			sym.appendChild(symCDATA)
-			wpt.appendChild(name)
-			wpt.appendChild(desc)
-			wpt.appendChild(sym)
-			gpx.appendChild(wpt)
-
-		doc.appendChild(gpx)
-
-		gpxFile.write(doc.toprettyxml())
-		gpxFile.close()
-		return True
-
-
+	# coordsChanged - called from textChanged of coordsField; (re)start the
+	#  debounce timer, which calls calcLatLon when it expires
+	def coordsChanged(self):
+		# (keystroke-to-render latency counts from the first keystroke that
+		#  the refresh coalesces)
+		if self.renderStart is None:
+			self.renderStart=buckshot_timing.start()
+		self.calcTimer.start()
 
 	# calcLatLon - make guesses about actual coordinates based on a string of numbers
-	#  called from textChanged of coordsField
-
-	# assumptions:
-	#  - Degrees Latitude is a two-digit number starting with 2, 3, or 4
-	#  - Degrees Longitude is a three-digit number starting with one, second digit
-	#   either 0, 1, or 2
-	#  - space or minus sign is a known delimiter and assumed to be correct
+	#  called from the debounce timer; the candidate logic itself lives
+	#  in buckshot_engine, so that it can also be run headless; a reading
+	#  typed again, or backspaced to, comes from the candidate cache; with an
+	#  incident area, each list is ranked against it (inside first, then
+	#  nearest outside)
 
 	def calcLatLon(self):
-
-### code to get overlapping matches (i.e. each possible longitude whole number) and their indices:
-##import regex as re
-##matches=re.finditer("1[012][0123456789]",numbers,overlapped=True)
-##[match.span() for match in matches]
-
+		tKeystroke=buckshot_timing.start()
 		coordString=self.ui.coordsField.text()
-
-		# shortCoordString = the 'canonical' form that the possibilities will
-		#  be compared to, to check for close or exact matches.  Same as
-		#  coordString, with standardized D/M/S delimiters; cannot eliminate all
-		#  spaces at this point since they may or may not be important delimiters;
-		#  therefore, will need to insert a space into the shortCoordString before
-		#  longitude for each possibility on the fly during parsing; this ensures
-		#  that original coordString with NO spaces at all can still make an
-		#  best match.
-
-		shortCoordString=coordString.lower()
-		shortCoordString=re.sub(r'[Xx]',' ',shortCoordString) # replace X or x with space for canonical form
-		shortCoordString=re.sub(r'\s+',' ',shortCoordString) # get rid of duplicate spaces
-		shortCoordString=re.sub(r'\'','m',shortCoordString)
-		shortCoordString=re.sub(r'"','s',shortCoordString)
-		print("Short coordinate string for comparison:"+shortCoordString+"\n")
-
-
-
-		# different approach:
-		# make a list of the indeces and kinds of delimiters;
-		# if the indeces all match, it is a 'close' match;
-		# if the indeces all match AND each one is of the same kind, it is an 'best' match
-
-		delimIter=re.finditer(r'[ .dDmMsS\'"-]+',coordString)
-
-
-
-##		numbers=re.sub(r'[ .dDmMsS\'"-]','',coordString)
-		numbers=re.sub(r'\D','',coordString)
-		print("Raw Numbers:"+numbers+"\n")
-
-##		numbers=self.ui.numbersField.text()
-		self.coordDdStringList=[]
-		self.coordDMmStringList=[]
-		self.coordDMSsStringList=[]
-		latDegIndex=0
-		lonDegIndex=-1
-		pattern=re.compile('1[012][0123456789]') # assume longitude 100-129 west
-		matches=pattern.finditer(numbers,2,overlapped=True)
-##		print(str([match.span() for match in matches]))
-		for lonDegMobj in matches:
-			print(str(lonDegMobj.span()))
-##		lonDegMobj=pattern.search(numbers,2) # skip the first two characters
-##		if lonDegMobj!=None:
-			lonDegIndex=lonDegMobj.start()
-			lonDeg=lonDegMobj.group()
-			print("lonDegIndex: '"+str(lonDegIndex)+"'")
-			print("Longitude Degrees: '"+lonDeg+"'")
-			lonRestIndex=lonDegIndex+3
-			lonRest=numbers[lonRestIndex:]
-			print("Longitude rest: '"+lonRest+"'")
-			if int(numbers[0])>1 and int(numbers[0])<5: #assume latitude 20-49 north
-				latDeg=numbers[0:2]
-				latRest=numbers[2:lonDegIndex]
-				print("Latitude degrees: '"+latDeg+"'")
-				print("Latitude rest: '"+latRest+"'")
-
-				# initialize whole minutes and seconds to unrealizable values
-				#  for use in the 'possible' section below
-				latMin1="99"
-				latMin2="99"
-				latSec11="99"
-				latSec12="99"
-				latSec21="99"
-				latSec22="99"
-
-				lonMin1="99"
-				lonMin2="99"
-				lonSec11="99"
-				lonSec12="99"
-				lonSec21="99"
-				lonSec22="99"
-
-				# initialize "rest" arguments to blank strings
-				latMin1Rest=""
-				latMin2Rest=""
-				latSec11Rest=""
-				latSec12Rest=""
-				latSec21Rest=""
-				latSec22Rest=""
-
-				lonMin1Rest=""
-				lonMin2Rest=""
-				lonSec11Rest=""
-				lonSec12Rest=""
-				lonSec21Rest=""
-				lonSec22Rest=""
-
-				# parse minutes and seconds from the rest of the string
-				# whole minutes and whole seconds could be one digit or two digits
-				if len(latRest)>0:
-					print("t1")
-					latMin1=latRest[0]
-					if len(latRest)>1:
-						print("t2")
-						latMin1Rest=latRest[1:]
-						latMin2=latRest[0:2]
-						if len(latRest)>2:
-							print("t2.5")
-							latMin2Rest=latRest[2:]
-						if len(latMin1Rest)>0:
-							print("t3")
-							latSec1=latMin1Rest[0:]
-							if len(latSec1)>0:
-								print("t4")
-								latSec11=latSec1[0]
-								if len(latSec1)>1:
-									print("t5")
-									latSec11Rest=latSec1[1:]
-									latSec12=latSec1[0:2]
-									if len(latSec1)>2:
-										print("t5.5")
-										latSec12Rest=latSec1[2:]
-									if len(latMin2Rest)>0:
-										print("t6")
-										latSec2=latMin2Rest[0:]
-										if len(latSec2)>0:
-											print("t7")
-											latSec21=latSec2[0]
-											if len(latSec2)>1:
-												print("t8")
-												latSec21Rest=latSec2[1:]
-												latSec22=latSec2[0:2]
-												if len(latSec2)>2:
-													print("t9")
-													latSec22Rest=latSec2[2:]
-								else:
-									latSec2="0" # account for implied zero seconds
-									latSec21="0"
-						else:
-							latSec1="0" # account for implied zero seconds
-							latSec11="0"
-
-				if len(lonRest)>0:
-					lonMin1=lonRest[0]
-					if len(lonRest)>1:
-						lonMin1Rest=lonRest[1:]
-						lonMin2=lonRest[0:2]
-						if len(lonRest)>2:
-							lonMin2Rest=lonRest[2:]
-						if len(lonMin1Rest)>0:
-							lonSec1=lonMin1Rest[0:]
-							if len(lonSec1)>0:
-								lonSec11=lonSec1[0]
-								if len(lonSec1)>1:
-									lonSec11Rest=lonSec1[1:]
-									lonSec12=lonSec1[0:2]
-									if len(lonSec1)>2:
-										lonSec12Rest=lonSec1[2:]
-									if len(lonMin2Rest)>0:
-										lonSec2=lonMin2Rest[0:]
-										if len(lonSec2)>0:
-											lonSec21=lonSec2[0]
-											if len(lonSec2)>1:
-												lonSec21Rest=lonSec2[1:]
-												lonSec22=lonSec2[0:2]
-												if len(lonSec2)>2:
-													lonSec22Rest=lonSec2[2:]
-								else:
-									lonSec2="0" # account for implied zero seconds
-									lonSec21="0"
-						else:
-							lonSec1="0" # account for implied zero seconds
-							lonSec11="0"
-
-
-				# set flags as to which ones are possible
-				# (whole min/sec <60 (2-digit) or <10 (1-digit))
-				latMin1Possible=int(latMin1)<10
-				latMin2Possible=int(latMin2)>9 and int(latMin2)<60
-				latSec11Possible=int(latSec11)<10
-				latSec12Possible=int(latSec12)<60
-				latSec21Possible=int(latSec21)<10
-				latSec22Possible=int(latSec22)<60
-
-				lonMin1Possible=int(lonMin1)<10
-				lonMin2Possible=int(lonMin2)>9 and int(lonMin2)<60
-				lonSec11Possible=int(lonSec11)<10
-				lonSec12Possible=int(lonSec12)<60
-				lonSec21Possible=int(lonSec21)<10
-				lonSec22Possible=int(lonSec22)<60
-
-				print("latMin1Possible:"+str(latMin1Possible)+":"+latMin1+":"+latMin1Rest)
-				print("latMin2Possible:"+str(latMin2Possible)+":"+latMin2+":"+latMin2Rest)
-				print("latSec11Possible:"+str(latSec11Possible)+":"+latSec11+":"+latSec11Rest)
-				print("latSec12Possible:"+str(latSec12Possible)+":"+latSec12+":"+latSec12Rest)
-				print("latSec21Possible:"+str(latSec21Possible)+":"+latSec21+":"+latSec21Rest)
-				print("latSec22Possible:"+str(latSec22Possible)+":"+latSec22+":"+latSec22Rest)
-
-				print("lonMin1Possible:"+str(lonMin1Possible)+":"+lonMin1+":"+lonMin1Rest)
-				print("lonMin2Possible:"+str(lonMin2Possible)+":"+lonMin2+":"+lonMin2Rest)
-				print("lonSec11Possible:"+str(lonSec11Possible)+":"+lonSec11+":"+lonSec11Rest)
-				print("lonSec12Possible:"+str(lonSec12Possible)+":"+lonSec12+":"+lonSec12Rest)
-				print("lonSec21Possible:"+str(lonSec21Possible)+":"+lonSec21+":"+lonSec21Rest)
-				print("lonSec22Possible:"+str(lonSec22Possible)+":"+lonSec22+":"+lonSec22Rest)
-
-				# zero-pad right-of-decimal if needed, i.e. no blank strings right-of-decimal
-
-				latRest=latRest or "0"
-				lonRest=lonRest or "0"
-				latMin1Rest=latMin1Rest or "0"
-				latMin2Rest=latMin2Rest or "0"
-				lonMin1Rest=lonMin1Rest or "0"
-				lonMin2Rest=lonMin2Rest or "0"
-				latSec11Rest=latSec11Rest or "0"
-				latSec12Rest=latSec12Rest or "0"
-				latSec21Rest=latSec21Rest or "0"
-				latSec22Rest=latSec22Rest or "0"
-				lonSec11Rest=lonSec11Rest or "0"
-				lonSec12Rest=lonSec12Rest or "0"
-				lonSec21Rest=lonSec21Rest or "0"
-				lonSec22Rest=lonSec22Rest or "0"
-
-				# build the lists of possible coordinate strings for each coordinate system
-				#  (if only one of lat/lon per pair is possible, then the pair is
-				#   not possible)
-
-				self.coordDdStringList.append(str(latDeg+"."+latRest+"deg N x "+lonDeg+"."+lonRest+"deg W"))
-
-				if latMin1Possible and lonMin1Possible:
-					self.coordDMmStringList.append(str(latDeg+"deg "+latMin1+"."+latMin1Rest+"min N x "+lonDeg+"deg "+lonMin1+"."+lonMin1Rest+"min W"))
-				if latMin1Possible and lonMin2Possible:
-					self.coordDMmStringList.append(str(latDeg+"deg "+latMin1+"."+latMin1Rest+"min N x "+lonDeg+"deg "+lonMin2+"."+lonMin2Rest+"min W"))
-				if latMin2Possible and lonMin1Possible:
-					self.coordDMmStringList.append(str(latDeg+"deg "+latMin2+"."+latMin2Rest+"min N x "+lonDeg+"deg "+lonMin1+"."+lonMin1Rest+"min W"))
-				if latMin2Possible and lonMin2Possible:
-					self.coordDMmStringList.append(str(latDeg+"deg "+latMin2+"."+latMin2Rest+"min N x "+lonDeg+"deg "+lonMin2+"."+lonMin2Rest+"min W"))
-
-				if latSec11Possible and lonSec11Possible:
-					self.coordDMSsStringList.append(str(latDeg+"deg "+latMin1+"min "+latSec11+"."+latSec11Rest+"sec N x "+lonDeg+"deg "+lonMin1+"min "+lonSec11+"."+lonSec11Rest+"sec W"))
-				if latSec11Possible and lonSec12Possible:
-					self.coordDMSsStringList.append(str(latDeg+"deg "+latMin1+"min "+latSec11+"."+latSec11Rest+"sec N x "+lonDeg+"deg "+lonMin1+"min "+lonSec12+"."+lonSec12Rest+"sec W"))
-				if latSec11Possible and lonSec21Possible:
-					self.coordDMSsStringList.append(str(latDeg+"deg "+latMin1+"min "+latSec11+"."+latSec11Rest+"sec N x "+lonDeg+"deg "+lonMin2+"min "+lonSec21+"."+lonSec21Rest+"sec W"))
-				if latSec11Possible and lonSec22Possible:
-					self.coordDMSsStringList.append(str(latDeg+"deg "+latMin1+"min "+latSec11+"."+latSec11Rest+"sec N x "+lonDeg+"deg "+lonMin2+"min "+lonSec22+"."+lonSec22Rest+"sec W"))
-				if latSec12Possible and lonSec11Possible:
-					self.coordDMSsStringList.append(str(latDeg+"deg "+latMin1+"min "+latSec12+"."+latSec12Rest+"sec N x "+lonDeg+"deg "+lonMin1+"min "+lonSec11+"."+lonSec11Rest+"sec W"))
-				if latSec12Possible and lonSec12Possible:
-					self.coordDMSsStringList.append(str(latDeg+"deg "+latMin1+"min "+latSec12+"."+latSec12Rest+"sec N x "+lonDeg+"deg "+lonMin1+"min "+lonSec12+"."+lonSec12Rest+"sec W"))
-				if latSec12Possible and lonSec21Possible:
-					self.coordDMSsStringList.append(str(latDeg+"deg "+latMin1+"min "+latSec12+"."+latSec12Rest+"sec N x "+lonDeg+"deg "+lonMin2+"min "+lonSec21+"."+lonSec21Rest+"sec W"))
-				if latSec12Possible and lonSec22Possible:
-					self.coordDMSsStringList.append(str(latDeg+"deg "+latMin1+"min "+latSec12+"."+latSec12Rest+"sec N x "+lonDeg+"deg "+lonMin2+"min "+lonSec22+"."+lonSec22Rest+"sec W"))
-				if latSec21Possible and lonSec11Possible:
-					self.coordDMSsStringList.append(str(latDeg+"deg "+latMin2+"min "+latSec21+"."+latSec21Rest+"sec N x "+lonDeg+"deg "+lonMin1+"min "+lonSec11+"."+lonSec11Rest+"sec W"))
-				if latSec21Possible and lonSec12Possible:
-					self.coordDMSsStringList.append(str(latDeg+"deg "+latMin2+"min "+latSec21+"."+latSec21Rest+"sec N x "+lonDeg+"deg "+lonMin1+"min "+lonSec12+"."+lonSec12Rest+"sec W"))
-				if latSec21Possible and lonSec21Possible:
-					self.coordDMSsStringList.append(str(latDeg+"deg "+latMin2+"min "+latSec21+"."+latSec21Rest+"sec N x "+lonDeg+"deg "+lonMin2+"min "+lonSec21+"."+lonSec21Rest+"sec W"))
-				if latSec21Possible and lonSec22Possible:
-					self.coordDMSsStringList.append(str(latDeg+"deg "+latMin2+"min "+latSec21+"."+latSec21Rest+"sec N x "+lonDeg+"deg "+lonMin2+"min "+lonSec22+"."+lonSec22Rest+"sec W"))
-				if latSec22Possible and lonSec11Possible:
-					self.coordDMSsStringList.append(str(latDeg+"deg "+latMin2+"min "+latSec22+"."+latSec22Rest+"sec N x "+lonDeg+"deg "+lonMin1+"min "+lonSec11+"."+lonSec11Rest+"sec W"))
-				if latSec22Possible and lonSec12Possible:
-					self.coordDMSsStringList.append(str(latDeg+"deg "+latMin2+"min "+latSec22+"."+latSec22Rest+"sec N x "+lonDeg+"deg "+lonMin1+"min "+lonSec12+"."+lonSec12Rest+"sec W"))
-				if latSec22Possible and lonSec21Possible:
-					self.coordDMSsStringList.append(str(latDeg+"deg "+latMin2+"min "+latSec22+"."+latSec22Rest+"sec N x "+lonDeg+"deg "+lonMin2+"min "+lonSec21+"."+lonSec21Rest+"sec W"))
-				if latSec22Possible and lonSec22Possible:
-					self.coordDMSsStringList.append(str(latDeg+"deg "+latMin2+"min "+latSec22+"."+latSec22Rest+"sec N x "+lonDeg+"deg "+lonMin2+"min "+lonSec22+"."+lonSec22Rest+"sec W"))
-			else:
-				print("Latitiude not found.")
+		candidates=buckshot_engine.generate(coordString)
+		t=buckshot_timing.start()
+		if self.area is not None:
+			candidates=self.area.rankCandidateSet(candidates)
+		# a landmark named in the report is stronger evidence than the area
+		#  boundary, so its ranking (by distance) takes over when one is set
+		if self.landmark is not None:
+			candidates=buckshot_gazetteer.rankCandidateSet(candidates,self.landmark.lat,self.landmark.lon)
+		# candidates in water or at the wrong elevation go last, keeping the
+		#  order above within the plausible and implausible groups
+		if self.terrain is not None:
+			candidates=self.terrain.rankCandidateSet(candidates)
+		log.debug("Short coordinate string for comparison: %s",candidates.shortCoordString)
+		log.debug("Raw Numbers: %s",candidates.numbers)
+		log.debug("Candidate cache: %s",buckshot_engine.cacheInfo())
+
+		self.candidates=candidates
+
+		# all candidates' UTM and datum positions, each worked out in one
+		#  batch
+		candidateList=buckshot_engine.allCandidates(candidates)
+		gridRefs=buckshot_usng.candidateUTM(candidateList)
+		positions=None
+		if self.datums:
+			import buckshot_cli
+			positions=buckshot_cli.convertCandidates(candidateList,self.datums)
+		for model in self.candidateModels.values():
+			model.setGridRefs(gridRefs)
+			if positions is not None:
+				model.setDatumPositions(positions)
+		self.showUSNG(candidates.USNG)
+
+		self.candidateModels["Dd"].setCandidates(candidates.Dd)
+		self.candidateModels["DMm"].setCandidates(candidates.DMm)
+		self.candidateModels["DMSs"].setCandidates(candidates.DMSs)
+		self.showBestMatch()
+		buckshot_timing.record("refresh",t)
+		buckshot_timing.record("keystroke",tKeystroke)
+		buckshot_timing.record("render",self.renderStart)
+		self.renderStart=None
+		buckshot_metrics.candidatesShown(candidates)
+
+		if buckshot_log.tracing(log):
+			for system in ["Dd","DMm","DMSs"]:
+				log.debug("Possible %s coordinates:\n%s",system,[c.label() for c in getattr(candidates,system)])
+
+	# showUSNG - show the USNG candidate, if the input can be read as one; it
+	#  is exported with the other candidates
+	def showUSNG(self,usngCandidates):
+		if usngCandidates:
+			candidate=usngCandidates[0]
+			self.ui.usngMatchLabel.setText("USNG "+candidate.label()+"\n= %.5f, %.5f" % (candidate.lat,candidate.lon))
 		else:
-			print("Longitude not found.")
-
-# 		self.ui.DdField.setPlainText("\n".join(self.coordDdStringList))
-# 		self.ui.DMmField.setPlainText("\n".join(self.coordDMmStringList))
-# 		self.ui.DMSsField.setPlainText("\n".join(self.coordDMSsStringList))
-		self.ui.DdField.clear()
-		self.ui.DdField.addItems(self.coordDdStringList)
-		self.ui.DMmField.clear()
-		self.ui.DMmField.addItems(self.coordDMmStringList)
-		self.ui.DMSsField.clear()
-		self.ui.DMSsField.addItems(self.coordDMSsStringList)
-
-		print("Possible Dd coordinates:\n"+str(self.coordDdStringList))
-		print("Possible DMm coordinates:\n"+str(self.coordDMmStringList))
-		print("Possible DMSs coordinates:\n"+str(self.coordDMSsStringList))
-
-		# now find the 'short' string corresponding to each possibility, and
-		#  see how close of a match it is to the originally entered string
-		#  (highlight the row in the GUI, and change the marker name and symbol)
-		for n,DdString in enumerate(self.coordDdStringList):
-			DdShort=DdString.replace("deg ","d")
-			DdShort=DdShort.replace("N x "," ")
-			DdShort=DdShort.replace("W","")
-			print("DdShort:"+DdShort)
-			if DdShort==shortCoordString:
-				print("  EXACT MATCH!")
-				self.coordDdStringList[n]=bestMatchLabelPrefix+DdString
-# 				self.ui.DdField.setPlainText("\n".join(self.coordDdStringList))
-				self.ui.DdField.clear()
-				self.ui.DdField.addItems(self.coordDdStringList)
-
-		for n,DMmString in enumerate(self.coordDMmStringList):
-			DMmShort=DMmString.replace("deg ","d")
-			DMmShort=DMmShort.replace("min ","m")
-			DMmShort=DMmShort.replace("N x "," ")
-			DMmShort=DMmShort.replace("W","")
-			print("DMmShort:"+DMmShort)
-			if DMmShort==shortCoordString:
-				print("  EXACT MATCH!")
-				self.coordDMmStringList[n]=bestMatchLabelPrefix+DMmString
-# 				self.ui.DMmField.setPlainText("\n".join(self.coordDMmStringList))
-				self.ui.DMmField.clear()
-				self.ui.DMmField.addItems(self.coordDMmStringList)
-
-		for n,DMSsString in enumerate(self.coordDMSsStringList):
-			DMSsShort=DMSsString.replace("deg ","d")
-			DMSsShort=DMSsShort.replace("min ","m")
-			DMSsShort=DMSsShort.replace("sec ","s")
-			DMSsShort=DMSsShort.replace("N x "," ")
-			DMSsShort=DMSsShort.replace("W","")
-			print("DMSsShort:"+DMSsShort)
-			if DMSsShort==shortCoordString:
-				print("  EXACT MATCH!")
-				self.coordDMSsStringList[n]=bestMatchLabelPrefix+DMSsString
-# 				self.ui.DMSsField.setPlainText("\n".join(self.coordDMSsStringList))
-				self.ui.DMSsField.clear()
-				self.ui.DMSsField.addItems(self.coordDMSsStringList)
+			self.ui.usngMatchLabel.setText("")
+
+	# landmarkChanged - called from textChanged of landmarkField; look up the
+	#  typed text in the gazetteer (a completion that was picked from the
+	#  popup selects exactly that feature), then re-rank the candidates
+	#  through the same debounce timer as coordsChanged
+	def landmarkChanged(self):
+		if self.gazetteer is None:
+			return
+		text=self.ui.landmarkField.text()
+		landmark=self.landmarkChoices.get(text)
+		if landmark is None:
+			matches=self.gazetteer.search(text,10)
+			labels=[buckshot_gazetteer.featureLabel(feature) for feature in matches]
+			self.landmarkChoices=dict(zip(labels,matches))
+			self.landmarkCompletions.setStringList(labels)
+			landmark=matches[0] if matches else None
+		self.landmark=landmark
+		if landmark is not None:
+			self.ui.landmarkMatchLabel.setText(buckshot_gazetteer.featureLabel(landmark))
+		elif text.strip():
+			self.ui.landmarkMatchLabel.setText("no match")
+		else:
+			self.ui.landmarkMatchLabel.setText("")
+		for model in self.candidateModels.values():
+			model.setLandmark(landmark)
+		self.calcTimer.start()
 
 	# possibilityClicked: when any row is clicked, unhighlight / unselect any
-	#  highlighted/selected rows in the other two coordinate system list widgets,
-	#  and use the selected row as the 'best match' possibility
-	def possibilityDdClicked(self):
-		clicked=self.ui.DdField.selectedItems()[0].text()
+	#  highlighted/selected rows in the other two coordinate system list views,
+	#  and use the selected row as the 'best match' possibility; clicking the
+	#  best match again unselects it
+	def possibilityClicked(self,system,index):
+		clicked=self.candidateModels[system].candidate(index.row())
 		if clicked==self.bestMatch:
-			self.bestMatch=""
-			self.ui.DdField.clearSelection()
+			self.bestMatch=None
 		else:
 			self.bestMatch=clicked
-			print(self.bestMatch)
-		self.ui.DMmField.clearSelection()
-		self.ui.DMSsField.clearSelection()
+			log.debug("best match: %s",self.bestMatch.text())
+		self.showBestMatch()
 
-	def possibilityDMmClicked(self):
-		clicked=self.ui.DMmField.selectedItems()[0].text()
-		if clicked==self.bestMatch:
-			self.bestMatch=""
-			self.ui.DMmField.clearSelection()
-		else:
-			self.bestMatch=clicked
-			print(self.bestMatch)
-		self.ui.DdField.clearSelection()
-		self.ui.DMSsField.clearSelection()
+	def possibilityDdClicked(self,index):
+		self.possibilityClicked("Dd",index)
+
+	def possibilityDMmClicked(self,index):
+		self.possibilityClicked("DMm",index)
 	
-	def possibilityDMSsClicked(self):
-		clicked=self.ui.DMSsField.selectedItems()[0].text()
-		if clicked==self.bestMatch:
-			self.bestMatch=""
-			self.ui.DMSsField.clearSelection()
-		else:
-			self.bestMatch=clicked
-			print(self.bestMatch)
-		self.ui.DdField.clearSelection()
-		self.ui.DMmField.clearSelection()
+	def possibilityDMSsClicked(self,index):
+		self.possibilityClicked("DMSs",index)
+
+	# showBestMatch - select the best match's row, if it is still one of the
+	#  current candidates, and nothing else
+	def showBestMatch(self):
+		for (system,view) in [
+				("Dd",self.ui.DdField),
+				("DMm",self.ui.DMmField),
+				("DMSs",self.ui.DMSsField)]:
+			candidates=self.candidateModels[system].candidates
+			if self.bestMatch is not None and self.bestMatch in candidates:
+				view.setCurrentIndex(self.candidateModels[system].index(candidates.index(self.bestMatch)))
+			else:
+				view.clearSelection()
 		
 	#fnameValidate: try writing a test file to the specified filename;
 	# return the filehandle if valid, or print the error message and return False
 	# if invalid for whatever reason
 	def fnameValidate(self,filename):
 		try:
-			f=open(filename,"w")
+			f=open(filename,"w",encoding="utf-8")
 		except (IOError,FileNotFoundError) as err:
 			QMessageBox.warning(self,"Invalid Filename","GPX filename is not valid:\n\n"+str(err)+"\n\nNo markers written to GPX or URL.  Fix or blank out the filename, and try again.")
 			return False
 		else:
 			return f
 		
+	# createMarkers - called from the Go button; the file name is validated and
+	#  the marker list is built here, on the main thread, then the GPX write
+	#  and the URL upload run on an ExportTask so the window stays responsive
+	#  and the next coordinate can be typed while the export is going on;
+	#  while an export is running, the Go button cancels it
 	def createMarkers(self):
-		print("createMarkers called")
+		log.debug("createMarkers called")
+
+		if self.exportTask:
+			log.info("cancelling export")
+			self.exportTask.cancel()
+			self.ui.goButton.setEnabled(False)
+			return
 		
 		# if a gpx filename is specified, validate it first; if invalid, force
 		#  the user to fix it or blank it out before generating any URL markers
-
-		if not self.fnameValidate(self.ui.gpxFileNameField.text()):
+		gpxFile=self.fnameValidate(self.ui.gpxFileNameField.text())
+		if not gpxFile:
 			return
 			
-		DdIdx=0
-		DMmIdx=0
-		DMSsIdx=0
-		DdIdxFlag=len(self.coordDdStringList)>1
-		DMmIdxFlag=len(self.coordDMmStringList)>1
-		DMSsIdxFlag=len(self.coordDMSsStringList)>1
-
-		markerName=self.ui.markerNameField.text()
-		if markerName=="":
-			markerName="X"
-
-		# for best match, use a ring with center dot
-		# for close match, use a hollow ring
-		# appropriate prefixes were determined from decoding json POST request
-		#  of a live header when creating each type of marker by hand
-		# final URL values:
-		#  simple dot: "#<hex_color>"
-		#  target: "c:target,<hex_color>" (notice, no pound sign)
-		#  ring: "c:ring,<hex_color>" (notice, no pound sign)
-		bestMatchSymbol="c:target"
-		closeMatchSymbol="c:ring"
-
-		# build a list of markers; each marker is a list:
-		# [markerName,lat,lon,color]
-		markerList=[]
-		for DdString in self.coordDdStringList:
-			DdIdx=DdIdx+1
-			labelPrefix=""
-			symbol="point"
-# 			if DdString.startswith(bestMatchLabelPrefix):
-			if DdString==self.bestMatch:
-				DdString=DdString.replace(bestMatchLabelPrefix,"")
-				labelPrefix=bestMatchLabelPrefix
-				symbol=bestMatchSymbol
-			if DdString.startswith(closeMatchLabelPrefix):
-				DdString=DdString.replace(closeMatchLabelPrefix,"")
-				labelPrefix=closeMatchLabelPrefix
-				symbol=closeMatchSymbol
-			print("  Dd : '"+DdString+"'")
-			r=parse("{:g}deg N x {:g}deg W",DdString)
-			print(r)
-			if DdIdxFlag:
-				idx=str(DdIdx)
-			else:
-				idx=""
-			markerList.append([labelPrefix+markerName+"_Dd"+idx,r[0],-r[1],"FF0000",symbol])
-		for DMmString in self.coordDMmStringList:
-			DMmIdx=DMmIdx+1
-			labelPrefix=""
-			symbol="point"
-# 			if DMmString.startswith(bestMatchLabelPrefix):
-			if DMmString==self.bestMatch:
-				DMmString=DMmString.replace(bestMatchLabelPrefix,"")
-				labelPrefix=bestMatchLabelPrefix
-				symbol=bestMatchSymbol
-			if DMmString.startswith(closeMatchLabelPrefix):
-				DMmString=DMmString.replace(closeMatchLabelPrefix,"")
-				labelPrefix=closeMatchLabelPrefix
-				symbol=closeMatchSymbol
-			print("  DMm : "+DMmString)
-			r=parse("{:g}deg {:g}min N x {:g}deg {:g}min W",DMmString)
-			print(r)
-			if DMmIdxFlag:
-				idx=str(DMmIdx)
-			else:
-				idx=""
-			markerList.append([labelPrefix+markerName+"_DMm"+idx,r[0]+r[1]/60.0,-(r[2]+r[3]/60.0),"FF00FF",symbol])
-		for DMSsString in self.coordDMSsStringList:
-			DMSsIdx=DMSsIdx+1
-			labelPrefix=""
-			symbol="point"
-# 			if DMSsString.startswith(bestMatchLabelPrefix):
-			if DMSsString==self.bestMatch:
-				DMSsString=DMSsString.replace(bestMatchLabelPrefix,"")
-				labelPrefix=bestMatchLabelPrefix
-				symbol=bestMatchSymbol
-			if DMSsString.startswith(closeMatchLabelPrefix):
-				DMSsString=DMSsString.replace(closeMatchLabelPrefix,"")
-				labelPrefix=closeMatchLabelPrefix
-				symbol=closeMatchSymbol
-			print("  DMSs: "+DMSsString)
-			r=parse("{:g}deg {:g}min {:g}sec N x {:g}deg {:g}min {:g}sec W",DMSsString)
-			print(r)
-			if DMSsIdxFlag:
-				idx=str(DMSsIdx)
-			else:
-				idx=""
-			markerList.append([labelPrefix+markerName+"_DMSs"+idx,r[0]+r[1]/60.0+r[2]/3600.0,-(r[3]+r[4]/60.0+r[5]/3600.0),"0000FF",symbol])
-
-		print("Final marker list:")
-		print(str(markerList))
-
-		if self.writeGPX(markerList):
-			infoStr="\nWrote GPX?   YES"
-		else:
-			infoStr="\nWrote GPX?   NO"
-
-		if self.ui.URLField.text():		
-			url=self.ui.URLField.text()
-			p=url.lower().replace("http://","").split("/")
-			domainAndPort=p[0]
-			mapID=p[-1]
-			print("domainAndPort: "+domainAndPort)
-			print("map ID: "+mapID)
-			
-			sts=SartopoSession(domainAndPort=domainAndPort,mapID=mapID)
-			fid=sts.addFolder("Buckshot")
-			print("  folder id="+str(fid))
-			for marker in markerList:
-				[title,lat,lon,color,symbol]=marker
-				description=""
-				if title.startswith(bestMatchLabelPrefix):
-					description="User-selected best match!"
-				if title.startswith(closeMatchLabelPrefix):
-					description="CLOSE match for specified coordinates"
-				sts.addMarker(lat,lon,title,description,color,symbol,None,fid)
-			infoStr+="\nWrote URL?   YES"
+		# build a list of markers; each marker unpacks as
+		# [markerName,lat,lon,color,symbol,description]
+		# (see buckshot_export.makeMarkers for the naming, color and symbol rules)
+		# then merge markers that are within clusterRadius of each other, and
+		#  follow each one with its datum variants (e.g. X_DMm2_NAD27)
+		t=buckshot_timing.start()
+		markerList=buckshot_export.makeMarkers(self.candidates,self.ui.markerNameField.text(),self.bestMatch,self.area,self.terrain)
+		markerList=buckshot_cluster.clusterMarkers(markerList,self.candidates,self.clusterRadius)
+		markerList=buckshot_datum.expandMarkers(markerList,self.datums)
+		buckshot_timing.record("markers",t)
+
+		log.debug("Final marker list:\n%s",markerList)
+
+		self.exportTask=ExportTask(markerList,gpxFile,self.ui.URLField.text())
+		self.exportTask.signals.progress.connect(self.exportProgress)
+		self.exportTask.signals.finished.connect(self.exportFinished)
+		self.ui.goButton.setText("Cancel")
+		QThreadPool.globalInstance().start(self.exportTask)
+		buckshot_metrics.exportStarted()
+
+	def exportProgress(self,done,total):
+		if self.ui.goButton.isEnabled():
+			self.ui.goButton.setText("Cancel ("+str(done)+"/"+str(total)+")")
+
+	# exportFinished - show the summary without blocking: the message box is
+	#  not modal, so typing can continue while it is up
+	def exportFinished(self,infoStr):
+		self.exportTask=None
+		self.ui.goButton.setText(self.goButtonText)
+		self.ui.goButton.setEnabled(True)
+		box=QMessageBox(QMessageBox.Information,"Markers Created",infoStr,QMessageBox.Ok,self)
+		box.setAttribute(Qt.WA_DeleteOnClose)
+		box.setModal(False)
+		box.show()
+
+	def closeEvent(self,event):
+		if self.exportTask:
+			self.exportTask.cancel()
+		QThreadPool.globalInstance().waitForDone()
+		QDialog.closeEvent(self,event)
+
+
+# ExportSignals - signals of an ExportTask; emitted from its QThreadPool thread
+#  and delivered on the main thread
+class ExportSignals(QObject):
+	progress=pyqtSignal(int,int) # markers done, total markers
+	finished=pyqtSignal(str) # summary text
+
+# ExportTask - one export (GPX file, then SARTopo URL if any) of a fixed
+#  marker list, run on a QThreadPool thread
+#  gpxFile = open (already validated) GPX file; it is closed when written
+#  url = map URL, or blank for GPX only
+class ExportTask(QRunnable):
+	def __init__(self,markerList,gpxFile,url):
+		QRunnable.__init__(self)
+		self.markerList=markerList
+		self.gpxFile=gpxFile
+		self.url=url
+		self.signals=ExportSignals()
+		self.uploader=None
+		self.cancelled=False
+		self.done=0
+
+	# cancel - called from the main thread
+	def cancel(self):
+		self.cancelled=True
+		uploader=self.uploader
+		if uploader:
+			uploader.cancel()
+
+	def run(self):
+		try:
+			infoStr=self.export()
+		except Exception as err:
+			log.exception("export failed")
+			infoStr="Export failed:\n\n"+str(err)
+		self.signals.finished.emit(infoStr)
+
+	def export(self):
+		total=len(self.markerList)
+		log.info("Writing GPX file %s",self.gpxFile.name)
+		t=buckshot_timing.start()
+		try:
+			# each element in markerList will result in a gpx wpt token,
+			#  written as it is produced (see buckshot_export.GpxWriter for
+			#  the <desc> and <sym> rules)
+			with self.gpxFile:
+				with buckshot_export.GpxWriter(self.gpxFile) as writer:
+					writer.writeAll(self.markerList)
+		except (IOError,ValueError) as err:
+			log.warning("GPX file not written: %s",err)
+			infoStr="\nWrote GPX?   NO ("+str(err)+")"
 		else:
-			infoStr+="\nWrote URL?    NO"
-			print("No URL specified; skipping URL export.")
-			
-		QMessageBox.information(self,"Markers Created","Markers created successfully.\n"+infoStr)
-
+			infoStr="\nWrote GPX?   YES"
+		buckshot_timing.record("gpx write",t)
+
+		if not self.url:
+			log.info("No URL specified; skipping URL export.")
+			return "Markers created successfully.\n"+infoStr+"\nWrote URL?    NO"
+		if self.cancelled:
+			return "Export cancelled.\n"+infoStr+"\nWrote URL?    NO (cancelled)"
+
+		import buckshot_sartopo
+		(domainAndPort,mapID)=buckshot_sartopo.parseMapURL(self.url)
+		log.info("Sending markers to %s, map ID %s",domainAndPort,mapID)
+
+		def markerDone(result):
+			self.done+=1 # only called from uploadMarkers' own thread
+			buckshot_metrics.markerUploaded(result)
+			if not result.ok:
+				log.warning("marker %s failed: %s",result.marker.title,result.error)
+			self.signals.progress.emit(self.done,total)
+
+		# markers are uploaded concurrently over one pooled connection; see
+		#  buckshot_sartopo.py
+		try:
+			with buckshot_sartopo.SartopoUploader(domainAndPort,mapID) as uploader:
+				self.uploader=uploader
+				if self.cancelled:
+					uploader.cancel()
+				results=uploader.uploadMarkers(self.markerList,"Buckshot",markerDone)
+		except buckshot_sartopo.SartopoError as err:
+			buckshot_metrics.uploadError()
+			log.warning("URL export failed: %s",err)
+			return "Markers not sent to URL.\n"+infoStr+"\nWrote URL?    NO ("+str(err)+")"
+		finally:
+			self.uploader=None
+		failed=[result for result in results if not result.ok]
+		if not failed:
+			return "Markers created successfully.\n"+infoStr+"\nWrote URL?   YES"
+		infoStr+="\nWrote URL?   "+str(len(results)-len(failed))+" of "+str(len(results))+" markers"
+		if self.cancelled:
+			return "Export cancelled.\n"+infoStr
+		return "Some markers were not created.\n"+infoStr+"\n  failed: "+", ".join(result.marker.title for result in failed)
+
+
+# loadDeferred - import everything that was deferred to get the window up
+#  quickly (see buckshot_lazy); a missing module only matters (and is
+#  reported) on export
+def loadDeferred():
+	buckshot_lazy.loadAll()
+	try:
+		import buckshot_sartopo
+	except ImportError:
+		pass
+
+# warmUp - run loadDeferred on a background thread; called after the first
+#  paint, so that neither the first keystroke nor the first export waits
+def warmUp():
+	threading.Thread(target=loadDeferred,daemon=True).start()
 
 def main():
-	app = QApplication(sys.argv)
-	w = MyWindow(app)
+	import buckshot_cli
+	# headless modes (e.g. 'buckshot batch ...') don't open a window
+	if len(sys.argv)>1 and sys.argv[1] in buckshot_cli.commands:
+		sys.exit(buckshot_cli.main(sys.argv[1:]))
+	# --region NAME_OR_SPEC (repeatable) sets the region hypotheses,
+	#  --usng-square GZD[SQUARE] the USNG grid zone and square to assume
+	#  (--usng-digits also reads bare digit runs in that square),
+	#  --area FILE loads an incident area, --dem/--water/--elevation set up
+	#  the terrain filter, --datum NAME=GRID adds datum variants and
+	#  --cluster METERS sets the marker merge radius, --trace turns on debug
+	#  logging, --timings FILE / --profile DIR record stage timings and
+	#  profiles (see buckshot_timing) and --metrics-port PORT /
+	#  --metrics-file FILE export live metrics (see buckshot_metrics), same
+	#  as in the headless modes;
+	#  --gazetteer FILE loads a GNIS-style place-name file for the landmark
+	#  field (--gazetteer-state, repeatable, keeps only those states);
+	#  everything else is left for Qt
+	parser=argparse.ArgumentParser(prog="buckshot")
+	buckshot_cli.addRegionArgument(parser)
+	buckshot_cli.addUSNGArgument(parser)
+	buckshot_cli.addAreaArgument(parser)
+	buckshot_cli.addTerrainArguments(parser)
+	buckshot_cli.addDatumArgument(parser)
+	buckshot_cli.addClusterArgument(parser,defaultClusterRadius)
+	buckshot_cli.addTraceArgument(parser)
+	buckshot_cli.addProfilingArguments(parser)
+	buckshot_cli.addMetricsArguments(parser)
+	parser.add_argument("--gazetteer",metavar="FILE",help="GNIS-style place-name file (pipe-delimited, with header row)")
+	parser.add_argument("--gazetteer-state",action="append",metavar="STATE",help="only load places in this state (e.g. CA); repeatable")
+	(args,qtArgs)=parser.parse_known_args()
+	buckshot_cli.setLoggingFromArgs(args)
+	buckshot_cli.setProfilingFromArgs(args)
+	buckshot_cli.setMetricsFromArgs(args)
+	buckshot_cli.setRegionsFromArgs(args)
+	buckshot_cli.setUSNGFromArgs(args)
+	buckshot_cli.setAreaFromArgs(args)
+	buckshot_cli.setTerrainFromArgs(args)
+	buckshot_cli.setDatumsFromArgs(args)
+	gazetteer=None
+	if args.gazetteer:
+		gazetteer=buckshot_gazetteer.Gazetteer(args.gazetteer,args.gazetteer_state)
+	app = QApplication(sys.argv[:1]+qtArgs)
+	w = MyWindow(app,gazetteer,args.cluster,buckshot_cli.area,buckshot_cli.terrain,buckshot_cli.datums)
+	w.painted.connect(warmUp)
 	w.show()
 	sys.exit(app.exec_())
 
@@ -0,0 +1,310 @@
+# #############################################################################
+#
+#  buckshot_area.py - spatial plausibility of buckshot candidates against an
+#   incident area boundary
+#
+#   developed for Nevada County Sheriff's Search and Rescue
+#
+#  Operators rule out candidates by eye ("it's on Prosser Mountain, not in
+#   Nevada"); given a local boundary (incident area, county, etc.) this does
+#   it for them: each candidate is scored as inside or outside the boundary,
+#   and by its distance to the boundary, so that the candidate lists can be
+#   sorted with the plausible candidates first and exported markers can be
+#   flagged.
+#
+#  The boundary is loaded from GeoJSON (Polygon / MultiPolygon geometries,
+#   Features or FeatureCollections) or from a shapefile (needs the optional
+#   pyshp module).  Rings are combined with the even-odd rule, so holes work.
+#
+#  Spatial indexes: the boundary is projected to a local flat plane (meters,
+#   equirectangular about the middle latitude of the boundary - good to well
+#   under 1% within a hundred km or so, plenty for ranking), then:
+#   - point-in-polygon uses a uniform grid of square cells, sized to the
+#     number of edges; each row of cells lists the edges that cross its
+#     latitude band, and each cell that no edge touches knows whether it is
+#     inside or outside.  A point in such a cell is a single lookup; any
+#     other point is a crossing count over one row's edges.
+#   - distance to the boundary uses an R-tree of the edges (bulk-loaded with
+#     Sort-Tile-Recursive packing), searched nearest node first, so only the
+#     few nodes and edges near the point are looked at, however far from the
+#     boundary the point is.
+#
+# #############################################################################
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  See included file LICENSE.txt for full license terms, also
+#  available at http://opensource.org/licenses/gpl-3.0.html
+#
+# ############################################################################
+
+import heapq
+import json
+import math
+import os
+from collections import namedtuple
+
+earthRadius=6371008.8 # meters (mean radius)
+
+# Plausibility - score of one point against the area:
+#  inside = True if the point is inside the boundary
+#  distance = distance from the point to the boundary, in meters
+Plausibility=namedtuple("Plausibility","inside distance")
+
+# formatDistance - e.g. "850 m" or "12.3 km"
+def formatDistance(meters):
+	if meters<1000:
+		return "%d m" % round(meters)
+	return "%.1f km" % (meters/1000.0)
+
+class IncidentArea(object):
+	# rings = list of rings, each a list of (lon,lat) pairs; a ring does not
+	#  need to repeat its first point at the end
+	def __init__(self,rings,name=""):
+		self.name=name
+		rings=[ring for ring in rings if len(ring)>=3]
+		if not rings:
+			raise ValueError("no polygon rings found in incident area "+name)
+		lats=[lat for ring in rings for (lon,lat) in ring]
+		lons=[lon for ring in rings for (lon,lat) in ring]
+		self.lat0=(min(lats)+max(lats))/2.0
+		self.ky=earthRadius*math.pi/180.0
+		self.kx=self.ky*math.cos(math.radians(self.lat0))
+
+		# edges, as (x1,y1,x2,y2) in meters
+		edges=[]
+		for ring in rings:
+			points=[self.project(lat,lon) for (lon,lat) in ring]
+			for n in range(len(points)):
+				(x1,y1)=points[n-1]
+				(x2,y2)=points[n]
+				if (x1,y1)!=(x2,y2):
+					edges.append((x1,y1,x2,y2))
+		self.edges=edges
+
+		# grid: square cells, about sqrt(edges) across the longer side
+		self.x0=min(min(e[0],e[2]) for e in edges)
+		self.y0=min(min(e[1],e[3]) for e in edges)
+		width=max(max(e[0],e[2]) for e in edges)-self.x0
+		height=max(max(e[1],e[3]) for e in edges)-self.y0
+		n=min(512,max(4,int(math.sqrt(len(edges)))))
+		self.cellSize=max(width,height,1.0)/n
+		self.nx=int(width/self.cellSize)+1
+		self.ny=int(height/self.cellSize)+1
+
+		# edgeCells = cells touched by the bounding box of some edge
+		# rowEdges[j] = edges whose latitude range overlaps row j
+		self.edgeCells=set()
+		self.rowEdges=[[] for j in range(self.ny)]
+		for edge in edges:
+			(i1,j1)=self.cellOf(min(edge[0],edge[2]),min(edge[1],edge[3]))
+			(i2,j2)=self.cellOf(max(edge[0],edge[2]),max(edge[1],edge[3]))
+			for j in range(j1,j2+1):
+				self.rowEdges[j].append(edge)
+				for i in range(i1,i2+1):
+					self.edgeCells.add((i,j))
+
+		# cellInside[j][i] = whether the center of cell (i,j) is inside;
+		#  only used for cells without edges, which are entirely inside or
+		#  entirely outside; one sweep along each row's center line
+		self.cellInside=[]
+		for j in range(self.ny):
+			yc=self.y0+(j+0.5)*self.cellSize
+			crossings=sorted(self.crossingX(edge,yc) for edge in self.rowEdges[j] if (edge[1]>yc)!=(edge[3]>yc))
+			row=bytearray(self.nx)
+			k=0
+			for i in range(self.nx):
+				xc=self.x0+(i+0.5)*self.cellSize
+				while k<len(crossings) and crossings[k]<=xc:
+					k+=1
+				# inside if an odd number of crossings lie to the right
+				row[i]=(len(crossings)-k)%2
+			self.cellInside.append(row)
+
+		self.tree=buildRTree(edges)
+
+	def project(self,lat,lon):
+		return ((lon*self.kx),(lat*self.ky))
+
+	def cellOf(self,x,y):
+		return (min(self.nx-1,max(0,int((x-self.x0)/self.cellSize))),min(self.ny-1,max(0,int((y-self.y0)/self.cellSize))))
+
+	# crossingX - x where an edge crosses the horizontal line at y
+	@staticmethod
+	def crossingX(edge,y):
+		(x1,y1,x2,y2)=edge
+		return x1+(y-y1)*(x2-x1)/(y2-y1)
+
+	def containsXY(self,x,y):
+		i=int(math.floor((x-self.x0)/self.cellSize))
+		j=int(math.floor((y-self.y0)/self.cellSize))
+		if i<0 or j<0 or i>=self.nx or j>=self.ny:
+			return False
+		if (i,j) not in self.edgeCells:
+			return bool(self.cellInside[j][i])
+		# crossing number of a ray to the right; only edges that cross this
+		#  row can cross the ray
+		inside=False
+		for (x1,y1,x2,y2) in self.rowEdges[j]:
+			if (y1>y)!=(y2>y) and x<x1+(y-y1)*(x2-x1)/(y2-y1):
+				inside=not inside
+		return inside
+
+	def contains(self,lat,lon):
+		return self.containsXY(*self.project(lat,lon))
+
+	# distanceXY - distance from a projected point to the nearest edge;
+	#  R-tree nodes are visited nearest first, and the search stops at the
+	#  first node that is farther away than the nearest edge found so far
+	def distanceXY(self,x,y):
+		best=float("inf")
+		heap=[(0.0,0,self.tree)]
+		count=1 # tie-breaker, so that nodes themselves are never compared
+		while heap:
+			(d2,n,node)=heapq.heappop(heap)
+			if d2>=best:
+				break
+			(x1,y1,x2,y2,leaf,children)=node
+			if leaf:
+				for edge in children:
+					d2=segmentDistance2(x,y,edge)
+					if d2<best:
+						best=d2
+			else:
+				for child in children:
+					d2=rectDistance2(x,y,child[0],child[1],child[2],child[3])
+					if d2<best:
+						heapq.heappush(heap,(d2,count,child))
+						count+=1
+		return math.sqrt(best)
+
+	def distance(self,lat,lon):
+		return self.distanceXY(*self.project(lat,lon))
+
+	def plausibility(self,lat,lon):
+		(x,y)=self.project(lat,lon)
+		return Plausibility(self.containsXY(x,y),self.distanceXY(x,y))
+
+	# describe - short text for marker descriptions, e.g.
+	#  "outside incident area (2.4 km)"
+	def describe(self,lat,lon):
+		p=self.plausibility(lat,lon)
+		if p.inside:
+			return "inside incident area"
+		return "outside incident area ("+formatDistance(p.distance)+")"
+
+	# rankCandidates - candidates sorted by plausibility: those inside the
+	#  boundary first (in their original order), then those outside, nearest
+	#  first
+	def rankCandidates(self,candidateList):
+		keyed=[]
+		for candidate in candidateList:
+			(x,y)=self.project(candidate.lat,candidate.lon)
+			if self.containsXY(x,y):
+				keyed.append(((False,0.0),candidate))
+			else:
+				keyed.append(((True,self.distanceXY(x,y)),candidate))
+		keyed.sort(key=lambda item: item[0])
+		return tuple(candidate for (key,candidate) in keyed)
+
+	# rankCandidateSet - a buckshot_engine.CandidateSet with each coordinate
+	#  system's candidates ranked
+	def rankCandidateSet(self,candidates):
+		return candidates._replace(
+			Dd=self.rankCandidates(candidates.Dd),
+			DMm=self.rankCandidates(candidates.DMm),
+			DMSs=self.rankCandidates(candidates.DMSs))
+
+# R-tree: each node is a tuple (xmin,ymin,xmax,ymax,leaf,children), where
+#  children is a list of edges for a leaf and a list of nodes otherwise
+rTreeCapacity=16
+
+# buildRTree - bulk-load an R-tree of edges, packed bottom-up with
+#  Sort-Tile-Recursive: sort by x, cut into vertical slices, sort each slice
+#  by y and pack each run of rTreeCapacity entries into one node
+def buildRTree(edges):
+	entries=[(min(e[0],e[2]),min(e[1],e[3]),max(e[0],e[2]),max(e[1],e[3]),e) for e in edges]
+	leaf=True
+	while True:
+		nodes=[]
+		nodeCount=int(math.ceil(len(entries)/float(rTreeCapacity)))
+		sliceSize=rTreeCapacity*int(math.ceil(math.sqrt(nodeCount)))
+		entries.sort(key=lambda b: b[0]+b[2])
+		for s in range(0,len(entries),sliceSize):
+			tile=sorted(entries[s:s+sliceSize],key=lambda b: b[1]+b[3])
+			for g in range(0,len(tile),rTreeCapacity):
+				group=tile[g:g+rTreeCapacity]
+				nodes.append((min(b[0] for b in group),min(b[1] for b in group),
+					max(b[2] for b in group),max(b[3] for b in group),
+					leaf,[b[4] for b in group]))
+		if len(nodes)==1:
+			return nodes[0]
+		entries=[node[:4]+(node,) for node in nodes]
+		leaf=False
+
+# segmentDistance2 - squared distance from a point to an edge
+def segmentDistance2(x,y,edge):
+	(x1,y1,x2,y2)=edge
+	dx=x2-x1
+	dy=y2-y1
+	t=((x-x1)*dx+(y-y1)*dy)/(dx*dx+dy*dy)
+	if t<0.0:
+		t=0.0
+	elif t>1.0:
+		t=1.0
+	ex=x1+t*dx-x
+	ey=y1+t*dy-y
+	return ex*ex+ey*ey
+
+# rectDistance2 - squared distance from a point to a rectangle
+def rectDistance2(x,y,x1,y1,x2,y2):
+	dx=max(x1-x,0.0,x-x2)
+	dy=max(y1-y,0.0,y-y2)
+	return dx*dx+dy*dy
+
+# geoJSONRings - all polygon rings in a GeoJSON object, as lists of (lon,lat)
+def geoJSONRings(obj):
+	kind=obj.get("type")
+	if kind=="FeatureCollection":
+		return [ring for feature in obj.get("features",[]) for ring in geoJSONRings(feature)]
+	if kind=="Feature":
+		return geoJSONRings(obj.get("geometry") or {})
+	if kind=="GeometryCollection":
+		return [ring for geometry in obj.get("geometries",[]) for ring in geoJSONRings(geometry)]
+	if kind=="Polygon":
+		return [[(p[0],p[1]) for p in ring] for ring in obj["coordinates"]]
+	if kind=="MultiPolygon":
+		return [[(p[0],p[1]) for p in ring] for polygon in obj["coordinates"] for ring in polygon]
+	return []
+
+# shapefileRings - all polygon rings in a shapefile (needs pyshp); the
+#  shapefile must be in lat/lon (e.g. WGS84 or NAD83 geographic)
+def shapefileRings(filename):
+	try:
+		import shapefile
+	except ImportError:
+		raise ImportError("reading shapefiles needs the pyshp module (pip install pyshp); or, use GeoJSON")
+	rings=[]
+	with shapefile.Reader(filename) as reader:
+		for shape in reader.shapes():
+			parts=list(shape.parts)+[len(shape.points)]
+			for n in range(len(parts)-1):
+				rings.append([(p[0],p[1]) for p in shape.points[parts[n]:parts[n+1]]])
+	return rings
+
+# loadArea - an IncidentArea from a GeoJSON (.geojson/.json) or shapefile (.shp)
+def loadArea(filename):
+	if os.path.splitext(filename)[1].lower()==".shp":
+		rings=shapefileRings(filename)
+	else:
+		with open(filename,"r",encoding="utf-8") as f:
+			rings=geoJSONRings(json.load(f))
+	return IncidentArea(rings,os.path.basename(filename))
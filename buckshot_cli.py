@@ -0,0 +1,735 @@
+# #############################################################################
+#
+#  buckshot_cli.py - headless command-line modes for buckshot
+#
+#   developed for Nevada County Sheriff's Search and Rescue
+#
+#  usage:
+#   python buckshot.py batch INPUT [-o OUTPUT] [options]
+#   python buckshot.py filter [--marker-name NAME]
+#   python buckshot.py serve [--port PORT] [--host HOST]
+#   (or python buckshot_cli.py ..., which does not need PyQt)
+#
+#  batch: reprocess a file of coordinate strings (e.g. a year of dispatch
+#   records); the input file is streamed line by line, the work is fanned
+#   out across a process pool in chunks, and candidate rows are written in
+#   input order with bounded memory (at most a few chunks per worker are in
+#   flight at any time).
+#
+#   input formats (default: from the file extension; '-' = stdin):
+#    text  - one coordinate string per line
+#    csv   - coordinate string in column --column (index, when there is no
+#            header row; or header name)
+#    jsonl - coordinate string in field --column of each JSON object
+#            (a line that is not a JSON object is logged and skipped)
+#   output formats (default: from the file extension, else jsonl):
+#    jsonl - one JSON object per candidate
+#    csv   - one row per candidate, with a header row
+#   each candidate's "match" is exact, close or none (filter mode also tells
+#    partial matches apart)
+#   --gpx FILE also streams every candidate to a GPX file, as waypoints named
+#    <marker name><record number>_<system><index>; with --cluster METERS,
+#    each record's waypoints within that distance of each other are merged
+#    (see buckshot_cluster)
+#
+#  --region NAME_OR_SPEC (batch and filter; repeatable) sets the region
+#   hypotheses: a preset name (default, conus, alaska, hawaii, world) or a
+#   spec like 20-49N,100-129W (see buckshot_engine.parseRegion); world
+#   gives about 1500 candidates per reading, about 100 times as many as
+#   default, and is logged as a warning
+#
+#  --area FILE (batch and filter) loads an incident area boundary (GeoJSON,
+#   or a shapefile with pyshp installed; see buckshot_area): each coordinate
+#   system's candidates are then ranked inside-the-area first, then by
+#   distance outside it, every candidate gets "inside" and "distance"
+#   (meters to the boundary) fields, and marker descriptions say whether
+#   the marker is inside the area
+#
+#  --dem PATH and --water PATH (batch and filter; repeatable; files or
+#   directories of SRTM .hgt or BIL/GridFloat rasters, see buckshot_terrain)
+#   add "elevation" and "water" fields to every candidate and to marker
+#   descriptions, and move candidates in water - or outside --elevation
+#   MIN-MAX meters, if given - to the end of each coordinate system's list;
+#   in batch mode the rasters are sampled once per chunk, tile by tile
+#
+#  every candidate row (batch) and candidate object (filter) carries "utm",
+#   "usng" and "mgrs" renderings of its position (see buckshot_usng), and
+#   marker descriptions give the USNG reference; a typed USNG/MGRS reference
+#   is read as a candidate too (system "USNG").  --usng-square GZD[SQUARE]
+#   (batch and filter), e.g. 10SGJ, sets the grid zone to assume for
+#   references that leave it out (e.g. "GJ 0683 1112"); with --usng-digits
+#   as well, a bare run of 4 to 10 digits (e.g. "0683 1112") is also read
+#   as a reference in that square - off by default, since most such runs
+#   are lat/lon readings
+#
+#  --trace (batch and filter) turns on debug logging to stderr (see
+#   buckshot_log); progress and errors are logged there either way, so
+#   stdout only ever carries results
+#
+#  --timings FILE (batch and filter) adds the time of each engine stage to
+#   histograms that are merged into FILE on exit, and --profile DIR writes
+#   cProfile and tracemalloc reports for the run to DIR (see
+#   buckshot_timing); with -j more than 1, the stages run in the worker
+#   processes and are not timed
+#
+#  --metrics-port PORT and --metrics-file FILE (batch, filter and serve)
+#   export running counts - candidates generated, candidate cache hits - in
+#   Prometheus text format on http://127.0.0.1:PORT/metrics or to FILE (see
+#   buckshot_metrics); in batch mode with -j more than 1, the candidates are
+#   counted as each chunk's results come back, and the cache figures are
+#   this process's only (each worker process has its own cache)
+#
+#  --datum NAME=GRID (batch and filter; repeatable) expands every candidate
+#   across another datum, using a NADCON .las/.los grid shift file (e.g.
+#   --datum NAD27=/grids/conus; see buckshot_datum): the position each
+#   candidate would have if the reading was taken in that datum is added as
+#   "lat_NAME" and "lon_NAME" fields (batch), a "datums" object (filter),
+#   and an extra GPX waypoint titled e.g. X12_DMm2_NAD27
+#
+#  serve: a local HTTP/JSON service with the same records as filter mode,
+#   and GPX documents, for other programs; see buckshot_service
+#
+#  filter: for pipeline integration (e.g. CAD); reads one coordinate string
+#   per line from stdin and writes one JSON object per line to stdout as soon
+#   as each line arrives (flushed per record):
+#    {"input": ..., "exactMatch": true/false, "candidates": [...]}
+#   each candidate carries the same marker title, color and symbols that an
+#   export from the GUI would use; an exact match is treated as the best match
+#   candidates of each coordinate system come in the order of their marker
+#   indices (X_DMm1, X_DMm2, ...), "match" is one of exact, close, partial or
+#   none, and "score" ranks candidates within a match class (higher is
+#   better; see buckshot_engine.gradeCandidate)
+#
+# #############################################################################
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  See included file LICENSE.txt for full license terms, also
+#  available at http://opensource.org/licenses/gpl-3.0.html
+#
+# ############################################################################
+
+import argparse
+import csv
+import io
+import json
+import os
+import sys
+from collections import deque
+
+import buckshot_engine
+import buckshot_export
+import buckshot_lazy
+import buckshot_log
+import buckshot_metrics
+import buckshot_timing
+import buckshot_usng
+
+# the feature modules are only needed when their options are given (see
+#  buckshot_lazy)
+buckshot_area=buckshot_lazy.optionalModule("buckshot_area")
+buckshot_cluster=buckshot_lazy.optionalModule("buckshot_cluster")
+buckshot_datum=buckshot_lazy.optionalModule("buckshot_datum")
+buckshot_terrain=buckshot_lazy.optionalModule("buckshot_terrain")
+
+log=buckshot_log.getLogger("cli")
+
+# UTM, USNG and MGRS renderings of each candidate's position
+gridFields=["utm","usng","mgrs"]
+
+# columns of each candidate row
+candidateFields=["record","input","system","index","lat","lon","text","match"]+gridFields
+
+# extra columns of each candidate row when an incident area is loaded
+areaFields=["inside","distance"]
+
+# extra columns of each candidate row when terrain rasters are loaded
+terrainFields=["elevation","water"]
+
+# extra columns of each candidate row for each datum set by --datum
+def datumFields(datum):
+	return ["lat_"+datum.name,"lon_"+datum.name]
+
+# area - the buckshot_area.IncidentArea set by --area, or None
+area=None
+
+# terrain - the buckshot_terrain.Terrain set by --dem/--water, or None
+terrain=None
+
+# datums - the buckshot_datum.Datums set by --datum (empty list = none)
+datums=[]
+
+def setArea(newArea):
+	global area
+	area=newArea
+
+def setTerrain(newTerrain):
+	global terrain
+	terrain=newTerrain
+
+def setDatums(newDatums):
+	global datums
+	datums=list(newDatums)
+
+# initWorker - batch worker process initializer, so that the workers use the
+#  same region hypotheses, USNG default square, incident area, terrain and
+#  datums as the parent process
+def initWorker(regions,usngDefault,newArea,newTerrain,newDatums):
+	buckshot_engine.setRegions(regions)
+	buckshot_engine.setUSNGDefault(*usngDefault)
+	setArea(newArea)
+	setTerrain(newTerrain)
+	setDatums(newDatums)
+
+# outputFields - the columns of each candidate row
+def outputFields():
+	fields=candidateFields
+	if area is not None:
+		fields=fields+areaFields
+	if terrain is not None:
+		fields=fields+terrainFields
+	for datum in datums:
+		fields=fields+datumFields(datum)
+	return fields
+
+# scoreCandidates - rank candidate sets against the incident area and the
+#  terrain, whichever are loaded; the terrain of all candidates of all the
+#  sets is sampled in one batch
+# returns (list of ranked candidate sets,{(lat,lon): TerrainSample} or None)
+def scoreCandidates(candidateSets):
+	if area is not None:
+		candidateSets=[area.rankCandidateSet(candidates) for candidates in candidateSets]
+	samples=None
+	if terrain is not None:
+		samples=terrain.sampleCandidates([c for candidates in candidateSets for c in buckshot_engine.allCandidates(candidates)])
+		candidateSets=[terrain.rankCandidateSet(candidates,samples) for candidates in candidateSets]
+	return (candidateSets,samples)
+
+# convertCandidates - the position of each candidate in each of the datums
+#  (the --datum datums if not given), converted in one batch per datum
+# returns {(lat,lon): [(lat,lon) or None for each datum]}, or None if no
+#  datums are set
+def convertCandidates(candidateList,datumList=None):
+	if datumList is None:
+		datumList=datums
+	if not datumList:
+		return None
+	points=list(set((c.lat,c.lon) for c in candidateList))
+	lats=[lat for (lat,lon) in points]
+	lons=[lon for (lat,lon) in points]
+	converted=[datum.convertMany(lats,lons) for datum in datumList]
+	return dict((point,[positions[n] for positions in converted]) for (n,point) in enumerate(points))
+
+# gridValues - the gridFields values of a UTM (or None)
+def gridValues(utm):
+	return [buckshot_usng.utmText(utm),buckshot_usng.usngText(utm),buckshot_usng.mgrsText(utm)]
+
+# datumValues - the datumFields values of each datum for one candidate
+def datumValues(positions):
+	values=[]
+	for position in positions:
+		values+=[None,None] if position is None else [round(position[0],7),round(position[1],7)]
+	return values
+
+# candidateRows - one row (list of values, in outputFields order) for each
+#  candidate of one input record; index is the 1-based position within the
+#  coordinate system, same as the marker name suffix (e.g. X_DMm3)
+#  samples = terrain samples from scoreCandidates
+#  converted = datum positions from convertCandidates
+#  gridRefs = UTM of the candidates (see buckshot_usng.candidateUTM)
+def candidateRows(record,coordString,candidates,samples=None,converted=None,gridRefs=None):
+	if gridRefs is None:
+		gridRefs=buckshot_usng.candidateUTM(buckshot_engine.allCandidates(candidates))
+	rows=[]
+	for candidateList in (candidates.Dd,candidates.DMm,candidates.DMSs,candidates.USNG):
+		for (n,candidate) in enumerate(candidateList):
+			row=[record,coordString,candidate.system,n+1,candidate.lat,candidate.lon,candidate.text(),candidate.match]
+			row+=gridValues(gridRefs[(candidate.lat,candidate.lon)])
+			if area is not None:
+				p=area.plausibility(candidate.lat,candidate.lon)
+				row+=[p.inside,round(p.distance,1)]
+			if terrain is not None:
+				row+=terrainValues(samples[(candidate.lat,candidate.lon)])
+			if converted is not None:
+				row+=datumValues(converted[(candidate.lat,candidate.lon)])
+			rows.append(row)
+	return rows
+
+# terrainValues - the terrainFields values of a TerrainSample
+def terrainValues(sample):
+	elevation=sample.elevation
+	if elevation is not None:
+		elevation=round(elevation,1)
+	return [elevation,sample.water]
+
+# formatRows - output text for a list of candidate rows
+def formatRows(rows,outputFormat):
+	if outputFormat=="csv":
+		buf=io.StringIO()
+		writer=csv.writer(buf,lineterminator="\n")
+		writer.writerows(rows)
+		return buf.getvalue()
+	fields=outputFields()
+	return "".join(json.dumps(dict(zip(fields,row)))+"\n" for row in rows)
+
+# processChunk - worker function: output text for a chunk of input records;
+#  the formatting is done here too, so that the parent process only has to
+#  read and write
+#  chunk = list of (record number,coordinate string)
+#  gpxMarkerName = base marker name for GPX waypoints (each record's markers
+#   are named <gpxMarkerName><record number>_...), or None for no GPX
+#  clusterRadius = merge each record's GPX waypoints within this many meters
+# returns a tuple: (output text,GPX waypoint text,number of GPX waypoints,
+#  {coordinate system:number of candidates})
+def processChunk(chunk,outputFormat,gpxMarkerName=None,clusterRadius=0):
+	rows=[]
+	gpxParts=[]
+	counts={}
+	(candidateSets,samples)=scoreCandidates([buckshot_engine.generate(coordString) for (record,coordString) in chunk])
+	candidateList=[c for candidates in candidateSets for c in buckshot_engine.allCandidates(candidates)]
+	converted=convertCandidates(candidateList)
+	gridRefs=buckshot_usng.candidateUTM(candidateList)
+	for ((record,coordString),candidates) in zip(chunk,candidateSets):
+		rows.extend(candidateRows(record,coordString,candidates,samples,converted,gridRefs))
+		for system in ("Dd","DMm","DMSs","USNG"):
+			counts[system]=counts.get(system,0)+len(getattr(candidates,system))
+		if gpxMarkerName is not None:
+			gpxParts.extend(buckshot_export.gpxWpt(marker) for marker in recordMarkers(candidates,gpxMarkerName+str(record),samples,clusterRadius,gridRefs))
+	return (formatRows(rows,outputFormat),"".join(gpxParts),len(gpxParts),counts)
+
+# recordMarkers - markers for one input record in the headless modes, where
+#  nobody is there to select a best match: an exact match is the best match;
+#  each (merged) marker is followed by its datum variants
+def recordMarkers(candidates,markerName,samples=None,clusterRadius=0,gridRefs=None):
+	markerList=buckshot_export.makeMarkers(candidates,markerName,exactMatchOf(candidates),area,terrain,samples,gridRefs)
+	markerList=buckshot_cluster.clusterMarkers(markerList,candidates,clusterRadius)
+	return buckshot_datum.expandMarkers(markerList,datums)
+
+# exactMatchOf - the first exact-match candidate of a candidate set, or None
+def exactMatchOf(candidates):
+	for candidate in buckshot_engine.allCandidates(candidates):
+		if candidate.match==buckshot_engine.exactMatch:
+			return candidate
+	return None
+
+# formatFromName - input/output format implied by a filename extension
+def formatFromName(filename,default):
+	ext=os.path.splitext(filename)[1].lower()
+	if ext in (".csv",".jsonl"):
+		return ext[1:]
+	if ext==".json":
+		return "jsonl"
+	return default
+
+# readRecords - generator of (record number,coordinate string) from an open
+#  input file; record numbers are 1-based and count data records, not header
+#  rows
+def readRecords(f,inputFormat,column):
+	if inputFormat=="csv":
+		if column is None:
+			column="0"
+		reader=csv.reader(f)
+		if column.isdigit():
+			columnIndex=int(column)
+		else:
+			header=next(reader,[])
+			if column not in header:
+				raise ValueError("column '"+column+"' not found in CSV header: "+str(header))
+			columnIndex=header.index(column)
+		for (n,row) in enumerate(reader):
+			yield (n+1,row[columnIndex] if columnIndex<len(row) else "")
+	elif inputFormat=="jsonl":
+		if column is None:
+			column="coords"
+		n=0
+		for line in f:
+			if not line.strip():
+				continue
+			n+=1
+			# a line that isn't a JSON object is logged and passed on as an
+			#  empty record (no candidates), like a CSV row without the column,
+			#  so that the rest of the file is still processed and the record
+			#  numbers still match the input
+			try:
+				obj=json.loads(line)
+				if not isinstance(obj,dict):
+					raise ValueError("not a JSON object")
+			except ValueError as err:
+				log.warning("record %d skipped: %s",n,err)
+				yield (n,"")
+				continue
+			yield (n,str(obj.get(column,"")))
+	else:
+		for (n,line) in enumerate(f):
+			yield (n+1,line.rstrip("\r\n"))
+
+# chunked - generator of lists of up to size items from an iterable
+def chunked(iterable,size):
+	chunk=[]
+	for item in iterable:
+		chunk.append(item)
+		if len(chunk)>=size:
+			yield chunk
+			chunk=[]
+	if chunk:
+		yield chunk
+
+# runBatch - process all records from the input file to the output file
+#  (and optionally to a GPXWriter); with jobs>1 the chunks are processed by a
+#  pool of worker processes, keeping at most jobs*2 chunks in flight and
+#  writing results in input order
+# returns the number of input records processed
+#  the worker processes use the same region hypotheses, USNG default
+#  square, incident area, terrain and datums as this process (see
+#  initWorker)
+def runBatch(inFile,outFile,inputFormat,outputFormat,column=None,jobs=1,chunkSize=1000,gpxWriter=None,markerName="X",clusterRadius=0):
+	if outputFormat=="csv":
+		outFile.write(formatRows([outputFields()],"csv"))
+	gpxMarkerName=markerName if gpxWriter is not None else None
+	count=0
+
+	def writeResult(result):
+		(text,gpxText,gpxCount,counts)=result
+		buckshot_metrics.candidatesCounted(counts)
+		outFile.write(text)
+		if gpxWriter is not None:
+			gpxWriter.writeRaw(gpxText,gpxCount)
+
+	chunks=chunked(readRecords(inFile,inputFormat,column),chunkSize)
+	if jobs<=1:
+		for chunk in chunks:
+			writeResult(processChunk(chunk,outputFormat,gpxMarkerName,clusterRadius))
+			count+=len(chunk)
+		return count
+	# (imported here: multiprocessing is slow to import, and the window
+	#  imports this module for its command line options)
+	from concurrent.futures import ProcessPoolExecutor
+	with ProcessPoolExecutor(max_workers=jobs,initializer=initWorker,initargs=(buckshot_engine.regions,buckshot_engine.usngDefault,area,terrain,datums)) as pool:
+		pending=deque()
+		for chunk in chunks:
+			pending.append((len(chunk),pool.submit(processChunk,chunk,outputFormat,gpxMarkerName,clusterRadius)))
+			if len(pending)>=jobs*2:
+				(n,future)=pending.popleft()
+				writeResult(future.result())
+				count+=n
+		while pending:
+			(n,future)=pending.popleft()
+			writeResult(future.result())
+			count+=n
+	return count
+
+# setLoggingFromArgs - log to stderr, with debug detail if --trace
+def setLoggingFromArgs(args):
+	buckshot_log.setup(args.trace)
+
+# setProfilingFromArgs - start timing stages (--timings) and profiling
+#  (--profile), if asked
+def setProfilingFromArgs(args):
+	if args.timings:
+		buckshot_timing.enableTimings(args.timings)
+	if args.profile:
+		buckshot_timing.enableProfiling(args.profile)
+
+# setMetricsFromArgs - start exporting metrics (--metrics-port,
+#  --metrics-file), if asked
+def setMetricsFromArgs(args):
+	if args.metrics_port is not None:
+		buckshot_metrics.serve(args.metrics_port)
+	if args.metrics_file:
+		buckshot_metrics.writePeriodically(args.metrics_file)
+
+# setRegionsFromArgs - apply the --region options, if any; warns if they
+#  cover so much of the globe (e.g. world) that every reading gets on the
+#  order of a thousand candidates
+def setRegionsFromArgs(args):
+	if args.region:
+		regionList=[region for regionList in args.region for region in regionList]
+		area=buckshot_engine.regionArea(regionList)
+		if area>buckshot_engine.wideRegionArea:
+			log.warning("regions %s cover %d square degrees: expect about %d candidates per reading and slow updates; a narrower region (e.g. 20-49N,100-129W) is much faster",
+				"+".join(region.name for region in regionList),area,round(area/45,-2))
+		buckshot_engine.setRegions(regionList)
+
+# setUSNGFromArgs - apply the --usng-square and --usng-digits options, if
+#  given
+def setUSNGFromArgs(args):
+	if args.usng_square:
+		buckshot_engine.setUSNGDefault(*args.usng_square,bareDigits=args.usng_digits)
+
+# setAreaFromArgs - load the --area boundary, if any
+def setAreaFromArgs(args):
+	if args.area:
+		setArea(buckshot_area.loadArea(args.area))
+
+# setTerrainFromArgs - load the --dem/--water rasters, if any
+def setTerrainFromArgs(args):
+	if args.dem or args.water:
+		setTerrain(buckshot_terrain.Terrain(args.dem or [],args.water or [],args.elevation))
+
+# setDatumsFromArgs - set the --datum datums, if any (already loaded by
+#  parseDatum)
+def setDatumsFromArgs(args):
+	if args.datum:
+		setDatums(args.datum)
+
+def batchCommand(args):
+	setLoggingFromArgs(args)
+	setProfilingFromArgs(args)
+	setMetricsFromArgs(args)
+	setRegionsFromArgs(args)
+	setUSNGFromArgs(args)
+	setAreaFromArgs(args)
+	setTerrainFromArgs(args)
+	setDatumsFromArgs(args)
+	inputFormat=args.input_format or formatFromName(args.input,"text")
+	outputFormat=args.output_format or formatFromName(args.output,"jsonl")
+	jobs=args.jobs or os.cpu_count() or 1
+	if args.input=="-":
+		inFile=sys.stdin
+	else:
+		inFile=open(args.input,"r",newline="",encoding="utf-8")
+	if args.output=="-":
+		outFile=sys.stdout
+	else:
+		outFile=open(args.output,"w",newline="",encoding="utf-8",buffering=1<<20)
+	gpxFile=None
+	gpxWriter=None
+	if args.gpx:
+		gpxFile=open(args.gpx,"w",encoding="utf-8",buffering=1<<20)
+		gpxWriter=buckshot_export.GpxWriter(gpxFile)
+	try:
+		count=runBatch(inFile,outFile,inputFormat,outputFormat,args.column,jobs,args.chunk_size,gpxWriter,args.marker_name,args.cluster)
+		if gpxWriter is not None:
+			gpxWriter.close()
+	finally:
+		if inFile is not sys.stdin:
+			inFile.close()
+		if outFile is not sys.stdout:
+			outFile.close()
+		if gpxFile is not None:
+			gpxFile.close()
+	log.info("batch: %d records processed",count)
+	return 0
+
+# recordCandidates - the ranked candidate set of one coordinate string, as
+#  the filter and the service report it
+# returns a tuple: (candidate set,terrain samples or None,{(lat,lon): UTM})
+def recordCandidates(coordString):
+	([candidates],samples)=scoreCandidates([buckshot_engine.generate(coordString)])
+	buckshot_metrics.candidatesShown(candidates)
+	gridRefs=buckshot_usng.candidateUTM(buckshot_engine.allCandidates(candidates))
+	return (candidates,samples,gridRefs)
+
+# filterRecord - the JSON-ready object for one input line in filter mode
+def filterRecord(coordString,markerName):
+	return candidatesRecord(coordString,markerName,*recordCandidates(coordString))
+
+# candidatesRecord - the JSON-ready object for the candidates of one
+#  coordinate string (see recordCandidates)
+def candidatesRecord(coordString,markerName,candidates,samples,gridRefs):
+	candidateList=buckshot_engine.allCandidates(candidates)
+	bestMatch=exactMatchOf(candidates)
+	markers=buckshot_export.makeMarkers(candidates,markerName,bestMatch,area,terrain,samples,gridRefs)
+	converted=convertCandidates(candidateList)
+	grades=buckshot_engine.matchGrades(candidates)
+	items=[]
+	for (candidate,marker,(match,score)) in zip(candidateList,markers,grades):
+		item={
+			"system":candidate.system,
+			"text":candidate.text(),
+			"lat":candidate.lat,
+			"lon":candidate.lon,
+			"match":match,
+			"score":score,
+			"exact":candidate.match==buckshot_engine.exactMatch,
+			"title":marker.title,
+			"color":marker.color,
+			"symbol":marker.symbol,
+			"gpxSymbol":buckshot_export.locusSymbol(marker.title),
+			"description":marker.description}
+		item.update(zip(gridFields,gridValues(gridRefs[(candidate.lat,candidate.lon)])))
+		if area is not None:
+			p=area.plausibility(candidate.lat,candidate.lon)
+			item["inside"]=p.inside
+			item["distance"]=round(p.distance,1)
+		if terrain is not None:
+			item.update(zip(terrainFields,terrainValues(samples[(candidate.lat,candidate.lon)])))
+		if converted is not None:
+			item["datums"]=dict((datum.name,{"lat":position[0],"lon":position[1],"title":marker.title+"_"+datum.name})
+				for (datum,position) in zip(datums,converted[(candidate.lat,candidate.lon)]) if position is not None)
+		items.append(item)
+	return {"input":coordString,"exactMatch":bestMatch is not None,"candidates":items}
+
+# runFilter - one JSON line out for each line in, flushed per record so that
+#  the caller sees each result as soon as its input line is complete
+def runFilter(inFile,outFile,markerName):
+	for line in iter(inFile.readline,""):
+		outFile.write(json.dumps(filterRecord(line.rstrip("\r\n"),markerName))+"\n")
+		outFile.flush()
+
+def filterCommand(args):
+	setLoggingFromArgs(args)
+	setProfilingFromArgs(args)
+	setMetricsFromArgs(args)
+	setRegionsFromArgs(args)
+	setUSNGFromArgs(args)
+	setAreaFromArgs(args)
+	setTerrainFromArgs(args)
+	setDatumsFromArgs(args)
+	runFilter(sys.stdin,sys.stdout,args.marker_name)
+	return 0
+
+# serveCommand - the service imports this module, so it is imported here
+def serveCommand(args):
+	import buckshot_service
+	setLoggingFromArgs(args)
+	setProfilingFromArgs(args)
+	setMetricsFromArgs(args)
+	setRegionsFromArgs(args)
+	setUSNGFromArgs(args)
+	setAreaFromArgs(args)
+	setTerrainFromArgs(args)
+	setDatumsFromArgs(args)
+	buckshot_service.clusterRadius=args.cluster
+	buckshot_service.serve(args.port,args.host)
+	return 0
+
+def addTraceArgument(parser):
+	parser.add_argument("--trace",action="store_true",
+		help="log debug detail (every canonical string, candidate list and marker list) to stderr")
+
+def addProfilingArguments(parser):
+	parser.add_argument("--timings",metavar="FILE",
+		help="record the time of each stage in histograms, merged into this JSON file on exit")
+	parser.add_argument("--profile",metavar="DIR",
+		help="profile the session (cProfile and tracemalloc); reports are written to this directory on exit")
+
+def addMetricsArguments(parser):
+	parser.add_argument("--metrics-port",type=int,metavar="PORT",
+		help="serve Prometheus-text metrics at http://127.0.0.1:PORT/metrics")
+	parser.add_argument("--metrics-file",metavar="FILE",
+		help="write Prometheus-text metrics to this file every 15 seconds and on exit")
+
+def addRegionArgument(parser):
+	parser.add_argument("--region",action="append",type=buckshot_engine.lookupRegions,metavar="NAME_OR_SPEC",
+		help="region hypothesis: "+", ".join(sorted(buckshot_engine.regionPresets))+", or e.g. 20-49N,100-129W; repeatable (default: default)")
+
+# parseUSNGSquare - argparse type for --usng-square
+def parseUSNGSquare(text):
+	try:
+		return buckshot_usng.parseSquare(text)
+	except ValueError as err:
+		raise argparse.ArgumentTypeError(str(err))
+
+def addUSNGArgument(parser):
+	parser.add_argument("--usng-square",type=parseUSNGSquare,metavar="GZD[SQUARE]",
+		help="grid zone (and 100 km square) to assume for USNG references typed without them, e.g. 10SGJ")
+	parser.add_argument("--usng-digits",action="store_true",
+		help="also read bare digit runs (4 to 10 digits) as USNG references in the --usng-square square (which must include the square, e.g. 10SGJ)")
+
+def addAreaArgument(parser):
+	parser.add_argument("--area",metavar="FILE",
+		help="incident area boundary (GeoJSON, or shapefile with pyshp): rank candidates inside it first")
+
+# parseElevationRange - argparse type for --elevation
+def parseElevationRange(text):
+	try:
+		return buckshot_terrain.parseElevationRange(text)
+	except ValueError as err:
+		raise argparse.ArgumentTypeError(str(err))
+
+def addTerrainArguments(parser):
+	parser.add_argument("--dem",action="append",metavar="PATH",
+		help="elevation raster file or directory (SRTM .hgt, BIL/GridFloat with .hdr); repeatable")
+	parser.add_argument("--water",action="append",metavar="PATH",
+		help="water mask raster file or directory (nonzero = water); repeatable")
+	parser.add_argument("--elevation",type=parseElevationRange,metavar="MIN-MAX",
+		help="elevation range in meters consistent with the report, e.g. 1500-2500; needs --dem")
+
+# parseDatum - argparse type for --datum
+def parseDatum(text):
+	try:
+		return buckshot_datum.parseDatumSpec(text)
+	except (ValueError,OSError) as err:
+		raise argparse.ArgumentTypeError(str(err))
+
+def addDatumArgument(parser):
+	parser.add_argument("--datum",action="append",type=parseDatum,metavar="NAME=GRID",
+		help="also place each candidate as if read in this datum, using a NADCON .las/.los grid, e.g. NAD27=/grids/conus; repeatable")
+
+# addClusterArgument - --cluster METERS, with a default that suits the mode
+def addClusterArgument(parser,default=0):
+	parser.add_argument("--cluster",type=float,default=default,metavar="METERS",
+		help="merge markers within this distance of each other into one marker (0 = off; default %g)" % default)
+
+def makeParser():
+	parser=argparse.ArgumentParser(prog="buckshot",description="SAR coordinate buckshot - headless modes")
+	subparsers=parser.add_subparsers(dest="command")
+	subparsers.required=True
+
+	batch=subparsers.add_parser("batch",help="reprocess a file of coordinate strings")
+	batch.add_argument("input",help="input file (text, csv or jsonl); '-' for stdin")
+	batch.add_argument("-o","--output",default="-",help="output file (jsonl or csv); default stdout")
+	batch.add_argument("--input-format",choices=["text","csv","jsonl"],help="default: from the input file extension")
+	batch.add_argument("--output-format",choices=["jsonl","csv"],help="default: from the output file extension")
+	batch.add_argument("--column",help="csv: column index or header name (default 0); jsonl: field name (default 'coords')")
+	batch.add_argument("-j","--jobs",type=int,default=0,help="worker processes (default: number of CPUs; 1 = no pool)")
+	batch.add_argument("--chunk-size",type=int,default=1000,help="records per work chunk (default 1000)")
+	batch.add_argument("--gpx",help="also write every candidate as a GPX waypoint to this file (streamed)")
+	batch.add_argument("--marker-name",default="X",help="base GPX marker name; the record number is appended (default X)")
+	addRegionArgument(batch)
+	addUSNGArgument(batch)
+	addAreaArgument(batch)
+	addTerrainArguments(batch)
+	addDatumArgument(batch)
+	addClusterArgument(batch)
+	addTraceArgument(batch)
+	addProfilingArguments(batch)
+	addMetricsArguments(batch)
+	batch.set_defaults(func=batchCommand)
+
+	filt=subparsers.add_parser("filter",help="stdin/stdout filter: one coordinate string in, one JSON line out")
+	filt.add_argument("--marker-name",default="X",help="base marker name (default X)")
+	addRegionArgument(filt)
+	addUSNGArgument(filt)
+	addAreaArgument(filt)
+	addTerrainArguments(filt)
+	addDatumArgument(filt)
+	addTraceArgument(filt)
+	addProfilingArguments(filt)
+	addMetricsArguments(filt)
+	filt.set_defaults(func=filterCommand)
+
+	serve=subparsers.add_parser("serve",help="local HTTP/JSON service: candidates and GPX for other programs")
+	serve.add_argument("--port",type=int,default=8378,help="port to listen on (default 8378; 0 = any free port)")
+	serve.add_argument("--host",default="127.0.0.1",help="address to listen on (default 127.0.0.1, this machine only)")
+	addRegionArgument(serve)
+	addUSNGArgument(serve)
+	addAreaArgument(serve)
+	addTerrainArguments(serve)
+	addDatumArgument(serve)
+	addClusterArgument(serve)
+	addTraceArgument(serve)
+	addProfilingArguments(serve)
+	addMetricsArguments(serve)
+	serve.set_defaults(func=serveCommand)
+	return parser
+
+# commands - the subcommand names, so that buckshot.py can tell a headless
+#  invocation from a GUI launch
+commands=["batch","filter","serve"]
+
+def main(argv=None):
+	args=makeParser().parse_args(argv)
+	return args.func(args)
+
+if __name__=="__main__":
+	sys.exit(main())
@@ -0,0 +1,112 @@
+# #############################################################################
+#
+#  buckshot_cluster.py - merge buckshot markers that land on top of each other
+#
+#   developed for Nevada County Sheriff's Search and Rescue
+#
+#  Different interpretations of the same digits sometimes land within a few
+#   meters of each other; on the map they are one point, but they still
+#   cost one marker each (clutter, and one more request each when uploading
+#   to SARTopo).  clusterMarkers merges markers within a given radius into
+#   one marker, whose description lists every interpretation it stands for.
+#
+#  Clusters are formed greedily around leaders, in priority order (the best
+#   match, then close matches, then the rest in list order): each marker
+#   joins the first leader within the radius, or else leads a new cluster.
+#   So every merged marker sits exactly on a real interpretation - the most
+#   important one in it - and every member is within the radius of it.
+#   Pairwise distances are computed in one vectorized haversine over all
+#   the markers when NumPy is installed.
+#
+# #############################################################################
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  See included file LICENSE.txt for full license terms, also
+#  available at http://opensource.org/licenses/gpl-3.0.html
+#
+# ############################################################################
+
+import math
+
+import buckshot_engine
+import buckshot_export
+import buckshot_lazy
+
+np=buckshot_lazy.optionalModule("numpy")
+
+earthRadius=6371008.8 # meters (mean radius)
+
+# leader priority of each marker symbol; lower goes first
+symbolPriority={buckshot_export.bestMatchSymbol:0,buckshot_export.closeMatchSymbol:1}
+
+# pairwiseDistances - matrix (list of rows) of great-circle distances in
+#  meters between all pairs of points
+def pairwiseDistances(lats,lons):
+	if np:
+		lat=np.radians(np.asarray(lats,dtype=float))
+		lon=np.radians(np.asarray(lons,dtype=float))
+		a=(np.sin((lat[:,None]-lat[None,:])/2)**2+
+			np.cos(lat)[:,None]*np.cos(lat)[None,:]*np.sin((lon[:,None]-lon[None,:])/2)**2)
+		return (2*earthRadius*np.arcsin(np.sqrt(np.minimum(a,1.0)))).tolist()
+	lat=[math.radians(x) for x in lats]
+	lon=[math.radians(x) for x in lons]
+	cosLat=[math.cos(x) for x in lat]
+	n=len(lat)
+	d=[[0.0]*n for i in range(n)]
+	for i in range(n):
+		for j in range(i+1,n):
+			a=math.sin((lat[j]-lat[i])/2)**2+cosLat[i]*cosLat[j]*math.sin((lon[j]-lon[i])/2)**2
+			d[i][j]=d[j][i]=2*earthRadius*math.asin(min(1.0,math.sqrt(a)))
+	return d
+
+# clusterPoints - greedy leader clustering of points within radius meters
+#  order = point indices in leader priority order
+# returns a list of clusters, each a list of point indices with the leader
+#  first, in order of their leaders' position in order
+def clusterPoints(lats,lons,radius,order):
+	d=pairwiseDistances(lats,lons)
+	clusters=[]
+	for i in order:
+		for cluster in clusters:
+			if d[i][cluster[0]]<=radius:
+				cluster.append(i)
+				break
+		else:
+			clusters.append([i])
+	return clusters
+
+# clusterMarkers - merge markers within radius meters of each other
+#  markerList = markers from buckshot_export.makeMarkers(candidates,...)
+#  candidates = the candidate set they were made from (for the coordinate
+#   text of each interpretation)
+# returns the new marker list, in the original order (of each cluster's
+#  leader); lone markers are unchanged, merged markers are titled
+#  e.g. "X_DMm2/DMSs5/DMSs6" and their description lists each member
+def clusterMarkers(markerList,candidates,radius):
+	if radius<=0 or len(markerList)<2:
+		return list(markerList)
+	candidateList=buckshot_engine.allCandidates(candidates)
+	order=sorted(range(len(markerList)),key=lambda n: (symbolPriority.get(markerList[n].symbol,2),n))
+	clusters=clusterPoints([m.lat for m in markerList],[m.lon for m in markerList],radius,order)
+	clusters.sort(key=lambda cluster: cluster[0])
+	result=[]
+	for cluster in clusters:
+		leader=markerList[cluster[0]]
+		if len(cluster)==1:
+			result.append(leader)
+			continue
+		members=[markerList[n] for n in cluster]
+		title="/".join([leader.title]+[m.title.rsplit("_",1)[-1] for m in members[1:]])
+		interpretations="; ".join(m.title+" = "+candidateList[n].text() for (m,n) in zip(members,cluster))
+		description=" - ".join(filter(None,[leader.description,"%d interpretations within %g m: " % (len(cluster),radius)+interpretations]))
+		result.append(leader._replace(title=title,description=description))
+	return result
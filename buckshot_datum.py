@@ -0,0 +1,281 @@
+# #############################################################################
+#
+#  buckshot_datum.py - datum expansion of buckshot candidates using NADCON
+#   grid shift files
+#
+#   developed for Nevada County Sheriff's Search and Rescue
+#
+#  After coordinate-system confusion, datum confusion is the next biggest
+#   source of error: a reading taken from an old USGS quad, or from a GPS
+#   left set to NAD27, is off by up to a couple of hundred meters when it
+#   is plotted as WGS84 (as SARTopo and GPX do).  Given a locally stored
+#   grid shift file, each candidate can be expanded with its position as if
+#   the reading had been in that datum - an extra marker, tagged with the
+#   datum name in its title and description.
+#
+#  Grids are NADCON binary .las/.los pairs (latitude and longitude shifts,
+#   in arc-seconds, longitude shifts positive west), e.g. conus.las and
+#   conus.los for NAD27 -> NAD83; specify either file or the common base
+#   name.  File layout: records of (columns+1) 4-byte words; the first
+#   record is the header (56 character ident, 8 character program name,
+#   int columns, rows, z, float xmin, dx, ymin, dy, angle), each of the
+#   following records is one row of the grid, south to north: one unused
+#   word, then one float per column, west to east.  Either byte order is
+#   accepted.  NAD83 and WGS84 are treated as the same datum - they differ
+#   by a meter or two in the lower 48, far less than the precision of any
+#   reading that could be confused this way.
+#
+#  The files are memory-mapped, and the shifts for all candidates at once
+#   are bilinearly interpolated in NumPy (if installed), so the expansion is
+#   cheap enough to run on every keystroke.
+#
+# #############################################################################
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  See included file LICENSE.txt for full license terms, also
+#  available at http://opensource.org/licenses/gpl-3.0.html
+#
+# ############################################################################
+
+import math
+import mmap
+import os
+import struct
+import threading
+
+import buckshot_lazy
+
+np=buckshot_lazy.optionalModule("numpy")
+
+headerFormat="56s8s3i5f"
+
+# ShiftFile - one memory-mapped NADCON .las or .los file; the header is read
+#  at load time, the grid is mapped on first use
+class ShiftFile(object):
+	def __init__(self,filename):
+		self.filename=filename
+		size=os.path.getsize(filename)
+		with open(filename,"rb") as f:
+			head=f.read(struct.calcsize(headerFormat))
+		if len(head)<struct.calcsize(headerFormat):
+			raise ValueError(filename+" is not a NADCON grid shift file")
+		for byteOrder in "<>":
+			fields=struct.unpack(byteOrder+headerFormat,head)
+			(nc,nr)=fields[2:4]
+			if 1<nc<100000 and 1<nr<100000 and (nr+1)*(nc+1)*4==size:
+				break
+		else:
+			raise ValueError(filename+" is not a NADCON grid shift file")
+		self.byteOrder=byteOrder
+		self.ncols=nc
+		self.nrows=nr
+		(self.xmin,self.dx,self.ymin,self.dy)=fields[5:9]
+		self.file=None
+		self.mm=None
+		self.grid=None
+		self.lock=threading.Lock()
+
+	# the mapping is not pickled (e.g. when the datums are passed to batch
+	#  worker processes); each process maps the file again on first use
+	def __getstate__(self):
+		state=self.__dict__.copy()
+		state.update(file=None,mm=None,grid=None,lock=None)
+		return state
+
+	def __setstate__(self,state):
+		self.__dict__.update(state)
+		self.lock=threading.Lock()
+
+	def open(self):
+		with self.lock:
+			if self.mm is not None:
+				return
+			f=open(self.filename,"rb")
+			try:
+				mm=mmap.mmap(f.fileno(),0,access=mmap.ACCESS_READ)
+			except Exception:
+				f.close()
+				raise
+			if np:
+				# rows of (unused word + columns), header record skipped
+				self.grid=np.frombuffer(mm,dtype=np.dtype(self.byteOrder+"f4"),count=self.nrows*(self.ncols+1),
+					offset=(self.ncols+1)*4).reshape(self.nrows,self.ncols+1)[:,1:]
+			self.file=f
+			self.mm=mm
+
+	def close(self):
+		with self.lock:
+			self.grid=None
+			if self.mm is not None:
+				self.mm.close()
+				self.file.close()
+				self.mm=None
+
+	# value - the grid value at row,column
+	def value(self,row,col):
+		if self.mm is None:
+			self.open()
+		return struct.unpack_from(self.byteOrder+"f",self.mm,((row+1)*(self.ncols+1)+col+1)*4)[0]
+
+	# values - grid values at NumPy arrays of rows and columns
+	def values(self,rows,cols):
+		if self.mm is None:
+			self.open()
+		return self.grid[rows,cols]
+
+# firstExisting - the first of a list of filenames that exists, or None
+def firstExisting(names):
+	for name in names:
+		if os.path.exists(name):
+			return name
+	return None
+
+# ShiftGrid - a .las/.los pair
+class ShiftGrid(object):
+	def __init__(self,path):
+		base=path
+		if os.path.splitext(path)[1].lower() in (".las",".los"):
+			base=os.path.splitext(path)[0]
+		lasName=firstExisting([base+".las",base+".LAS"])
+		losName=firstExisting([base+".los",base+".LOS"])
+		if lasName is None or losName is None:
+			raise ValueError("no NADCON grid shift file pair "+base+".las/.los")
+		self.las=ShiftFile(lasName)
+		self.los=ShiftFile(losName)
+		if (self.las.ncols,self.las.nrows,self.las.xmin,self.las.ymin)!=(self.los.ncols,self.los.nrows,self.los.xmin,self.los.ymin):
+			raise ValueError(lasName+" and "+losName+" do not cover the same grid")
+		g=self.las
+		self.south=g.ymin
+		self.west=g.xmin
+		self.north=g.ymin+(g.nrows-1)*g.dy
+		self.east=g.xmin+(g.ncols-1)*g.dx
+
+	def close(self):
+		self.las.close()
+		self.los.close()
+
+	def contains(self,lat,lon):
+		return self.south<=lat<=self.north and self.west<=lon<=self.east
+
+	# shift - (dlat,dlon) in degrees, east positive, at one point inside
+	def shift(self,lat,lon):
+		g=self.las
+		x=(lon-g.xmin)/g.dx
+		y=(lat-g.ymin)/g.dy
+		col=min(int(x),g.ncols-2)
+		row=min(int(y),g.nrows-2)
+		fx=x-col
+		fy=y-row
+		shifts=[]
+		for f in (self.las,self.los):
+			v00=f.value(row,col)
+			v01=f.value(row,col+1)
+			v10=f.value(row+1,col)
+			v11=f.value(row+1,col+1)
+			shifts.append(v00+(v01-v00)*fx+(v10-v00)*fy+(v11-v10-v01+v00)*fx*fy)
+		return (shifts[0]/3600.0,-shifts[1]/3600.0)
+
+	# shiftArrays - shift for NumPy arrays of points (all inside)
+	def shiftArrays(self,lats,lons):
+		g=self.las
+		x=(lons-g.xmin)/g.dx
+		y=(lats-g.ymin)/g.dy
+		col=np.minimum(x.astype(np.int64),g.ncols-2)
+		row=np.minimum(y.astype(np.int64),g.nrows-2)
+		fx=x-col
+		fy=y-row
+		shifts=[]
+		for f in (self.las,self.los):
+			v00=f.values(row,col)
+			v01=f.values(row,col+1)
+			v10=f.values(row+1,col)
+			v11=f.values(row+1,col+1)
+			shifts.append(v00+(v01-v00)*fx+(v10-v00)*fy+(v11-v10-v01+v00)*fx*fy)
+		return (shifts[0]/3600.0,-shifts[1]/3600.0)
+
+# Datum - a datum that readings may have been taken in, with the grids that
+#  shift it to NAD83/WGS84 (e.g. NAD27 with the conus and alaska grids)
+class Datum(object):
+	def __init__(self,name,grids):
+		self.name=name
+		self.grids=grids
+
+	def close(self):
+		for grid in self.grids:
+			grid.close()
+
+	# convertMany - WGS84 positions of points read in this datum, as a list
+	#  of (lat,lon), or None for points outside all of the grids
+	def convertMany(self,lats,lons):
+		if not np or len(lats)<4:
+			result=[]
+			for (lat,lon) in zip(lats,lons):
+				for grid in self.grids:
+					if grid.contains(lat,lon):
+						(dlat,dlon)=grid.shift(lat,lon)
+						result.append((lat+dlat,lon+dlon))
+						break
+				else:
+					result.append(None)
+			return result
+		lats=np.asarray(lats,dtype=float)
+		lons=np.asarray(lons,dtype=float)
+		newLats=np.full(len(lats),np.nan)
+		newLons=np.full(len(lats),np.nan)
+		left=np.ones(len(lats),dtype=bool)
+		for grid in self.grids:
+			indices=np.nonzero(left&(lats>=grid.south)&(lats<=grid.north)&(lons>=grid.west)&(lons<=grid.east))[0]
+			if len(indices):
+				(dlat,dlon)=grid.shiftArrays(lats[indices],lons[indices])
+				newLats[indices]=lats[indices]+dlat
+				newLons[indices]=lons[indices]+dlon
+				left[indices]=False
+		return [None if lat!=lat else (lat,lon) for (lat,lon) in zip(newLats.tolist(),newLons.tolist())]
+
+	def convert(self,lat,lon):
+		return self.convertMany([lat],[lon])[0]
+
+# parseDatumSpec - a Datum from e.g. "NAD27=/grids/conus,/grids/alaska"
+def parseDatumSpec(spec):
+	if "=" not in spec:
+		raise ValueError("datum should look like NAD27=/path/to/conus (NADCON .las/.los base name)")
+	(name,paths)=spec.split("=",1)
+	name=name.strip()
+	if not name or not paths:
+		raise ValueError("datum should look like NAD27=/path/to/conus (NADCON .las/.los base name)")
+	return Datum(name,[ShiftGrid(path) for path in paths.split(",")])
+
+# expandMarkers - each marker, followed by one marker for each datum that
+#  covers it: the same marker moved to where the reading would be if it
+#  had been taken in that datum, with the datum name appended to its title
+#  (e.g. "X_DMm2_NAD27") and noted in its description
+def expandMarkers(markerList,datums):
+	if not datums or not markerList:
+		return list(markerList)
+	lats=[m.lat for m in markerList]
+	lons=[m.lon for m in markerList]
+	converted=[datum.convertMany(lats,lons) for datum in datums]
+	result=[]
+	for (n,marker) in enumerate(markerList):
+		result.append(marker)
+		for (datum,positions) in zip(datums,converted):
+			if positions[n] is not None:
+				(lat,lon)=positions[n]
+				description=" - ".join(filter(None,["if read in "+datum.name,marker.description]))
+				result.append(marker._replace(title=marker.title+"_"+datum.name,lat=lat,lon=lon,description=description))
+	return result
+
+# shiftDistance - meters between two nearby points (for descriptions)
+def shiftDistance(lat1,lon1,lat2,lon2):
+	dy=(lat2-lat1)*111195.0
+	dx=(lon2-lon1)*111195.0*math.cos(math.radians((lat1+lat2)/2))
+	return math.hypot(dx,dy)
@@ -0,0 +1,734 @@
+# #############################################################################
+#
+#  buckshot_engine.py - headless candidate engine for buckshot: given a raw
+#   coordinate string, make guesses about the actual coordinates in all three
+#   lat-lon coordinate systems (Dd, DMm, DMSs), and as a USNG reference
+#
+#   developed for Nevada County Sheriff's Search and Rescue
+#
+#  This module has no Qt dependency, so that the same candidate logic can be
+#   used by the buckshot GUI (buckshot.py) and by headless callers that need
+#   to process coordinate strings at volume (e.g. dispatch-log reprocessing).
+#
+# #############################################################################
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  See included file LICENSE.txt for full license terms, also
+#  available at http://opensource.org/licenses/gpl-3.0.html
+#
+# ############################################################################
+
+import re
+from collections import namedtuple,OrderedDict
+from functools import lru_cache
+
+import buckshot_lazy
+
+# (deferred, so that importing the engine stays cheap; see buckshot_lazy)
+buckshot_timing=buckshot_lazy.optionalModule("buckshot_timing")
+buckshot_usng=buckshot_lazy.optionalModule("buckshot_usng")
+
+delimiterRegEx="[ .XxDdMm'Ss\"]"
+bestMatchLabelPrefix="*"
+closeMatchLabelPrefix="+"
+
+# match classes: how well a candidate matches the delimiters of the input
+#  (see gradeCandidate)
+noMatch="none"
+exactMatch="exact"
+closeMatch="close"
+partialMatch="partial"
+
+# Candidate - one possible interpretation of the input string, as a compact
+#  record; display strings are only built when asked for (text/label/short)
+#  system = "Dd", "DMm", "DMSs" or "USNG"
+#  latDeg,latMin,latSec,latFrac = digit strings of each latitude component;
+#   latMin and latSec are None if not used by the coordinate system; latFrac
+#   is the right-of-decimal part of the last component
+#  latHemisphere = "N" or "S"
+#  lonDeg,lonMin,lonSec,lonFrac,lonHemisphere = same, for longitude ("E" or "W")
+#  lat,lon = decimal degrees (south latitude and west longitude are negative)
+#  match = match class: exactMatch, closeMatch or noMatch (partial matches
+#   are only told apart on request, see matchGrades)
+#  USNG candidates (see usngCandidates) use latDeg for the grid zone
+#   designation, latMin for the 100 km square letters, and latFrac and
+#   lonFrac for the easting and northing digits
+class Candidate(namedtuple("Candidate","system latDeg latMin latSec latFrac latHemisphere lonDeg lonMin lonSec lonFrac lonHemisphere lat lon match")):
+	__slots__=()
+
+	# text - human-readable form, e.g. "39deg 12.5min N x 120deg 30.25min W"
+	def text(self):
+		if self.system=="USNG":
+			return " ".join(filter(None,[self.latDeg,self.latMin,self.latFrac,self.lonFrac]))
+		if self.system=="Dd":
+			return self.latDeg+"."+self.latFrac+"deg "+self.latHemisphere+" x "+self.lonDeg+"."+self.lonFrac+"deg "+self.lonHemisphere
+		if self.system=="DMm":
+			return self.latDeg+"deg "+self.latMin+"."+self.latFrac+"min "+self.latHemisphere+" x "+self.lonDeg+"deg "+self.lonMin+"."+self.lonFrac+"min "+self.lonHemisphere
+		return self.latDeg+"deg "+self.latMin+"min "+self.latSec+"."+self.latFrac+"sec "+self.latHemisphere+" x "+self.lonDeg+"deg "+self.lonMin+"min "+self.lonSec+"."+self.lonFrac+"sec "+self.lonHemisphere
+
+	# label - text as shown in the candidate lists, with the match prefix
+	def label(self):
+		if self.match==exactMatch:
+			return bestMatchLabelPrefix+self.text()
+		if self.match==closeMatch:
+			return closeMatchLabelPrefix+self.text()
+		return self.text()
+
+	# short - the 'short' form of the candidate, to be compared against the
+	#  canonical form of the input string, e.g. "39d12.5m 120d30.25m"
+	def short(self):
+		if self.system=="USNG":
+			return self.text().lower()
+		if self.system=="Dd":
+			return self.latDeg+"."+self.latFrac+"d "+self.lonDeg+"."+self.lonFrac+"d"
+		if self.system=="DMm":
+			return self.latDeg+"d"+self.latMin+"."+self.latFrac+"m "+self.lonDeg+"d"+self.lonMin+"."+self.lonFrac+"m"
+		return self.latDeg+"d"+self.latMin+"m"+self.latSec+"."+self.latFrac+"s "+self.lonDeg+"d"+self.lonMin+"m"+self.lonSec+"."+self.lonFrac+"s"
+
+# makeCandidate - build a Candidate from its digit-string components,
+#  calculating decimal degrees
+def makeCandidate(system,latDeg,latMin,latSec,latFrac,lonDeg,lonMin,lonSec,lonFrac,latHemisphere="N",lonHemisphere="W"):
+	if system=="Dd":
+		lat=float(latDeg+"."+latFrac)
+		lon=float(lonDeg+"."+lonFrac)
+	elif system=="DMm":
+		lat=float(latDeg)+float(latMin+"."+latFrac)/60.0
+		lon=float(lonDeg)+float(lonMin+"."+lonFrac)/60.0
+	else:
+		lat=float(latDeg)+float(latMin)/60.0+float(latSec+"."+latFrac)/3600.0
+		lon=float(lonDeg)+float(lonMin)/60.0+float(lonSec+"."+lonFrac)/3600.0
+	return Candidate(system,latDeg,latMin,latSec,latFrac,latHemisphere,lonDeg,lonMin,lonSec,lonFrac,lonHemisphere,
+		hemisphereSigns[latHemisphere]*lat,hemisphereSigns[lonHemisphere]*lon,noMatch)
+
+# CandidateSet - everything the engine knows about one input string:
+#  coordString = the raw input string
+#  shortCoordString = canonical form of the input string (see canonicalize)
+#  numbers = the digits of the input string, all delimiters removed
+#  Dd, DMm, DMSs = tuples of Candidate records for each coordinate system
+#  USNG = tuple of USNG Candidates (none, or one if the input string can be
+#   read as a USNG reference)
+CandidateSet=namedtuple("CandidateSet","coordString shortCoordString numbers Dd DMm DMSs USNG")
+
+# allCandidates - all candidates of a candidate set, in list and marker order
+def allCandidates(candidates):
+	return candidates.Dd+candidates.DMm+candidates.DMSs+candidates.USNG
+
+# canonicalize - make the 'canonical' form of the input string, that the
+#  possibilities will be compared to, to check for close or exact matches.
+#  Same as coordString, with standardized D/M/S delimiters; cannot eliminate
+#  all spaces at this point since they may or may not be important delimiters.
+def canonicalize(coordString):
+	shortCoordString=coordString.lower()
+	shortCoordString=re.sub(r'[Xx]',' ',shortCoordString) # replace X or x with space for canonical form
+	shortCoordString=re.sub(r'\s+',' ',shortCoordString) # get rid of duplicate spaces
+	shortCoordString=re.sub(r'\'','m',shortCoordString)
+	shortCoordString=re.sub(r'"','s',shortCoordString)
+	return shortCoordString
+
+# region hypotheses: the whole degrees of latitude and longitude that a
+#  reading is assumed to fall within.  The candidate search only considers
+#  lat/lon splits whose whole degrees are possible in at least one of the
+#  current region hypotheses; several hypotheses (e.g. for a mutual-aid team
+#  far from home, or for all four hemispheres) can be searched at once.
+# Region - one hypothesis:
+#  name = for display
+#  latMin,latMax = range of whole degrees latitude, 0-90
+#  latHemisphere = "N" or "S"
+#  lonMin,lonMax = range of whole degrees longitude, 0-180
+#  lonHemisphere = "E" or "W"
+#  latDegWidths,lonDegWidths = numbers of digits that the whole degrees could
+#   be written with; a width wider than a value needs means leading zeros,
+#   e.g. width 2 accepts "05" for 5 degrees
+Region=namedtuple("Region","name latMin latMax latHemisphere lonMin lonMax lonHemisphere latDegWidths lonDegWidths")
+
+hemisphereSigns={"N":1.0,"S":-1.0,"E":1.0,"W":-1.0}
+
+# naturalWidths - the digit counts of the values in a range, e.g. (2,3) for 60-120
+def naturalWidths(lo,hi):
+	return tuple(sorted(set(len(str(v)) for v in range(lo,hi+1))))
+
+# makeRegion - build and check a Region; the degree widths default to the
+#  widths of the values in each range (no leading zeros)
+def makeRegion(name,latMin,latMax,latHemisphere,lonMin,lonMax,lonHemisphere,latDegWidths=None,lonDegWidths=None):
+	latHemisphere=latHemisphere.upper()
+	lonHemisphere=lonHemisphere.upper()
+	if not 0<=latMin<=latMax<=90:
+		raise ValueError("region "+name+": latitude range must be within 0-90: "+str(latMin)+"-"+str(latMax))
+	if not 0<=lonMin<=lonMax<=180:
+		raise ValueError("region "+name+": longitude range must be within 0-180: "+str(lonMin)+"-"+str(lonMax))
+	if latHemisphere not in ("N","S"):
+		raise ValueError("region "+name+": latitude hemisphere must be N or S: "+latHemisphere)
+	if lonHemisphere not in ("E","W"):
+		raise ValueError("region "+name+": longitude hemisphere must be E or W: "+lonHemisphere)
+	latDegWidths=tuple(latDegWidths or naturalWidths(latMin,latMax))
+	lonDegWidths=tuple(lonDegWidths or naturalWidths(lonMin,lonMax))
+	for width in latDegWidths+lonDegWidths:
+		if width not in (1,2,3):
+			raise ValueError("region "+name+": degree widths must be 1, 2 or 3: "+str(width))
+	return Region(name,latMin,latMax,latHemisphere,lonMin,lonMax,lonHemisphere,latDegWidths,lonDegWidths)
+
+# regionPresets - named lists of region hypotheses
+#  default = the original buckshot assumption, latitude 20-49 north and
+#   longitude 100-129 west
+regionPresets={
+	"default":[makeRegion("default",20,49,"N",100,129,"W")],
+	"conus":[makeRegion("conus",24,49,"N",66,125,"W")],
+	"alaska":[makeRegion("alaska",51,71,"N",129,179,"W")],
+	"hawaii":[makeRegion("hawaii",18,22,"N",154,160,"W")],
+	"world":[makeRegion("world-"+h1+h2,0,90,h1,0,180,h2) for h1 in "NS" for h2 in "WE"]}
+
+# wideRegionArea - regions that together cover more than this many square
+#  degrees of whole-degree hypotheses make the search slow: the world preset
+#  (4 x 91 x 181) gives about 1500 candidates per string and about 400
+#  strings/s, against about 15 candidates and 30000 strings/s for the
+#  default region
+wideRegionArea=20000
+
+# regionArea - the square degrees of whole-degree hypotheses in a list of
+#  regions
+def regionArea(regionList):
+	return sum((r.latMax-r.latMin+1)*(r.lonMax-r.lonMin+1) for r in regionList)
+
+# parseRegion - a Region from a spec string:
+#  LATMIN-LATMAX{N|S}[:WIDTHS],LONMIN-LONMAX{E|W}[:WIDTHS]
+#  e.g. "20-49N,100-129W" or "0-15S:12,60-80W" (WIDTHS = allowed digit
+#  counts of the whole degrees, e.g. 12 = one or two digits)
+regionSpecRegEx=re.compile(r'^\s*(\d+)-(\d+)([NnSs])(?::([123]+))?\s*,\s*(\d+)-(\d+)([EeWw])(?::([123]+))?\s*$')
+
+def parseRegion(spec):
+	m=regionSpecRegEx.match(spec)
+	if not m:
+		raise ValueError("invalid region '"+spec+"'; expected e.g. 20-49N,100-129W")
+	(latMin,latMax,latHemisphere,latWidths,lonMin,lonMax,lonHemisphere,lonWidths)=m.groups()
+	return makeRegion(spec.strip(),int(latMin),int(latMax),latHemisphere,int(lonMin),int(lonMax),lonHemisphere,
+		latWidths and [int(c) for c in latWidths],lonWidths and [int(c) for c in lonWidths])
+
+# lookupRegions - the list of regions for a preset name or a region spec
+def lookupRegions(nameOrSpec):
+	if nameOrSpec.lower() in regionPresets:
+		return list(regionPresets[nameOrSpec.lower()])
+	return [parseRegion(nameOrSpec)]
+
+# RegionPlan - a Region compiled for the search: for each allowed width, the
+#  set of possible whole-degree digit strings (and, for longitude, the set of
+#  possible first digits, to skip most positions without slicing)
+RegionPlan=namedtuple("RegionPlan","region latHemisphere lonHemisphere hemispheres latSign lonSign latDegs lonDegs")
+
+# degreeStrings - all digit strings of a given width for whole degrees lo-hi
+def degreeStrings(lo,hi,width):
+	return frozenset("%0*d" % (width,v) for v in range(lo,hi+1) if len(str(v))<=width)
+
+def makeRegionPlan(region):
+	latDegs=[]
+	for width in region.latDegWidths:
+		degs=degreeStrings(region.latMin,region.latMax,width)
+		if degs:
+			latDegs.append((width,degs))
+	lonDegs=[]
+	for width in region.lonDegWidths:
+		degs=degreeStrings(region.lonMin,region.lonMax,width)
+		if degs:
+			lonDegs.append((width,degs,frozenset(d[0] for d in degs)))
+	return RegionPlan(region,region.latHemisphere,region.lonHemisphere,region.latHemisphere+region.lonHemisphere,
+		hemisphereSigns[region.latHemisphere],hemisphereSigns[region.lonHemisphere],tuple(latDegs),tuple(lonDegs))
+
+regions=regionPresets["default"]
+regionPlans=[makeRegionPlan(region) for region in regions]
+
+# setRegions - change the region hypotheses used by the candidate search;
+#  takes a list of Regions (e.g. from lookupRegions); this also empties the
+#  candidate cache, whose entries depend on the regions
+def setRegions(regionList):
+	global regions,regionPlans
+	if not regionList:
+		raise ValueError("at least one region is needed")
+	regions=list(regionList)
+	regionPlans=[makeRegionPlan(region) for region in regions]
+	cacheClear()
+
+# split plans: the digits following the whole degrees of one side (latitude
+#  or longitude) can be split into whole minutes, whole seconds and
+#  right-of-decimal digits in only a few ways, which depend only on how many
+#  digits there are; so, list every valid slice layout once per length, and
+#  candidate generation becomes a loop over slice indices.
+#  (for a digit string of length n with two-digit latitude whole degrees and
+#   three-digit longitude whole degrees starting at index i, the latitude side
+#   has i-2 digits and the longitude side has n-i-3 digits)
+# minute layouts: whole minutes = rest[:minEnd], right-of-decimal = rest[minEnd:]
+# second layouts: whole minutes = rest[:minEnd], whole seconds = rest[minEnd:secEnd],
+#  right-of-decimal = rest[secEnd:]; minEnd==secEnd means implied zero seconds
+# whole minutes and whole seconds could be one digit or two digits; a
+#  two-digit value must also be realizable (see validMinutes, validSeconds)
+SplitPlan=namedtuple("SplitPlan","minutes seconds")
+
+def makeSplitPlan(restLength):
+	minutes=[]
+	seconds=[]
+	if restLength>=1:
+		minutes.append(1)
+	if restLength>=2:
+		minutes.append(2)
+		seconds.append((1,2))
+	if restLength>=3:
+		seconds.append((1,3))
+		seconds.append((2,3))
+	elif restLength==2:
+		seconds.append((2,2)) # account for implied zero seconds
+	if restLength>=4:
+		seconds.append((2,4))
+	return SplitPlan(tuple(minutes),tuple(seconds))
+
+# the layouts stop changing at 4 digits, so the table only needs to cover
+#  the lengths where they differ; longer rests use the last entry
+splitPlans=[makeSplitPlan(n) for n in range(5)]
+
+# two-digit whole minutes must be 10-59 (a leading zero would be a one-digit
+#  minute); two-digit whole seconds must be 00-59
+validMinutes=frozenset("%02d" % n for n in range(10,60))
+validSeconds=frozenset("%02d" % n for n in range(60))
+
+# sideChoices - apply the split plan to the rest of the string following the
+#  whole degrees of one side; the minute and second terms of the decimal
+#  degrees are calculated here once per side, rather than once per lat/lon pair
+# returns a tuple: (rest,minutes,seconds) where
+#  rest = all digits after the whole degrees, for Dd
+#  minutes = list of possible (whole minutes,right-of-decimal,minute term) triples
+#  seconds = list of possible (whole minutes,whole seconds,right-of-decimal,
+#   minute term,second term) tuples; the whole minutes are not themselves
+#   checked, same as always
+def sideChoices(rest):
+	plan=splitPlans[min(len(rest),4)]
+	minutes=[]
+	for minEnd in plan.minutes:
+		if minEnd==1 or rest[:2] in validMinutes:
+			frac=rest[minEnd:] or "0"
+			minutes.append((rest[:minEnd],frac,float(rest[:minEnd]+"."+frac)/60.0))
+	seconds=[]
+	for (minEnd,secEnd) in plan.seconds:
+		sec=rest[minEnd:secEnd] or "0"
+		if secEnd-minEnd<2 or sec in validSeconds:
+			frac=rest[secEnd:] or "0"
+			seconds.append((rest[:minEnd],sec,frac,float(rest[:minEnd])/60.0,float(sec+"."+frac)/3600.0))
+	return (rest or "0",minutes,seconds)
+
+# addCandidates - build the possible candidates for one lat/lon split and
+#  append them to the lists for each coordinate system
+#  (if only one of lat/lon per pair is possible, then the pair is
+#   not possible); same decimal degrees as makeCandidate
+def addCandidates(plan,latDeg,lat,lonDeg,lon,DdList,DMmList,DMSsList):
+	(latRest,latMinutes,latSeconds)=lat
+	(lonRest,lonMinutes,lonSeconds)=lon
+	(latHemisphere,lonHemisphere,latSign,lonSign)=(plan.latHemisphere,plan.lonHemisphere,plan.latSign,plan.lonSign)
+	latDegValue=float(latDeg)
+	lonDegValue=float(lonDeg)
+	DdList.append(Candidate("Dd",latDeg,None,None,latRest,latHemisphere,lonDeg,None,None,lonRest,lonHemisphere,
+		latSign*float(latDeg+"."+latRest),lonSign*float(lonDeg+"."+lonRest),noMatch))
+	for (latMin,latFrac,latMinTerm) in latMinutes:
+		for (lonMin,lonFrac,lonMinTerm) in lonMinutes:
+			DMmList.append(Candidate("DMm",latDeg,latMin,None,latFrac,latHemisphere,lonDeg,lonMin,None,lonFrac,lonHemisphere,
+				latSign*(latDegValue+latMinTerm),lonSign*(lonDegValue+lonMinTerm),noMatch))
+	for (latMin,latSec,latFrac,latMinTerm,latSecTerm) in latSeconds:
+		for (lonMin,lonSec,lonFrac,lonMinTerm,lonSecTerm) in lonSeconds:
+			DMSsList.append(Candidate("DMSs",latDeg,latMin,latSec,latFrac,latHemisphere,lonDeg,lonMin,lonSec,lonFrac,lonHemisphere,
+				latSign*(latDegValue+latMinTerm+latSecTerm),lonSign*(lonDegValue+lonMinTerm+lonSecTerm),noMatch))
+
+# calcLatLon - make guesses about actual coordinates based on a string of numbers
+
+# assumptions:
+#  - the whole degrees of latitude are at the start of the string, and the
+#   whole degrees of longitude follow somewhere after them; which values (and
+#   how many digits) are possible for each is set by the region hypotheses
+#   (see setRegions); by default, latitude is a two-digit number 20-49 north
+#   and longitude is a three-digit number 100-129 west
+#  - space or minus sign is a known delimiter and assumed to be correct
+
+# the search is pruned from the outside in: a region hypothesis (or degree
+#  width) whose latitude whole degrees don't match the start of the string is
+#  dropped before any longitude position is looked at, and a longitude
+#  position is only sliced and looked up if its first digit can start a
+#  longitude whole number of that width; the minute/second choices for each
+#  side are worked out once per distinct rest of string, since neighboring
+#  hypotheses often share them
+
+# returns a tuple of three lists of Candidate records: (Dd,DMm,DMSs)
+def calcLatLon(numbers):
+	DdList=[]
+	DMmList=[]
+	DMSsList=[]
+	sides={}
+	# only overlapping hypotheses can find the same split twice
+	seen=set() if len(regionPlans)>1 else None
+	n=len(numbers)
+	for plan in regionPlans:
+		for (latWidth,latDegs) in plan.latDegs:
+			latDeg=numbers[:latWidth]
+			if latDeg not in latDegs:
+				continue
+			for (lonWidth,lonDegs,lonFirstDigits) in plan.lonDegs:
+				for lonDegIndex in range(latWidth,n-lonWidth+1):
+					if numbers[lonDegIndex] not in lonFirstDigits:
+						continue
+					lonEnd=lonDegIndex+lonWidth
+					lonDeg=numbers[lonDegIndex:lonEnd]
+					if lonDeg not in lonDegs:
+						continue
+					if seen is not None:
+						key=(plan.hemispheres,latWidth,lonDegIndex,lonWidth)
+						if key in seen:
+							continue
+						seen.add(key)
+					latRest=numbers[latWidth:lonDegIndex]
+					lat=sides.get(latRest)
+					if lat is None:
+						lat=sides[latRest]=sideChoices(latRest)
+					lonRest=numbers[lonEnd:]
+					lon=sides.get(lonRest)
+					if lon is None:
+						lon=sides[lonRest]=sideChoices(lonRest)
+					addCandidates(plan,latDeg,lat,lonDeg,lon,DdList,DMmList,DMSsList)
+	return (DdList,DMmList,DMSsList)
+
+# match grading: how well the delimiters that were typed agree with each
+#  candidate's layout.  The input's delimiters are extracted once, as
+#  (digit position,delimiter text) pairs - "39d15.000m 120d30.000m" has
+#  (2,"d"),(4,"."),(7,"m "),(10,"d"),(12,"."),(15,"m") - and each candidate's
+#  layout is the same kind of list of the boundaries between its components,
+#  each with the delimiter that its short form puts there (see
+#  sideBoundaries); one merge pass over the two lists grades the candidate:
+#  - exact: the typed delimiters are exactly the candidate's (the same as
+#    the canonical input string being equal to the candidate's short form)
+#  - close: every typed delimiter falls on a boundary and agrees with it,
+#    and every boundary has a typed delimiter (except the unit at the very
+#    end, which is often left off); a d/m/s/. must be that very delimiter,
+#    while anything else (a space, or a hemisphere letter) may stand for any
+#    boundary except a decimal point
+#  - partial: some typed delimiters agree, but some don't, or some
+#    boundaries fall inside a run of digits that was typed without one
+#  - none: none agree (including no delimiters at all)
+#  Delimiters before the first digit are ignored.
+
+# delimiterLayout - the (digit position,delimiter text) pairs of a canonical
+#  input string
+def delimiterLayout(shortCoordString):
+	layout=[]
+	pos=0
+	token=""
+	for ch in shortCoordString:
+		if "0"<=ch<="9":
+			if token:
+				layout.append((pos,token))
+				token=""
+			pos+=1
+		else:
+			token+=ch
+	if token:
+		layout.append((pos,token))
+	return layout
+
+# systemUnits - the delimiter after the last component of each system
+systemUnits={"Dd":"d","DMm":"m","DMSs":"s"}
+
+# candidateBoundaries - the (digit position,delimiter) boundaries between
+#  the components of a candidate, in the order of its short form; positions
+#  are in digits of numbers, so a filled-in fraction takes no digits (a side
+#  with no right-of-decimal digits gets a "0"; if only one side did, it is
+#  the latitude if the longitude starts right after its body)
+# returns a tuple: (boundaries,whether all right-of-decimal digits were typed)
+def candidateBoundaries(c,numbers):
+	system=c.system
+	latDeg=len(c.latDeg)
+	lonDeg=len(c.lonDeg)
+	latFrac=len(c.latFrac)
+	lonFrac=len(c.lonFrac)
+	if system=="Dd":
+		(latMin,latSec,lonMin,lonSec)=(0,0,0,0)
+	else:
+		latMin=len(c.latMin)
+		lonMin=len(c.lonMin)
+		if system=="DMm":
+			(latSec,lonSec)=(0,0)
+		else:
+			latSec=len(c.latSec)
+			lonSec=len(c.lonSec)
+	latBody=latDeg+latMin+latSec
+	extra=latBody+latFrac+lonDeg+lonMin+lonSec+lonFrac-len(numbers)
+	complete=not extra
+	if extra==2 or (extra==1 and c.latFrac=="0" and numbers[latBody:latBody+lonDeg]==c.lonDeg):
+		latFrac=0
+		extra-=1
+	if extra==1:
+		lonFrac=0
+	latEnd=latBody+latFrac
+	lonBody=latEnd+lonDeg+lonMin+lonSec
+	if system=="Dd":
+		return (((latDeg,"."),(latEnd,"d "),(latEnd+lonDeg,"."),(lonBody+lonFrac,"d")),complete)
+	if system=="DMm":
+		return (((latDeg,"d"),(latBody,"."),(latEnd,"m "),
+			(latEnd+lonDeg,"d"),(lonBody,"."),(lonBody+lonFrac,"m")),complete)
+	return (((latDeg,"d"),(latDeg+latMin,"m"),(latBody,"."),(latEnd,"s "),
+		(latEnd+lonDeg,"d"),(latEnd+lonDeg+lonMin,"m"),(lonBody,"."),(lonBody+lonFrac,"s")),complete)
+
+specificDelimiters=".dms"
+
+# agrees - whether typed delimiter text agrees with a boundary's delimiter
+def agrees(token,boundary):
+	if boundary=="." and "." not in token:
+		return False
+	for ch in token:
+		if ch in specificDelimiters and ch not in boundary:
+			return False
+	return True
+
+# boundaryTexts - every delimiter a boundary can have
+boundaryTexts=[".","d","m","d ","m ","s ","s"]
+
+# agreeingBoundaries - the boundary delimiters that typed delimiter text
+#  agrees with; the same few delimiters are typed over and over
+@lru_cache(maxsize=256)
+def agreeingBoundaries(token):
+	return frozenset(b for b in boundaryTexts if agrees(token,b))
+
+# layoutTokens - {digit position:(delimiter text,boundary delimiters it
+#  agrees with)} for the typed delimiters of a layout, worked out once per
+#  input string; delimiters before the first digit are left out
+def layoutTokens(layout):
+	return {pos:(token,agreeingBoundaries(token)) for (pos,token) in layout if pos>0}
+
+# gradeCandidate - (match class,score) of a candidate against the typed
+#  delimiters (see layoutTokens; exactPossible is false if any were left
+#  out); score = agreeing delimiters, less disagreeing delimiters and
+#  missed boundaries, to order candidates within a match class
+def gradeCandidate(c,tokens,exactPossible,numbers):
+	(boundaries,complete)=candidateBoundaries(c,numbers)
+	exact=exactPossible and complete and len(tokens)==len(boundaries)
+	end=len(numbers)
+	agreed=0
+	missed=0
+	lastPos=-1
+	lastAgreed=False
+	for (pos,text) in boundaries:
+		entry=tokens.get(pos)
+		if entry is None:
+			# no delimiter typed here
+			if pos!=end and pos!=lastPos:
+				missed+=1
+			exact=False
+		else:
+			if pos!=lastPos:
+				lastAgreed=False
+			if not lastAgreed and text in entry[1]:
+				lastAgreed=True
+				agreed+=1
+			if text!=entry[0]:
+				exact=False
+		lastPos=pos
+	if exact:
+		return (exactMatch,agreed)
+	if not agreed:
+		return (noMatch,0)
+	disagreed=len(tokens)-agreed
+	if not disagreed and not missed:
+		return (closeMatch,agreed)
+	return (partialMatch,agreed-disagreed-missed)
+
+# matchPossible - whether a candidate could be an exact or close match at
+#  all: the boundaries after its whole degrees, minutes and seconds are
+#  found from the lengths alone, and each must have a typed delimiter (see
+#  candidateBoundaries and gradeCandidate); most candidates of a delimited
+#  reading fail this, and are not graded any further
+#  tokens = the typed delimiters, by digit position (see layoutTokens)
+def matchPossible(c,tokens,end):
+	pos=len(c.latDeg)
+	if pos not in tokens and pos!=end:
+		return False
+	if c.system=="Dd":
+		return True
+	pos+=len(c.latMin)
+	if pos not in tokens and pos!=end:
+		return False
+	if c.system=="DMm":
+		return True
+	pos+=len(c.latSec)
+	return pos in tokens or pos==end
+
+# markMatches - set the match class of the exact and close matches; the
+#  candidates stay in calcLatLon order, which is also the order of the
+#  marker indices (X_DMm1, X_DMm2, ...) that users and saved GPX files go by
+def markMatches(candidateList,tokens,exactPossible,numbers):
+	if not tokens:
+		return tuple(candidateList)
+	marked=[]
+	end=len(numbers)
+	# (_make on a sliced tuple is several times quicker than _replace)
+	make=Candidate._make
+	for c in candidateList:
+		if matchPossible(c,tokens,end):
+			match=gradeCandidate(c,tokens,exactPossible,numbers)[0]
+			if match==exactMatch or match==closeMatch:
+				c=make(c[:-1]+(match,))
+		marked.append(c)
+	return tuple(marked)
+
+# markCandidates - the marked candidate lists for one canonical input string
+#  and its digits; the input layout is extracted once for all of them
+# returns a tuple: (numbers,Dd,DMm,DMSs)
+def markCandidates(shortCoordString,numbers,Dd,DMm,DMSs):
+	layout=delimiterLayout(shortCoordString)
+	tokens=layoutTokens(layout)
+	exactPossible=len(tokens)==len(layout)
+	return (
+		numbers,
+		markMatches(Dd,tokens,exactPossible,numbers),
+		markMatches(DMm,tokens,exactPossible,numbers),
+		markMatches(DMSs,tokens,exactPossible,numbers))
+
+# matchGrades - the full gradeCandidate (match class,score) of each candidate
+#  of a candidate set, partial matches included, in allCandidates order
+#  (USNG candidates, which are not graded, keep their match class and get a
+#  score of None); the candidate records only carry the exact and close
+#  matches, so this grades again, for callers that report the grades
+#  themselves
+def matchGrades(candidates):
+	layout=delimiterLayout(candidates.shortCoordString)
+	tokens=layoutTokens(layout)
+	exactPossible=len(tokens)==len(layout)
+	return [(c.match,None) if c.system=="USNG" else gradeCandidate(c,tokens,exactPossible,candidates.numbers)
+		for c in allCandidates(candidates)]
+
+# calcCandidates - the marked candidate lists for one canonical input string;
+#  everything except the raw input string itself is determined by the
+#  canonical form, so this is what gets memoized
+# returns a tuple: (numbers,Dd,DMm,DMSs)
+def calcCandidates(shortCoordString):
+	t=buckshot_timing.start()
+	numbers=re.sub(r'\D','',shortCoordString)
+	(Dd,DMm,DMSs)=calcLatLon(numbers)
+	t=buckshot_timing.lap("enumerate",t)
+	value=markCandidates(shortCoordString,numbers,Dd,DMm,DMSs)
+	buckshot_timing.record("score",t)
+	return value
+
+CacheInfo=namedtuple("CacheInfo","hits misses maxsize currsize")
+
+# CandidateCache - bounded LRU cache of candidate sets, keyed on the canonical
+#  input string, so that repeated or reverted inputs (e.g. toggling between
+#  the same few readings, or backspacing) are answered without re-enumerating
+class CandidateCache(object):
+	def __init__(self,maxsize):
+		self.maxsize=maxsize
+		self.data=OrderedDict()
+		self.hits=0
+		self.misses=0
+
+	# get - the cached value for key, or None on a miss
+	def get(self,key):
+		value=self.data.get(key)
+		if value is None:
+			self.misses+=1
+		else:
+			self.hits+=1
+			self.data.move_to_end(key)
+		return value
+
+	def put(self,key,value):
+		if self.maxsize<=0:
+			return
+		self.data[key]=value
+		self.data.move_to_end(key)
+		if len(self.data)>self.maxsize:
+			self.data.popitem(last=False)
+
+	def info(self):
+		return CacheInfo(self.hits,self.misses,self.maxsize,len(self.data))
+
+	def clear(self):
+		self.data.clear()
+		self.hits=0
+		self.misses=0
+
+cacheSize=512
+candidateCache=CandidateCache(cacheSize)
+
+# setCacheSize - change the maximum number of cached candidate sets; this
+#  also empties the cache and resets its statistics; 0 disables caching
+def setCacheSize(size):
+	global cacheSize,candidateCache
+	cacheSize=size
+	candidateCache=CandidateCache(size)
+
+# cacheInfo - hit/miss statistics of the candidate cache, as a named tuple
+#  (hits,misses,maxsize,currsize)
+def cacheInfo():
+	return candidateCache.info()
+
+def cacheClear():
+	candidateCache.clear()
+
+# USNG hypothesis: a typed USNG/MGRS reference (e.g. "10S GJ 06832 11123")
+#  is read as one; with a default grid zone set, e.g. for the incident,
+#  references that leave the zone out ("GJ 0683 1112") are too.  A bare run
+#  of digits ("0683 1112") is far more often part of a lat/lon reading, so
+#  it is only read in the default square when asked for (bareDigits), and
+#  only with at least usngMinBareDigits digits.  The letters matter here, so
+#  this works on the raw input string rather than the canonical form, and is
+#  cheap enough not to be cached.
+#  usngDefault = (grid zone designation,square,bareDigits), (None,None,False)
+#   by default; see buckshot_usng.parseSquare
+usngDefault=(None,None,False)
+usngMinBareDigits=4
+
+def setUSNGDefault(gzd,square=None,bareDigits=False):
+	global usngDefault
+	usngDefault=(gzd,square,bareDigits)
+
+# usngCandidates - the USNG candidates (a tuple of none or one) for a raw
+#  input string; a reference with its grid zone and square typed out is an
+#  exact match
+def usngCandidates(coordString):
+	(gzd,square,bareDigits)=usngDefault
+	# (parseUSNG only takes letters as a zone or square)
+	letters=any(ch.isalpha() for ch in coordString)
+	if not letters and not bareDigits:
+		return ()
+	ref=buckshot_usng.parseUSNG(coordString,gzd,square)
+	if ref is None:
+		return ()
+	if not letters and len(ref.easting)*2<usngMinBareDigits:
+		return ()
+	latLon=buckshot_usng.referenceLatLon(ref)
+	if latLon is None:
+		return ()
+	(lat,lon)=latLon
+	typed=buckshot_usng.parseUSNG(coordString)
+	return (Candidate("USNG",ref.gzd,ref.square,None,ref.easting,"N" if lat>=0 else "S",None,None,None,ref.northing,"E" if lon>=0 else "W",
+		lat,lon,exactMatch if typed is not None and typed.easting else noMatch),)
+
+# generate - the full candidate set for one raw coordinate string
+def generate(coordString,useCache=True):
+	t=buckshot_timing.start()
+	shortCoordString=canonicalize(coordString)
+	buckshot_timing.record("canonicalize",t)
+	value=None
+	if useCache:
+		value=candidateCache.get(shortCoordString)
+	if value is None:
+		value=calcCandidates(shortCoordString)
+		if useCache:
+			candidateCache.put(shortCoordString,value)
+	(numbers,Dd,DMm,DMSs)=value
+	return CandidateSet(coordString,shortCoordString,numbers,Dd,DMm,DMSs,usngCandidates(coordString))
+
+# generate_many - batch entry point: takes an iterable of raw coordinate
+#  strings and yields one CandidateSet per string, in order
+def generate_many(coordStrings,useCache=True):
+	for coordString in coordStrings:
+		yield generate(coordString,useCache)
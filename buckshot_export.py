@@ -0,0 +1,217 @@
+# #############################################################################
+#
+#  buckshot_export.py - marker construction and export rules for buckshot
+#
+#   developed for Nevada County Sheriff's Search and Rescue
+#
+#  Turns a buckshot_engine candidate set into a list of markers (name,
+#   lat/lon, SARTopo color and symbol), and holds the description and Locus
+#   Map icon rules used when the markers are exported.  No Qt dependency, so
+#   the GUI (buckshot.py) and the headless modes (buckshot_cli.py) build
+#   exactly the same markers.
+#
+# #############################################################################
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  See included file LICENSE.txt for full license terms, also
+#  available at http://opensource.org/licenses/gpl-3.0.html
+#
+# ############################################################################
+
+from collections import namedtuple
+
+import buckshot_engine
+import buckshot_usng
+from buckshot_engine import bestMatchLabelPrefix,closeMatchLabelPrefix
+
+# for best match, use a ring with center dot
+# for close match, use a hollow ring
+# appropriate prefixes were determined from decoding json POST request
+#  of a live header when creating each type of marker by hand
+# final URL values:
+#  simple dot: "#<hex_color>"
+#  target: "c:target,<hex_color>" (notice, no pound sign)
+#  ring: "c:ring,<hex_color>" (notice, no pound sign)
+bestMatchSymbol="c:target"
+closeMatchSymbol="c:ring"
+defaultSymbol="point"
+
+# SARTopo marker color for each coordinate system
+systemColors={"Dd":"FF0000","DMm":"FF00FF","DMSs":"0000FF","USNG":"00A000"}
+
+# Marker - one marker to export: the fields of the original marker lists
+#  ([title,lat,lon,color,symbol]) plus the description text
+Marker=namedtuple("Marker","title lat lon color symbol description")
+
+# makeMarkers - build the list of markers for a candidate set
+#  markerName = base marker name; blank means "X"
+#  bestMatch = the candidate (if any) to be exported as the best match
+#  area = optional buckshot_area.IncidentArea; if given, each description
+#   also says whether the marker is inside the incident area (and if not,
+#   how far outside)
+#  terrain = optional buckshot_terrain.Terrain; if given, each description
+#   also gives the elevation and whether the marker is in water
+#  terrainSamples = optional {(lat,lon): TerrainSample} already sampled for
+#   these candidates (see buckshot_terrain.Terrain.sampleCandidates)
+#  gridRefs = optional {(lat,lon): UTM} already projected for these
+#   candidates (see buckshot_usng.candidateUTM); each description gives the
+#   USNG reference of the marker
+# each marker title is the marker name followed by the coordinate system and,
+#  if there is more than one candidate in that system, a 1-based index; best
+#  and close matches get the corresponding label prefix
+def makeMarkers(candidates,markerName,bestMatch=None,area=None,terrain=None,terrainSamples=None,gridRefs=None):
+	if markerName=="":
+		markerName="X"
+	if gridRefs is None:
+		gridRefs=buckshot_usng.candidateUTM(buckshot_engine.allCandidates(candidates))
+	if terrain is not None and terrainSamples is None:
+		terrainSamples=terrain.sampleCandidates(buckshot_engine.allCandidates(candidates))
+	markerList=[]
+	for (system,candidateList) in [
+			("Dd",candidates.Dd),
+			("DMm",candidates.DMm),
+			("DMSs",candidates.DMSs),
+			("USNG",candidates.USNG)]:
+		idxFlag=len(candidateList)>1
+		for n,candidate in enumerate(candidateList):
+			labelPrefix=""
+			symbol=defaultSymbol
+			if bestMatch is not None and candidate==bestMatch:
+				labelPrefix=bestMatchLabelPrefix
+				symbol=bestMatchSymbol
+			elif candidate.match==buckshot_engine.closeMatch:
+				labelPrefix=closeMatchLabelPrefix
+				symbol=closeMatchSymbol
+			if idxFlag:
+				idx=str(n+1)
+			else:
+				idx=""
+			title=labelPrefix+markerName+"_"+system+idx
+			description=markerDescription(title)
+			usng=buckshot_usng.usngText(gridRefs[(candidate.lat,candidate.lon)])
+			if usng:
+				description=" - ".join(filter(None,[description,"USNG "+usng]))
+			if area is not None:
+				description=" - ".join(filter(None,[description,area.describe(candidate.lat,candidate.lon)]))
+			if terrain is not None:
+				description=" - ".join(filter(None,[description,terrain.describe(terrainSamples[(candidate.lat,candidate.lon)])]))
+			markerList.append(Marker(title,candidate.lat,candidate.lon,systemColors[system],symbol,description))
+	return markerList
+
+# markerDescription - marker description text, from the marker title
+def markerDescription(title):
+	description=""
+	if title.startswith(bestMatchLabelPrefix):
+		description="User-selected best match!"
+	if title.startswith(closeMatchLabelPrefix):
+		description="CLOSE match for specified coordinates"
+	return description
+
+# locusSymbol - Locus Map icon for the GPX <sym> tag, parsed from marker title
+#  some relevant Locus markers:
+#   z-ico01 = red down arrow
+#   z-ico02 = red x
+#   z-ico03 = red donut
+#   z-ico04 = red dot
+#   z-ico05 = red down triangle
+#   same sequence as above: 06-10 = cyan; 11-15=green; 16-20=yellow
+#   misc-sunny = large green star bubble
+def locusSymbol(title):
+	best=title.startswith(bestMatchLabelPrefix)
+	if "_Dd" in title: # red
+		return "z-ico01" if best else "z-ico04"
+	elif "_DMm" in title: # cyan
+		return "z-ico06" if best else "z-ico09"
+	elif "_DMSs" in title: # yellow
+		return "z-ico16" if best else "z-ico19"
+	return "z-ico11" if best else "z-ico14" # green (also USNG)
+
+# GPX output: GpxWriter writes the same document that writeGPX used to build
+#  with xml.dom.minidom and toprettyxml(), byte for byte, but one <wpt> at a
+#  time as markers are produced, so memory use does not grow with the number
+#  of waypoints
+gpxHeader='<?xml version="1.0" ?>\n'
+gpxOpenTag='<gpx creator="BUCKSHOT" version="1.1" xmlns="http://www.topografix.com/GPX/1/1"'
+
+# xmlEscape - same escaping that minidom applies to text and attribute values
+def xmlEscape(data):
+	return data.replace("&","&amp;").replace("<","&lt;").replace("\"","&quot;").replace(">","&gt;")
+
+# cdata - CDATA section, as minidom would write it
+def cdata(data):
+	if "]]>" in data:
+		raise ValueError("']]>' not allowed in a CDATA section")
+	return "<![CDATA["+data+"]]>"
+
+# gpxWpt - the <wpt> element for one marker, including indentation and
+#  trailing newline
+# <desc> CDATA contains SARSoft marker and color
+# <sym> CDATA contains Locus marker, parsed from marker name
+def gpxWpt(marker):
+	(title,lat,lon,color,symbol,description)=marker
+	return (
+		'\t<wpt lat="'+xmlEscape(str(lat))+'" lon="'+xmlEscape(str(lon))+'">\n'
+		'\t\t<name>'+xmlEscape(title)+'</name>\n'
+		'\t\t<desc>'+cdata(description)+'</desc>\n'
+		'\t\t<sym>'+cdata(locusSymbol(title))+'</sym>\n'
+		'\t</wpt>\n')
+
+# GpxWriter - incremental GPX writer over an open text file
+#  write(marker) writes one waypoint; writeRaw(text,n) writes n waypoints
+#  already formatted by gpxWpt (e.g. by a worker process); close() finishes
+#  the document (but does not close the file).  Also usable as a context
+#  manager.
+class GpxWriter(object):
+	def __init__(self,f):
+		self.f=f
+		self.count=0
+		self.started=False
+		self.closed=False
+
+	def writeRaw(self,text,n):
+		if n==0:
+			return
+		if not self.started:
+			self.f.write(gpxHeader+gpxOpenTag+">\n")
+			self.started=True
+		self.f.write(text)
+		self.count+=n
+
+	def write(self,marker):
+		self.writeRaw(gpxWpt(marker),1)
+
+	def writeAll(self,markers):
+		for marker in markers:
+			self.write(marker)
+
+	def close(self):
+		if self.closed:
+			return
+		self.closed=True
+		if not self.started:
+			self.f.write(gpxHeader+gpxOpenTag+"/>\n")
+		else:
+			self.f.write("</gpx>\n")
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self,*args):
+		self.close()
+
+# writeGPXFile - write an iterable of markers (e.g. a generator) to a GPX file
+#  with buffered I/O; returns the number of waypoints written
+def writeGPXFile(filename,markers):
+	with open(filename,"w",encoding="utf-8",buffering=1<<16) as f:
+		with GpxWriter(f) as writer:
+			writer.writeAll(markers)
+	return writer.count
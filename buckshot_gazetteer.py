@@ -0,0 +1,261 @@
+# #############################################################################
+#
+#  buckshot_gazetteer.py - offline place-name index for landmark proximity
+#
+#   developed for Nevada County Sheriff's Search and Rescue
+#
+#  Reports often come with a landmark ("on the side of Prosser Mountain");
+#   given a local place-name file, the operator can type the landmark and
+#   get the candidates ranked by distance to it, and each candidate can be
+#   described by the nearest named place.  Works offline, from a GNIS-style
+#   file: one record per line, fields separated by '|' (or tab), with a
+#   header row naming the columns; both the USGS GNIS NationalFile layout
+#   (FEATURE_NAME, FEATURE_CLASS, STATE_ALPHA, COUNTY_NAME, PRIM_LAT_DEC,
+#   PRIM_LONG_DEC) and the newer DomesticNames layout (feature_name, ...,
+#   state_name, ...) work, as does a minimal name|lat|lon file.
+#
+#  The file is memory-mapped and only indexed at load time; records are
+#   parsed from the mapping when they are needed (a handful per keystroke),
+#   so the national file does not have to fit in memory as Python objects.
+#   Indexes:
+#   - names: a sorted list of keys, one for each word of each name onwards
+#     ("prosser creek reservoir", "creek reservoir", "reservoir"), so that a
+#     prefix search (two bisections) finds names by their first letters or
+#     by any later word; this answers the same queries as a prefix trie,
+#     with far fewer Python objects
+#   - locations: a grid of 0.1 degree cells, each listing its features, for
+#     nearest-place lookups
+#
+# #############################################################################
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  See included file LICENSE.txt for full license terms, also
+#  available at http://opensource.org/licenses/gpl-3.0.html
+#
+# ############################################################################
+
+import math
+import mmap
+import re
+from array import array
+from bisect import bisect_left
+from collections import namedtuple
+
+earthRadius=6371008.8 # meters (mean radius)
+
+# Feature - one named place
+#  featureClass = GNIS feature class, e.g. "Summit", "Lake" ("" if unknown)
+#  state, county = "" if not in the file
+Feature=namedtuple("Feature","name featureClass state county lat lon")
+
+# header names (lowercase) accepted for each column, in order of preference
+columnNames={
+	"name":["feature_name","name"],
+	"featureClass":["feature_class","class"],
+	"state":["state_alpha","state_name","state"],
+	"county":["county_name","county"],
+	"lat":["prim_lat_dec","latitude","lat"],
+	"lon":["prim_long_dec","longitude","long","lon"]}
+
+gridCellsPerDegree=10
+
+nonAlphanumeric=re.compile(r"[\W_]+")
+
+# normalize - lowercase words of a name, e.g. "Prosser Hill (historical)"
+#  -> ["prosser","hill","historical"]
+def normalize(text):
+	return nonAlphanumeric.sub(" ",text.lower()).split()
+
+# distance - great-circle distance in meters (haversine)
+def distance(lat1,lon1,lat2,lon2):
+	p1=math.radians(lat1)
+	p2=math.radians(lat2)
+	a=math.sin((p2-p1)/2)**2+math.cos(p1)*math.cos(p2)*math.sin(math.radians(lon2-lon1)/2)**2
+	return 2*earthRadius*math.asin(min(1.0,math.sqrt(a)))
+
+# featureLabel - e.g. "Prosser Hill (Summit), Nevada CA"
+def featureLabel(feature):
+	label=feature.name
+	if feature.featureClass:
+		label+=" ("+feature.featureClass+")"
+	place=" ".join(filter(None,[feature.county,feature.state]))
+	if place:
+		label+=", "+place
+	return label
+
+class Gazetteer(object):
+	# states = optional list of state codes/names to keep (e.g. ["CA","NV"]),
+	#  to keep the index small when loading a national file
+	def __init__(self,filename,states=None):
+		self.filename=filename
+		self.file=open(filename,"rb")
+		try:
+			self.mm=mmap.mmap(self.file.fileno(),0,access=mmap.ACCESS_READ)
+		except ValueError: # empty file
+			self.file.close()
+			raise ValueError("gazetteer file "+filename+" is empty")
+		try:
+			self.load(states)
+		except Exception:
+			self.close()
+			raise
+
+	def close(self):
+		self.mm.close()
+		self.file.close()
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self,*args):
+		self.close()
+
+	def __len__(self):
+		return len(self.offsets)
+
+	def load(self,states):
+		mm=self.mm
+		header=mm.readline().decode("utf-8-sig").rstrip("\r\n")
+		self.delimiter="|" if "|" in header else "\t"
+		headerNames=[name.strip().lower() for name in header.split(self.delimiter)]
+		self.columns={}
+		for (field,names) in columnNames.items():
+			for name in names:
+				if name in headerNames:
+					self.columns[field]=headerNames.index(name)
+					break
+		for field in ("name","lat","lon"):
+			if field not in self.columns:
+				raise ValueError("gazetteer file "+self.filename+" has no "+"/".join(columnNames[field])+" column")
+		nameCol=self.columns["name"]
+		latCol=self.columns["lat"]
+		lonCol=self.columns["lon"]
+		stateCol=self.columns.get("state")
+		stateSet=None
+		if states and stateCol is not None:
+			stateSet=set(state.strip().lower().encode("utf-8") for state in states)
+		delimiter=self.delimiter.encode("ascii")
+		lastCol=max(nameCol,latCol,lonCol)
+
+		# offsets/lats/lons are parallel arrays, one entry per feature
+		self.offsets=array("q")
+		self.lats=array("d")
+		self.lons=array("d")
+		self.grid={}
+		keyed=[]
+		readline=mm.readline
+		while True:
+			offset=mm.tell()
+			line=readline()
+			if not line:
+				break
+			fields=line.split(delimiter)
+			if len(fields)<=lastCol:
+				continue
+			if stateSet is not None and (stateCol>=len(fields) or fields[stateCol].strip().lower() not in stateSet):
+				continue
+			try:
+				lat=float(fields[latCol])
+				lon=float(fields[lonCol])
+			except ValueError:
+				continue
+			if lat==0.0 and lon==0.0: # GNIS: location unknown
+				continue
+			n=len(self.offsets)
+			self.offsets.append(offset)
+			self.lats.append(lat)
+			self.lons.append(lon)
+			self.grid.setdefault(self.cellOf(lat,lon),[]).append(n)
+			words=normalize(fields[nameCol].decode("utf-8","replace"))
+			for k in range(len(words)):
+				keyed.append((" ".join(words[k:]),n))
+		keyed.sort()
+		self.keys=[key for (key,n) in keyed]
+		self.keyFeatures=array("l",[n for (key,n) in keyed])
+
+	@staticmethod
+	def cellOf(lat,lon):
+		return (int(math.floor(lat*gridCellsPerDegree)),int(math.floor(lon*gridCellsPerDegree)))
+
+	# feature - the Feature for feature number n, parsed from the file
+	def feature(self,n):
+		mm=self.mm
+		offset=self.offsets[n]
+		end=mm.find(b"\n",offset)
+		if end<0:
+			end=len(mm)
+		fields=mm[offset:end].decode("utf-8","replace").rstrip("\r").split(self.delimiter)
+		def field(name):
+			col=self.columns.get(name)
+			if col is None or col>=len(fields):
+				return ""
+			return fields[col].strip()
+		return Feature(field("name"),field("featureClass"),field("state"),field("county"),self.lats[n],self.lons[n])
+
+	# search - features whose name, or any word of it onwards, starts with
+	#  text; names that start with text come first, then in alphabetical order
+	#  of the matching key; at most limit features
+	# returns a list of Features
+	def search(self,text,limit=10):
+		prefix=" ".join(normalize(text))
+		if not prefix:
+			return []
+		keys=self.keys
+		i=bisect_left(keys,prefix)
+		leading=[]
+		other=[]
+		seen=set()
+		# scan a bounded number of keys, so that a one-letter prefix doesn't
+		#  walk a large part of the index
+		while i<len(keys) and len(seen)<limit*4 and keys[i].startswith(prefix):
+			n=self.keyFeatures[i]
+			if n not in seen:
+				seen.add(n)
+				feature=self.feature(n)
+				if " ".join(normalize(feature.name)).startswith(prefix):
+					leading.append(feature)
+				else:
+					other.append(feature)
+			i+=1
+		return (leading+other)[:limit]
+
+	# nearest - the nearest feature within maxDistance meters of a point, as
+	#  (Feature,distance), or None
+	def nearest(self,lat,lon,maxDistance=5000):
+		dLat=math.degrees(maxDistance/earthRadius)
+		dLon=dLat/max(0.01,math.cos(math.radians(lat)))
+		(i1,j1)=self.cellOf(lat-dLat,lon-dLon)
+		(i2,j2)=self.cellOf(lat+dLat,lon+dLon)
+		best=None
+		bestDistance=maxDistance
+		for i in range(i1,i2+1):
+			for j in range(j1,j2+1):
+				for n in self.grid.get((i,j),()):
+					d=distance(lat,lon,self.lats[n],self.lons[n])
+					if d<=bestDistance:
+						best=n
+						bestDistance=d
+		if best is None:
+			return None
+		return (self.feature(best),bestDistance)
+
+# rankCandidates - candidates sorted by distance from a point, nearest first
+def rankCandidates(candidateList,lat,lon):
+	return tuple(sorted(candidateList,key=lambda c: distance(lat,lon,c.lat,c.lon)))
+
+# rankCandidateSet - a buckshot_engine.CandidateSet with each coordinate
+#  system's candidates ranked by distance from a point (e.g. a landmark)
+def rankCandidateSet(candidates,lat,lon):
+	return candidates._replace(
+		Dd=rankCandidates(candidates.Dd,lat,lon),
+		DMm=rankCandidates(candidates.DMm,lat,lon),
+		DMSs=rankCandidates(candidates.DMSs,lat,lon))
@@ -0,0 +1,128 @@
+# #############################################################################
+#
+#  buckshot_lazy.py - deferred loading of optional modules
+#
+#   developed for Nevada County Sheriff's Search and Rescue
+#
+#  During a callout the window is launched cold, and every import that runs
+#   before it appears is time the operator spends waiting.  NumPy alone
+#   takes about as long to import as everything else put together, but it
+#   only pays off once there are enough points to vectorize (projecting a
+#   few dozen candidates, clustering the markers on export, sampling
+#   terrain rasters), so the modules that use it get a stand-in instead:
+#
+#     np=buckshot_lazy.optionalModule("numpy")
+#
+#   instead of the usual try: import numpy as np / except ImportError: np=None.
+#   The stand-in is false if the module is not installed - test it with
+#   'if np:' or 'if not np:' rather than against None; that only looks the
+#   module up (importlib.util.find_spec), it does not import it - and any
+#   attribute of it (np.asarray ...) imports the module on first use.  Each
+#   attribute is copied onto the stand-in the first time it is looked up, so
+#   later lookups cost the same as on the module itself.  Only use a stand-in
+#   for functions, classes and constants: a module global that is set later
+#   (buckshot_cli.area ...) would keep the value it had when first looked up.
+#
+#  buckshot's own feature modules (incident area, gazetteer, datums, marker
+#   clustering ...) are deferred the same way, since most launches never use
+#   them.
+#
+#  load() imports the module right away; the window calls it for everything
+#   deferred once it has been painted, so that the first keystroke does not
+#   pay for the import either (see buckshot.warmUp).
+#
+# #############################################################################
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  See included file LICENSE.txt for full license terms, also
+#  available at http://opensource.org/licenses/gpl-3.0.html
+#
+# ############################################################################
+
+import importlib
+import importlib.util
+import threading
+
+# stand-ins by module name, so that every module shares one per name
+deferred={}
+deferredLock=threading.RLock()
+
+# LazyModule - stand-in for an optional module that is imported on first use
+class LazyModule(object):
+	def __init__(self,name):
+		self.__dict__["_name"]=name
+		self.__dict__["_module"]=None
+		self.__dict__["_missing"]=False
+		self.__dict__["_found"]=None
+
+	# load - import the module now (once); returns the module, or None if
+	#  it is not installed
+	def load(self):
+		if self._module is None and not self._missing:
+			with deferredLock:
+				if self._module is None and not self._missing:
+					try:
+						self.__dict__["_module"]=importlib.import_module(self._name)
+					except ImportError:
+						self.__dict__["_missing"]=True
+		return self._module
+
+	def loaded(self):
+		return self._module is not None
+
+	# available - whether the module is installed, without importing it (a
+	#  module that is found but then fails to import is false from then on)
+	def available(self):
+		if self._module is not None:
+			return True
+		if self._missing:
+			return False
+		if self._found is None:
+			try:
+				found=importlib.util.find_spec(self._name) is not None
+			except (ImportError,ValueError):
+				found=False
+			self.__dict__["_found"]=found
+		return self._found
+
+	def __bool__(self):
+		return self.available()
+
+	# only called for attributes not yet copied onto the stand-in
+	def __getattr__(self,attr):
+		if attr.startswith("__"):
+			raise AttributeError(attr)
+		module=self.load()
+		if module is None:
+			raise ImportError("module "+self._name+" is not installed")
+		value=getattr(module,attr)
+		self.__dict__[attr]=value
+		return value
+
+	def __setattr__(self,attr,value):
+		raise AttributeError("cannot set attributes of deferred module "+self._name)
+
+	def __repr__(self):
+		return "<deferred module "+self._name+(" (loaded)>" if self._module is not None else ">")
+
+# optionalModule - the shared stand-in for a module name
+def optionalModule(name):
+	with deferredLock:
+		module=deferred.get(name)
+		if module is None:
+			module=deferred[name]=LazyModule(name)
+	return module
+
+# loadAll - import every deferred module now (e.g. once the window is up)
+def loadAll():
+	for module in list(deferred.values()):
+		module.load()
@@ -0,0 +1,71 @@
+# #############################################################################
+#
+#  buckshot_log.py - leveled logging for buckshot
+#
+#   developed for Nevada County Sheriff's Search and Rescue
+#
+#  Every module logs through a child of the "buckshot" logger (getLogger).
+#   Levels:
+#   - DEBUG: per-keystroke and per-marker diagnostics (the canonical string,
+#     the digits, every candidate list, the final marker list); off unless
+#     --trace is given.  Messages that take real work to build are guarded
+#     with tracing(log), so the hot path only pays for one level check
+#     when tracing is off
+#   - INFO: one line per export or batch run (GPX file written, map ID)
+#   - WARNING: a marker or an upload that failed
+#  Messages use lazy %-formatting (log.info("wrote %s",name)), so nothing is
+#   formatted for a level that is off.
+#
+#  setup() sends everything at or above the level to stderr with a
+#   timestamp; both the window and the headless modes call it from their
+#   --trace option (addTraceArgument / setLoggingFromArgs in buckshot_cli).
+#
+# #############################################################################
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  See included file LICENSE.txt for full license terms, also
+#  available at http://opensource.org/licenses/gpl-3.0.html
+#
+# ############################################################################
+
+import logging
+import sys
+
+rootName="buckshot"
+logFormat="%(asctime)s %(levelname)-7s %(name)s: %(message)s"
+dateFormat="%H:%M:%S"
+
+# handler installed by setup, so that calling it again replaces it
+handler=None
+
+# getLogger - the logger for one part of buckshot, e.g. getLogger("export")
+#  gives "buckshot.export"
+def getLogger(name=None):
+	return logging.getLogger(rootName+"."+name if name else rootName)
+
+# tracing - whether DEBUG messages of a logger are on (guard for messages
+#  whose arguments are expensive to build)
+def tracing(log):
+	return log.isEnabledFor(logging.DEBUG)
+
+# setup - log at INFO and above (DEBUG and above with trace) to stream
+#  (default stderr)
+def setup(trace=False,stream=None):
+	global handler
+	root=getLogger()
+	if handler is not None:
+		root.removeHandler(handler)
+	handler=logging.StreamHandler(stream if stream is not None else sys.stderr)
+	handler.setFormatter(logging.Formatter(logFormat,dateFormat))
+	root.addHandler(handler)
+	root.setLevel(logging.DEBUG if trace else logging.INFO)
+	root.propagate=False
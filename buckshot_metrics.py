@@ -0,0 +1,288 @@
+# #############################################################################
+#
+#  buckshot_metrics.py - engine and export metrics in Prometheus text format
+#
+#   developed for Nevada County Sheriff's Search and Rescue
+#
+#  For the shared command-post laptop: with --metrics-port PORT the metrics
+#   are served at http://127.0.0.1:PORT/metrics (localhost only), and with
+#   --metrics-file FILE they are written to FILE every 15 seconds and on
+#   exit (replaced atomically, e.g. for node_exporter's textfile collector).
+#   Nothing else is needed - no client library, no external service.
+#
+#  Metrics:
+#   buckshot_candidates_generated_total{system}  candidates shown, by system
+#   buckshot_candidate_cache_hits_total          candidate cache hits
+#   buckshot_candidate_cache_misses_total        candidate cache misses
+#   buckshot_candidate_cache_entries             cached candidate sets
+#   buckshot_keystroke_render_seconds            first keystroke of a burst
+#                                                 to refreshed lists (histogram)
+#   buckshot_markers_uploaded_total              markers created on the map
+#   buckshot_marker_upload_failures_total        marker creations that failed
+#   buckshot_marker_upload_seconds               marker creation request
+#                                                 latency (histogram)
+#   buckshot_upload_errors_total                 exports that could not reach
+#                                                 the map at all
+#   buckshot_exports_total                       exports started
+#  The latencies come from the stages recorded through buckshot_timing
+#   (render, sartopo marker), so enabling metrics also turns that on.
+#
+# #############################################################################
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  See included file LICENSE.txt for full license terms, also
+#  available at http://opensource.org/licenses/gpl-3.0.html
+#
+# ############################################################################
+
+import atexit
+import os
+import threading
+from bisect import bisect_left
+
+import buckshot_engine
+import buckshot_log
+import buckshot_timing
+
+log=buckshot_log.getLogger("metrics")
+
+contentType="text/plain; version=0.0.4; charset=utf-8"
+
+# latency buckets (seconds): keystrokes are expected in milliseconds,
+#  marker requests in tenths of a second over a field link
+keystrokeBuckets=[0.005,0.01,0.025,0.05,0.1,0.25,0.5,1.0,2.5]
+uploadBuckets=[0.05,0.1,0.25,0.5,1.0,2.5,5.0,10.0,30.0]
+
+# formatValue - a sample value as Prometheus writes it
+def formatValue(value):
+	if isinstance(value,int):
+		return str(value)
+	if value==float("inf"):
+		return "+Inf"
+	return repr(float(value))
+
+# formatLabels - {name:value} as {name="value",...} (sorted), or ""
+def formatLabels(labels):
+	if not labels:
+		return ""
+	return "{"+",".join('%s="%s"' % (name,str(value).replace("\\","\\\\").replace('"','\\"').replace("\n","\\n"))
+		for (name,value) in sorted(labels.items()))+"}"
+
+# Counter - a monotonically increasing count, optionally by one label
+class Counter(object):
+	def __init__(self,name,help,label=None):
+		self.name=name
+		self.help=help
+		self.label=label
+		self.values={}
+		self.lock=threading.Lock()
+
+	def inc(self,amount=1,labelValue=None):
+		with self.lock:
+			self.values[labelValue]=self.values.get(labelValue,0)+amount
+
+	def render(self):
+		lines=["# HELP %s %s" % (self.name,self.help),"# TYPE %s counter" % self.name]
+		with self.lock:
+			items=sorted(self.values.items(),key=lambda item:str(item[0]))
+		if not items and self.label is None:
+			items=[(None,0)]
+		for (labelValue,value) in items:
+			labels={self.label:labelValue} if self.label is not None else None
+			lines.append(self.name+formatLabels(labels)+" "+formatValue(value))
+		return lines
+
+# Histogram - Prometheus histogram of durations in seconds
+class Histogram(object):
+	def __init__(self,name,help,buckets):
+		self.name=name
+		self.help=help
+		self.buckets=buckets
+		self.counts=[0]*(len(buckets)+1)
+		self.sum=0.0
+		self.lock=threading.Lock()
+
+	def observe(self,seconds):
+		with self.lock:
+			self.counts[bisect_left(self.buckets,seconds)]+=1
+			self.sum+=seconds
+
+	def render(self):
+		lines=["# HELP %s %s" % (self.name,self.help),"# TYPE %s histogram" % self.name]
+		with self.lock:
+			counts=list(self.counts)
+			total=self.sum
+		cumulative=0
+		for (bound,count) in zip(self.buckets+[float("inf")],counts):
+			cumulative+=count
+			lines.append(self.name+"_bucket"+formatLabels({"le":formatValue(bound)})+" "+str(cumulative))
+		lines.append(self.name+"_sum "+formatValue(total))
+		lines.append(self.name+"_count "+str(cumulative))
+		return lines
+
+# Gauge - a value read when the metrics are rendered
+class Gauge(object):
+	def __init__(self,name,help,read,kind="gauge"):
+		self.name=name
+		self.help=help
+		self.read=read
+		self.kind=kind
+
+	def render(self):
+		return ["# HELP %s %s" % (self.name,self.help),"# TYPE %s %s" % (self.name,self.kind),
+			self.name+" "+formatValue(self.read())]
+
+# Metrics - everything that is exported
+class Metrics(object):
+	def __init__(self):
+		self.candidatesGenerated=Counter("buckshot_candidates_generated_total","Candidates generated, by coordinate system.","system")
+		self.keystrokeRender=Histogram("buckshot_keystroke_render_seconds","Time from the first keystroke of a burst to the refreshed candidate lists.",keystrokeBuckets)
+		self.markersUploaded=Counter("buckshot_markers_uploaded_total","Markers created on the map.")
+		self.uploadFailures=Counter("buckshot_marker_upload_failures_total","Marker creations that failed.")
+		self.uploadLatency=Histogram("buckshot_marker_upload_seconds","Latency of marker creation requests.",uploadBuckets)
+		self.uploadErrors=Counter("buckshot_upload_errors_total","Exports that could not reach the map at all.")
+		self.exports=Counter("buckshot_exports_total","Exports started.")
+		self.all=[
+			self.candidatesGenerated,
+			Gauge("buckshot_candidate_cache_hits_total","Candidate cache hits.",lambda:buckshot_engine.cacheInfo().hits,"counter"),
+			Gauge("buckshot_candidate_cache_misses_total","Candidate cache misses.",lambda:buckshot_engine.cacheInfo().misses,"counter"),
+			Gauge("buckshot_candidate_cache_entries","Candidate sets in the cache.",lambda:buckshot_engine.cacheInfo().currsize),
+			self.keystrokeRender,
+			self.exports,
+			self.markersUploaded,
+			self.uploadFailures,
+			self.uploadLatency,
+			self.uploadErrors]
+		# stages recorded through buckshot_timing that feed a histogram
+		self.stageHistograms={"render":self.keystrokeRender,"sartopo marker":self.uploadLatency}
+
+	# stageRecorded - buckshot_timing sink
+	def stageRecorded(self,stage,seconds):
+		h=self.stageHistograms.get(stage)
+		if h is not None:
+			h.observe(seconds)
+
+	def render(self):
+		lines=[]
+		for metric in self.all:
+			lines.extend(metric.render())
+		return "\n".join(lines)+"\n"
+
+# makeServer - an HTTP server for /metrics (and / for convenience); http.server
+#  is imported here, since it takes longer to import than the rest of the
+#  window's modules and is only needed with --metrics-port
+def makeServer(host,port):
+	from http.server import BaseHTTPRequestHandler,HTTPServer
+	from socketserver import ThreadingMixIn
+
+	class MetricsHandler(BaseHTTPRequestHandler):
+		protocol_version="HTTP/1.1"
+
+		def do_GET(self):
+			if self.path.split("?")[0] not in ("/metrics","/"):
+				self.send_error(404)
+				return
+			body=metrics.render().encode("utf-8")
+			self.send_response(200)
+			self.send_header("Content-Type",contentType)
+			self.send_header("Content-Length",str(len(body)))
+			self.end_headers()
+			self.wfile.write(body)
+
+		def log_message(self,format,*args):
+			log.debug("%s - "+format,self.address_string(),*args)
+
+	class MetricsServer(ThreadingMixIn,HTTPServer):
+		daemon_threads=True
+
+	return MetricsServer((host,port),MetricsHandler)
+
+# the metrics, or None while they are off
+metrics=None
+server=None
+
+# enable - start collecting metrics (once)
+def enable():
+	global metrics
+	if metrics is None:
+		metrics=Metrics()
+		buckshot_timing.addSink(metrics.stageRecorded)
+	return metrics
+
+# serve - serve the metrics on a localhost port, from a background thread;
+#  returns the port (useful with port 0, which picks a free one)
+def serve(port,host="127.0.0.1"):
+	global server
+	enable()
+	server=makeServer(host,port)
+	threading.Thread(target=server.serve_forever,daemon=True).start()
+	log.info("metrics at http://%s:%d/metrics",host,server.server_address[1])
+	return server.server_address[1]
+
+# writeFile - write the metrics to path, atomically
+def writeFile(path):
+	if metrics is None:
+		return
+	temp=path+".tmp"
+	try:
+		with open(temp,"w",encoding="utf-8") as f:
+			f.write(metrics.render())
+		os.replace(temp,path)
+	except OSError as err:
+		log.warning("could not write metrics file %s: %s",path,err)
+
+# writePeriodically - write the metrics to path every interval seconds from
+#  a background thread, and once more on exit
+def writePeriodically(path,interval=15.0):
+	enable()
+	stop=threading.Event()
+	def run():
+		while not stop.wait(interval):
+			writeFile(path)
+	writeFile(path)
+	threading.Thread(target=run,daemon=True).start()
+	def final():
+		stop.set()
+		writeFile(path)
+	atexit.register(final)
+
+# hooks for the window and the export; each does nothing while metrics are
+#  off
+
+# candidatesShown - count the candidates of a candidate set
+def candidatesShown(candidates):
+	if metrics is not None:
+		candidatesCounted(dict((system,len(getattr(candidates,system))) for system in ("Dd","DMm","DMSs","USNG")))
+
+# candidatesCounted - count candidates already counted by coordinate system,
+#  {system:number} (e.g. by a batch worker process)
+def candidatesCounted(counts):
+	if metrics is not None:
+		for (system,n) in counts.items():
+			if n:
+				metrics.candidatesGenerated.inc(n,system)
+
+def exportStarted():
+	if metrics is not None:
+		metrics.exports.inc()
+
+# markerUploaded - count one buckshot_sartopo.MarkerResult
+def markerUploaded(result):
+	if metrics is not None:
+		if result.ok:
+			metrics.markersUploaded.inc()
+		elif result.error!="cancelled":
+			metrics.uploadFailures.inc()
+
+def uploadError():
+	if metrics is not None:
+		metrics.uploadErrors.inc()
@@ -0,0 +1,193 @@
+# #############################################################################
+#
+#  buckshot_sartopo.py - concurrent marker upload to SARTopo / CalTopo
+#
+#   developed for Nevada County Sheriff's Search and Rescue
+#
+#  Speaks the same protocol as sartopo_python's SartopoSession (API v1 at
+#   /api/v1/map/<mapID>/, falling back to the old /rest/ API v0), but:
+#   - all requests go through one requests.Session whose connection pool is
+#     sized for the number of workers, so connections are kept alive and
+#     reused instead of reconnecting for every marker
+#   - marker creations are issued concurrently from a bounded thread pool,
+#     so a 20-marker buckshot over a slow field LTE link takes about as long
+#     as a few round trips instead of twenty
+#   - every marker gets a MarkerResult, so failures are reported per marker
+#     instead of being printed and ignored
+#
+# #############################################################################
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  See included file LICENSE.txt for full license terms, also
+#  available at http://opensource.org/licenses/gpl-3.0.html
+#
+# ############################################################################
+
+import json
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor,as_completed
+
+import requests
+from requests.adapters import HTTPAdapter
+
+import buckshot_timing
+
+class SartopoError(Exception):
+	pass
+
+# MarkerResult - outcome of one marker creation:
+#  marker = the buckshot_export.Marker that was sent
+#  ok = True if the server accepted it
+#  status = HTTP status code, or None if no response was received
+#  error = error text if not ok, else ""
+#  elapsed = seconds taken by the request
+MarkerResult=namedtuple("MarkerResult","marker ok status error elapsed")
+
+# parseMapURL - (domainAndPort,mapID) from a map URL as typed in the URL
+#  field, e.g. "http://localhost:8080/m/ABCD" -> ("localhost:8080","abcd")
+def parseMapURL(url):
+	p=url.lower().replace("http://","").split("/")
+	return (p[0],p[-1])
+
+class SartopoUploader(object):
+	def __init__(self,domainAndPort,mapID,maxWorkers=4,timeout=10):
+		if not mapID or len(mapID)<3:
+			raise SartopoError("you must specify a three-or-more-character sartopo map ID string (end of the URL)")
+		self.domainAndPort=domainAndPort
+		self.mapID=mapID
+		self.maxWorkers=max(1,maxWorkers)
+		self.timeout=timeout
+		self.apiVersion=-1
+		self.apiUrlMid="/invalid/"
+		self.cancelled=threading.Event()
+		self.session=requests.Session()
+		adapter=HTTPAdapter(pool_connections=1,pool_maxsize=self.maxWorkers)
+		self.session.mount("http://",adapter)
+		self.session.mount("https://",adapter)
+
+	def close(self):
+		self.session.close()
+
+	# cancel - may be called from any thread; markers not yet sent are
+	#  skipped (reported as failed with error "cancelled"), requests already
+	#  in flight are allowed to finish
+	def cancel(self):
+		self.cancelled.set()
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self,*args):
+		self.close()
+
+	# connect - find out which API the server speaks:
+	#  GET /api/v1/map/ returns 200 = API v1
+	#  otherwise, GET /rest/marker/ returns 200 = API v0, which also needs a
+	#   GET of the map URL to authenticate the session
+	def connect(self):
+		base="http://"+self.domainAndPort
+		t=buckshot_timing.start()
+		try:
+			r=self.session.get(base+"/api/v1/map/",timeout=self.timeout)
+			if r.status_code==200:
+				self.apiVersion=1
+				self.apiUrlMid="/api/v1/map/"+self.mapID+"/"
+				return self.apiVersion
+			r=self.session.get(base+"/rest/marker/",timeout=self.timeout)
+			if r.status_code==200:
+				self.apiVersion=0
+				self.apiUrlMid="/rest/"
+				self.session.get(base+"/m/"+self.mapID,timeout=self.timeout)
+				return self.apiVersion
+		except requests.RequestException as err:
+			raise SartopoError("no response from "+base+": "+str(err))
+		finally:
+			buckshot_timing.record("sartopo connect",t)
+		raise SartopoError("no SARTopo API found at "+base)
+
+	# post - POST a JSON object to an API endpoint ("folder" or "marker");
+	#  returns the requests.Response
+	def post(self,apiUrlEnd,j):
+		if self.apiVersion<0:
+			self.connect()
+		apiUrlEnd=apiUrlEnd.lower()
+		if self.apiVersion>0:
+			apiUrlEnd=apiUrlEnd.capitalize()
+		url="http://"+self.domainAndPort+self.apiUrlMid+apiUrlEnd+"/"
+		t=buckshot_timing.start()
+		try:
+			return self.session.post(url,data={'json':json.dumps(j)},timeout=self.timeout)
+		finally:
+			buckshot_timing.record("sartopo "+apiUrlEnd.lower(),t)
+
+	# addFolder - create a folder; returns its id
+	def addFolder(self,label="New Folder"):
+		try:
+			r=self.post("folder",{"properties":{"title":label}})
+			r.raise_for_status()
+			rj=r.json()
+		except (requests.RequestException,ValueError) as err:
+			raise SartopoError("could not create folder '"+label+"': "+str(err))
+		if 'result' in rj and 'id' in rj['result']:
+			return rj['result']['id']
+		elif 'id' in rj:
+			return rj['id']
+		raise SartopoError("no valid folder ID was returned from the request")
+
+	# addMarker - create one marker; returns a MarkerResult (never raises)
+	#  the payload is the same GeoJSON Feature that sartopo_python sends
+	def addMarker(self,marker,folderId=None):
+		(title,lat,lon,color,symbol,description)=marker
+		j={
+			"type":"Feature",
+			"properties":{
+				"class":"Marker",
+				"marker-color":color,
+				"marker-symbol":symbol,
+				"title":title,
+				"folderId":folderId,
+				"description":description},
+			"geometry":{"type":"Point","coordinates":[lon,lat]}}
+		if self.cancelled.is_set():
+			return MarkerResult(marker,False,None,"cancelled",0)
+		t0=time.perf_counter()
+		try:
+			r=self.post("marker",j)
+		except (requests.RequestException,SartopoError) as err:
+			return MarkerResult(marker,False,None,str(err),time.perf_counter()-t0)
+		elapsed=time.perf_counter()-t0
+		if r.status_code!=200:
+			return MarkerResult(marker,False,r.status_code,"HTTP "+str(r.status_code)+": "+r.text[:200],elapsed)
+		return MarkerResult(marker,True,r.status_code,"",elapsed)
+
+	# uploadMarkers - create a new folder and all markers in it, with up to
+	#  maxWorkers marker requests in flight at a time
+	#  callback = optional function called with each MarkerResult as it
+	#   completes (on the calling thread, between waits for the workers)
+	# returns the list of MarkerResults, in the same order as markerList
+	def uploadMarkers(self,markerList,folderLabel="Buckshot",callback=None):
+		if self.apiVersion<0:
+			self.connect()
+		if self.cancelled.is_set():
+			return [MarkerResult(marker,False,None,"cancelled",0) for marker in markerList]
+		fid=self.addFolder(folderLabel)
+		results=[None]*len(markerList)
+		with ThreadPoolExecutor(max_workers=self.maxWorkers) as pool:
+			futures={pool.submit(self.addMarker,marker,fid):n for (n,marker) in enumerate(markerList)}
+			for future in as_completed(futures):
+				result=future.result()
+				results[futures[future]]=result
+				if callback:
+					callback(result)
+		return results
@@ -0,0 +1,396 @@
+# #############################################################################
+#
+#  buckshot_service.py - local HTTP/JSON service for buckshot results
+#
+#   developed for Nevada County Sheriff's Search and Rescue
+#
+#  usage:
+#   python buckshot.py serve [--port PORT] [--host HOST] [options]
+#   (or python buckshot_cli.py serve ..., which does not need PyQt)
+#
+#  For the other tools at the command post (CAD bridge, radio log, web
+#   forms), so that nobody has to re-type a reading into the window: the
+#   same candidates, match grades and markers as the window and the filter
+#   mode, over HTTP on localhost (default http://127.0.0.1:8378/).
+#
+#  Endpoints (GET with a query string, or POST with a body):
+#   /candidates - JSON: for one coordinate string, the same object as one
+#                 line of filter mode ({"input":...,"exactMatch":...,
+#                 "candidates":[...]}, each candidate with its "match" and
+#                 "score"); for a batch, {"results":[one such object per
+#                 string, in order]}
+#   /gpx        - GPX document of the markers that an export from the
+#                 window would make (merged within --cluster meters, and
+#                 followed by their --datum variants), for all strings
+#  Request fields, as a JSON object body or as query parameters:
+#   coords     - a coordinate string, or (JSON) a list of them for a batch;
+#                a repeated query parameter is a batch too
+#   markerName - base marker name (default X); in a batch, the number of
+#                each string (from 1) is appended, as in batch mode
+#   gpx        - true: also give each /candidates object a "gpx" field with
+#                the GPX document of its markers
+#   cluster    - merge markers within this many meters (default --cluster;
+#                0 = off)
+#  A text/plain body is a batch of one coordinate string per line, with
+#   any other fields in the query string.  Errors are {"error": message}
+#   with a 4xx status.
+#
+#  e.g.
+#   curl 'http://127.0.0.1:8378/candidates?coords=39+22.3+120+11.5'
+#   curl -d '{"coords":["39 22.3 120 11.5","3922312011"]}' http://127.0.0.1:8378/candidates
+#   curl --data-binary @readings.txt -H 'Content-Type: text/plain' http://127.0.0.1:8378/gpx
+#
+#  All clients are served by one asyncio event loop: HTTP/1.1 keep-alive
+#   (HTTP/1.0 with Connection: keep-alive), idle connections closed after
+#   30 seconds.  The engine work runs on the loop itself, since it is
+#   CPU-bound and the candidate cache, incident area and terrain are not
+#   shared between threads; a batch returns to the loop every 50 strings,
+#   so that one large batch does not hold up other clients' readings.
+#
+#  The HTTP handling is only what these clients need:
+#   - a request body must have a Content-Length (digits only; repeated, it
+#     must agree); any Transfer-Encoding, chunked uploads included, gets a
+#     501 and the connection is closed
+#   - Expect: 100-continue gets a 100 Continue (HTTP/1.1 only) before the
+#     body is read, or the error without it if the body is too large; any
+#     other expectation gets a 417
+#   - folded header lines (obsolete since RFC 7230) get a 400; so do
+#     malformed request and header lines
+#   - a request line or header line over 64 KiB, or more than maxHeaders
+#     header lines, gets a 431
+#   - pipelined requests are answered one at a time, in order
+#   - a client that closes the connection partway through a request (in
+#     the headers or the body) gets no response
+#   After any error in the request itself the rest of the stream can't be
+#   trusted, so the connection is closed after the error response.
+#
+#  The --region, --usng-square, --area, --dem/--water, --datum, --trace,
+#   --timings, --profile and --metrics-* options are those of filter mode
+#   (see buckshot_cli); --timings adds a "request" stage, from a complete
+#   request to its response having been written.
+#
+# #############################################################################
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  See included file LICENSE.txt for full license terms, also
+#  available at http://opensource.org/licenses/gpl-3.0.html
+#
+# ############################################################################
+
+import asyncio
+import io
+import json
+import re
+import signal
+from collections import namedtuple
+from http import HTTPStatus
+from urllib.parse import parse_qs,urlsplit
+
+import buckshot_cli
+import buckshot_export
+import buckshot_log
+import buckshot_timing
+
+log=buckshot_log.getLogger("service")
+
+defaultPort=8378
+
+# defaultClusterRadius - meters; 0 = markers are not merged unless asked
+#  (--cluster, or cluster in the request), same as the window
+defaultClusterRadius=0
+
+# limits: seconds a connection may sit idle (or take to send a request),
+#  request header lines, request body bytes, and strings in one batch
+idleTimeout=30.0
+maxHeaders=100
+maxBody=4<<20
+maxBatch=10000
+
+# chunkSize - strings worked through between returns to the event loop
+chunkSize=50
+
+jsonType="application/json"
+gpxType="application/gpx+xml"
+
+# clusterRadius - default for requests that don't give one (--cluster)
+clusterRadius=defaultClusterRadius
+
+# HTTPError - a request that gets an error response
+class HTTPError(Exception):
+	def __init__(self,status,message):
+		Exception.__init__(self,message)
+		self.status=status
+		self.message=message
+
+# Request - one parsed HTTP request; query is {name:[values]}, headers are
+#  {lowercase name:value}
+Request=namedtuple("Request","method path query headers body keepAlive")
+
+# readRequest - read the next request of a connection; returns None if the
+#  client has closed it.  Raises HTTPError for a malformed request, after
+#  which the rest of the stream can't be trusted.
+async def readRequest(reader,writer):
+	try:
+		line=await reader.readline()
+		# (blank lines before a request are allowed)
+		while line in (b"\r\n",b"\n"):
+			line=await reader.readline()
+		# (a line cut short means the client closed the connection mid-request)
+		if not line.endswith(b"\n"):
+			return None
+		parts=line.decode("latin-1").split()
+		if len(parts)!=3:
+			raise HTTPError(400,"malformed request line")
+		(method,target,version)=parts
+		if not version.startswith("HTTP/1."):
+			raise HTTPError(505,"HTTP/1.x only")
+		headers={}
+		count=0
+		while True:
+			line=await reader.readline()
+			if not line.endswith(b"\n"):
+				return None
+			# (a header line continued on the next one)
+			if line[:1] in (b" ",b"\t"):
+				raise HTTPError(400,"folded header lines are not supported")
+			line=line.decode("latin-1").strip()
+			if not line:
+				break
+			count+=1
+			if count>maxHeaders:
+				raise HTTPError(431,"too many header lines")
+			(name,sep,value)=line.partition(":")
+			name=name.lower()
+			value=value.strip()
+			if not sep or not name or name!=name.strip():
+				raise HTTPError(400,"malformed header line")
+			if name=="content-length" and headers.get(name,value)!=value:
+				raise HTTPError(400,"conflicting Content-Length headers")
+			headers[name]=value
+	except ValueError:
+		# a line over the stream's limit (64 KiB)
+		raise HTTPError(431,"request line or header line too long")
+	connection=headers.get("connection","").lower()
+	if version=="HTTP/1.0":
+		keepAlive="keep-alive" in connection
+	else:
+		keepAlive="close" not in connection
+	if "transfer-encoding" in headers:
+		raise HTTPError(501,"Transfer-Encoding (e.g. chunked) is not supported; send a Content-Length")
+	length=headers.get("content-length","0")
+	if not re.fullmatch("[0-9]+",length):
+		raise HTTPError(400,"malformed Content-Length")
+	length=int(length)
+	if length>maxBody:
+		raise HTTPError(413,"request body over %d bytes" % maxBody)
+	expect=headers.get("expect","").lower()
+	if expect and expect!="100-continue":
+		raise HTTPError(417,"only Expect: 100-continue is supported")
+	body=b""
+	if length:
+		if expect and version!="HTTP/1.0":
+			writer.write(b"HTTP/1.1 100 Continue\r\n\r\n")
+		try:
+			body=await reader.readexactly(length)
+		except asyncio.IncompleteReadError:
+			return None
+	split=urlsplit(target)
+	return Request(method,split.path,parse_qs(split.query,keep_blank_values=True),headers,body,keepAlive)
+
+# parseFlag - a true/false request field, from JSON or a query string
+def parseFlag(value):
+	if isinstance(value,str):
+		return value.lower() in ("1","true","yes","on")
+	return bool(value)
+
+# parseRadius - a cluster radius in meters, from a JSON number or a query
+#  string; None if it is not a finite number >= 0 (JSON true is not 1 meter)
+def parseRadius(value):
+	if isinstance(value,str):
+		try:
+			value=float(value)
+		except ValueError:
+			return None
+	elif isinstance(value,bool) or not isinstance(value,(int,float)):
+		return None
+	if not 0<=value<float("inf"):
+		return None
+	return float(value)
+
+# requestFields - the coordinate strings and options of a request (see the
+#  top of this file)
+# returns a tuple: (list of coordinate strings,whether it is a batch,
+#  base marker name,whether to add GPX,cluster radius)
+def requestFields(request):
+	fields=dict((name,values[-1]) for (name,values) in request.query.items())
+	coords=request.query.get("coords",[])
+	batch=len(coords)>1
+	if request.body:
+		try:
+			text=request.body.decode("utf-8")
+		except UnicodeDecodeError:
+			raise HTTPError(400,"request body is not UTF-8")
+		if request.headers.get("content-type","").split(";")[0].strip().lower()=="text/plain":
+			coords=text.splitlines()
+			batch=True
+		else:
+			try:
+				obj=json.loads(text)
+			except ValueError as err:
+				raise HTTPError(400,"request body is not JSON: "+str(err))
+			if not isinstance(obj,dict):
+				raise HTTPError(400,"request body must be a JSON object")
+			fields.update(obj)
+			if "coords" in obj:
+				coords=obj["coords"]
+				batch=isinstance(coords,list)
+				if not batch:
+					coords=[coords]
+	if not coords:
+		raise HTTPError(400,"no coordinate strings (coords)")
+	if len(coords)>maxBatch:
+		raise HTTPError(413,"over %d coordinate strings in one request" % maxBatch)
+	if not all(isinstance(coordString,str) for coordString in coords):
+		raise HTTPError(400,"coords must be a string or a list of strings")
+	markerName=fields.get("markerName","X")
+	if not isinstance(markerName,str):
+		raise HTTPError(400,"markerName must be a string")
+	radius=parseRadius(fields.get("cluster",clusterRadius))
+	if radius is None:
+		raise HTTPError(400,"cluster must be a number of meters")
+	return (coords,batch,markerName,parseFlag(fields.get("gpx",False)),radius)
+
+# serviceRecord - the /candidates object for one coordinate string: the
+#  filter mode record, plus the GPX document of its markers if asked
+def serviceRecord(coordString,markerName,gpx,radius):
+	(candidates,samples,gridRefs)=buckshot_cli.recordCandidates(coordString)
+	record=buckshot_cli.candidatesRecord(coordString,markerName,candidates,samples,gridRefs)
+	if gpx:
+		f=io.StringIO()
+		with buckshot_export.GpxWriter(f) as writer:
+			writer.writeAll(buckshot_cli.recordMarkers(candidates,markerName,samples,radius,gridRefs))
+		record["gpx"]=f.getvalue()
+	return record
+
+# gpxWaypoints - the GPX waypoint text for the markers of one coordinate
+#  string; returns (text,number of waypoints)
+def gpxWaypoints(coordString,markerName,radius):
+	(candidates,samples,gridRefs)=buckshot_cli.recordCandidates(coordString)
+	waypoints=[buckshot_export.gpxWpt(marker) for marker in buckshot_cli.recordMarkers(candidates,markerName,samples,radius,gridRefs)]
+	return ("".join(waypoints),len(waypoints))
+
+# inChunks - [work(*args) for args in argList], returning to the event loop
+#  between chunks
+async def inChunks(work,argList):
+	results=[]
+	for n in range(0,len(argList),chunkSize):
+		if n:
+			await asyncio.sleep(0)
+		results.extend(work(*args) for args in argList[n:n+chunkSize])
+	return results
+
+# respond - the response to a well-formed request
+# returns a tuple: (status,content type,body bytes)
+async def respond(request):
+	if request.path not in ("/candidates","/gpx"):
+		raise HTTPError(404,"no such endpoint: "+request.path+" (try /candidates or /gpx)")
+	if request.method not in ("GET","POST"):
+		raise HTTPError(405,"use GET or POST")
+	(coords,batch,markerName,gpx,radius)=requestFields(request)
+	if batch:
+		names=[markerName+str(n) for n in range(1,len(coords)+1)]
+	else:
+		names=[markerName]
+	if request.path=="/gpx":
+		f=io.StringIO()
+		with buckshot_export.GpxWriter(f) as writer:
+			for (text,count) in await inChunks(gpxWaypoints,[(coordString,name,radius) for (coordString,name) in zip(coords,names)]):
+				writer.writeRaw(text,count)
+		return (200,gpxType,f.getvalue().encode("utf-8"))
+	records=await inChunks(serviceRecord,[(coordString,name,gpx,radius) for (coordString,name) in zip(coords,names)])
+	return (200,jsonType,json.dumps({"results":records} if batch else records[0]).encode("utf-8"))
+
+def errorResponse(err):
+	return (err.status,jsonType,json.dumps({"error":err.message}).encode("utf-8"))
+
+# sendResponse - write a response and wait until it can be taken
+async def sendResponse(writer,status,contentType,body,keepAlive):
+	head="HTTP/1.1 %d %s\r\nContent-Type: %s\r\nContent-Length: %d\r\nConnection: %s\r\n\r\n" % (
+		status,HTTPStatus(status).phrase,contentType,len(body),"keep-alive" if keepAlive else "close")
+	writer.write(head.encode("latin-1")+body)
+	await writer.drain()
+
+# handleConnection - serve the requests of one connection until the client
+#  closes it, asks to, sends a malformed request, or sits idle too long
+async def handleConnection(reader,writer):
+	peer=writer.get_extra_info("peername")
+	try:
+		while True:
+			try:
+				request=await asyncio.wait_for(readRequest(reader,writer),idleTimeout)
+			except asyncio.TimeoutError:
+				break
+			except HTTPError as err:
+				log.debug("%s: %s",peer,err.message)
+				await sendResponse(writer,*errorResponse(err),keepAlive=False)
+				break
+			if request is None:
+				break
+			t=buckshot_timing.start()
+			try:
+				(status,contentType,body)=await respond(request)
+			except HTTPError as err:
+				(status,contentType,body)=errorResponse(err)
+			except Exception:
+				log.exception("%s %s failed",request.method,request.path)
+				(status,contentType,body)=errorResponse(HTTPError(500,"internal error"))
+			await sendResponse(writer,status,contentType,body,request.keepAlive)
+			buckshot_timing.record("request",t)
+			log.debug("%s: %s %s %d, %d bytes",peer,request.method,request.path,status,len(body))
+			if not request.keepAlive:
+				break
+	except (ConnectionError,asyncio.CancelledError):
+		# (cancelled when the service stops)
+		pass
+	finally:
+		writer.close()
+
+# start - start listening (in a running loop); port 0 picks a free port
+# returns the asyncio server
+async def start(port=defaultPort,host="127.0.0.1"):
+	server=await asyncio.start_server(handleConnection,host,port)
+	address=server.sockets[0].getsockname()
+	log.info("serving on http://%s:%d/",address[0],address[1])
+	return server
+
+# serve - run the service until interrupted (Ctrl+C, or SIGTERM)
+def serve(port=defaultPort,host="127.0.0.1"):
+	loop=asyncio.new_event_loop()
+	asyncio.set_event_loop(loop)
+	try:
+		loop.add_signal_handler(signal.SIGTERM,loop.stop)
+	except (NotImplementedError,AttributeError):
+		# (no signal handlers on Windows)
+		pass
+	server=loop.run_until_complete(start(port,host))
+	try:
+		loop.run_forever()
+	except KeyboardInterrupt:
+		pass
+	finally:
+		server.close()
+		tasks=asyncio.all_tasks(loop)
+		for task in tasks:
+			task.cancel()
+		loop.run_until_complete(asyncio.gather(*tasks,return_exceptions=True))
+		loop.close()
+		log.info("service stopped")
@@ -0,0 +1,428 @@
+# #############################################################################
+#
+#  buckshot_terrain.py - terrain plausibility of buckshot candidates from
+#   local elevation (DEM) and land/water rasters
+#
+#   developed for Nevada County Sheriff's Search and Rescue
+#
+#  Many impossible candidates land in a lake, or at an elevation that does
+#   not fit the report ("on the ridge", "down by the river"); given local
+#   rasters, each candidate is sampled for its elevation and a water flag,
+#   which go into the marker description and push implausible candidates
+#   to the end of the lists.
+#
+#  Rasters are read in place through memory-mapped files - a tile is only
+#   mapped when a point first falls on it, and only the pages holding the
+#   sampled cells are ever read from disk.  Supported formats (one band,
+#   geographic lat/lon grids, e.g. as downloaded from USGS or CGIAR):
+#   - SRTM .hgt tiles (big-endian 16-bit, 1 or 3 arc-second, location from
+#     the file name, e.g. N39W121.hgt)
+#   - ESRI BIL / GridFloat: a raw .bil/.flt/.bin file with an .hdr sidecar
+#     (either the BIL keywords NROWS, NCOLS, NBITS, PIXELTYPE, BYTEORDER,
+#     ULXMAP, ULYMAP, XDIM, YDIM, NODATA or the GridFloat keywords ncols,
+#     nrows, xllcorner, yllcorner, cellsize, NODATA_value, byteorder)
+#   a water mask is any such raster with nonzero cells for water.
+#
+#  Elevations are interpolated bilinearly between the four cells around
+#   the point (the nearest cell's value is used where one of the four has
+#   no data); water masks use the nearest cell.
+#
+#  Lookups are batched per tile: sampleMany groups the points by tile and
+#   reads each tile's cells in one go (as one NumPy gather when NumPy is
+#   installed), so batch mode can score a chunk of candidates at a time.
+#
+# #############################################################################
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  See included file LICENSE.txt for full license terms, also
+#  available at http://opensource.org/licenses/gpl-3.0.html
+#
+# ############################################################################
+
+import math
+import mmap
+import os
+import re
+import struct
+import threading
+from collections import namedtuple
+
+import buckshot_lazy
+
+np=buckshot_lazy.optionalModule("numpy")
+
+# TerrainSample - terrain at one point:
+#  elevation = meters, or None if no DEM covers the point (or no data there)
+#  water = True/False, or None if no water mask covers the point
+TerrainSample=namedtuple("TerrainSample","elevation water")
+
+rasterExtensions=(".hgt",".bil",".flt",".bin")
+
+hgtName=re.compile(r"^([NS])(\d{2})([EW])(\d{3})",re.IGNORECASE)
+
+# Raster - one memory-mapped single-band grid
+#  north,west = lat/lon of the center of the upper-left cell
+#  dy,dx = cell size in degrees
+#  typeCode = struct type code of one cell, with byte order (e.g. ">h")
+class Raster(object):
+	def __init__(self,filename,nrows,ncols,north,west,dy,dx,typeCode,nodata=None,skipBytes=0):
+		self.filename=filename
+		self.nrows=nrows
+		self.ncols=ncols
+		self.north=north
+		self.west=west
+		self.dy=dy
+		self.dx=dx
+		self.typeCode=typeCode
+		self.cellSize=struct.calcsize(typeCode)
+		self.nodata=nodata
+		self.skipBytes=skipBytes
+		# bounds, out to the outer edges of the edge cells
+		self.top=north+dy/2
+		self.bottom=north-(nrows-0.5)*dy
+		self.left=west-dx/2
+		self.right=west+(ncols-0.5)*dx
+		self.file=None
+		self.mm=None
+		self.array=None
+		self.lock=threading.Lock()
+
+	# the mapping is not pickled (e.g. when the terrain is passed to batch
+	#  worker processes); each process maps the file again on first use
+	def __getstate__(self):
+		state=self.__dict__.copy()
+		state.update(file=None,mm=None,array=None,lock=None)
+		return state
+
+	def __setstate__(self,state):
+		self.__dict__.update(state)
+		self.lock=threading.Lock()
+
+	def contains(self,lat,lon):
+		return self.bottom<=lat<self.top and self.left<=lon<self.right
+
+	# open - map the file, the first time the raster is sampled
+	def open(self):
+		with self.lock:
+			if self.mm is not None:
+				return
+			size=self.skipBytes+self.nrows*self.ncols*self.cellSize
+			f=open(self.filename,"rb")
+			try:
+				if os.fstat(f.fileno()).st_size<size:
+					raise ValueError("raster file "+self.filename+" is smaller than its header says ("+str(size)+" bytes)")
+				mm=mmap.mmap(f.fileno(),0,access=mmap.ACCESS_READ)
+			except Exception:
+				f.close()
+				raise
+			if np:
+				self.array=np.frombuffer(mm,dtype=np.dtype(self.typeCode),count=self.nrows*self.ncols,offset=self.skipBytes)
+			self.file=f
+			self.mm=mm
+
+	def close(self):
+		with self.lock:
+			self.array=None
+			if self.mm is not None:
+				self.mm.close()
+				self.file.close()
+				self.mm=None
+
+	# cellIndex - index of the cell nearest to a point (which must be inside)
+	def cellIndex(self,lat,lon):
+		row=min(self.nrows-1,max(0,int((self.north-lat)/self.dy+0.5)))
+		col=min(self.ncols-1,max(0,int((lon-self.west)/self.dx+0.5)))
+		return row*self.ncols+col
+
+	# cellValue - the value of cell number n (as a float), or None for no data
+	def cellValue(self,n):
+		v=struct.unpack_from(self.typeCode,self.mm,self.skipBytes+n*self.cellSize)[0]
+		if v==self.nodata or v!=v: # NaN
+			return None
+		return float(v)
+
+	# value - the nearest cell's value at a point, or None for no data
+	def value(self,lat,lon):
+		if self.mm is None:
+			self.open()
+		return self.cellValue(self.cellIndex(lat,lon))
+
+	# interpolatedValue - the value at a point, interpolated bilinearly
+	#  between the centers of the four cells around it (the edge cells' values
+	#  hold out to the edge of the raster); the nearest cell's value if one
+	#  of the four has no data
+	def interpolatedValue(self,lat,lon):
+		if self.mm is None:
+			self.open()
+		y=min(self.nrows-1.0,max(0.0,(self.north-lat)/self.dy))
+		x=min(self.ncols-1.0,max(0.0,(lon-self.west)/self.dx))
+		row=int(y)
+		col=int(x)
+		(fy,fx)=(y-row,x-col)
+		row2=min(row+1,self.nrows-1)
+		col2=min(col+1,self.ncols-1)
+		v=[self.cellValue(r*self.ncols+c) for (r,c) in ((row,col),(row,col2),(row2,col),(row2,col2))]
+		if None in v:
+			return self.value(lat,lon)
+		return (v[0]*(1-fx)+v[1]*fx)*(1-fy)+(v[2]*(1-fx)+v[3]*fx)*fy
+
+	# gather - cell values at many points (NumPy arrays of lat and lon, all
+	#  inside), as a float array with NaN for no data; needs NumPy
+	def gather(self,lats,lons):
+		if self.mm is None:
+			self.open()
+		rows=np.clip(((self.north-lats)/self.dy+0.5).astype(np.int64),0,self.nrows-1)
+		cols=np.clip(((lons-self.west)/self.dx+0.5).astype(np.int64),0,self.ncols-1)
+		return self.cells(rows*self.ncols+cols)
+
+	# cells - values of cells by number, as a float array with NaN for no
+	#  data; needs NumPy
+	def cells(self,indices):
+		v=self.array[indices].astype(float)
+		if self.nodata is not None:
+			v[v==self.nodata]=np.nan
+		return v
+
+	# gatherInterpolated - interpolatedValue at many points (NumPy arrays,
+	#  all inside), as a float array with NaN for no data; needs NumPy
+	def gatherInterpolated(self,lats,lons):
+		if self.mm is None:
+			self.open()
+		y=np.clip((self.north-lats)/self.dy,0.0,self.nrows-1.0)
+		x=np.clip((lons-self.west)/self.dx,0.0,self.ncols-1.0)
+		rows=y.astype(np.int64)
+		cols=x.astype(np.int64)
+		(fy,fx)=(y-rows,x-cols)
+		rows2=np.minimum(rows+1,self.nrows-1)
+		cols2=np.minimum(cols+1,self.ncols-1)
+		v=((self.cells(rows*self.ncols+cols)*(1-fx)+self.cells(rows*self.ncols+cols2)*fx)*(1-fy)
+			+(self.cells(rows2*self.ncols+cols)*(1-fx)+self.cells(rows2*self.ncols+cols2)*fx)*fy)
+		missing=np.isnan(v)
+		if missing.any():
+			v[missing]=self.gather(lats[missing],lons[missing])
+		return v
+
+# openHGT - a Raster for an SRTM .hgt tile; the grid size (1201 or 3601
+#  square) comes from the file size, the location from the file name
+def openHGT(filename):
+	m=hgtName.match(os.path.basename(filename))
+	if not m:
+		raise ValueError("can't tell the location of "+filename+" from its name (expected e.g. N39W121.hgt)")
+	south=int(m.group(2))*(1 if m.group(1).upper()=="N" else -1)
+	west=int(m.group(4))*(1 if m.group(3).upper()=="E" else -1)
+	n=int(round(math.sqrt(os.path.getsize(filename)/2)))
+	if n*n*2!=os.path.getsize(filename):
+		raise ValueError(filename+" is not a square grid of 16-bit cells")
+	cell=1.0/(n-1)
+	return Raster(filename,n,n,south+1.0,float(west),cell,cell,">h",-32768)
+
+# readHeader - keyword/value pairs of an .hdr sidecar, keywords in uppercase
+def readHeader(filename):
+	header={}
+	with open(filename,"r") as f:
+		for line in f:
+			parts=line.split()
+			if len(parts)>=2:
+				header[parts[0].upper()]=parts[1]
+	return header
+
+# openBIL - a Raster for a BIL or GridFloat file with an .hdr sidecar
+def openBIL(filename):
+	hdr=os.path.splitext(filename)[0]+".hdr"
+	if not os.path.exists(hdr):
+		raise ValueError("no header file "+hdr+" for "+filename)
+	h=readHeader(hdr)
+	nrows=int(h["NROWS"])
+	ncols=int(h["NCOLS"])
+	if int(h.get("NBANDS","1"))!=1:
+		raise ValueError(filename+": only single-band rasters are supported")
+	byteOrder=">" if h.get("BYTEORDER",h.get("BYTE_ORDER","I")).upper() in ("M","MSBFIRST") else "<"
+	if "CELLSIZE" in h: # GridFloat
+		dx=dy=float(h["CELLSIZE"])
+		west=float(h["XLLCORNER"])+dx/2
+		north=float(h["YLLCORNER"])+nrows*dy-dy/2
+		typeCode="f"
+		nodata=h.get("NODATA_VALUE")
+	else: # BIL
+		dx=float(h["XDIM"])
+		dy=float(h["YDIM"])
+		west=float(h["ULXMAP"])
+		north=float(h["ULYMAP"])
+		nbits=int(h.get("NBITS","8"))
+		pixelType=h.get("PIXELTYPE","UNSIGNEDINT").upper()
+		if pixelType=="FLOAT":
+			typeCode={32:"f",64:"d"}[nbits]
+		else:
+			typeCode={8:"b",16:"h",32:"i"}[nbits]
+			if pixelType!="SIGNEDINT":
+				typeCode=typeCode.upper()
+		nodata=h.get("NODATA")
+	if nodata is not None:
+		nodata=float(nodata)
+	return Raster(filename,nrows,ncols,north,west,dy,dx,byteOrder+typeCode,nodata,int(h.get("SKIPBYTES","0")))
+
+# openRaster - a Raster for a file of any supported format
+def openRaster(filename):
+	if filename.lower().endswith(".hgt"):
+		return openHGT(filename)
+	return openBIL(filename)
+
+# rasterFiles - the raster files named by a list of files and directories
+#  (all supported files directly in each directory)
+def rasterFiles(paths):
+	files=[]
+	for path in paths:
+		if os.path.isdir(path):
+			files.extend(sorted(os.path.join(path,name) for name in os.listdir(path) if name.lower().endswith(rasterExtensions)))
+		else:
+			files.append(path)
+	return files
+
+# RasterSet - a mosaic of rasters (e.g. a directory of 1 degree tiles), with
+#  an index from each whole-degree cell to the rasters that overlap it
+#  interpolate = interpolate values between cells (elevations) instead of
+#   taking the nearest cell (water masks)
+class RasterSet(object):
+	def __init__(self,paths,interpolate=False):
+		self.interpolate=interpolate
+		self.rasters=[openRaster(filename) for filename in rasterFiles(paths)]
+		self.index={}
+		for raster in self.rasters:
+			for lat in range(int(math.floor(raster.bottom)),int(math.floor(raster.top))+1):
+				for lon in range(int(math.floor(raster.left)),int(math.floor(raster.right))+1):
+					self.index.setdefault((lat,lon),[]).append(raster)
+
+	def __len__(self):
+		return len(self.rasters)
+
+	def close(self):
+		for raster in self.rasters:
+			raster.close()
+
+	# rasterAt - the first raster that covers a point, or None
+	def rasterAt(self,lat,lon):
+		for raster in self.index.get((int(math.floor(lat)),int(math.floor(lon))),()):
+			if raster.contains(lat,lon):
+				return raster
+		return None
+
+	def value(self,lat,lon):
+		raster=self.rasterAt(lat,lon)
+		if raster is None:
+			return None
+		if self.interpolate:
+			return raster.interpolatedValue(lat,lon)
+		return raster.value(lat,lon)
+
+	# values - values at many points; with NumPy, the points are assigned to
+	#  rasters with one array comparison per raster, and each raster is read
+	#  with one gather for all of its points
+	def values(self,lats,lons):
+		if not np or len(lats)<64:
+			return [self.value(lat,lon) for (lat,lon) in zip(lats,lons)]
+		lats=np.asarray(lats,dtype=float)
+		lons=np.asarray(lons,dtype=float)
+		result=np.full(len(lats),np.nan)
+		left=np.ones(len(lats),dtype=bool) # not yet on a raster
+		for raster in self.rasters:
+			indices=np.nonzero(left&(lats>=raster.bottom)&(lats<raster.top)&(lons>=raster.left)&(lons<raster.right))[0]
+			if len(indices):
+				if self.interpolate:
+					result[indices]=raster.gatherInterpolated(lats[indices],lons[indices])
+				else:
+					result[indices]=raster.gather(lats[indices],lons[indices])
+				left[indices]=False
+		return [None if v!=v else v for v in result.tolist()]
+
+# parseElevationRange - (minimum,maximum) in meters from e.g. "1500-2500";
+#  either end may be left out ("2000-" = at least 2000 m)
+def parseElevationRange(text):
+	m=re.match(r"^\s*(-?\d+(?:\.\d*)?)?\s*-\s*(-?\d+(?:\.\d*)?)?\s*$",text)
+	if not m or (m.group(1) is None and m.group(2) is None):
+		raise ValueError("elevation range should look like 1500-2500 (meters), 2000- or -1000")
+	low=float(m.group(1)) if m.group(1) is not None else None
+	high=float(m.group(2)) if m.group(2) is not None else None
+	if low is not None and high is not None and low>high:
+		raise ValueError("elevation range "+text+" is backwards")
+	return (low,high)
+
+class Terrain(object):
+	# demPaths, waterPaths = lists of raster files and/or directories
+	# elevationRange = optional (minimum,maximum) meters consistent with the
+	#  report (either may be None); candidates outside it are implausible
+	def __init__(self,demPaths=(),waterPaths=(),elevationRange=None):
+		self.dem=RasterSet(demPaths,interpolate=True)
+		self.water=RasterSet(waterPaths)
+		self.elevationRange=elevationRange
+
+	def close(self):
+		self.dem.close()
+		self.water.close()
+
+	def sample(self,lat,lon):
+		elevation=self.dem.value(lat,lon)
+		water=self.water.value(lat,lon)
+		return TerrainSample(elevation,None if water is None else water!=0)
+
+	# sampleMany - TerrainSamples for lists of latitudes and longitudes,
+	#  batched per tile
+	def sampleMany(self,lats,lons):
+		elevations=self.dem.values(lats,lons) if len(self.dem) else [None]*len(lats)
+		water=self.water.values(lats,lons) if len(self.water) else [None]*len(lats)
+		return [TerrainSample(e,None if w is None else w!=0) for (e,w) in zip(elevations,water)]
+
+	# sampleCandidates - {(lat,lon): TerrainSample} for a list of candidates
+	def sampleCandidates(self,candidateList):
+		points=list(set((c.lat,c.lon) for c in candidateList))
+		samples=self.sampleMany([p[0] for p in points],[p[1] for p in points])
+		return dict(zip(points,samples))
+
+	def elevationOK(self,elevation):
+		if self.elevationRange is None or elevation is None:
+			return True
+		(low,high)=self.elevationRange
+		return (low is None or elevation>=low) and (high is None or elevation<=high)
+
+	# plausible - False if the sample is in water, or outside the elevation
+	#  range; missing data counts as plausible
+	def plausible(self,sample):
+		return not sample.water and self.elevationOK(sample.elevation)
+
+	# describe - short text for marker descriptions, e.g.
+	#  "elevation 1843 m, in water"
+	def describe(self,sample):
+		parts=[]
+		if sample.elevation is not None:
+			text="elevation %d m" % round(sample.elevation)
+			if not self.elevationOK(sample.elevation):
+				text+=" (outside reported range)"
+			parts.append(text)
+		if sample.water:
+			parts.append("in water")
+		return ", ".join(parts)
+
+	# rankCandidates - the plausible candidates first, then the rest, each in
+	#  their original order
+	#  samples = optional {(lat,lon): TerrainSample}, e.g. from a batched
+	#   sampleCandidates over many candidate sets
+	def rankCandidates(self,candidateList,samples=None):
+		if samples is None:
+			samples=self.sampleCandidates(candidateList)
+		return tuple(sorted(candidateList,key=lambda c: not self.plausible(samples[(c.lat,c.lon)])))
+
+	def rankCandidateSet(self,candidates,samples=None):
+		if samples is None:
+			samples=self.sampleCandidates(candidates.Dd+candidates.DMm+candidates.DMSs)
+		return candidates._replace(
+			Dd=self.rankCandidates(candidates.Dd,samples),
+			DMm=self.rankCandidates(candidates.DMm,samples),
+			DMSs=self.rankCandidates(candidates.DMSs,samples))
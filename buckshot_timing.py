@@ -0,0 +1,336 @@
+# #############################################################################
+#
+#  buckshot_timing.py - opt-in timing and profiling instrumentation
+#
+#   developed for Nevada County Sheriff's Search and Rescue
+#
+#  usage (comparing timing files, e.g. from two laptops or two releases):
+#   python buckshot_timing.py FILE [FILE ...]
+#
+#  Stage timings: with --timings FILE, the time of each stage of each
+#   keystroke and each export is added to a histogram for that stage:
+#    canonicalize   - canonical form of the input string
+#    enumerate      - lat/lon split enumeration (calcLatLon)
+#    score          - match grading and sorting (markCandidates)
+#    refresh        - ranking, projection and list refresh in the window
+#    keystroke      - the window's whole calcLatLon, all of the above
+#    render         - from the first keystroke of a burst to the refreshed
+#                     lists (including the debounce delay)
+#    markers        - building, merging and expanding the marker list
+#    gpx write      - writing the GPX file
+#    sartopo connect, sartopo folder, sartopo marker - each SARTopo request
+#    request        - a request to the service (buckshot_service), from
+#                     reading it to writing the response
+#   The histograms are merged into FILE (JSON) when the program exits, so a
+#   file accumulates over sessions; use one file per laptop and release to
+#   compare them.  Histogram buckets are a 1-2-5 series from 10 us to 100 s;
+#   percentiles are interpolated within a bucket.
+#  Instrumented code calls start()/lap()/record() around its stages, and
+#   each recorded stage goes to every sink (addSink): the timing file's
+#   histograms, and the live metrics (see buckshot_metrics); while there are
+#   no sinks these return right away (start() returns None), so the
+#   keystroke path pays a few function calls and nothing else.
+#
+#  Profiling: with --profile DIR, the session is run under cProfile (main
+#   thread only - the export threads are timed, not profiled) and
+#   tracemalloc, and reports are written to DIR when the program exits, or
+#   at any time with dumpProfile() (Ctrl+Shift+P in the window):
+#    buckshot-<time>.prof        - cProfile data, for pstats or snakeviz
+#    buckshot-<time>-profile.txt - top functions by cumulative time
+#    buckshot-<time>-memory.txt  - top allocation sites still allocated
+#
+# #############################################################################
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  See included file LICENSE.txt for full license terms, also
+#  available at http://opensource.org/licenses/gpl-3.0.html
+#
+# ############################################################################
+
+import atexit
+import json
+import os
+import sys
+import threading
+import time
+from bisect import bisect_left
+
+import buckshot_log
+
+log=buckshot_log.getLogger("timing")
+
+# bucketBounds - upper bounds (seconds) of the histogram buckets; one more
+#  bucket counts everything over the last bound
+bucketBounds=[m*10.0**e for e in range(-5,2) for m in (1,2,5)]+[100.0]
+
+# Histogram - durations of one stage
+class Histogram(object):
+	def __init__(self):
+		self.counts=[0]*(len(bucketBounds)+1)
+		self.count=0
+		self.total=0.0
+		self.min=None
+		self.max=None
+
+	def add(self,seconds):
+		self.counts[bisect_left(bucketBounds,seconds)]+=1
+		self.count+=1
+		self.total+=seconds
+		if self.min is None or seconds<self.min:
+			self.min=seconds
+		if self.max is None or seconds>self.max:
+			self.max=seconds
+
+	def merge(self,other):
+		self.counts=[a+b for (a,b) in zip(self.counts,other.counts)]
+		self.count+=other.count
+		self.total+=other.total
+		for value in (other.min,other.max):
+			if value is not None:
+				if self.min is None or value<self.min:
+					self.min=value
+				if self.max is None or value>self.max:
+					self.max=value
+
+	# percentile - approximate duration below which fraction p of the
+	#  samples fall, interpolated linearly within its bucket
+	def percentile(self,p):
+		if not self.count:
+			return None
+		rank=p*self.count
+		seen=0
+		for (n,count) in enumerate(self.counts):
+			if count and seen+count>=rank:
+				low=bucketBounds[n-1] if n>0 else 0.0
+				high=bucketBounds[n] if n<len(bucketBounds) else self.max
+				low=max(low,self.min)
+				high=min(high,self.max)
+				return low+(high-low)*(rank-seen)/count
+			seen+=count
+		return self.max
+
+	def toDict(self):
+		return {"count":self.count,"total":self.total,"min":self.min,"max":self.max,"counts":self.counts}
+
+	@classmethod
+	def fromDict(cls,d):
+		h=cls()
+		h.counts=list(d["counts"])
+		h.count=d["count"]
+		h.total=d["total"]
+		h.min=d["min"]
+		h.max=d["max"]
+		return h
+
+# Timings - the histograms of one session, by stage name; add() is called
+#  from the export threads too
+class Timings(object):
+	def __init__(self):
+		self.histograms={}
+		self.lock=threading.Lock()
+
+	def add(self,stage,seconds):
+		with self.lock:
+			h=self.histograms.get(stage)
+			if h is None:
+				h=self.histograms[stage]=Histogram()
+			h.add(seconds)
+
+	def snapshot(self):
+		with self.lock:
+			return {stage:Histogram.fromDict(h.toDict()) for (stage,h) in self.histograms.items()}
+
+	# save - merge the histograms into a timing file (created if need be)
+	def save(self,path):
+		import platform
+		stages={}
+		sessions=0
+		if os.path.exists(path):
+			try:
+				(old,sessions)=loadFile(path)
+				stages.update(old)
+			except (ValueError,KeyError,OSError) as err:
+				log.warning("timing file %s is not readable (%s); starting it over",path,err)
+		for (stage,h) in self.snapshot().items():
+			if stage in stages:
+				stages[stage].merge(h)
+			else:
+				stages[stage]=h
+		data={
+			"machine":platform.node(),
+			"platform":platform.platform(),
+			"python":platform.python_version(),
+			"sessions":sessions+1,
+			"saved":time.strftime("%Y-%m-%d %H:%M:%S"),
+			"bucketBounds":bucketBounds,
+			"stages":{stage:h.toDict() for (stage,h) in sorted(stages.items())}}
+		with open(path,"w",encoding="utf-8") as f:
+			json.dump(data,f,indent=1)
+
+# loadFile - ({stage:Histogram},number of sessions) from a timing file
+def loadFile(path):
+	with open(path,encoding="utf-8") as f:
+		data=json.load(f)
+	if data.get("bucketBounds")!=bucketBounds:
+		raise ValueError("different histogram buckets")
+	return ({stage:Histogram.fromDict(d) for (stage,d) in data["stages"].items()},data.get("sessions",1))
+
+# sinks - functions called with (stage,seconds) for each recorded stage
+sinks=[]
+
+def addSink(sink):
+	sinks.append(sink)
+
+# the current session's timings, or None while timing is off
+timings=None
+
+# enableTimings - start timing stages; the histograms are merged into path
+#  (if given) when the program exits
+def enableTimings(path=None):
+	global timings
+	timings=Timings()
+	addSink(timings.add)
+	if path:
+		atexit.register(saveTimings,path)
+	return timings
+
+def saveTimings(path):
+	if timings is not None:
+		try:
+			timings.save(path)
+		except OSError as err:
+			log.warning("could not write timing file %s: %s",path,err)
+
+# start - the start time of a stage, or None while nothing is recorded
+def start():
+	if not sinks:
+		return None
+	return time.perf_counter()
+
+# record - pass the time since t0 (from start or lap) for a stage to the
+#  sinks
+def record(stage,t0):
+	if t0 is not None:
+		seconds=time.perf_counter()-t0
+		for sink in sinks:
+			sink(stage,seconds)
+
+# lap - record a stage that started at t0, and return the start time of the
+#  next one
+def lap(stage,t0):
+	if t0 is None:
+		return None
+	t=time.perf_counter()
+	for sink in sinks:
+		sink(stage,t-t0)
+	return t
+
+# Profiler - a cProfile and tracemalloc run for the whole session
+class Profiler(object):
+	def __init__(self,directory):
+		import cProfile
+		import tracemalloc
+		self.directory=directory
+		self.tracemalloc=tracemalloc
+		self.profile=cProfile.Profile()
+		self.lock=threading.Lock()
+		tracemalloc.start()
+		self.profile.enable()
+
+	# dump - write the reports so far (profiling goes on); returns the
+	#  common start of their file names
+	def dump(self):
+		import pstats
+		with self.lock:
+			base=os.path.join(self.directory,time.strftime("buckshot-%Y%m%d-%H%M%S"))
+			self.profile.disable()
+			try:
+				self.profile.dump_stats(base+".prof")
+				with open(base+"-profile.txt","w",encoding="utf-8") as f:
+					pstats.Stats(self.profile,stream=f).sort_stats("cumulative").print_stats(60)
+			finally:
+				self.profile.enable()
+			snapshot=self.tracemalloc.take_snapshot()
+			(current,peak)=self.tracemalloc.get_traced_memory()
+			with open(base+"-memory.txt","w",encoding="utf-8") as f:
+				f.write("traced memory: %d bytes now, %d bytes peak\n\n" % (current,peak))
+				for stat in snapshot.statistics("lineno")[:40]:
+					f.write(str(stat)+"\n")
+		log.info("profile written to %s*",base)
+		return base
+
+	def stop(self):
+		self.profile.disable()
+		self.tracemalloc.stop()
+
+# the session profiler, or None
+profiler=None
+
+# enableProfiling - start profiling the session into directory; the reports
+#  are written when the program exits, and by dumpProfile
+def enableProfiling(directory):
+	global profiler
+	os.makedirs(directory,exist_ok=True)
+	profiler=Profiler(directory)
+	atexit.register(dumpProfile)
+	return profiler
+
+# dumpProfile - write the profile reports now, if profiling; returns the
+#  start of their file names, or None
+def dumpProfile():
+	if profiler is None:
+		return None
+	try:
+		return profiler.dump()
+	except OSError as err:
+		log.warning("could not write profile: %s",err)
+		return None
+
+# formatSeconds - e.g. 350us, 12.5ms, 1.20s
+def formatSeconds(seconds):
+	if seconds is None:
+		return "-"
+	if seconds<1e-3:
+		return "%.0fus" % (seconds*1e6)
+	if seconds<1.0:
+		return "%.1fms" % (seconds*1e3)
+	return "%.2fs" % seconds
+
+# report - lines comparing the stages of one or more timing files
+def report(paths):
+	files=[(path,)+loadFile(path) for path in paths]
+	stages=sorted(set(stage for (path,histograms,sessions) in files for stage in histograms))
+	lines=[]
+	for (path,histograms,sessions) in files:
+		lines.append("%s: %d session(s)" % (path,sessions))
+	lines.append("%-16s %-24s %8s %9s %9s %9s %9s" % ("stage","file","count","mean","p50","p90","p99"))
+	for stage in stages:
+		for (path,histograms,sessions) in files:
+			h=histograms.get(stage)
+			if h is None or not h.count:
+				continue
+			lines.append("%-16s %-24s %8d %9s %9s %9s %9s" % (stage,os.path.basename(path)[-24:],h.count,
+				formatSeconds(h.total/h.count),formatSeconds(h.percentile(0.5)),
+				formatSeconds(h.percentile(0.9)),formatSeconds(h.percentile(0.99))))
+	return lines
+
+def main(argv=None):
+	paths=sys.argv[1:] if argv is None else argv
+	if not paths:
+		print("usage: python buckshot_timing.py FILE [FILE ...]",file=sys.stderr)
+		return 2
+	for line in report(paths):
+		print(line)
+	return 0
+
+if __name__=="__main__":
+	sys.exit(main())
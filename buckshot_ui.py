@@ -177,26 +177,60 @@ class Ui_buckshot(object):
         self.label_8.setFont(font)
         self.label_8.setAlignment(QtCore.Qt.AlignCenter)
         self.label_8.setObjectName("label_8")
-        self.DdField = QtWidgets.QListWidget(buckshot)
+        self.DdField = QtWidgets.QListView(buckshot)
         self.DdField.setGeometry(QtCore.QRect(360, 170, 451, 101))
         self.DdField.setObjectName("DdField")
-        self.DMmField = QtWidgets.QListWidget(buckshot)
+        self.DMmField = QtWidgets.QListView(buckshot)
         self.DMmField.setGeometry(QtCore.QRect(360, 280, 451, 131))
         self.DMmField.setObjectName("DMmField")
-        self.DMSsField = QtWidgets.QListWidget(buckshot)
+        self.DMSsField = QtWidgets.QListView(buckshot)
         self.DMSsField.setGeometry(QtCore.QRect(360, 420, 451, 171))
         self.DMSsField.setObjectName("DMSsField")
+        self.landmarkLabel = QtWidgets.QLabel(buckshot)
+        self.landmarkLabel.setGeometry(QtCore.QRect(20, 480, 321, 31))
+        font = QtGui.QFont()
+        font.setFamily("Segoe UI")
+        font.setPointSize(10)
+        self.landmarkLabel.setFont(font)
+        self.landmarkLabel.setAlignment(QtCore.Qt.AlignRight|QtCore.Qt.AlignTrailing|QtCore.Qt.AlignVCenter)
+        self.landmarkLabel.setObjectName("landmarkLabel")
+        self.landmarkField = QtWidgets.QLineEdit(buckshot)
+        self.landmarkField.setGeometry(QtCore.QRect(20, 515, 321, 31))
+        font = QtGui.QFont()
+        font.setPointSize(10)
+        self.landmarkField.setFont(font)
+        self.landmarkField.setObjectName("landmarkField")
+        self.landmarkMatchLabel = QtWidgets.QLabel(buckshot)
+        self.landmarkMatchLabel.setGeometry(QtCore.QRect(20, 550, 321, 31))
+        font = QtGui.QFont()
+        font.setItalic(True)
+        self.landmarkMatchLabel.setFont(font)
+        self.landmarkMatchLabel.setText("")
+        self.landmarkMatchLabel.setAlignment(QtCore.Qt.AlignRight|QtCore.Qt.AlignTrailing|QtCore.Qt.AlignVCenter)
+        self.landmarkMatchLabel.setObjectName("landmarkMatchLabel")
+        self.usngMatchLabel = QtWidgets.QLabel(buckshot)
+        self.usngMatchLabel.setGeometry(QtCore.QRect(20, 340, 321, 71))
+        font = QtGui.QFont()
+        font.setFamily("Segoe UI")
+        font.setPointSize(10)
+        self.usngMatchLabel.setFont(font)
+        self.usngMatchLabel.setText("")
+        self.usngMatchLabel.setAlignment(QtCore.Qt.AlignRight|QtCore.Qt.AlignTrailing|QtCore.Qt.AlignVCenter)
+        self.usngMatchLabel.setWordWrap(True)
+        self.usngMatchLabel.setObjectName("usngMatchLabel")
 
         self.retranslateUi(buckshot)
-        self.coordsField.textChanged['QString'].connect(buckshot.calcLatLon)
+        self.coordsField.textChanged['QString'].connect(buckshot.coordsChanged)
         self.goButton.clicked.connect(buckshot.createMarkers)
         self.gpxBrowseButton.clicked['bool'].connect(buckshot.gpxSetFileName)
         self.markerNameField.textChanged['QString'].connect(buckshot.markerNameChanged)
-        self.DdField.itemClicked['QListWidgetItem*'].connect(buckshot.possibilityDdClicked)
-        self.DMmField.itemClicked['QListWidgetItem*'].connect(buckshot.possibilityDMmClicked)
-        self.DMSsField.itemClicked['QListWidgetItem*'].connect(buckshot.possibilityDMSsClicked)
+        self.DdField.clicked['QModelIndex'].connect(buckshot.possibilityDdClicked)
+        self.DMmField.clicked['QModelIndex'].connect(buckshot.possibilityDMmClicked)
+        self.DMSsField.clicked['QModelIndex'].connect(buckshot.possibilityDMSsClicked)
+        self.landmarkField.textChanged['QString'].connect(buckshot.landmarkChanged)
         QtCore.QMetaObject.connectSlotsByName(buckshot)
-        buckshot.setTabOrder(self.coordsField, self.markerNameField)
+        buckshot.setTabOrder(self.coordsField, self.landmarkField)
+        buckshot.setTabOrder(self.landmarkField, self.markerNameField)
         buckshot.setTabOrder(self.markerNameField, self.gpxFileNameField)
         buckshot.setTabOrder(self.gpxFileNameField, self.URLField)
         buckshot.setTabOrder(self.URLField, self.goButton)
@@ -223,4 +257,6 @@ class Ui_buckshot(object):
         self.label_7.setText(_translate("buckshot", "Optional.  Full .gpx filename.  File is not written until \'Create Markers\' is clicked."))
         self.gpxBrowseButton.setText(_translate("buckshot", "Browse"))
         self.label_8.setText(_translate("buckshot", "Optional: Click the one possibility that most closely matches the report.  Click it again to clear."))
+        self.landmarkLabel.setText(_translate("buckshot", "Landmark"))
+        self.landmarkField.setPlaceholderText(_translate("buckshot", "Optional.  Rank by distance from a named place"))
 
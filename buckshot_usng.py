@@ -0,0 +1,337 @@
+# #############################################################################
+#
+#  buckshot_usng.py - UTM and USNG/MGRS for buckshot candidates
+#
+#   developed for Nevada County Sheriff's Search and Rescue
+#
+#  Ground teams navigate by USNG (the US National Grid; same grid as MGRS,
+#   written with spaces), so every candidate gets a UTM and a USNG/MGRS
+#   rendering, and a typed USNG reference is accepted as one more input
+#   hypothesis (see buckshot_engine).
+#
+#  Projection: transverse Mercator on WGS84 with the Krueger series (as in
+#   Karney 2011, to the 4th order in n), accurate to well under a meter
+#   across the zone; UTM zones 1-60 with the Norway and Svalbard exceptions,
+#   latitude bands C-X (80 S - 84 N; the polar UPS areas are not covered).
+#   The series coefficients are computed once, and the per-zone constants
+#   (central meridian, USNG 100 km column letters and row letter offset) are
+#   cached per zone.  toUTMMany projects whole arrays of points at once, in
+#   NumPy if installed.
+#
+#  USNG references are truncated, not rounded, as the standard requires:
+#   "10S GJ 06832 11123" (1 m precision) names the square meter whose
+#   southwest corner is at those digits, and "10S GJ 0683 1112" the 10 m
+#   square that contains it.  UTM text is truncated to the same meter, so
+#   that the two agree digit for digit.  A typed reference is placed at the
+#   center of the square it names.
+#
+# #############################################################################
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  See included file LICENSE.txt for full license terms, also
+#  available at http://opensource.org/licenses/gpl-3.0.html
+#
+# ############################################################################
+
+import math
+import re
+from collections import namedtuple
+
+import buckshot_lazy
+
+np=buckshot_lazy.optionalModule("numpy")
+
+# WGS84 ellipsoid and UTM constants
+equatorialRadius=6378137.0
+flattening=1/298.257223563
+k0=0.9996
+falseEasting=500000.0
+falseNorthingSouth=10000000.0
+
+# Krueger series coefficients (n = third flattening)
+def seriesCoefficients(n):
+	A=equatorialRadius/(1+n)*(1+n**2/4+n**4/64)
+	alpha=(
+		n/2-2*n**2/3+5*n**3/16+41*n**4/180,
+		13*n**2/48-3*n**3/5+557*n**4/1440,
+		61*n**3/240-103*n**4/140,
+		49561*n**4/161280)
+	beta=(
+		n/2-2*n**2/3+37*n**3/96-n**4/360,
+		n**2/48+n**3/15-437*n**4/1440,
+		17*n**3/480-37*n**4/840,
+		4397*n**4/161280)
+	delta=(
+		2*n-2*n**2/3-2*n**3,
+		7*n**2/3-8*n**3/5,
+		56*n**3/15)
+	return (A,alpha,beta,delta,2*math.sqrt(n)/(1+n))
+
+(A,alpha,beta,delta,e2n)=seriesCoefficients(flattening/(2-flattening))
+
+# latitude bands, 8 degrees each from 80 S, except X (72-84 N)
+bandLetters="CDEFGHJKLMNPQRSTUVWX"
+
+# USNG 100 km square letters: columns cycle through three sets of eight
+#  letters by zone, rows through twenty letters (offset by five in even
+#  zones)
+columnSets=("ABCDEFGH","JKLMNPQR","STUVWXYZ")
+rowLetters="ABCDEFGHJKLMNPQRSTUV"
+
+# UTM - one point in UTM; easting and northing in meters (float)
+UTM=namedtuple("UTM","zone band easting northing")
+
+# ZoneConstants - what is needed per zone: central meridian (radians),
+#  USNG column letters and row letter offset
+ZoneConstants=namedtuple("ZoneConstants","lon0 columns rowOffset")
+
+zoneCache={}
+
+def zoneConstants(zone):
+	c=zoneCache.get(zone)
+	if c is None:
+		c=ZoneConstants(math.radians(zone*6-183),columnSets[(zone-1)%3],5 if zone%2==0 else 0)
+		zoneCache[zone]=c
+	return c
+
+# bandOf - latitude band letter, or None outside 80 S - 84 N
+def bandOf(lat):
+	if lat<-80 or lat>84:
+		return None
+	return bandLetters[min(19,int((lat+80)//8))]
+
+# zoneOf - UTM zone number, including the Norway and Svalbard exceptions
+def zoneOf(lat,lon):
+	lon=(lon+180)%360-180
+	zone=min(60,int((lon+180)//6)+1)
+	if 56<=lat<64 and 3<=lon<12:
+		return 32
+	if 72<=lat<=84 and 0<=lon<42:
+		if lon<9:
+			return 31
+		if lon<21:
+			return 33
+		if lon<33:
+			return 35
+		return 37
+	return zone
+
+# project - easting,northing (before false easting/northing) of a point,
+#  latitude and longitude relative to the central meridian in radians
+def project(phi,lam):
+	t=math.sinh(math.atanh(math.sin(phi))-e2n*math.atanh(e2n*math.sin(phi)))
+	xi1=math.atan2(t,math.cos(lam))
+	eta1=math.atanh(math.sin(lam)/math.sqrt(1+t*t))
+	xi=xi1
+	eta=eta1
+	for (j,aj) in enumerate(alpha):
+		j2=2*(j+1)
+		xi+=aj*math.sin(j2*xi1)*math.cosh(j2*eta1)
+		eta+=aj*math.cos(j2*xi1)*math.sinh(j2*eta1)
+	return (k0*A*eta,k0*A*xi)
+
+# toUTM - UTM of one point, or None outside the UTM latitudes
+def toUTM(lat,lon):
+	band=bandOf(lat)
+	if band is None:
+		return None
+	zone=zoneOf(lat,lon)
+	lam=math.radians(lon)-zoneConstants(zone).lon0
+	lam=(lam+math.pi)%(2*math.pi)-math.pi
+	(x,y)=project(math.radians(lat),lam)
+	return UTM(zone,band,falseEasting+x,y if lat>=0 else falseNorthingSouth+y)
+
+# toUTMMany - UTM of many points at once, as a list of UTM (or None)
+def toUTMMany(lats,lons):
+	if not np or len(lats)<8:
+		return [toUTM(lat,lon) for (lat,lon) in zip(lats,lons)]
+	lat=np.asarray(lats,dtype=float)
+	lon=np.asarray(lons,dtype=float)
+	ok=(lat>=-80)&(lat<=84)
+	wrapped=(lon+180)%360-180
+	zones=np.minimum(60,((wrapped+180)//6).astype(np.int64)+1)
+	# exceptions (rare; done point by point)
+	special=np.nonzero(ok&(((lat>=56)&(lat<64)&(wrapped>=3)&(wrapped<12))|((lat>=72)&(wrapped>=0)&(wrapped<42))))[0]
+	for i in special.tolist():
+		zones[i]=zoneOf(lats[i],lons[i])
+	lon0=np.radians(zones*6-183)
+	lam=(np.radians(lon)-lon0+np.pi)%(2*np.pi)-np.pi
+	phi=np.radians(np.clip(lat,-80,84))
+	t=np.sinh(np.arctanh(np.sin(phi))-e2n*np.arctanh(e2n*np.sin(phi)))
+	xi1=np.arctan2(t,np.cos(lam))
+	eta1=np.arctanh(np.sin(lam)/np.sqrt(1+t*t))
+	xi=xi1.copy()
+	eta=eta1.copy()
+	for (j,aj) in enumerate(alpha):
+		j2=2*(j+1)
+		xi+=aj*np.sin(j2*xi1)*np.cosh(j2*eta1)
+		eta+=aj*np.cos(j2*xi1)*np.sinh(j2*eta1)
+	eastings=(falseEasting+k0*A*eta).tolist()
+	northings=(k0*A*xi+np.where(lat<0,falseNorthingSouth,0.0)).tolist()
+	bandIndex=np.minimum(19,((np.clip(lat,-80,84)+80)//8).astype(np.int64)).tolist()
+	return [UTM(zone,bandLetters[b],e,nn) if good else None
+		for (zone,b,e,nn,good) in zip(zones.tolist(),bandIndex,eastings,northings,ok.tolist())]
+
+# fromUTM - (lat,lon) of a UTM point; south = southern hemisphere northing
+def fromUTM(zone,easting,northing,south=False):
+	if south:
+		northing-=falseNorthingSouth
+	xi=northing/(k0*A)
+	eta=(easting-falseEasting)/(k0*A)
+	xi1=xi
+	eta1=eta
+	for (j,bj) in enumerate(beta):
+		j2=2*(j+1)
+		xi1-=bj*math.sin(j2*xi)*math.cosh(j2*eta)
+		eta1-=bj*math.cos(j2*xi)*math.sinh(j2*eta)
+	chi=math.asin(math.sin(xi1)/math.cosh(eta1))
+	phi=chi
+	for (j,dj) in enumerate(delta):
+		phi+=dj*math.sin(2*(j+1)*chi)
+	lam=zoneConstants(zone).lon0+math.atan2(math.sinh(eta1),math.cos(xi1))
+	return (math.degrees(phi),(math.degrees(lam)+180)%360-180)
+
+# squareOf - USNG 100 km square letters of a UTM point, or None if the
+#  easting is outside the lettered columns
+def squareOf(utm):
+	c=zoneConstants(utm.zone)
+	col=meters(utm.easting)//100000-1
+	if col<0 or col>=len(c.columns):
+		return None
+	row=(meters(utm.northing)//100000+c.rowOffset)%20
+	return c.columns[col]+rowLetters[row]
+
+# meters - whole meters of an easting or northing, truncated (after rounding
+#  off the last fraction of a millimeter of projection round-off)
+def meters(x):
+	return int(math.floor(round(x,3)))
+
+# utmText - e.g. "10S 706832E 4311123N"
+def utmText(utm):
+	if utm is None:
+		return ""
+	return "%d%s %dE %dN" % (utm.zone,utm.band,meters(utm.easting),meters(utm.northing))
+
+# usngText - e.g. "10S GJ 06832 11123" (digits = 1 to 5 per coordinate)
+def usngText(utm,digits=5):
+	if utm is None:
+		return ""
+	square=squareOf(utm)
+	if square is None:
+		return ""
+	scale=10**(5-digits)
+	return "%d%s %s %0*d %0*d" % (utm.zone,utm.band,square,digits,meters(utm.easting)%100000//scale,digits,meters(utm.northing)%100000//scale)
+
+# mgrsText - same reference as usngText, without the spaces
+def mgrsText(utm,digits=5):
+	return usngText(utm,digits).replace(" ","")
+
+# candidateUTM - the UTM of each candidate, projected in one batch
+# returns {(lat,lon): UTM or None}
+def candidateUTM(candidateList):
+	points=list(set((c.lat,c.lon) for c in candidateList))
+	utms=toUTMMany([lat for (lat,lon) in points],[lon for (lat,lon) in points])
+	return dict(zip(points,utms))
+
+# USNG parsing
+
+# GridReference - a parsed USNG/MGRS reference: gzd = grid zone designation
+#  (e.g. "10S"), square = 100 km square letters (e.g. "GJ"), easting and
+#  northing = digit strings of equal length (0-5 digits)
+GridReference=namedtuple("GridReference","gzd square easting northing")
+
+gzdRegEx=re.compile(r'^(\d{1,2})([C-HJ-NP-X])$')
+usngRegEx=re.compile(r'^\s*(?:(\d{1,2})\s*([C-HJ-NP-X])\s*)?(?:([A-HJ-NP-Z])\s*([A-HJ-NP-V])\s*)?(\d*)\s*(\d*)\s*$')
+
+# parseGZD - normalize a grid zone designation, e.g. "10s" -> "10S"; raises
+#  ValueError if it is not one
+def parseGZD(text):
+	m=gzdRegEx.match(text.strip().upper())
+	if not m or not 1<=int(m.group(1))<=60:
+		raise ValueError("not a USNG grid zone designation: "+text)
+	return str(int(m.group(1)))+m.group(2)
+
+# parseSquare - default grid zone and 100 km square for references that
+#  leave them out, e.g. "10SGJ" or "10S GJ" -> ("10S","GJ"), "10S" ->
+#  ("10S",None); raises ValueError
+def parseSquare(text):
+	m=re.match(r'^\s*(\d{1,2}\s*[A-Za-z])\s*([A-Za-z]{2})?\s*$',text)
+	if not m:
+		raise ValueError("USNG square should look like 10SGJ or 10S: "+text)
+	gzd=parseGZD(m.group(1).replace(" ",""))
+	square=None
+	if m.group(2):
+		square=m.group(2).upper()
+		if square[0] not in "ABCDEFGHJKLMNPQRSTUVWXYZ" or square[1] not in rowLetters:
+			raise ValueError("not a USNG 100 km square: "+m.group(2))
+	return (gzd,square)
+
+# parseUSNG - a GridReference for a typed USNG/MGRS reference, or None if
+#  the text can't be one; the grid zone and square may be left out if
+#  defaults are given (defaultGZD, defaultSquare), and the easting and
+#  northing may be typed as one run of digits (split in half)
+def parseUSNG(text,defaultGZD=None,defaultSquare=None):
+	m=usngRegEx.match(text.upper())
+	if not m:
+		return None
+	(zone,band,col,row,e,nn)=m.groups()
+	if zone:
+		if not 1<=int(zone)<=60:
+			return None
+		gzd=str(int(zone))+band
+	else:
+		gzd=defaultGZD
+	if col:
+		square=col+row
+	else:
+		# a square is only assumed for the zone it was given with
+		square=defaultSquare if gzd==defaultGZD else None
+	if gzd is None or square is None:
+		return None
+	if nn:
+		if len(e)!=len(nn):
+			return None
+	else:
+		if len(e)%2:
+			return None
+		(e,nn)=(e[:len(e)//2],e[len(e)//2:])
+	if len(e)>5 or (not e and not col):
+		return None
+	return GridReference(gzd,square,e,nn)
+
+# bandMinNorthing - lowest northing of a latitude band in a zone, less a
+#  100 km margin for squares that straddle the band edge
+def bandMinNorthing(zone,band):
+	south=-80+8*bandLetters.index(band)
+	(x,y)=project(math.radians(south),0.0)
+	(x3,y3)=project(math.radians(south),math.radians(3))
+	y=min(y,y3)
+	if south<0:
+		y+=falseNorthingSouth
+	return y-100000
+
+# referenceLatLon - (lat,lon) of the center of the square a GridReference
+#  names, or None if its letters don't exist in its zone
+def referenceLatLon(ref):
+	zone=int(ref.gzd[:-1])
+	band=ref.gzd[-1]
+	c=zoneConstants(zone)
+	if ref.square[0] not in c.columns:
+		return None
+	digits=len(ref.easting)
+	scale=10**(5-digits)
+	easting=(c.columns.index(ref.square[0])+1)*100000+(int(ref.easting)*scale if digits else 0)+scale/2.0
+	northing=((rowLetters.index(ref.square[1])-c.rowOffset)%20)*100000+(int(ref.northing)*scale if digits else 0)+scale/2.0
+	minNorthing=bandMinNorthing(zone,band)
+	while northing<minNorthing:
+		northing+=2000000
+	return fromUTM(zone,easting,northing,band<"N")
@@ -0,0 +1,274 @@
+# #############################################################################
+#
+#  buckshot_vector.py - vectorized buckshot for whole columns of coordinate
+#   strings, e.g. CSV exports of historical callouts
+#
+#   developed for Nevada County Sheriff's Search and Rescue
+#
+#  Same split rules as buckshot_engine.calcLatLon (same region hypotheses,
+#   same whole degree search, same split plans, same minute/second validity
+#   rules), but computed with NumPy array operations over all input strings
+#   at once: for each region hypothesis, degree width and longitude start
+#   index, every row that has possible whole degrees there is handled in one
+#   pass, with validity masks in place of the per-string checks.
+#
+#  Requires numpy, which is only needed for this module.
+#
+# #############################################################################
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  See included file LICENSE.txt for full license terms, also
+#  available at http://opensource.org/licenses/gpl-3.0.html
+#
+# ############################################################################
+
+import re
+from collections import namedtuple
+
+import numpy as np
+
+import buckshot_engine
+
+# digit strings longer than this are skipped (listed in CandidateColumns.skipped)
+#  since their integer values would not fit in int64; no real coordinate
+#  reading comes close.  Up to 15 digits, the decimal degrees are bit-identical
+#  to buckshot_engine; beyond that they may differ in the last bit.
+maxDigits=18
+
+# system codes used in the system column
+systemCodes={"Dd":0,"DMm":1,"DMSs":2}
+systemNames=["Dd","DMm","DMSs"]
+
+POW10=10.0**np.arange(maxDigits+1)
+IPOW10=10**np.arange(maxDigits+1,dtype=np.int64)
+
+# CandidateColumns - columnar result, one array element per candidate:
+#  row = index of the input string that the candidate came from
+#  system = system code (see systemCodes)
+#  region = index of the region hypothesis in buckshot_engine.regions
+#  latDegDigits = number of latitude whole-degree digits
+#  lonDegIndex = start index of the longitude whole degrees in the digit string
+#  lonDegDigits = number of longitude whole-degree digits
+#  latMinDigits,lonMinDigits = number of whole-minute digits (0 for Dd)
+#  latSecDigits,lonSecDigits = number of whole-second digits (0 for Dd and DMm,
+#   and for implied zero seconds)
+#  lat,lon = decimal degrees (south latitude and west longitude are negative)
+#  skipped = indices of input strings that were too long to process
+# candidates are sorted by row, then by system, then in the same order as
+#  buckshot_engine.calcLatLon produces them
+CandidateColumns=namedtuple("CandidateColumns",
+	"row system region latDegDigits lonDegIndex lonDegDigits latMinDigits latSecDigits lonMinDigits lonSecDigits lat lon skipped")
+
+# digitMatrix - convert a list of digit strings to an int64 matrix of digits
+#  (zero-padded on the right) and an array of lengths
+def digitMatrix(numbersList,width):
+	n=len(numbersList)
+	lengths=np.fromiter((len(numbers) for numbers in numbersList),dtype=np.int64,count=n)
+	if n==0 or width==0:
+		return (np.zeros((n,max(width,1)),dtype=np.int64),lengths)
+	codes=np.array(numbersList,dtype="U%d" % width).view(np.uint32).reshape(n,width)
+	digits=codes.astype(np.int64)-48
+	digits[np.arange(width)[None,:]>=lengths[:,None]]=0
+	return (digits,lengths)
+
+# prefixValues - P[:,k] = integer value of the first k digits of each row,
+#  so that the value of digits [a,b) is P[:,b]-P[:,a]*10**(b-a)
+def prefixValues(digits):
+	(n,width)=digits.shape
+	P=np.zeros((n,width+1),dtype=np.int64)
+	for k in range(width):
+		P[:,k+1]=P[:,k]*10+digits[:,k]
+	return P
+
+# Side - integer-valued accessors for the digits following the whole degrees
+#  of one side, for a set of rows; start is a scalar, end is an array
+#  (constant for latitude, per-row for longitude)
+class Side(object):
+	def __init__(self,P,start,end):
+		self.P=P
+		self.start=start
+		self.end=end
+		self.length=end-start
+
+	# value - integer value of digits [start+a,start+b) of each row
+	def value(self,a,b):
+		rows=np.arange(len(self.P))
+		return self.P[rows,self.start+b]-self.P[rows,self.start+a]*IPOW10[b-a]
+
+	# decimal - value of "<digits [start,start+intDigits)>.<remaining digits>",
+	#  same as float() of that string (right-of-decimal blank means zero)
+	def decimal(self,intDigits):
+		rows=np.arange(len(self.P))
+		fracDigits=np.maximum(self.length-intDigits,0)
+		whole=self.P[rows,self.end]-self.P[rows,self.start]*IPOW10[self.length]
+		return whole.astype(np.float64)/POW10[fracDigits]
+
+	# minuteChoices - list of (minDigits,valid mask,minute term) for each
+	#  minute layout in the split plans
+	def minuteChoices(self):
+		choices=[]
+		for minEnd in (1,2):
+			valid=self.length>=minEnd
+			if minEnd==2:
+				minutes=self.value(0,np.minimum(2,self.length))
+				valid=valid&(minutes>=10)&(minutes<60)
+			choices.append((minEnd,valid,self.decimal(minEnd)/60.0))
+		return choices
+
+	# secondChoices - list of (minDigits,secDigits,valid mask,minute term,
+	#  second term) for each second layout in the split plans, in the same
+	#  order as buckshot_engine.sideChoices
+	def secondChoices(self):
+		choices=[]
+		for (minEnd,secEnd,valid) in (
+				(1,2,self.length>=2),
+				(1,3,self.length>=3),
+				(2,3,self.length>=3),
+				(2,2,self.length==2), # account for implied zero seconds
+				(2,4,self.length>=4)):
+			if not valid.any():
+				continue
+			if secEnd-minEnd==2:
+				seconds=self.value(minEnd,np.minimum(secEnd,self.length))
+				valid=valid&(seconds<60)
+			minTerm=self.value(0,np.minimum(minEnd,self.length)).astype(np.float64)/60.0
+			secTerm=self.secondDecimal(minEnd,secEnd)/3600.0
+			choices.append((minEnd,secEnd-minEnd,valid,minTerm,secTerm))
+		return choices
+
+	# secondDecimal - value of "<whole seconds>.<remaining digits>"
+	def secondDecimal(self,minEnd,secEnd):
+		rows=np.arange(len(self.P))
+		a=np.minimum(minEnd,self.length)
+		fracDigits=np.maximum(self.length-secEnd,0)
+		whole=self.P[rows,self.end]-self.P[rows,self.start+a]*IPOW10[self.length-a]
+		return whole.astype(np.float64)/POW10[fracDigits]
+
+# generateColumns - all Dd/DMm/DMSs interpretations of each input string
+#  coordStrings = sequence of raw coordinate strings or digit strings; any
+#   non-digit characters are removed first
+# returns a CandidateColumns
+def generateColumns(coordStrings):
+	numbersList=[re.sub(r'[^0-9]','',coordString) for coordString in coordStrings]
+	skipped=np.array([k for (k,numbers) in enumerate(numbersList) if len(numbers)>maxDigits],dtype=np.int64)
+	if len(skipped):
+		numbersList=[numbers if len(numbers)<=maxDigits else "" for numbers in numbersList]
+	width=max([len(numbers) for numbers in numbersList]+[0])
+	(digits,lengths)=digitMatrix(numbersList,width)
+	P=prefixValues(digits)
+	allRows=np.arange(len(numbersList))
+
+	blocks=[]
+	def addBlock(rows,system,region,latDegDigits,lonDegIndex,lonDegDigits,latMinDigits,latSecDigits,lonMinDigits,lonSecDigits,lat,lon):
+		blocks.append((rows,np.full(len(rows),system),np.full(len(rows),region),np.full(len(rows),latDegDigits),
+			np.full(len(rows),lonDegIndex),np.full(len(rows),lonDegDigits),
+			np.broadcast_to(latMinDigits,len(rows)),np.broadcast_to(latSecDigits,len(rows)),
+			np.broadcast_to(lonMinDigits,len(rows)),np.broadcast_to(lonSecDigits,len(rows)),
+			lat,lon))
+
+	# rows already covered by an earlier (overlapping) hypothesis, for each
+	#  (hemispheres,latWidth,lonDegIndex,lonWidth) split
+	used={}
+	for (region,plan) in enumerate(buckshot_engine.regionPlans):
+		latSign=plan.latSign
+		lonSign=plan.lonSign
+		for (latWidth,latDegs) in plan.latDegs:
+			if latWidth>width:
+				continue
+			# whole degrees of a given width are possible if their value is in
+			#  range (same as the digit string being in the region plan's set)
+			latValid=(lengths>=latWidth)&(P[:,latWidth]>=plan.region.latMin)&(P[:,latWidth]<=plan.region.latMax)
+			if not latValid.any():
+				continue
+			for (lonWidth,lonDegs,lonFirstDigits) in plan.lonDegs:
+				# each possible longitude start index, i.e. each possible lat/lon split
+				for lonDegIndex in range(latWidth,width-lonWidth+1):
+					lonEnd=lonDegIndex+lonWidth
+					lonValues=P[:,lonEnd]-P[:,lonDegIndex]*IPOW10[lonWidth]
+					mask=latValid&(lengths>=lonEnd)&(lonValues>=plan.region.lonMin)&(lonValues<=plan.region.lonMax)
+					key=(plan.hemispheres,latWidth,lonDegIndex,lonWidth)
+					if key in used:
+						mask&=~used[key]
+						used[key]|=mask
+					else:
+						used[key]=mask
+					rows=allRows[mask]
+					if len(rows)==0:
+						continue
+					Pr=P[rows]
+					lengthsr=lengths[rows]
+					latDegValue=Pr[:,latWidth].astype(np.float64)
+					lonDegValue=(Pr[:,lonEnd]-Pr[:,lonDegIndex]*IPOW10[lonWidth]).astype(np.float64)
+					lat=Side(Pr,latWidth,np.full(len(rows),lonDegIndex))
+					lon=Side(Pr,lonEnd,lengthsr)
+					ids=(region,latWidth,lonDegIndex,lonWidth)
+
+					# Dd: whole degrees, with everything else right-of-decimal
+					latDd=Side(Pr,0,np.full(len(rows),lonDegIndex)).decimal(latWidth)
+					lonDd=Side(Pr,lonDegIndex,lengthsr).decimal(lonWidth)
+					addBlock(rows,0,*ids,0,0,0,0,latSign*latDd,lonSign*lonDd)
+
+					# DMm: every possible lat minutes with every possible lon minutes
+					lonMinutes=lon.minuteChoices()
+					for (latMinDigits,latOk,latMinTerm) in lat.minuteChoices():
+						for (lonMinDigits,lonOk,lonMinTerm) in lonMinutes:
+							ok=latOk&lonOk
+							if ok.any():
+								addBlock(rows[ok],1,*ids,latMinDigits,0,lonMinDigits,0,
+									latSign*(latDegValue+latMinTerm)[ok],lonSign*(lonDegValue+lonMinTerm)[ok])
+
+					# DMSs: every possible lat minutes/seconds with every possible lon minutes/seconds
+					lonSeconds=lon.secondChoices()
+					for (latMinDigits,latSecDigits,latOk,latMinTerm,latSecTerm) in lat.secondChoices():
+						for (lonMinDigits,lonSecDigits,lonOk,lonMinTerm,lonSecTerm) in lonSeconds:
+							ok=latOk&lonOk
+							if ok.any():
+								addBlock(rows[ok],2,*ids,latMinDigits,latSecDigits,lonMinDigits,lonSecDigits,
+									latSign*(latDegValue+latMinTerm+latSecTerm)[ok],lonSign*(lonDegValue+lonMinTerm+lonSecTerm)[ok])
+
+	if not blocks:
+		empty=np.zeros(0,dtype=np.int64)
+		return CandidateColumns(empty,empty,empty,empty,empty,empty,empty,empty,empty,empty,
+			np.zeros(0),np.zeros(0),skipped)
+	columns=[np.concatenate([block[k] for block in blocks]) for k in range(12)]
+	# blocks were produced in split order, so a stable sort by row and system
+	#  gives the same order as the scalar engine
+	order=np.argsort(columns[0]*3+columns[1],kind="stable")
+	columns=[column[order].astype(np.float64 if k>=10 else np.int64) for (k,column) in enumerate(columns)]
+	return CandidateColumns(*columns,skipped)
+
+# candidateAt - build the buckshot_engine.Candidate record for candidate k of
+#  a CandidateColumns result, given the same digit strings (e.g. for display);
+#  the region hypotheses must not have changed since generateColumns
+def candidateAt(columns,numbersList,k):
+	numbers=numbersList[columns.row[k]]
+	system=systemNames[columns.system[k]]
+	plan=buckshot_engine.regionPlans[columns.region[k]]
+	latDegDigits=int(columns.latDegDigits[k])
+	lonDegIndex=int(columns.lonDegIndex[k])
+	lonEnd=lonDegIndex+int(columns.lonDegDigits[k])
+	latRest=numbers[latDegDigits:lonDegIndex]
+	lonRest=numbers[lonEnd:]
+	(latMin,latSec,latFrac)=splitComponents(system,latRest,columns.latMinDigits[k],columns.latSecDigits[k])
+	(lonMin,lonSec,lonFrac)=splitComponents(system,lonRest,columns.lonMinDigits[k],columns.lonSecDigits[k])
+	return buckshot_engine.Candidate(system,numbers[:latDegDigits],latMin,latSec,latFrac,plan.latHemisphere,
+		numbers[lonDegIndex:lonEnd],lonMin,lonSec,lonFrac,plan.lonHemisphere,
+		float(columns.lat[k]),float(columns.lon[k]),buckshot_engine.noMatch)
+
+# splitComponents - (whole minutes,whole seconds,right-of-decimal) digit
+#  strings of one side, from its layout
+def splitComponents(system,rest,minDigits,secDigits):
+	if system=="Dd":
+		return (None,None,rest or "0")
+	if system=="DMm":
+		return (rest[:minDigits],None,rest[minDigits:] or "0")
+	return (rest[:minDigits],rest[minDigits:minDigits+secDigits] or "0",rest[minDigits+secDigits:] or "0")
@@ -0,0 +1,17 @@
+# the buckshot modules are flat top-level modules in the repository root
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0,os.path.join(os.path.dirname(os.path.abspath(__file__)),".."))
+
+import buckshot_engine
+
+# the engine's settings are module state; put them back after every test
+@pytest.fixture(autouse=True)
+def defaultEngine():
+	yield
+	buckshot_engine.setRegions(buckshot_engine.regionPresets["default"])
+	buckshot_engine.setUSNGDefault(None,None)
+	buckshot_engine.setCacheSize(buckshot_engine.cacheSize)
@@ -0,0 +1,115 @@
+import json
+import math
+import random
+from collections import namedtuple
+
+import pytest
+
+import buckshot_area
+
+# a 0.4 degree square with a 0.1 degree square hole, as (lon,lat) rings
+outer=[(-120.4,39.0),(-120.0,39.0),(-120.0,39.4),(-120.4,39.4)]
+hole=[(-120.3,39.1),(-120.2,39.1),(-120.2,39.2),(-120.3,39.2)]
+
+# star - a star-shaped ring with many vertices, so that the grid has cells
+#  with and without edges
+def star(lat,lon,points=60,r1=0.05,r2=0.2):
+	ring=[]
+	for n in range(points*2):
+		r=r2 if n%2==0 else r1
+		a=math.pi*n/points
+		ring.append((lon+r*math.cos(a)/math.cos(math.radians(lat)),lat+r*math.sin(a)))
+	return ring
+
+# bruteContains, bruteDistance - even-odd crossing count and nearest edge
+#  over every edge, without the grid or the R-tree
+def bruteContains(area,x,y):
+	inside=False
+	for (x1,y1,x2,y2) in area.edges:
+		if (y1>y)!=(y2>y) and x<x1+(y-y1)*(x2-x1)/(y2-y1):
+			inside=not inside
+	return inside
+
+def bruteDistance(area,x,y):
+	return math.sqrt(min(buckshot_area.segmentDistance2(x,y,edge) for edge in area.edges))
+
+def test_contains_with_hole():
+	area=buckshot_area.IncidentArea([outer,hole])
+	assert area.contains(39.05,-120.05)
+	assert area.contains(39.3,-120.35)
+	assert not area.contains(39.15,-120.25) # in the hole
+	assert not area.contains(39.5,-120.2) # north of it
+	assert not area.contains(39.2,-119.9) # east of it
+	assert area.plausibility(39.15,-120.25).inside is False
+	assert area.describe(39.05,-120.05)=="inside incident area"
+	# the hole's east and west edges are 0.05 degrees of longitude away
+	assert abs(area.distance(39.15,-120.25)-0.05*area.kx)<1.0
+	assert area.describe(39.15,-120.25)=="outside incident area (4.3 km)"
+
+# points in cells that an edge crosses are counted edge by edge, points in
+#  the other cells are looked up; both must agree with a full crossing count
+def test_contains_matches_crossing_count_in_edge_and_plain_cells():
+	area=buckshot_area.IncidentArea([star(39.2,-120.2),star(39.2,-120.2,points=12,r1=0.01,r2=0.03)])
+	rnd=random.Random(1)
+	kinds=set()
+	for n in range(5000):
+		(lat,lon)=(39.2+rnd.uniform(-0.25,0.25),-120.2+rnd.uniform(-0.3,0.3))
+		(x,y)=area.project(lat,lon)
+		kinds.add(area.cellOf(x,y) in area.edgeCells)
+		assert area.contains(lat,lon)==bruteContains(area,x,y),(lat,lon)
+	assert kinds=={True,False}
+
+def test_distance_matches_nearest_edge():
+	area=buckshot_area.IncidentArea([star(39.2,-120.2,points=200),hole])
+	rnd=random.Random(2)
+	for n in range(500):
+		# near the boundary and far from it
+		spread=rnd.choice([0.3,3.0])
+		(lat,lon)=(39.2+rnd.uniform(-spread,spread),-120.2+rnd.uniform(-spread,spread))
+		(x,y)=area.project(lat,lon)
+		assert area.distance(lat,lon)==pytest.approx(bruteDistance(area,x,y),abs=1e-6),(lat,lon)
+
+Point=namedtuple("Point","name lat lon")
+
+def test_rank_candidates_inside_first_then_nearest():
+	area=buckshot_area.IncidentArea([outer,hole])
+	candidates=(
+		Point("far",41.0,-120.2),
+		Point("in1",39.05,-120.05),
+		Point("near",39.43,-120.2),
+		Point("hole",39.15,-120.25),
+		Point("in2",39.35,-120.35))
+	ranked=area.rankCandidates(candidates)
+	# near is 0.03 degrees of latitude (3.3 km) out, the hole's middle 0.05
+	#  degrees of longitude (4.3 km) from its edges
+	assert [c.name for c in ranked]==["in1","in2","near","hole","far"]
+
+def test_geojson_multipolygon_and_feature_collection(tmp_path):
+	square=lambda lat,lon: [[lon,lat],[lon+0.1,lat],[lon+0.1,lat+0.1],[lon,lat+0.1],[lon,lat]]
+	collection={"type":"FeatureCollection","features":[
+		{"type":"Feature","properties":{},"geometry":{"type":"MultiPolygon","coordinates":[
+			[square(39.0,-120.0)],
+			[[[-121.5,39.0],[-121.0,39.0],[-121.0,39.5],[-121.5,39.5]],square(39.2,-121.3)]]}},
+		{"type":"Feature","properties":{},"geometry":{"type":"Polygon","coordinates":[square(40.0,-122.0)]}},
+		{"type":"Feature","properties":{},"geometry":{"type":"Point","coordinates":[-119.0,38.0]}},
+		{"type":"Feature","properties":{},"geometry":None}]}
+	filename=tmp_path/"area.geojson"
+	filename.write_text(json.dumps(collection),encoding="utf-8")
+	assert len(buckshot_area.geoJSONRings(collection))==4
+	area=buckshot_area.loadArea(str(filename))
+	assert area.name=="area.geojson"
+	assert area.contains(39.05,-119.95)
+	assert area.contains(39.1,-121.4)
+	assert not area.contains(39.25,-121.25) # the second polygon's hole
+	assert area.contains(40.05,-121.95)
+	assert not area.contains(38.0,-119.0)
+
+def test_no_rings_is_an_error(tmp_path):
+	with pytest.raises(ValueError):
+		buckshot_area.IncidentArea([])
+	with pytest.raises(ValueError):
+		buckshot_area.IncidentArea([[(-120.0,39.0),(-120.1,39.1)]])
+	filename=tmp_path/"points.geojson"
+	filename.write_text(json.dumps({"type":"Point","coordinates":[-120.0,39.0]}),encoding="utf-8")
+	with pytest.raises(ValueError):
+		buckshot_area.loadArea(str(filename))
@@ -0,0 +1,66 @@
+import io
+import json
+import logging
+import os
+import subprocess
+import sys
+
+import buckshot_cli
+
+repoDir=os.path.join(os.path.dirname(os.path.abspath(__file__)),"..")
+
+# runCLI - run buckshot_cli.main(args) in a fresh interpreter, with an ASCII
+#  locale so that any file opened without an explicit encoding fails on
+#  non-ASCII text (the arguments are passed as Python source, since the
+#  command line itself would be decoded with that locale)
+def runCLI(args,cwd):
+	env=dict(os.environ,PYTHONUTF8="0",PYTHONCOERCECLOCALE="0",LC_ALL="C")
+	code="import sys; sys.path.insert(0,%r); import buckshot_cli; sys.exit(buckshot_cli.main(%s))" % (repoDir,ascii(args))
+	return subprocess.run([sys.executable,"-c",code],cwd=cwd,env=env,capture_output=True,universal_newlines=True,errors="replace")
+
+def test_batch_gpx_is_utf8(tmp_path):
+	(tmp_path/"in.txt").write_text("39 22.3 120 11.5\n",encoding="utf-8")
+	result=runCLI(["batch","in.txt","-o","out.jsonl","--gpx","out.gpx","--marker-name","Pe\u00f1a","-j","1"],str(tmp_path))
+	assert result.returncode==0,result.stderr
+	text=(tmp_path/"out.gpx").read_bytes().decode("utf-8")
+	assert "<name>Pe\u00f1a1_Dd1</name>" in text
+
+jsonlInput='{"coords":"3922312011"}\nnot json\n[1,2]\n7\n\n{"other":"x"}\n{"coords":"39 22.3 120 11.5"}\n'
+
+# a jsonl line that isn't a JSON object is logged and becomes an empty
+#  record; the record numbers still count the non-blank lines
+def test_jsonl_lines_that_are_not_objects(caplog):
+	with caplog.at_level(logging.WARNING,logger="buckshot.cli"):
+		records=list(buckshot_cli.readRecords(io.StringIO(jsonlInput),"jsonl",None))
+	assert records==[(1,"3922312011"),(2,""),(3,""),(4,""),(5,""),(6,"39 22.3 120 11.5")]
+	assert [r.getMessage().split(":")[0] for r in caplog.records]==["record 2 skipped","record 3 skipped","record 4 skipped"]
+
+def test_batch_continues_past_bad_jsonl_lines():
+	out=io.StringIO()
+	count=buckshot_cli.runBatch(io.StringIO(jsonlInput),out,"jsonl","jsonl",jobs=1)
+	assert count==6
+	rows=[json.loads(line) for line in out.getvalue().splitlines()]
+	assert set(row["record"] for row in rows)=={1,6}
+
+# batch mode exports the same candidate counts as the window, whether the
+#  chunks run here or in worker processes
+def test_batch_metrics_file(tmp_path):
+	(tmp_path/"in.txt").write_text("39 22.3 120 11.5\n3922312011\n",encoding="utf-8")
+	counts=[]
+	for jobs in ("1","2"):
+		result=runCLI(["batch","in.txt","-o","out.jsonl","-j",jobs,"--chunk-size","1","--metrics-file","m.prom"],str(tmp_path))
+		assert result.returncode==0,result.stderr
+		lines=(tmp_path/"m.prom").read_text().splitlines()
+		counts.append(sorted(line for line in lines if line.startswith("buckshot_candidates_generated_total{")))
+	assert counts[0] and counts[0]==counts[1]
+
+# the world preset is allowed, with a warning about how many candidates it
+#  gives; ordinary regions aren't warned about
+def test_wide_region_warning(caplog):
+	parser=buckshot_cli.makeParser()
+	with caplog.at_level(logging.WARNING,logger="buckshot.cli"):
+		buckshot_cli.setRegionsFromArgs(parser.parse_args(["filter","--region","conus","--region","alaska"]))
+		assert not caplog.records
+		buckshot_cli.setRegionsFromArgs(parser.parse_args(["filter","--region","world"]))
+	assert [r.getMessage().split(" cover ")[0] for r in caplog.records]==["regions world-NW+world-NE+world-SW+world-SE"]
+	assert len(buckshot_cli.buckshot_engine.regions)==4
@@ -0,0 +1,91 @@
+import random
+
+import pytest
+
+import buckshot_cluster
+import buckshot_engine
+import buckshot_export
+from buckshot_engine import bestMatchLabelPrefix,closeMatchLabelPrefix
+
+metersPerDegree=111195.0 # of latitude
+
+# candidateSet - a CandidateSet with candidates at given points, each given
+#  as (lat,lon) or (lat,lon,match); the digit fields are only for the text
+def candidateSet(Dd=(),DMm=(),DMSs=()):
+	def make(system,points):
+		candidates=[]
+		for point in points:
+			match=point[2] if len(point)>2 else buckshot_engine.noMatch
+			c=buckshot_engine.makeCandidate(system,"39","22","18","0","120","11","30","0")
+			candidates.append(c._replace(lat=point[0],lon=point[1],match=match))
+		return tuple(candidates)
+	return buckshot_engine.CandidateSet("","","",make("Dd",Dd),make("DMm",DMm),make("DMSs",DMSs),())
+
+def markersFor(candidates):
+	best=[c for c in buckshot_engine.allCandidates(candidates) if c.match==buckshot_engine.exactMatch]
+	return buckshot_export.makeMarkers(candidates,"X",best[0] if best else None)
+
+def titles(markerList):
+	return [m.title for m in markerList]
+
+(lat0,lon0)=(39.37,-120.19)
+
+def test_merged_title_and_description():
+	candidates=candidateSet(
+		DMm=[(lat0+0.5,lon0),(lat0,lon0)],
+		DMSs=[(lat0+1.0,lon0),(lat0-1.0,lon0),(lat0,lon0+1.0),(lat0,lon0-1.0),(lat0+2/metersPerDegree,lon0)])
+	markerList=markersFor(candidates)
+	merged=buckshot_cluster.clusterMarkers(markerList,candidates,10)
+	assert titles(merged)==["X_DMm1","X_DMm2/DMSs5","X_DMSs1","X_DMSs2","X_DMSs3","X_DMSs4"]
+	marker=merged[1]
+	assert (marker.lat,marker.lon)==(lat0,lon0)
+	text=candidates.DMm[1].text()
+	assert "2 interpretations within 10 m: X_DMm2 = "+text+"; X_DMSs5 = "+candidates.DMSs[4].text() in marker.description
+	# lone markers are passed through as they are
+	assert merged[0]==markerList[0]
+
+# the best match leads its cluster, and keeps its place and position,
+#  even when it comes after the other members
+def test_best_match_leads_even_when_later():
+	candidates=candidateSet(
+		Dd=[(lat0,lon0)],
+		DMm=[(lat0+0.5,lon0),(lat0+3/metersPerDegree,lon0,buckshot_engine.closeMatch)],
+		DMSs=[(lat0+1.0,lon0),(lat0+5/metersPerDegree,lon0,buckshot_engine.exactMatch)])
+	merged=buckshot_cluster.clusterMarkers(markersFor(candidates),candidates,10)
+	# (the members follow in the same priority order: close match first)
+	best=bestMatchLabelPrefix+"X_DMSs2"
+	assert titles(merged)==["X_DMm1","X_DMSs1",best+"/DMm2/Dd"]
+	assert (merged[2].lat,merged[2].lon)==(candidates.DMSs[1].lat,candidates.DMSs[1].lon)
+	assert merged[2].symbol==buckshot_export.bestMatchSymbol
+	# without the best match, the close match leads ahead of the earlier Dd
+	candidates=candidates._replace(DMSs=candidates.DMSs[:1])
+	merged=buckshot_cluster.clusterMarkers(markersFor(candidates),candidates,10)
+	assert titles(merged)==["X_DMm1",closeMatchLabelPrefix+"X_DMm2/Dd","X_DMSs"]
+
+# members join the first leader within the radius; clusters don't chain
+def test_clusters_do_not_chain():
+	candidates=candidateSet(DMm=[(lat0,lon0),(lat0+8/metersPerDegree,lon0),(lat0+16/metersPerDegree,lon0)])
+	merged=buckshot_cluster.clusterMarkers(markersFor(candidates),candidates,10)
+	assert titles(merged)==["X_DMm1/DMm2","X_DMm3"]
+
+@pytest.mark.parametrize("radius",[0,-5])
+def test_radius_zero_or_less_is_a_no_op(radius):
+	candidates=candidateSet(DMm=[(lat0,lon0),(lat0,lon0)],DMSs=[(lat0,lon0)])
+	markerList=markersFor(candidates)
+	assert buckshot_cluster.clusterMarkers(markerList,candidates,radius)==markerList
+	assert buckshot_cluster.clusterMarkers(markerList[:1],candidates,100)==markerList[:1]
+
+def test_pure_python_distances_match_numpy(monkeypatch):
+	pytest.importorskip("numpy")
+	rnd=random.Random(5)
+	lats=[rnd.uniform(-90,90) for n in range(40)]+[lat0,lat0,-lat0,0.0]
+	lons=[rnd.uniform(-180,180) for n in range(40)]+[lon0,lon0,lon0+180,0.0]
+	withNumPy=buckshot_cluster.pairwiseDistances(lats,lons)
+	monkeypatch.setattr(buckshot_cluster,"np",None)
+	pure=buckshot_cluster.pairwiseDistances(lats,lons)
+	assert len(pure)==len(withNumPy)==len(lats)
+	for (row1,row2) in zip(pure,withNumPy):
+		assert row1==pytest.approx(row2,rel=1e-9,abs=1e-6)
+	assert pure[40][41]==0.0
+	# antipodes are half the circumference apart
+	assert pure[40][42]==pytest.approx(buckshot_cluster.earthRadius*3.141592653589793)
@@ -0,0 +1,128 @@
+import pickle
+import struct
+
+import pytest
+
+import buckshot_datum
+import buckshot_engine
+import buckshot_export
+
+# a synthetic NADCON grid: 30 columns from 121 W every 0.05 degrees, 5 rows
+#  from 39 N every 0.1 degrees; the shifts (arc-seconds, longitude positive
+#  west) are bilinear in the row and column, so that interpolation gives
+#  them exactly between the nodes
+(ncols,nrows,xmin,dx,ymin,dy)=(30,5,-121.0,0.05,39.0,0.1)
+
+def latShift(row,col):
+	return 1.0+0.1*row+0.01*col+0.02*row*col
+
+def lonShift(row,col):
+	return 2.0+0.2*col-0.05*row-0.01*row*col
+
+def writeShiftFile(filename,shift,byteOrder):
+	record=(ncols+1)*4
+	header=struct.pack(byteOrder+buckshot_datum.headerFormat,b"NADCON test grid",b"NADGRD",ncols,nrows,1,xmin,dx,ymin,dy,0.0)
+	data=header+b"\0"*(record-len(header))
+	for row in range(nrows):
+		data+=struct.pack(byteOrder+"%df" % (ncols+1),0.0,*[shift(row,col) for col in range(ncols)])
+	filename.write_bytes(data)
+
+def writeGrid(directory,name,byteOrder="<"):
+	writeShiftFile(directory/(name+".las"),latShift,byteOrder)
+	writeShiftFile(directory/(name+".los"),lonShift,byteOrder)
+	return str(directory/name)
+
+# expected - the position of a point read in the grid's datum
+def expected(lat,lon):
+	(row,col)=((lat-ymin)/dy,(lon-xmin)/dx)
+	return (lat+latShift(row,col)/3600.0,lon-lonShift(row,col)/3600.0)
+
+@pytest.fixture
+def datum(tmp_path):
+	d=buckshot_datum.parseDatumSpec("NAD27="+writeGrid(tmp_path,"conus"))
+	yield d
+	d.close()
+
+def test_header(tmp_path):
+	for byteOrder in "<>":
+		base=writeGrid(tmp_path,"grid"+byteOrder.replace("<","LE").replace(">","BE"),byteOrder)
+		grid=buckshot_datum.ShiftGrid(base+".las")
+		assert grid.las.byteOrder==byteOrder
+		assert (grid.las.ncols,grid.las.nrows)==(ncols,nrows)
+		assert (grid.south,grid.west)==(ymin,xmin)
+		assert grid.north==pytest.approx(39.4)
+		assert grid.east==pytest.approx(-119.55)
+		assert grid.shift(39.2,-120.85)==pytest.approx((latShift(2,3)/3600.0,-lonShift(2,3)/3600.0))
+		grid.close()
+
+def test_shift_at_node_and_cell_midpoint(datum):
+	# at a node, the shift is the node's value
+	assert datum.convert(39.2,-120.85)==pytest.approx(expected(39.2,-120.85),abs=1e-9)
+	assert datum.convert(39.2,-120.85)[0]==pytest.approx(39.2+latShift(2,3)/3600.0,abs=1e-9)
+	# halfway between four nodes, it is their average
+	mid=datum.convert(39.25,-120.825)
+	corners=[(2,3),(2,4),(3,3),(3,4)]
+	assert mid[0]==pytest.approx(39.25+sum(latShift(*c) for c in corners)/4/3600.0,abs=1e-9)
+	assert mid[1]==pytest.approx(-120.825-sum(lonShift(*c) for c in corners)/4/3600.0,abs=1e-9)
+	# the grid's corners and edges are inside
+	for (lat,lon) in ((39.0,-121.0),(39.4,-119.55),(39.4,-120.0),(39.05,-119.55)):
+		assert datum.convert(lat,lon)==pytest.approx(expected(lat,lon),abs=1e-9)
+
+def test_outside_the_grid(datum):
+	for (lat,lon) in ((38.99,-120.5),(39.41,-120.5),(39.2,-121.01),(39.2,-119.5),(-39.2,120.85)):
+		assert datum.convert(lat,lon) is None
+
+# convertMany shifts larger batches with NumPy; that must give the same as
+#  converting the points one by one
+def test_batched_matches_single(datum):
+	pytest.importorskip("numpy")
+	lats=[38.95+0.5*n/40 for n in range(41)]
+	lons=[-121.05+1.6*n/40 for n in range(41)]
+	for (point,single) in zip(datum.convertMany(lats,lons),[datum.convert(lat,lon) for (lat,lon) in zip(lats,lons)]):
+		if single is None:
+			assert point is None
+		else:
+			assert point==pytest.approx(single,abs=1e-9)
+
+def test_expand_markers(tmp_path,datum):
+	c=buckshot_engine.makeCandidate("DMm","39","12","","0","120","51","","0")
+	candidates=buckshot_engine.CandidateSet("","","",(),(c,c._replace(lat=45.0)),(),())
+	markerList=buckshot_export.makeMarkers(candidates,"X")
+	expanded=buckshot_datum.expandMarkers(markerList,[datum])
+	assert [m.title for m in expanded]==["X_DMm1","X_DMm1_NAD27","X_DMm2"]
+	assert expanded[0]==markerList[0] and expanded[2]==markerList[1]
+	shifted=expanded[1]
+	assert (shifted.lat,shifted.lon)==pytest.approx(expected(39.2,-120.85),abs=1e-9)
+	assert shifted.description=="if read in NAD27 - "+markerList[0].description
+	# a second datum adds its own marker after the first one's
+	other=buckshot_datum.Datum("OLD",[buckshot_datum.ShiftGrid(writeGrid(tmp_path,"old",">"))])
+	assert [m.title for m in buckshot_datum.expandMarkers(markerList,[datum,other])]==["X_DMm1","X_DMm1_NAD27","X_DMm1_OLD","X_DMm2"]
+	assert buckshot_datum.expandMarkers(markerList,[])==markerList
+	other.close()
+
+def test_pickled_datum_converts_the_same(datum):
+	position=datum.convert(39.25,-120.825)
+	copy=pickle.loads(pickle.dumps(datum))
+	assert copy.convert(39.25,-120.825)==position
+	copy.close()
+
+def test_bad_grids(tmp_path):
+	for spec in ("NAD27","=/grids/conus","NAD27="):
+		with pytest.raises(ValueError):
+			buckshot_datum.parseDatumSpec(spec)
+	with pytest.raises(ValueError):
+		buckshot_datum.ShiftGrid(str(tmp_path/"missing"))
+	(tmp_path/"short.las").write_bytes(b"\0"*40)
+	(tmp_path/"short.los").write_bytes(b"\0"*40)
+	with pytest.raises(ValueError):
+		buckshot_datum.ShiftGrid(str(tmp_path/"short"))
+	# a header that doesn't match the file size
+	writeGrid(tmp_path,"cut")
+	data=(tmp_path/"cut.los").read_bytes()
+	(tmp_path/"cut.los").write_bytes(data[:-4])
+	with pytest.raises(ValueError):
+		buckshot_datum.ShiftGrid(str(tmp_path/"cut"))
+
+def test_shift_distance():
+	assert buckshot_datum.shiftDistance(39.0,-120.0,39.0,-120.0)==0.0
+	assert buckshot_datum.shiftDistance(39.0,-120.0,39.001,-120.0)==pytest.approx(111.195)
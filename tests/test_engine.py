@@ -0,0 +1,203 @@
+import random
+
+import pytest
+
+import buckshot_engine
+
+# makeCorpus - digit strings and typed readings: random digits of every
+#  length, strings that have the default region's whole degrees in them,
+#  and readings with delimiters, as bench_engine generates them
+def makeCorpus(count,seed=1234):
+	rnd=random.Random(seed)
+	corpus=[]
+	for n in range(count):
+		kind=n%3
+		if kind==0:
+			corpus.append("".join(rnd.choice("0123456789") for i in range(rnd.randint(0,16))))
+		elif kind==1:
+			digits=lambda k:"".join(rnd.choice("0123456789") for i in range(k))
+			corpus.append(str(rnd.randint(20,49))+digits(rnd.randint(0,6))+str(rnd.randint(100,129))+digits(rnd.randint(0,6)))
+		else:
+			delimiter=rnd.choice([" ",".","d","m","'",'"'," x "])
+			lat=str(rnd.randint(20,49))+delimiter+"".join(rnd.choice("0123456789") for i in range(rnd.randint(1,6)))
+			lon=str(rnd.randint(100,129))+delimiter+"".join(rnd.choice("0123456789") for i in range(rnd.randint(1,6)))
+			corpus.append(lat+" "+lon)
+	return corpus
+
+corpus=makeCorpus(3000)
+
+# the enumeration as it was before the split plans (latitude 20-49 north,
+#  longitude 100-129 west), as
+#  (system,latDeg,latMin,latSec,latFrac,lonDeg,lonMin,lonSec,lonFrac,lat,lon)
+
+def oldSplitRest(rest):
+	(min1,min2,sec11,sec12,sec21,sec22)=("99",)*6
+	(min1Rest,min2Rest,sec11Rest,sec12Rest,sec21Rest,sec22Rest)=("",)*6
+	if len(rest)>0:
+		min1=rest[0]
+		if len(rest)>1:
+			min1Rest=rest[1:]
+			min2=rest[0:2]
+			if len(rest)>2:
+				min2Rest=rest[2:]
+			if len(min1Rest)>0:
+				sec1=min1Rest[0:]
+				if len(sec1)>0:
+					sec11=sec1[0]
+					if len(sec1)>1:
+						sec11Rest=sec1[1:]
+						sec12=sec1[0:2]
+						if len(sec1)>2:
+							sec12Rest=sec1[2:]
+						if len(min2Rest)>0:
+							sec2=min2Rest[0:]
+							if len(sec2)>0:
+								sec21=sec2[0]
+								if len(sec2)>1:
+									sec21Rest=sec2[1:]
+									sec22=sec2[0:2]
+									if len(sec2)>2:
+										sec22Rest=sec2[2:]
+					else:
+						sec21="0"
+			else:
+				sec11="0"
+	minutes=[]
+	if int(min1)<10:
+		minutes.append((min1,min1Rest or "0"))
+	if 9<int(min2)<60:
+		minutes.append((min2,min2Rest or "0"))
+	seconds=[]
+	if int(sec11)<10:
+		seconds.append((min1,sec11,sec11Rest or "0"))
+	if int(sec12)<60:
+		seconds.append((min1,sec12,sec12Rest or "0"))
+	if int(sec21)<10:
+		seconds.append((min2,sec21,sec21Rest or "0"))
+	if int(sec22)<60:
+		seconds.append((min2,sec22,sec22Rest or "0"))
+	return (rest or "0",minutes,seconds)
+
+def oldCalcLatLon(numbers):
+	result=[]
+	if not (len(numbers)>0 and 1<int(numbers[0])<5):
+		return result
+	latDeg=numbers[0:2]
+	for i in range(2,len(numbers)-2):
+		if not (numbers[i]=="1" and numbers[i+1] in "012" and numbers[i+2] in "0123456789"):
+			continue
+		lonDeg=numbers[i:i+3]
+		(latRest,latMinutes,latSeconds)=oldSplitRest(numbers[2:i])
+		(lonRest,lonMinutes,lonSeconds)=oldSplitRest(numbers[i+3:])
+		result.append(("Dd",latDeg,None,None,latRest,lonDeg,None,None,lonRest,
+			float(latDeg+"."+latRest),-float(lonDeg+"."+lonRest)))
+		for (latMin,latFrac) in latMinutes:
+			for (lonMin,lonFrac) in lonMinutes:
+				result.append(("DMm",latDeg,latMin,None,latFrac,lonDeg,lonMin,None,lonFrac,
+					float(latDeg)+float(latMin+"."+latFrac)/60.0,-(float(lonDeg)+float(lonMin+"."+lonFrac)/60.0)))
+		for (latMin,latSec,latFrac) in latSeconds:
+			for (lonMin,lonSec,lonFrac) in lonSeconds:
+				result.append(("DMSs",latDeg,latMin,latSec,latFrac,lonDeg,lonMin,lonSec,lonFrac,
+					float(latDeg)+float(latMin)/60.0+float(latSec+"."+latFrac)/3600.0,
+					-(float(lonDeg)+float(lonMin)/60.0+float(lonSec+"."+lonFrac)/3600.0)))
+	return result
+
+def candidateKey(c):
+	return (c.system,c.latDeg,c.latMin,c.latSec,c.latFrac,c.lonDeg,c.lonMin,c.lonSec,c.lonFrac,c.lat,c.lon)
+
+def digitsOf(coordString):
+	return "".join(ch for ch in coordString if ch.isdigit())
+
+# each rest length's split plan gives the same minute and second layouts as
+#  the old nested branches
+@pytest.mark.parametrize("length",range(9))
+def test_split_plans_match_pre_refactor(length):
+	rnd=random.Random(length)
+	rests=set("".join(rnd.choice("0123456789") for i in range(length)) for n in range(300))
+	rests|=set(prefix+"0"*length for prefix in ("","1","5","6","59","60","09","10"))
+	for rest in rests:
+		rest=rest[:length]
+		(restText,minutes,seconds)=buckshot_engine.sideChoices(rest)
+		assert (restText,[m[:2] for m in minutes],[s[:3] for s in seconds])==oldSplitRest(rest),rest
+
+# same candidates, in the same order, with bit-identical decimal degrees
+def test_calcLatLon_matches_pre_refactor():
+	for coordString in corpus:
+		numbers=digitsOf(coordString)
+		(Dd,DMm,DMSs)=buckshot_engine.calcLatLon(numbers)
+		assert [candidateKey(c) for c in Dd+DMm+DMSs]==sorted(oldCalcLatLon(numbers),key=lambda c:["Dd","DMm","DMSs"].index(c[0])),coordString
+
+# generate grades and sorts the same candidates; a candidate is an exact
+#  match exactly when its short form is the canonical input, as before
+def test_generate_matches_pre_refactor():
+	for coordString in corpus:
+		candidates=buckshot_engine.generate(coordString)
+		candidateList=buckshot_engine.allCandidates(candidates)
+		assert sorted(map(candidateKey,candidateList),key=repr)==sorted(oldCalcLatLon(candidates.numbers),key=repr),coordString
+		for c in candidateList:
+			assert (c.match==buckshot_engine.exactMatch)==(c.short()==candidates.shortCoordString),(coordString,c)
+
+# generate keeps calcLatLon's order, and marks a candidate exact or close
+#  exactly when the full grading does; partial matches only show in
+#  matchGrades
+def test_generate_marks_exact_and_close_matches_in_order():
+	typedShort=[c.short() for coordString in corpus[:300] for c in buckshot_engine.allCandidates(buckshot_engine.generate(coordString))]
+	for coordString in corpus+typedShort:
+		candidates=buckshot_engine.generate(coordString,useCache=False)
+		candidateList=buckshot_engine.allCandidates(candidates)
+		(Dd,DMm,DMSs)=buckshot_engine.calcLatLon(candidates.numbers)
+		assert [c[:-1] for c in candidateList]==[c[:-1] for c in Dd+DMm+DMSs],coordString
+		grades=buckshot_engine.matchGrades(candidates)
+		for (c,(match,score)) in zip(candidateList,grades):
+			if match in (buckshot_engine.exactMatch,buckshot_engine.closeMatch):
+				assert c.match==match,(coordString,c)
+			else:
+				assert c.match==buckshot_engine.noMatch,(coordString,c)
+
+# a cached candidate set is the same as a fresh one
+def test_generate_cache_is_transparent():
+	for coordString in corpus[:500]:
+		assert buckshot_engine.generate(coordString)==buckshot_engine.generate(coordString,useCache=False)
+
+# every candidate lies in one of the regions, with north and east positive
+#  and south and west negative
+def checkRegionCandidates(candidates,regionList):
+	assert candidates
+	for c in candidates:
+		assert (c.latHemisphere=="N" and c.lat>=0) or (c.latHemisphere=="S" and c.lat<=0),c
+		assert (c.lonHemisphere=="E" and c.lon>=0) or (c.lonHemisphere=="W" and c.lon<=0),c
+		assert any(r.latHemisphere==c.latHemisphere and r.lonHemisphere==c.lonHemisphere
+			and r.latMin<=int(c.latDeg)<=r.latMax and r.lonMin<=int(c.lonDeg)<=r.lonMax for r in regionList),c
+
+@pytest.mark.parametrize("name,coordString,point",[
+	("conus","42 21.6 71 3.6",(42.36,-71.06)),
+	("alaska","61 13.0 149 54.0",(61.2167,-149.9)),
+	("hawaii","21 18.6 157 51.5",(21.31,-157.8583)),
+	("0-15S,60-80W","12 2.7 77 2.5",(-12.045,-77.0417)),
+	("30-40N,130-145E","35 41.0 139 41.5",(35.6833,139.6917)),
+	("30-40S,10-25E","33 55.5 18 25.4",(-33.925,18.4233))])
+def test_region_signs(name,coordString,point):
+	regionList=buckshot_engine.lookupRegions(name)
+	buckshot_engine.setRegions(regionList)
+	candidates=buckshot_engine.allCandidates(buckshot_engine.generate(coordString))
+	checkRegionCandidates(candidates,regionList)
+	assert any(abs(c.lat-point[0])<0.001 and abs(c.lon-point[1])<0.001 for c in candidates)
+
+def test_world_region_gives_all_four_hemispheres():
+	regionList=buckshot_engine.lookupRegions("world")
+	buckshot_engine.setRegions(regionList)
+	candidates=buckshot_engine.allCandidates(buckshot_engine.generate("12 34.5 56 12.3"))
+	checkRegionCandidates(candidates,regionList)
+	assert {c.latHemisphere+c.lonHemisphere for c in candidates}=={"NW","NE","SW","SE"}
+	assert buckshot_engine.regionArea(regionList)>buckshot_engine.wideRegionArea
+	assert buckshot_engine.regionArea(buckshot_engine.lookupRegions("conus"))<buckshot_engine.wideRegionArea
+
+@pytest.mark.parametrize("spec",["","nowhere","20-49N","20-49N,100-129","20-49X,100-129W","20-49N,100-129N",
+	"49-20N,100-129W","20-95N,100-129W","20-49N,100-190W","20-49N:4,100-129W","-5-10N,100-129W"])
+def test_bad_region_specs(spec):
+	with pytest.raises(ValueError):
+		buckshot_engine.lookupRegions(spec)
+
+def test_setRegions_needs_a_region():
+	with pytest.raises(ValueError):
+		buckshot_engine.setRegions([])
@@ -0,0 +1,41 @@
+import buckshot_engine
+import buckshot_export
+
+def closeCandidate(candidates):
+	return [c for c in buckshot_engine.allCandidates(candidates) if c.match==buckshot_engine.closeMatch][0]
+
+# a user-selected best match that is also a close match keeps the best match
+#  title prefix, symbol and description
+def test_best_match_takes_precedence_over_close():
+	candidates=buckshot_engine.generate("39 30.5 120 15.25")
+	best=closeCandidate(candidates)
+	markers=buckshot_export.makeMarkers(candidates,"X",best)
+	marker=[m for m in markers if (m.lat,m.lon)==(best.lat,best.lon)][0]
+	assert marker.title=="*X_DMm4"
+	assert marker.symbol==buckshot_export.bestMatchSymbol
+	assert marker.description.startswith("User-selected best match!")
+	assert "CLOSE" not in marker.description
+
+def test_close_match_without_best_match():
+	candidates=buckshot_engine.generate("39 30.5 120 15.25")
+	close=closeCandidate(candidates)
+	markers=buckshot_export.makeMarkers(candidates,"X")
+	marker=[m for m in markers if (m.lat,m.lon)==(close.lat,close.lon)][0]
+	assert marker.title=="+X_DMm4"
+	assert marker.symbol==buckshot_export.closeMatchSymbol
+	assert marker.description.startswith("CLOSE match for specified coordinates")
+	assert not [m for m in markers if m.title.startswith("*")]
+
+# marker indices follow calcLatLon order, whatever the match grades, so that
+#  X_DMm2 is the same position as in earlier releases and saved GPX files
+def test_marker_indices_follow_enumeration_order():
+	for coordString in ["39 30.5 120 15.25","39d30.5m 120d15.25m","3930512015","39 30 30 120 15 15"]:
+		candidates=buckshot_engine.generate(coordString)
+		(Dd,DMm,DMSs)=buckshot_engine.calcLatLon(candidates.numbers)
+		markers=buckshot_export.makeMarkers(candidates,"X")
+		expected=[(c.lat,c.lon) for c in Dd+DMm+DMSs]
+		assert [(m.lat,m.lon) for m in markers]==expected
+		for (system,systemList) in (("DMm",DMm),("DMSs",DMSs)):
+			if len(systemList)>1:
+				titles=[m.title.lstrip("*+") for m in markers if m.title.lstrip("*+").startswith("X_"+system)]
+				assert titles==["X_"+system+str(n+1) for n in range(len(systemList))]
@@ -0,0 +1,111 @@
+from collections import namedtuple
+
+import pytest
+
+import buckshot_engine
+import buckshot_gazetteer
+
+# a few GNIS NationalFile records (and two that are skipped: a location of
+#  0,0 means unknown, and a short line)
+nationalFile="""\ufeffFEATURE_ID|FEATURE_NAME|FEATURE_CLASS|STATE_ALPHA|STATE_NUMERIC|COUNTY_NAME|PRIM_LAT_DEC|PRIM_LONG_DEC
+1|Prosser Hill|Summit|CA|06|Nevada|39.3885|-120.1885
+2|Prosser Creek Reservoir|Reservoir|CA|06|Nevada|39.3793|-120.1477
+3|Prosser Creek|Stream|CA|06|Nevada|39.3713|-120.1224
+4|Donner Lake|Lake|CA|06|Nevada|39.3238|-120.2449
+5|Lake Tahoe|Lake|NV|32|Washoe|39.0968|-120.0324
+6|Mount Rose|Summit|NV|32|Washoe|39.3438|-119.9180
+7|Lost Place|Locale|CA|06|Nevada|0|0
+8|Short Line|Locale
+9|Peña Flat|Flat|CA|06|Nevada|39.2000|-120.5000
+"""
+
+@pytest.fixture
+def gazetteer(tmp_path):
+	filename=tmp_path/"NationalFile.txt"
+	filename.write_bytes(nationalFile.encode("utf-8"))
+	with buckshot_gazetteer.Gazetteer(str(filename)) as g:
+		yield g
+
+def names(features):
+	return [f.name for f in features]
+
+def test_load_skips_unknown_locations(gazetteer):
+	assert len(gazetteer)==7
+	assert "Lost Place" not in names(gazetteer.search("lost"))
+
+def test_search_by_prefix_and_later_words(gazetteer):
+	# names that start with the text first, then names with a later word
+	#  that does, each alphabetically
+	assert names(gazetteer.search("pros"))==["Prosser Creek","Prosser Creek Reservoir","Prosser Hill"]
+	assert names(gazetteer.search("prosser c"))==["Prosser Creek","Prosser Creek Reservoir"]
+	assert names(gazetteer.search("lake"))==["Lake Tahoe","Donner Lake"]
+	assert names(gazetteer.search("creek"))==["Prosser Creek","Prosser Creek Reservoir"]
+	assert names(gazetteer.search("RESERVOIR"))==["Prosser Creek Reservoir"]
+	assert names(gazetteer.search("pena"))==[]
+	assert names(gazetteer.search("peña"))==["Peña Flat"]
+	assert gazetteer.search("zzz")==[]
+	assert gazetteer.search("  ")==[]
+	assert len(gazetteer.search("p",limit=2))==2
+
+def test_feature_fields(gazetteer):
+	feature=gazetteer.search("mount rose")[0]
+	assert feature==buckshot_gazetteer.Feature("Mount Rose","Summit","NV","Washoe",39.3438,-119.918)
+	assert buckshot_gazetteer.featureLabel(feature)=="Mount Rose (Summit), Washoe NV"
+
+def test_states_filter(tmp_path):
+	filename=tmp_path/"NationalFile.txt"
+	filename.write_bytes(nationalFile.encode("utf-8"))
+	with buckshot_gazetteer.Gazetteer(str(filename),states=["nv"]) as g:
+		assert sorted(names(g.search("l")+g.search("m")))==["Lake Tahoe","Mount Rose"]
+
+def test_minimal_tab_file(tmp_path):
+	filename=tmp_path/"places.tsv"
+	filename.write_text("name\tlat\tlon\nBase Camp\t39.1\t-120.1\n",encoding="utf-8")
+	with buckshot_gazetteer.Gazetteer(str(filename)) as g:
+		assert g.search("camp")==[buckshot_gazetteer.Feature("Base Camp","","","",39.1,-120.1)]
+		assert buckshot_gazetteer.featureLabel(g.search("base")[0])=="Base Camp"
+
+def test_missing_columns_and_empty_file(tmp_path):
+	filename=tmp_path/"bad.txt"
+	filename.write_text("name|latitude\nX|39\n",encoding="utf-8")
+	with pytest.raises(ValueError):
+		buckshot_gazetteer.Gazetteer(str(filename))
+	filename.write_text("",encoding="utf-8")
+	with pytest.raises(ValueError):
+		buckshot_gazetteer.Gazetteer(str(filename))
+
+def test_nearest(gazetteer):
+	# about 300 m east of Prosser Hill, 3 km west of Prosser Creek Reservoir
+	(feature,d)=gazetteer.nearest(39.3885,-120.185)
+	assert feature.name=="Prosser Hill"
+	assert d==pytest.approx(buckshot_gazetteer.distance(39.3885,-120.185,39.3885,-120.1885))
+	assert 250<d<350
+	# across a grid cell boundary (39.4)
+	assert gazetteer.nearest(39.401,-120.19)[0].name=="Prosser Hill"
+	assert gazetteer.nearest(39.6,-120.19) is None
+	assert gazetteer.nearest(39.6,-120.19,maxDistance=30000)[0].name=="Prosser Hill"
+
+def test_distance():
+	assert buckshot_gazetteer.distance(39.0,-120.0,39.0,-120.0)==0.0
+	# one degree of latitude is about 111.2 km
+	assert buckshot_gazetteer.distance(39.0,-120.0,40.0,-120.0)==pytest.approx(111195,rel=1e-4)
+
+Point=namedtuple("Point","name lat lon")
+
+def test_rank_candidates_by_distance(gazetteer):
+	landmark=gazetteer.search("donner")[0]
+	candidates=(Point("tahoe",39.1,-120.03),Point("donner",39.32,-120.24),Point("prosser",39.38,-120.15))
+	ranked=buckshot_gazetteer.rankCandidates(candidates,landmark.lat,landmark.lon)
+	assert names(ranked)==["donner","prosser","tahoe"]
+
+def test_rank_candidate_set(gazetteer):
+	landmark=gazetteer.search("prosser hill")[0]
+	candidates=buckshot_engine.generate("3923312011")
+	ranked=buckshot_gazetteer.rankCandidateSet(candidates,landmark.lat,landmark.lon)
+	for system in ("Dd","DMm","DMSs"):
+		before=getattr(candidates,system)
+		after=getattr(ranked,system)
+		assert sorted(after)==sorted(before)
+		distances=[buckshot_gazetteer.distance(landmark.lat,landmark.lon,c.lat,c.lon) for c in after]
+		assert distances==sorted(distances)
+	assert ranked.USNG==candidates.USNG
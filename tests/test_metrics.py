@@ -0,0 +1,104 @@
+import time
+import urllib.error
+import urllib.request
+
+import pytest
+
+import buckshot_engine
+import buckshot_metrics
+import buckshot_sartopo
+import buckshot_timing
+
+@pytest.fixture
+def scrape():
+	port=buckshot_metrics.serve(0)
+	def get():
+		with urllib.request.urlopen("http://127.0.0.1:%d/metrics" % port,timeout=5) as r:
+			assert r.headers["Content-Type"]==buckshot_metrics.contentType
+			return r.read().decode("utf-8")
+	yield get
+	buckshot_metrics.server.shutdown()
+	buckshot_metrics.server.server_close()
+	buckshot_timing.sinks.remove(buckshot_metrics.metrics.stageRecorded)
+	buckshot_metrics.server=None
+	buckshot_metrics.metrics=None
+
+# samples - {sample name with labels:value} of a scrape
+def samples(text):
+	result={}
+	for line in text.splitlines():
+		if line and not line.startswith("#"):
+			(name,value)=line.rsplit(" ",1)
+			result[name]=float(value)
+	return result
+
+# recordStage - feed one duration of a stage through buckshot_timing, as
+#  the instrumented code does
+def recordStage(stage,seconds):
+	buckshot_timing.record(stage,time.perf_counter()-seconds)
+
+def test_hooks_do_nothing_while_off():
+	assert buckshot_metrics.metrics is None
+	buckshot_metrics.candidatesShown(buckshot_engine.generate("3922312011"))
+	buckshot_metrics.exportStarted()
+	buckshot_metrics.uploadError()
+
+def test_counters(scrape):
+	before=samples(scrape())
+	assert before["buckshot_exports_total"]==0
+	assert before["buckshot_markers_uploaded_total"]==0
+	candidates=buckshot_engine.generate("39 22.3 120 11.5")
+	buckshot_metrics.candidatesShown(candidates)
+	buckshot_metrics.exportStarted()
+	marker=buckshot_sartopo.MarkerResult(None,True,200,"",0.1)
+	buckshot_metrics.markerUploaded(marker)
+	buckshot_metrics.markerUploaded(marker._replace(ok=False,status=500,error="HTTP 500"))
+	buckshot_metrics.markerUploaded(marker._replace(ok=False,status=None,error="cancelled"))
+	buckshot_metrics.uploadError()
+	after=samples(scrape())
+	for system in ("Dd","DMm","DMSs"):
+		assert after['buckshot_candidates_generated_total{system="%s"}' % system]==len(getattr(candidates,system))
+	assert 'buckshot_candidates_generated_total{system="USNG"}' not in after
+	assert after["buckshot_exports_total"]==1
+	assert after["buckshot_markers_uploaded_total"]==1
+	assert after["buckshot_marker_upload_failures_total"]==1
+	assert after["buckshot_upload_errors_total"]==1
+	info=buckshot_engine.cacheInfo()
+	assert after["buckshot_candidate_cache_hits_total"]==info.hits
+	assert after["buckshot_candidate_cache_misses_total"]==info.misses
+	assert after["buckshot_candidate_cache_entries"]==info.currsize
+
+# the le buckets are cumulative, and _count is the +Inf bucket
+def test_histogram(scrape):
+	durations=[0.003,0.003,0.03,0.3,3.0,30.0]
+	for seconds in durations:
+		recordStage("render",seconds)
+	recordStage("sartopo marker",0.2)
+	recordStage("enumerate",0.001) # not exported
+	text=scrape()
+	assert "# TYPE buckshot_keystroke_render_seconds histogram" in text
+	s=samples(text)
+	name="buckshot_keystroke_render_seconds"
+	buckets=[(bound,s[name+'_bucket{le="%s"}' % buckshot_metrics.formatValue(bound)]) for bound in buckshot_metrics.keystrokeBuckets]
+	counts=[count for (bound,count) in buckets]
+	assert counts==sorted(counts)
+	for (bound,count) in buckets:
+		assert count==len([seconds for seconds in durations if seconds<=bound])
+	assert s[name+'_bucket{le="+Inf"}']==len(durations)
+	assert s[name+"_count"]==s[name+'_bucket{le="+Inf"}']
+	assert s[name+"_sum"]==pytest.approx(sum(durations),rel=0.01)
+	assert s['buckshot_marker_upload_seconds_bucket{le="0.25"}']==1
+	assert s['buckshot_marker_upload_seconds_bucket{le="0.1"}']==0
+	assert s["buckshot_marker_upload_seconds_count"]==1
+
+def test_not_found(scrape):
+	with pytest.raises(urllib.error.HTTPError) as err:
+		urllib.request.urlopen("http://127.0.0.1:%d/other" % buckshot_metrics.server.server_address[1],timeout=5)
+	assert err.value.code==404
+
+def test_write_file(scrape,tmp_path):
+	path=str(tmp_path/"buckshot.prom")
+	buckshot_metrics.exportStarted()
+	buckshot_metrics.writeFile(path)
+	with open(path) as f:
+		assert samples(f.read())["buckshot_exports_total"]==1
@@ -0,0 +1,94 @@
+import os
+
+import pytest
+
+os.environ.setdefault("QT_QPA_PLATFORM","offscreen")
+QtCore=pytest.importorskip("PyQt5.QtCore")
+from PyQt5.QtTest import QAbstractItemModelTester,QSignalSpy
+from PyQt5.QtWidgets import QApplication
+
+import buckshot
+import buckshot_engine
+
+@pytest.fixture(scope="module")
+def app():
+	return QApplication.instance() or QApplication([])
+
+# model - a CandidateListModel watched by QAbstractItemModelTester; the
+#  tester's complaints are collected in the returned list
+@pytest.fixture
+def model(app):
+	problems=[]
+	def handler(msgType,context,message):
+		if msgType!=QtCore.QtDebugMsg:
+			problems.append(message)
+	old=QtCore.qInstallMessageHandler(handler)
+	m=buckshot.CandidateListModel()
+	tester=QAbstractItemModelTester(m,QAbstractItemModelTester.FailureReportingMode.Warning)
+	yield (m,problems)
+	del tester
+	QtCore.qInstallMessageHandler(old)
+
+def spies(m):
+	return {name:QSignalSpy(getattr(m,name)) for name in ("rowsInserted","rowsRemoved","dataChanged")}
+
+def rows(spy):
+	return [(spy[n][1],spy[n][2]) for n in range(len(spy))]
+
+def changedRows(spy):
+	return [(spy[n][0].row(),spy[n][1].row()) for n in range(len(spy))]
+
+def setText(m,coordString):
+	candidates=buckshot_engine.generate(coordString).DMSs
+	s=spies(m)
+	m.setCandidates(candidates)
+	assert [m.data(m.index(n)) for n in range(m.rowCount())]==[c.label() for c in candidates]
+	return (candidates,s)
+
+def test_grow_inserts_only_the_new_rows(model):
+	(m,problems)=model
+	(first,s)=setText(m,"3922312011")
+	assert rows(s["rowsInserted"])==[(0,len(first)-1)]
+	(second,s)=setText(m,"39 22.3 120 11.5")
+	assert len(second)>len(first)
+	assert rows(s["rowsInserted"])==[(len(first),len(second)-1)]
+	assert rows(s["rowsRemoved"])==[]
+	changed=[n for n in range(len(first)) if first[n]!=second[n]]
+	assert changedRows(s["dataChanged"])==[(changed[0],changed[-1])]
+	assert problems==[]
+
+def test_shrink_removes_only_the_extra_rows(model):
+	(m,problems)=model
+	(first,s)=setText(m,"39 22.3 120 11.5")
+	(second,s)=setText(m,"3922312011")
+	assert rows(s["rowsRemoved"])==[(len(second),len(first)-1)]
+	assert rows(s["rowsInserted"])==[]
+	(third,s)=setText(m,"")
+	assert rows(s["rowsRemoved"])==[(0,len(second)-1)]
+	assert m.rowCount()==0
+	assert problems==[]
+
+def test_equal_length_update_changes_rows_in_place(model):
+	(m,problems)=model
+	(first,s)=setText(m,"3922312011")
+	(second,s)=setText(m,"3922312012")
+	assert len(first)==len(second)
+	assert rows(s["rowsInserted"])==rows(s["rowsRemoved"])==[]
+	changed=[n for n in range(len(first)) if first[n]!=second[n]]
+	assert changed
+	assert changedRows(s["dataChanged"])==[(changed[0],changed[-1])]
+	(third,s)=setText(m,"3922312012")
+	assert len(s["dataChanged"])==0
+	assert problems==[]
+
+# tooltips are kept for the rows still shown and dropped for the others
+def test_tooltips_only_cached_for_current_rows(model):
+	(m,problems)=model
+	(first,s)=setText(m,"39 22.3 120 11.5")
+	for n in range(m.rowCount()):
+		assert "USNG" in m.data(m.index(n),QtCore.Qt.ToolTipRole)
+	(second,s)=setText(m,"3922312011")
+	assert set(m.toolTips)<={(c.lat,c.lon) for c in second}
+	gone={(c.lat,c.lon) for c in first}-{(c.lat,c.lon) for c in second}
+	assert gone and not gone&set(m.toolTips)
+	assert problems==[]
@@ -0,0 +1,80 @@
+import os
+import sys
+import threading
+
+import pytest
+
+pytest.importorskip("requests")
+
+sys.path.insert(0,os.path.join(os.path.dirname(os.path.abspath(__file__)),"..","benchmarks"))
+
+import buckshot_engine
+import buckshot_export
+import buckshot_sartopo
+from sartopo_standin import StandinServer
+
+@pytest.fixture
+def markerList():
+	return buckshot_export.makeMarkers(buckshot_engine.generate("39 22.3 120 11.5"),"X")
+
+def upload(server,markerList,**kwargs):
+	with buckshot_sartopo.SartopoUploader(server.domainAndPort(),"test",4) as uploader:
+		return uploader.uploadMarkers(markerList,"Buckshot",**kwargs)
+
+# every marker arrives once, in a new folder, as the GeoJSON Feature that
+#  sartopo_python sends
+@pytest.mark.parametrize("api",[1,0])
+def test_upload_payload(markerList,api):
+	server=StandinServer(api=api).start()
+	try:
+		results=upload(server,markerList)
+	finally:
+		server.stop()
+	assert [result.marker for result in results]==markerList
+	assert all(result.ok for result in results)
+	assert server.folders==[{"properties":{"title":"Buckshot"}}]
+	assert len(server.markers)==len(markerList)
+	byTitle=dict((j["properties"]["title"],j) for j in server.markers)
+	for marker in markerList:
+		j=byTitle[marker.title]
+		assert j["type"]=="Feature"
+		assert j["geometry"]=={"type":"Point","coordinates":[marker.lon,marker.lat]}
+		assert j["properties"]=={
+			"class":"Marker",
+			"marker-color":marker.color,
+			"marker-symbol":marker.symbol,
+			"title":marker.title,
+			"folderId":1,
+			"description":marker.description}
+
+# failures are reported per marker, and the callback sees every result on
+#  the calling thread
+def test_upload_failures_and_callback(markerList):
+	server=StandinServer(failEvery=3).start()
+	seen=[]
+	try:
+		results=upload(server,markerList,callback=lambda result:seen.append((result,threading.current_thread())))
+	finally:
+		server.stop()
+	failed=[result for result in results if not result.ok]
+	assert len(failed)==len(markerList)//3
+	assert all(result.status==500 for result in failed)
+	assert len(server.markers)==len(markerList)-len(failed)
+	assert sorted(map(id,(result for (result,thread) in seen)))==sorted(map(id,results))
+	assert all(thread is threading.current_thread() for (result,thread) in seen)
+
+def test_cancelled_upload_sends_nothing(markerList):
+	server=StandinServer().start()
+	try:
+		with buckshot_sartopo.SartopoUploader(server.domainAndPort(),"test") as uploader:
+			uploader.cancel()
+			results=uploader.uploadMarkers(markerList)
+	finally:
+		server.stop()
+	assert all(result.error=="cancelled" for result in results)
+	assert server.markers==[]
+
+def test_no_server():
+	with buckshot_sartopo.SartopoUploader("127.0.0.1:9","test",timeout=2) as uploader:
+		with pytest.raises(buckshot_sartopo.SartopoError):
+			uploader.connect()
@@ -0,0 +1,286 @@
+import asyncio
+import json
+from urllib.parse import quote
+
+import pytest
+
+import buckshot_cli
+import buckshot_service
+
+# withService - run client(port) against a service on a free port
+def withService(client):
+	async def run():
+		server=await buckshot_service.start(0,"127.0.0.1")
+		try:
+			return await client(server.sockets[0].getsockname()[1])
+		finally:
+			server.close()
+	return asyncio.run(run())
+
+# request - send one request on a connection and read the response
+# returns a tuple: (status,{lowercase header:value},body bytes)
+async def request(reader,writer,method,target,body=b"",headers=None):
+	lines=["%s %s HTTP/1.1" % (method,target),"Host: localhost"]
+	if body or method=="POST":
+		lines.append("Content-Length: %d" % len(body))
+	lines.extend("%s: %s" % item for item in (headers or {}).items())
+	writer.write(("\r\n".join(lines)+"\r\n\r\n").encode("latin-1")+body)
+	status=int((await reader.readline()).split()[1])
+	responseHeaders={}
+	while True:
+		line=(await reader.readline()).decode("latin-1").strip()
+		if not line:
+			break
+		(name,sep,value)=line.partition(":")
+		responseHeaders[name.lower()]=value.strip()
+	return (status,responseHeaders,await reader.readexactly(int(responseHeaders["content-length"])))
+
+# fetch - one request on a new connection
+def fetch(method,target,body=b"",headers=None):
+	async def client(port):
+		(reader,writer)=await asyncio.open_connection("127.0.0.1",port)
+		try:
+			return await request(reader,writer,method,target,body,headers)
+		finally:
+			writer.close()
+	return withService(client)
+
+def postJSON(target,obj):
+	return fetch("POST",target,json.dumps(obj).encode("utf-8"),{"Content-Type":"application/json"})
+
+readings=["39 22.3 120 11.5","3922312011","39 30.5 120 15.25"]
+
+def test_single_get():
+	(status,headers,body)=fetch("GET","/candidates?coords="+quote(readings[0]))
+	assert status==200
+	assert headers["content-type"]==buckshot_service.jsonType
+	assert json.loads(body)==buckshot_cli.filterRecord(readings[0],"X")
+
+def test_json_batch():
+	(status,headers,body)=postJSON("/candidates",{"coords":readings,"markerName":"R"})
+	assert status==200
+	results=json.loads(body)["results"]
+	assert results==[buckshot_cli.filterRecord(coordString,"R"+str(n+1)) for (n,coordString) in enumerate(readings)]
+
+def test_json_single_with_gpx():
+	(status,headers,body)=postJSON("/candidates",{"coords":readings[2],"gpx":True,"cluster":0})
+	record=json.loads(body)
+	assert status==200
+	assert record["input"]==readings[2]
+	assert record["gpx"].count("<wpt ")==len(record["candidates"])
+	assert "<name>+X_DMm4</name>" in record["gpx"]
+
+def test_text_plain_batch():
+	(status,headers,body)=fetch("POST","/candidates?markerName=T","\n".join(readings).encode("utf-8"),{"Content-Type":"text/plain; charset=utf-8"})
+	assert status==200
+	assert [record["input"] for record in json.loads(body)["results"]]==readings
+	assert json.loads(body)["results"][1]["candidates"][0]["title"].startswith("T2_")
+
+def test_gpx():
+	(status,headers,body)=postJSON("/gpx",{"coords":readings[:2],"cluster":0})
+	assert status==200
+	assert headers["content-type"]==buckshot_service.gpxType
+	text=body.decode("utf-8")
+	assert text.startswith("<?xml")
+	assert text.rstrip().endswith("</gpx>")
+	expected=[marker.title for (n,coordString) in enumerate(readings[:2])
+		for marker in buckshot_cli.recordMarkers(buckshot_cli.recordCandidates(coordString)[0],"X"+str(n+1))]
+	assert text.count("<wpt ")==len(expected)
+	for title in expected:
+		assert "<name>"+title+"</name>" in text
+
+# merging markers within the cluster radius gives fewer waypoints
+def test_gpx_cluster():
+	target="/gpx?coords="+quote("39 30 00 120 30 00")
+	unmerged=fetch("GET",target+"&cluster=0")[2].count(b"<wpt ")
+	merged=fetch("GET",target+"&cluster=10")[2].count(b"<wpt ")
+	assert 0<merged<unmerged
+
+def test_keep_alive():
+	async def client(port):
+		(reader,writer)=await asyncio.open_connection("127.0.0.1",port)
+		responses=[]
+		for coordString in readings+readings:
+			responses.append(await request(reader,writer,"GET","/candidates?coords="+quote(coordString)))
+		responses.append(await request(reader,writer,"GET","/nope"))
+		responses.append(await request(reader,writer,"GET","/candidates?coords=1",headers={"Connection":"close"}))
+		closed=await reader.read()==b""
+		writer.close()
+		return (responses,closed)
+	(responses,closed)=withService(client)
+	assert [status for (status,headers,body) in responses]==[200]*6+[404,200]
+	assert all(headers["connection"]=="keep-alive" for (status,headers,body) in responses[:-1])
+	assert responses[-1][1]["connection"]=="close"
+	assert closed
+
+# several clients at once, each with its own keep-alive connection
+def test_concurrent_clients():
+	async def client(port):
+		async def one(coordStrings):
+			(reader,writer)=await asyncio.open_connection("127.0.0.1",port)
+			results=[json.loads((await request(reader,writer,"GET","/candidates?coords="+quote(s)))[2])["input"] for s in coordStrings]
+			writer.close()
+			return results
+		return await asyncio.gather(*[one(readings[n:]+readings[:n]) for n in range(3)]*4)
+	for (n,inputs) in enumerate(withService(client)):
+		assert inputs==readings[n%3:]+readings[:n%3]
+
+@pytest.mark.parametrize("cluster",[True,"abc",-5,"nan",None])
+def test_bad_cluster(cluster):
+	(status,headers,body)=postJSON("/candidates",{"coords":readings[0],"cluster":cluster})
+	assert status==400
+	assert "cluster" in json.loads(body)["error"]
+
+@pytest.mark.parametrize("obj",[{},{"coords":[]},{"coords":5},{"coords":["3922312011",7]},{"coords":"1","markerName":3}])
+def test_bad_fields(obj):
+	assert postJSON("/candidates",obj)[0]==400
+
+def test_bad_json():
+	assert fetch("POST","/candidates",b"{nope",{"Content-Type":"application/json"})[0]==400
+	assert fetch("POST","/candidates",b"[1,2]")[0]==400
+
+def test_oversized_body():
+	async def client(port):
+		(reader,writer)=await asyncio.open_connection("127.0.0.1",port)
+		writer.write(b"POST /candidates HTTP/1.1\r\nContent-Length: %d\r\n\r\n" % (buckshot_service.maxBody+1))
+		response=await reader.read()
+		writer.close()
+		return response
+	response=withService(client)
+	assert response.startswith(b"HTTP/1.1 413 ")
+	assert b"Connection: close" in response
+
+def test_oversized_batch(monkeypatch):
+	monkeypatch.setattr(buckshot_service,"maxBatch",2)
+	assert postJSON("/candidates",{"coords":readings})[0]==413
+
+def test_chunked_body():
+	(status,headers,body)=fetch("POST","/candidates",headers={"Transfer-Encoding":"chunked"})
+	assert status==501
+	assert headers["connection"]=="close"
+
+def test_method_not_allowed():
+	assert fetch("PUT","/candidates?coords=1")[0]==405
+
+def test_malformed_request_line():
+	async def client(port):
+		(reader,writer)=await asyncio.open_connection("127.0.0.1",port)
+		writer.write(b"garbage\r\n\r\n")
+		response=await reader.read()
+		writer.close()
+		return response
+	assert withService(client).startswith(b"HTTP/1.1 400 ")
+
+# exchange - write raw bytes on a new connection (then, with eof, close
+#  the sending side) and read everything until the service closes it
+def exchange(data,eof=False):
+	async def client(port):
+		(reader,writer)=await asyncio.open_connection("127.0.0.1",port)
+		writer.write(data)
+		if eof:
+			writer.write_eof()
+		response=await asyncio.wait_for(reader.read(),10)
+		writer.close()
+		return response
+	return withService(client)
+
+def statusOf(response):
+	return int(response.split(None,2)[1])
+
+@pytest.mark.parametrize("length",["abc","-1","+5","1_0"," ","5, 6"])
+def test_bad_content_length(length):
+	response=exchange(b"POST /candidates HTTP/1.1\r\nContent-Length: "+length.encode("latin-1")+b"\r\n\r\n12345")
+	assert statusOf(response)==400
+	assert b"Connection: close" in response
+
+def test_conflicting_content_lengths():
+	head=b"POST /candidates HTTP/1.1\r\nConnection: close\r\nContent-Type: text/plain\r\nContent-Length: 10\r\nContent-Length: %s\r\n\r\n3922312011"
+	assert statusOf(exchange(head % b"11"))==400
+	# (repeated, but the same)
+	assert statusOf(exchange(head % b"10"))==200
+
+def test_oversized_headers():
+	response=exchange(b"GET /candidates?coords=1 HTTP/1.1\r\nX-Long: "+b"a"*(70<<10)+b"\r\n\r\n")
+	assert statusOf(response)==431
+	lines=b"".join(b"X-Header-%d: 1\r\n" % n for n in range(buckshot_service.maxHeaders+1))
+	assert statusOf(exchange(b"GET /candidates?coords=1 HTTP/1.1\r\n"+lines+b"\r\n"))==431
+	# (exactly maxHeaders is fine)
+	lines=b"".join(b"X-Header-%d: 1\r\n" % n for n in range(buckshot_service.maxHeaders-1))
+	assert statusOf(exchange(b"GET /candidates?coords=1 HTTP/1.1\r\nConnection: close\r\n"+lines+b"\r\n"))==200
+	assert statusOf(exchange(b"GET /candidates?coords=1 HTTP/1.1\r\n"+b"a"*(70<<10)+b"\r\n\r\n"))==431
+
+@pytest.mark.parametrize("lines",[
+	b"Host: localhost\r\nX-Folded: a\r\n b\r\n",
+	b"Host: localhost\r\nX-Folded: a\r\n\tb: c\r\n",
+	b"Host : localhost\r\n",
+	b"no colon\r\n",
+	b": no name\r\n"])
+def test_malformed_headers(lines):
+	assert statusOf(exchange(b"GET /candidates?coords=1 HTTP/1.1\r\n"+lines+b"\r\n"))==400
+
+# a client that goes away partway through a request gets no response
+@pytest.mark.parametrize("data",[
+	b"GET /candidates?coords=1 HTT",
+	b"GET /candidates?coords=1 HTTP/1.1\r\nHost: local",
+	b"POST /candidates HTTP/1.1\r\nContent-Length: 20\r\n\r\n{\"coords\":"])
+def test_early_eof(data):
+	assert exchange(data,eof=True)==b""
+
+@pytest.mark.parametrize("encoding",["chunked","gzip, chunked","identity"])
+def test_transfer_encoding_is_not_supported(encoding):
+	body=b"a\r\n3922312011\r\n0\r\n\r\n"
+	response=exchange(b"POST /candidates HTTP/1.1\r\nContent-Type: text/plain\r\nTransfer-Encoding: "+encoding.encode("latin-1")+b"\r\n\r\n"+body)
+	assert statusOf(response)==501
+	assert b"Content-Length" in response and b"Connection: close" in response
+	# the body is never read as a request
+	assert response.count(b"HTTP/1.1 ")==1
+
+def test_expect_continue():
+	async def client(port):
+		(reader,writer)=await asyncio.open_connection("127.0.0.1",port)
+		body=b"3922312011"
+		writer.write(b"POST /candidates HTTP/1.1\r\nContent-Type: text/plain\r\nExpect: 100-continue\r\nContent-Length: %d\r\n\r\n" % len(body))
+		interim=await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"),10)
+		writer.write(body)
+		(status,headers,response)=await request(reader,writer,"GET","/candidates?coords=1",headers={"Connection":"close"})
+		writer.close()
+		return (interim,status)
+	assert withService(client)==(b"HTTP/1.1 100 Continue\r\n\r\n",200)
+	# too large: the error, without a 100 Continue, and without reading
+	#  the body
+	response=exchange(b"POST /candidates HTTP/1.1\r\nExpect: 100-continue\r\nContent-Length: %d\r\n\r\n" % (buckshot_service.maxBody+1))
+	assert statusOf(response)==413 and b" 100 " not in response
+	# no 100 Continue for HTTP/1.0
+	response=exchange(b"POST /candidates HTTP/1.0\r\nExpect: 100-continue\r\nContent-Type: text/plain\r\nContent-Length: 10\r\n\r\n3922312011")
+	assert statusOf(response)==200 and b" 100 " not in response
+	assert statusOf(exchange(b"POST /candidates HTTP/1.1\r\nExpect: something-else\r\nContent-Length: 10\r\n\r\n3922312011"))==417
+
+# pipelined requests, all written at once, are answered in order; nothing
+#  after a Connection: close is
+def test_pipelining():
+	data=b"".join(b"GET /candidates?coords=%s HTTP/1.1\r\nHost: localhost\r\n\r\n" % quote(s).encode("ascii") for s in readings)
+	data+=b"POST /candidates HTTP/1.1\r\nContent-Type: text/plain\r\nContent-Length: 10\r\n\r\n3922312011"
+	data+=b"GET /nope HTTP/1.1\r\nConnection: close\r\n\r\n"
+	data+=b"GET /candidates?coords=1 HTTP/1.1\r\n\r\n"
+	async def client(port):
+		(reader,writer)=await asyncio.open_connection("127.0.0.1",port)
+		writer.write(data)
+		responses=[]
+		while True:
+			line=await asyncio.wait_for(reader.readline(),10)
+			if not line:
+				break
+			headers={}
+			while True:
+				headerLine=(await reader.readline()).decode("latin-1").strip()
+				if not headerLine:
+					break
+				(name,sep,value)=headerLine.partition(":")
+				headers[name.lower()]=value.strip()
+			responses.append((int(line.split()[1]),await reader.readexactly(int(headers["content-length"]))))
+		writer.close()
+		return responses
+	responses=withService(client)
+	assert [status for (status,body) in responses]==[200]*len(readings)+[200,404]
+	assert [json.loads(body)["input"] for (status,body) in responses[:len(readings)]]==readings
+	assert [r["input"] for r in json.loads(responses[len(readings)][1])["results"]]==["3922312011"]
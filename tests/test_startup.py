@@ -0,0 +1,45 @@
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+import buckshot_lazy
+
+repoDir=os.path.join(os.path.dirname(os.path.abspath(__file__)),"..")
+
+# the feature modules that a plain launch must not import
+featureModules=["buckshot_area","buckshot_gazetteer","buckshot_terrain","buckshot_datum","buckshot_cluster",
+	"buckshot_cli","buckshot_metrics","buckshot_timing","buckshot_usng"]
+
+# importedAfter - run code in a fresh interpreter; returns the feature
+#  modules it left in sys.modules
+def importedAfter(code):
+	pytest.importorskip("PyQt5.QtWidgets")
+	env=dict(os.environ)
+	env.setdefault("QT_QPA_PLATFORM","offscreen")
+	code="import sys; sys.path.insert(0,%r)\n%s\nimport json; print(json.dumps(sorted(m for m in %r if m in sys.modules)))" % (repoDir,code,featureModules)
+	result=subprocess.run([sys.executable,"-c",code],env=env,capture_output=True,universal_newlines=True)
+	assert result.returncode==0,result.stderr
+	return json.loads(result.stdout.splitlines()[-1])
+
+def test_import_defers_feature_modules():
+	assert importedAfter("import buckshot")==[]
+
+# the empty candidate set at startup times itself, but needs nothing else
+def test_window_defers_feature_modules():
+	code="import buckshot\nfrom PyQt5.QtWidgets import QApplication\napp=QApplication(sys.argv[:1])\nw=buckshot.MyWindow(app)"
+	assert importedAfter(code)==["buckshot_timing"]
+
+def test_lazy_module_truth_does_not_import(monkeypatch):
+	monkeypatch.delitem(sys.modules,"colorsys",raising=False)
+	module=buckshot_lazy.LazyModule("colorsys")
+	assert module
+	assert "colorsys" not in sys.modules and not module.loaded()
+	assert module.rgb_to_hsv(1.0,0.0,0.0)==(0.0,1.0,1.0)
+	assert module.loaded() and module
+	missing=buckshot_lazy.LazyModule("buckshot_no_such_module")
+	assert not missing
+	with pytest.raises(ImportError):
+		missing.anything
@@ -0,0 +1,164 @@
+import pickle
+import random
+import struct
+from collections import namedtuple
+
+import pytest
+
+import buckshot_terrain
+
+# a 0.1 degree DEM tile, N39W121.hgt: 11 x 11 cells whose centers are on
+#  the tenths of a degree from 40 N, 121 W; the elevation is a plane,
+#  2000 m - 100 m per row south + 10 m per column east, so that bilinear
+#  interpolation gives it exactly between the cells; one cell has no data
+def elevationAt(row,col):
+	return 2000-100*row+10*col
+
+noDataCell=(5,5) # 39.5 N, 120.5 W
+
+def writeHGT(path):
+	values=[]
+	for row in range(11):
+		for col in range(11):
+			values.append(-32768 if (row,col)==noDataCell else elevationAt(row,col))
+	path.write_bytes(struct.pack(">%dh" % len(values),*values))
+
+# a 4 x 4 water mask over the tile's northwest corner, with water in the
+#  cell centered on 39.85 N, 120.85 W
+def writeWater(directory):
+	(directory/"water.bil").write_bytes(bytes([1 if (row,col)==(1,1) else 0 for row in range(4) for col in range(4)]))
+	(directory/"water.hdr").write_text("NROWS 4\nNCOLS 4\nNBITS 8\nULXMAP -120.95\nULYMAP 39.95\nXDIM 0.1\nYDIM 0.1\n")
+
+@pytest.fixture
+def terrainDir(tmp_path):
+	(tmp_path/"dem").mkdir()
+	(tmp_path/"water").mkdir()
+	writeHGT(tmp_path/"dem"/"N39W121.hgt")
+	writeWater(tmp_path/"water")
+	return tmp_path
+
+@pytest.fixture
+def terrain(terrainDir):
+	t=buckshot_terrain.Terrain([str(terrainDir/"dem")],[str(terrainDir/"water")])
+	yield t
+	t.close()
+
+def test_hgt_location_and_size(terrainDir):
+	raster=buckshot_terrain.openRaster(str(terrainDir/"dem"/"N39W121.hgt"))
+	assert (raster.nrows,raster.ncols)==(11,11)
+	assert (raster.north,raster.west)==(40.0,-121.0)
+	assert raster.dx==pytest.approx(0.1)
+	assert raster.bottom==pytest.approx(38.95)
+	assert raster.right==pytest.approx(-119.95)
+
+def test_elevation_at_cells_and_between_them(terrain):
+	assert terrain.sample(39.8,-120.7).elevation==pytest.approx(elevationAt(2,3))
+	# halfway between four cells, and a quarter of the way along a row
+	assert terrain.sample(39.75,-120.65).elevation==pytest.approx(2000-250+35)
+	assert terrain.sample(39.8,-120.675).elevation==pytest.approx(2000-200+32.5)
+	# the edge cells' values hold out to the edge of the tile
+	assert terrain.sample(39.5,-119.96).elevation==pytest.approx(elevationAt(5,10))
+	assert terrain.sample(40.04,-121.04).elevation==pytest.approx(elevationAt(0,0))
+
+def test_elevation_next_to_no_data(terrain):
+	# one of the four cells has no data: the nearest cell's value, if any
+	assert terrain.sample(39.57,-120.43).elevation==pytest.approx(elevationAt(4,6))
+	assert terrain.sample(39.52,-120.52).elevation is None
+
+def test_out_of_bounds(terrain):
+	for (lat,lon) in ((41.0,-120.5),(39.5,-119.9),(38.9,-120.5),(39.5,-121.1),(-39.5,120.5)):
+		assert terrain.sample(lat,lon)==buckshot_terrain.TerrainSample(None,None)
+	# on the DEM but off the water mask
+	assert terrain.sample(39.2,-120.2).water is None
+
+def test_water(terrain):
+	assert terrain.sample(39.85,-120.85).water is True
+	assert terrain.sample(39.86,-120.87).water is True
+	assert terrain.sample(39.75,-120.85).water is False
+
+def test_describe(terrainDir,terrain):
+	assert terrain.describe(terrain.sample(39.8,-120.7))=="elevation 1830 m"
+	assert terrain.describe(terrain.sample(39.85,-120.85))=="elevation 1865 m, in water"
+	assert terrain.describe(terrain.sample(41.0,-120.5))==""
+	ranged=buckshot_terrain.Terrain([str(terrainDir/"dem")],[],buckshot_terrain.parseElevationRange("1500-1800"))
+	assert ranged.describe(ranged.sample(39.8,-120.7))=="elevation 1830 m (outside reported range)"
+	assert ranged.describe(ranged.sample(39.2,-120.2))=="elevation 1280 m (outside reported range)"
+	assert ranged.describe(ranged.sample(39.5,-120.7))=="elevation 1530 m"
+	ranged.close()
+
+Point=namedtuple("Point","name lat lon")
+
+def test_rank_and_sample_candidates(terrain):
+	candidates=(Point("lake",39.85,-120.85),Point("dry",39.8,-120.7),Point("off",41.0,-120.0),Point("lake",39.85,-120.85))
+	samples=terrain.sampleCandidates(candidates)
+	assert set(samples)=={(39.85,-120.85),(39.8,-120.7),(41.0,-120.0)}
+	assert samples[(39.8,-120.7)]==terrain.sample(39.8,-120.7)
+	# missing data counts as plausible; the original order is kept otherwise
+	assert [c.name for c in terrain.rankCandidates(candidates)]==["dry","off","lake","lake"]
+
+# sampleMany reads each tile with NumPy gathers for larger batches; that
+#  must give the same as sampling the points one by one
+def test_batched_samples_match_single_samples(terrain):
+	pytest.importorskip("numpy")
+	rnd=random.Random(3)
+	lats=[rnd.uniform(38.9,40.1) for n in range(500)]+[39.52,39.57]
+	lons=[rnd.uniform(-121.1,-119.9) for n in range(500)]+[-120.52,-120.43]
+	batched=terrain.sampleMany(lats,lons)
+	for (lat,lon,sample) in zip(lats,lons,batched):
+		single=terrain.sample(lat,lon)
+		assert sample.water==single.water
+		if single.elevation is None:
+			assert sample.elevation is None,(lat,lon)
+		else:
+			assert sample.elevation==pytest.approx(single.elevation),(lat,lon)
+
+# BIL headers in both byte orders, and GridFloat
+def test_bil_and_gridfloat(tmp_path):
+	values=[100,-200,300,-400,500,-600]
+	header="NROWS 2\nNCOLS 3\nNBITS 16\nPIXELTYPE SIGNEDINT\nULXMAP -120.0\nULYMAP 39.5\nXDIM 0.5\nYDIM 0.5\n"
+	for (byteOrder,code) in (("I","<"),("M",">")):
+		(tmp_path/("dem"+byteOrder+".bil")).write_bytes(struct.pack(code+"6h",*values))
+		(tmp_path/("dem"+byteOrder+".hdr")).write_text(header+"BYTEORDER "+byteOrder+"\n")
+		raster=buckshot_terrain.openRaster(str(tmp_path/("dem"+byteOrder+".bil")))
+		assert raster.typeCode==code+"h"
+		assert [raster.value(lat,lon) for lat in (39.5,39.0) for lon in (-120.0,-119.5,-119.0)]==values
+		raster.close()
+	(tmp_path/"grid.flt").write_bytes(struct.pack(">6f",1.5,2.5,-9999,4.5,5.5,6.5))
+	(tmp_path/"grid.hdr").write_text("ncols 3\nnrows 2\nxllcorner -120.25\nyllcorner 38.75\ncellsize 0.5\nNODATA_value -9999\nbyteorder MSBFIRST\n")
+	raster=buckshot_terrain.openRaster(str(tmp_path/"grid.flt"))
+	assert (raster.north,raster.west,raster.typeCode)==(39.5,-120.0,">f")
+	assert [raster.value(lat,lon) for lat in (39.5,39.0) for lon in (-120.0,-119.5,-119.0)]==[1.5,2.5,None,4.5,5.5,6.5]
+	raster.close()
+
+def test_bad_rasters(tmp_path):
+	(tmp_path/"N39W121.hgt").write_bytes(b"\0"*10)
+	with pytest.raises(ValueError):
+		buckshot_terrain.openRaster(str(tmp_path/"N39W121.hgt"))
+	(tmp_path/"tile.hgt").write_bytes(b"\0"*8)
+	with pytest.raises(ValueError):
+		buckshot_terrain.openRaster(str(tmp_path/"tile.hgt"))
+	(tmp_path/"nohdr.bil").write_bytes(b"\0"*4)
+	with pytest.raises(ValueError):
+		buckshot_terrain.openRaster(str(tmp_path/"nohdr.bil"))
+	(tmp_path/"short.bil").write_bytes(b"\0"*4)
+	(tmp_path/"short.hdr").write_text("NROWS 2\nNCOLS 3\nNBITS 8\nULXMAP -120\nULYMAP 39\nXDIM 1\nYDIM 1\n")
+	raster=buckshot_terrain.openRaster(str(tmp_path/"short.bil"))
+	with pytest.raises(ValueError):
+		raster.value(39.0,-120.0)
+
+# batch mode sends the terrain to worker processes; the mappings are made
+#  again there
+def test_pickled_terrain_samples_the_same(terrain):
+	sample=terrain.sample(39.75,-120.65)
+	copy=pickle.loads(pickle.dumps(terrain))
+	assert copy.sample(39.75,-120.65)==sample
+	copy.close()
+
+def test_parse_elevation_range():
+	assert buckshot_terrain.parseElevationRange("1500-2500")==(1500.0,2500.0)
+	assert buckshot_terrain.parseElevationRange("2000-")==(2000.0,None)
+	assert buckshot_terrain.parseElevationRange("-1000")==(None,1000.0)
+	assert buckshot_terrain.parseElevationRange("-50--10")==(-50.0,-10.0)
+	for text in ("","-","2500-1500","high"):
+		with pytest.raises(ValueError):
+			buckshot_terrain.parseElevationRange(text)
@@ -0,0 +1,83 @@
+import json
+import math
+
+import pytest
+
+import buckshot_timing
+from buckshot_timing import Histogram,bucketBounds
+
+def histogram(*samples):
+	h=Histogram()
+	for seconds in samples:
+		h.add(seconds)
+	return h
+
+def test_bucket_bounds_are_1_2_5():
+	assert len(bucketBounds)==22
+	assert bucketBounds[:4]==pytest.approx([1e-5,2e-5,5e-5,1e-4])
+	assert bucketBounds[-4:]==pytest.approx([10.0,20.0,50.0,100.0])
+	assert bucketBounds==sorted(bucketBounds)
+	for (low,high) in zip(bucketBounds,bucketBounds[1:]):
+		assert high/low in (pytest.approx(2.0),pytest.approx(2.5))
+
+# each bound is the top of its own bucket; anything past it goes in the next
+def test_bucket_edges():
+	for (n,bound) in enumerate(bucketBounds):
+		h=histogram(bound,math.nextafter(bound,math.inf))
+		assert h.counts[n]==1 and h.counts[n+1]==1,bound
+		assert sum(h.counts)==2
+	assert histogram(0.0).counts[0]==1
+	h=histogram(1000.0)
+	assert h.counts[-1]==1 and len(h.counts)==len(bucketBounds)+1
+
+def test_percentile_interpolates_within_buckets():
+	assert Histogram().percentile(0.5) is None
+	h=histogram(*[0.0015]*4+[0.003]*4+[0.3]*2)
+	# (the first bucket starts at the smallest sample, the last one ends at
+	#  the largest)
+	assert h.percentile(0.0)==pytest.approx(0.0015)
+	assert h.percentile(0.2)==pytest.approx(0.0015+0.0005*2/4)
+	assert h.percentile(0.5)==pytest.approx(0.002+0.003*1/4)
+	assert h.percentile(0.9)==pytest.approx(0.2+0.1*1/2)
+	assert h.percentile(1.0)==pytest.approx(0.3)
+	# past the last bound, the largest sample is the top of the bucket
+	h=histogram(150.0,250.0)
+	assert h.percentile(0.5)==pytest.approx(200.0)
+	assert h.percentile(1.0)==pytest.approx(250.0)
+
+def test_merge():
+	first=[0.0015,0.003,0.003,0.7]
+	second=[0.00001,0.04,0.04]
+	h=histogram(*first)
+	h.merge(histogram(*second))
+	both=histogram(*first+second)
+	assert h.counts==both.counts
+	assert (h.count,h.min,h.max)==(7,0.00001,0.7)
+	assert h.total==pytest.approx(sum(first+second))
+	for p in (0.1,0.5,0.9,0.99):
+		assert h.percentile(p)==pytest.approx(both.percentile(p))
+	# empty histograms don't move the min and max
+	h.merge(Histogram())
+	assert (h.count,h.min,h.max)==(7,0.00001,0.7)
+	empty=Histogram()
+	empty.merge(both)
+	assert empty.toDict()==both.toDict()
+
+def test_save_merges_sessions(tmp_path):
+	path=str(tmp_path/"timings.json")
+	for seconds in (0.001,0.004):
+		timings=buckshot_timing.Timings()
+		timings.add("refresh",seconds)
+		timings.save(path)
+	(stages,sessions)=buckshot_timing.loadFile(path)
+	assert sessions==2
+	assert (stages["refresh"].count,stages["refresh"].min,stages["refresh"].max)==(2,0.001,0.004)
+	with open(path,"rb") as f:
+		data=json.loads(f.read().decode("utf-8"))
+	assert data["bucketBounds"]==bucketBounds
+	# a file with other buckets is started over
+	data["bucketBounds"]=[1.0]
+	with open(path,"w",encoding="utf-8") as f:
+		json.dump(data,f)
+	timings.save(path)
+	assert buckshot_timing.loadFile(path)[1]==1
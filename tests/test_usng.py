@@ -0,0 +1,105 @@
+import random
+
+import pytest
+
+import buckshot_cli
+import buckshot_engine
+import buckshot_usng
+from buckshot_usng import GridReference
+
+@pytest.mark.parametrize("text,defaults,ref",[
+	("10S GJ 06832 11123",(),GridReference("10S","GJ","06832","11123")),
+	("10sgj0683211123",(),GridReference("10S","GJ","06832","11123")),
+	("4Q FJ 123 678",(),GridReference("4Q","FJ","123","678")),
+	("10S GJ",(),GridReference("10S","GJ","","")),
+	("GJ 0683 1112",("10S",),GridReference("10S","GJ","0683","1112")),
+	("0683 1112",("10S","GJ"),GridReference("10S","GJ","0683","1112")),
+	("06831112",("10S","GJ"),GridReference("10S","GJ","0683","1112")),
+	# the default square is only for its own zone
+	("11S 0683 1112",("10S","GJ"),None),
+	("GJ 0683 1112",(),None),
+	("0683 1112",("10S",),None),
+	("10S GJ 0683 111",(),None),
+	("10S GJ 06831",(),None),
+	("10S GJ 068321 111231",(),None),
+	("61S GJ 0683 1112",(),None),
+	("10I GJ 0683 1112",(),None),
+	("10S GI 0683 1112",(),None),
+	("39 22.3 120 11.5",("10S","GJ"),None),
+	("",("10S","GJ"),None)])
+def test_parseUSNG(text,defaults,ref):
+	assert buckshot_usng.parseUSNG(text,*defaults)==ref
+
+def test_parseSquare():
+	assert buckshot_usng.parseSquare("10sgj")==("10S","GJ")
+	assert buckshot_usng.parseSquare("10S GJ")==("10S","GJ")
+	assert buckshot_usng.parseSquare("4q")==("4Q",None)
+	for text in ("GJ","10SG","99SGJ","10SGW"):
+		with pytest.raises(ValueError):
+			buckshot_usng.parseSquare(text)
+
+# a point's USNG reference is read back as the center of the square (of 1 m,
+#  100 m or 10 km) that holds the point, in the point's zone
+@pytest.mark.parametrize("digits",[5,3,1])
+def test_referenceLatLon_round_trip(digits):
+	rnd=random.Random(digits)
+	points=[(39.37,-120.19),(-33.9,18.4),(21.3,-157.8),(60.5,5.0),(78.0,15.0),(0.1,0.1),(-0.1,-179.9),(83.9,-45.0),(-79.9,100.0)]
+	points+=[(rnd.uniform(-80,84),rnd.uniform(-180,180)) for n in range(200)]
+	scale=10**(5-digits)
+	for (lat,lon) in points:
+		utm=buckshot_usng.toUTM(lat,lon)
+		text=buckshot_usng.usngText(utm,digits)
+		ref=buckshot_usng.parseUSNG(text)
+		assert ref is not None and len(ref.easting)==digits,text
+		center=buckshot_usng.fromUTM(utm.zone,buckshot_usng.meters(utm.easting)//scale*scale+scale/2.0,
+			buckshot_usng.meters(utm.northing)//scale*scale+scale/2.0,lat<0)
+		assert buckshot_usng.referenceLatLon(ref)==pytest.approx(center,abs=1e-9),text
+		# (the center is in the same square, unless the square straddles a
+		#  zone boundary)
+		utm2=buckshot_usng.toUTM(*center)
+		if utm2.zone==utm.zone:
+			assert buckshot_usng.usngText(utm2,digits)==text
+
+def test_referenceLatLon_letters_not_in_zone():
+	# zone 10 uses columns A-H; S-Z are zones 3, 6, 9, ...
+	assert buckshot_usng.referenceLatLon(GridReference("10S","SJ","0683","1112")) is None
+	assert buckshot_usng.referenceLatLon(GridReference("9S","SJ","0683","1112")) is not None
+
+def test_usngCandidates_full_reference():
+	(c,)=buckshot_engine.usngCandidates("10S GJ 06832 11123")
+	assert (c.system,c.latDeg,c.latMin,c.latFrac,c.lonFrac)==("USNG","10S","GJ","06832","11123")
+	assert c.match==buckshot_engine.exactMatch
+	assert buckshot_usng.usngText(buckshot_usng.toUTM(c.lat,c.lon))=="10S GJ 06832 11123"
+	assert c.text()=="10S GJ 06832 11123"
+	assert buckshot_engine.generate("10S GJ 06832 11123").USNG==(c,)
+
+# without letters, a reading is only read as USNG when bare digits are
+#  asked for, and has at least 4 digits
+def test_usngCandidates_gating():
+	for text in ("0683 1112","06831112","3922312011","39 22","3922"):
+		assert buckshot_engine.usngCandidates(text)==()
+	buckshot_engine.setUSNGDefault("10S","GJ")
+	assert buckshot_engine.usngCandidates("0683 1112")==()
+	assert buckshot_engine.generate("3922312011").USNG==()
+	(c,)=buckshot_engine.usngCandidates("GJ 0683 1112")
+	assert c.match==buckshot_engine.noMatch
+	# a typed zone counts as a prefix; the default square only goes with
+	#  the default zone
+	assert len(buckshot_engine.usngCandidates("10S 0683 1112"))==1
+	assert buckshot_engine.usngCandidates("11S 0683 1112")==()
+	buckshot_engine.setUSNGDefault("10S","GJ",bareDigits=True)
+	(c,)=buckshot_engine.usngCandidates("0683 1112")
+	assert (c.latDeg,c.latMin,c.latFrac,c.lonFrac,c.match)==("10S","GJ","0683","1112",buckshot_engine.noMatch)
+	assert len(buckshot_engine.generate("3922312011").USNG)==1
+	assert len(buckshot_engine.usngCandidates("3922"))==1
+	for text in ("39","3 9","392","39 22.3"):
+		assert buckshot_engine.usngCandidates(text)==(),text
+	# letters typed out still need no opt-in
+	assert buckshot_engine.usngCandidates("10S GJ 06 11")[0].match==buckshot_engine.exactMatch
+
+def test_cli_usng_options():
+	parser=buckshot_cli.makeParser()
+	buckshot_cli.setUSNGFromArgs(parser.parse_args(["filter","--usng-square","10sgj"]))
+	assert buckshot_engine.usngDefault==("10S","GJ",False)
+	buckshot_cli.setUSNGFromArgs(parser.parse_args(["filter","--usng-square","10SGJ","--usng-digits"]))
+	assert buckshot_engine.usngDefault==("10S","GJ",True)
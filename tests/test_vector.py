@@ -0,0 +1,51 @@
+import pytest
+
+pytest.importorskip("numpy")
+
+import buckshot_engine
+import buckshot_vector
+from test_engine import corpus,digitsOf
+
+# scalarCandidates - calcLatLon's candidates of each string, in order
+def scalarCandidates(numbersList):
+	result=[]
+	for numbers in numbersList:
+		(Dd,DMm,DMSs)=buckshot_engine.calcLatLon(numbers)
+		result.append(list(Dd+DMm+DMSs))
+	return result
+
+# vectorCandidates - generateColumns's candidates of each string, in order
+def vectorCandidates(numbersList):
+	columns=buckshot_vector.generateColumns(numbersList)
+	result=[[] for numbers in numbersList]
+	for k in range(len(columns.row)):
+		result[columns.row[k]].append(buckshot_vector.candidateAt(columns,numbersList,k))
+	return result
+
+# the same candidates in the same order as the scalar engine, with the same
+#  decimal degrees (bit-identical up to 15 digits)
+@pytest.mark.parametrize("regionName",["default","conus","world"])
+def test_vector_matches_scalar(regionName):
+	buckshot_engine.setRegions(buckshot_engine.regionPresets[regionName])
+	numbersList=[digitsOf(coordString)[:15] for coordString in corpus[:1000 if regionName!="world" else 200]]
+	assert vectorCandidates(numbersList)==scalarCandidates(numbersList)
+
+# raw strings are stripped of delimiters the same way
+def test_vector_takes_raw_strings():
+	strings=corpus[:300]
+	numbersList=[digitsOf(coordString) for coordString in strings]
+	columns=buckshot_vector.generateColumns(strings)
+	assert len(columns.row)==sum(len(c) for c in scalarCandidates(numbersList))
+
+# overlapping region hypotheses don't produce the same split twice
+def test_vector_overlapping_regions():
+	buckshot_engine.setRegions(buckshot_engine.lookupRegions("20-49N,100-129W")+buckshot_engine.lookupRegions("30-45N,110-125W"))
+	numbersList=[digitsOf(coordString)[:15] for coordString in corpus[:500]]
+	assert vectorCandidates(numbersList)==scalarCandidates(numbersList)
+
+# digit strings too long for int64 are skipped, not wrong
+def test_vector_skips_long_strings():
+	numbersList=["3922312011","3"*(buckshot_vector.maxDigits+1)]
+	columns=buckshot_vector.generateColumns(numbersList)
+	assert list(columns.skipped)==[1]
+	assert set(columns.row)=={0}